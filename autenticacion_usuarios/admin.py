@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Rol, Usuario, Cliente, Bitacora, Notificacion
+from .models import Rol, Usuario, Cliente, Bitacora, BitacoraArchivo, Notificacion
+from . import identidad
 
 # ==========================================================
 # ADMINISTRACIÓN DE MODELOS DE AUTENTICACIÓN
@@ -10,6 +11,12 @@ class RolAdmin(admin.ModelAdmin):
     list_display = ('id_rol', 'nombre')
     search_fields = ('nombre',)
     ordering = ('nombre',)
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change:
+            # El nombre del rol está en la identidad de la sesión de sus usuarios
+            identidad.invalidar(*Usuario.objects.filter(id_rol=obj).values_list('id', flat=True))
 
 @admin.register(Usuario)
 class UsuarioAdmin(admin.ModelAdmin):
@@ -27,6 +34,21 @@ class UsuarioAdmin(admin.ModelAdmin):
             'fields': ('contrasena', 'id_rol', 'estado')
         }),
     )
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change:
+            identidad.invalidar(obj.id)
+    
+    def delete_model(self, request, obj):
+        usuario_id = obj.id
+        super().delete_model(request, obj)
+        identidad.invalidar(usuario_id)
+    
+    def delete_queryset(self, request, queryset):
+        usuario_ids = list(queryset.values_list('id', flat=True))
+        super().delete_queryset(request, queryset)
+        identidad.invalidar(*usuario_ids)
 
 @admin.register(Cliente)
 class ClienteAdmin(admin.ModelAdmin):
@@ -59,6 +81,12 @@ class BitacoraAdmin(admin.ModelAdmin):
         }),
     )
 
+@admin.register(BitacoraArchivo)
+class BitacoraArchivoAdmin(admin.ModelAdmin):
+    list_display = ('mes', 'archivo', 'filas', 'fecha_archivado')
+    ordering = ('-mes',)
+    readonly_fields = ('mes', 'archivo', 'filas', 'conteo_acciones', 'fecha_archivado')
+
 @admin.register(Notificacion)
 class NotificacionAdmin(admin.ModelAdmin):
     list_display = ('id_notificacion', 'titulo', 'tipo', 'prioridad', 'leido', 'fecha_envio', 'id_usuario')
@@ -0,0 +1,317 @@
+"""
+Archivo mensual de la bitácora.
+
+La tabla `bitacora` solo crece. Los últimos BITACORA_MESES_ACTIVOS meses (hora
+local) quedan en la tabla, con índice por (accion, fecha); los anteriores se
+mueven con el comando archivar_bitacora a un archivo NDJSON comprimido por mes
+(bitacora-AAAA-MM.ndjson.gz en BITACORA_ARCHIVO_DIR) y se registran en
+BitacoraArchivo junto con las filas por acción.
+
+Las lecturas (`consultar`, `contar_por_mes`) combinan la tabla con los meses
+archivados que toca el rango pedido, así que quien lee no necesita saber dónde
+está cada mes. Un conteo que cubre un mes archivado completo sale de
+BitacoraArchivo sin abrir el archivo.
+
+Archivar un mes es idempotente: el archivo se reescribe con sus filas previas
+más las de la tabla que aún no tenía (por id_bitacora) y se reemplaza de forma
+atómica antes de borrar esas filas de la tabla. Si el proceso se corta entre
+ambos pasos, las lecturas ignoran la tabla en los meses archivados (las filas
+ya están en el archivo) y la siguiente ejecución termina de borrarlas.
+
+BITACORA_ARCHIVO_DIR debe configurarse explícitamente con un directorio
+persistente (p. ej. un disco montado): en un sistema de archivos efímero los
+meses archivados se perderían en el siguiente despliegue. Sin él no se archiva.
+Si falta un archivo registrado, las lecturas lo informan en el log y siguen.
+"""
+import gzip
+import json
+import logging
+import os
+from collections import Counter
+from datetime import date, datetime, time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Bitacora, BitacoraArchivo
+
+logger = logging.getLogger(__name__)
+
+MESES_ACTIVOS = getattr(settings, 'BITACORA_MESES_ACTIVOS', 6)
+ARCHIVO_DIR = getattr(settings, 'BITACORA_ARCHIVO_DIR', '')
+
+FILAS_POR_LOTE = 2000
+
+CAMPOS = ('id_bitacora', 'fecha', 'ip', 'accion', 'modulo', 'descripcion', 'id_usuario')
+
+
+def inicio_mes(valor):
+    """Primer día del mes (date) de una fecha o datetime, en hora local"""
+    if isinstance(valor, datetime):
+        valor = timezone.localtime(valor) if timezone.is_aware(valor) else valor
+        valor = valor.date()
+    return valor.replace(day=1)
+
+
+def mes_siguiente(mes):
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def _mes_anterior(mes, meses=1):
+    total = mes.year * 12 + mes.month - 1 - meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def _a_datetime(mes):
+    return timezone.make_aware(datetime.combine(mes, time.min))
+
+
+def frontera_activa(meses_activos=MESES_ACTIVOS):
+    """Inicio del mes más antiguo que se conserva en la tabla"""
+    return _mes_anterior(timezone.localdate().replace(day=1), max(meses_activos, 1) - 1)
+
+
+def verificar_directorio():
+    """Exige un BITACORA_ARCHIVO_DIR explícito y absoluto antes de archivar"""
+    if not ARCHIVO_DIR or not os.path.isabs(ARCHIVO_DIR):
+        raise ImproperlyConfigured(
+            'BITACORA_ARCHIVO_DIR debe ser la ruta absoluta de un directorio persistente para archivar la bitácora'
+        )
+
+
+def ruta_archivo(nombre):
+    return os.path.join(ARCHIVO_DIR, nombre)
+
+
+def _nombre_archivo(mes):
+    return f'bitacora-{mes:%Y-%m}.ndjson.gz'
+
+
+def _leer_filas(nombre):
+    """Filas (dicts con `fecha` como datetime) de un archivo de mes"""
+    with gzip.open(ruta_archivo(nombre), 'rt', encoding='utf-8') as archivo:
+        for linea in archivo:
+            if linea.strip():
+                fila = json.loads(linea)
+                fila['fecha'] = datetime.fromisoformat(fila['fecha'])
+                yield fila
+
+
+def _filas_archivo(archivo):
+    """Filas de un BitacoraArchivo, o None si su archivo ya no existe"""
+    try:
+        return list(_leer_filas(archivo.archivo))
+    except FileNotFoundError:
+        logger.error(f"Bitácora: falta el archivo {archivo.archivo} del mes {archivo.mes:%Y-%m} en {ARCHIVO_DIR}")
+        return None
+
+
+# ==========================================================
+# ARCHIVADO
+# ==========================================================
+
+def archivar_mes(mes, lote=FILAS_POR_LOTE):
+    """Mueve las filas de un mes a su archivo; retorna cuántas filas se movieron"""
+    verificar_directorio()
+    mes = inicio_mes(mes)
+    if mes >= frontera_activa(1):
+        raise ValueError(f"El mes en curso no se puede archivar: {mes:%Y-%m}")
+
+    nombre = _nombre_archivo(mes)
+    ruta = ruta_archivo(nombre)
+    previas = list(_leer_filas(nombre)) if os.path.exists(ruta) else []
+    ids_previos = {fila['id_bitacora'] for fila in previas}
+
+    filas = (
+        Bitacora.objects
+        .filter(fecha__gte=_a_datetime(mes), fecha__lt=_a_datetime(mes_siguiente(mes)))
+        .order_by('fecha', 'id_bitacora')
+        .values_list(*CAMPOS)
+        .iterator(chunk_size=lote)
+    )
+
+    os.makedirs(ARCHIVO_DIR, exist_ok=True)
+    temporal = f'{ruta}.tmp'
+    movidas = []
+    # Filas que ya estaban en el archivo pero siguen en la tabla (corte entre
+    # el reemplazo del archivo y el borrado en una ejecución anterior)
+    ya_archivadas = []
+    conteo = Counter(fila['accion'] for fila in previas)
+    with open(temporal, 'wb') as destino:
+        with gzip.GzipFile(fileobj=destino, mode='wb') as comprimido:
+            for fila in previas:
+                comprimido.write(_linea(fila))
+            for valores in filas:
+                fila = dict(zip(CAMPOS, valores))
+                if fila['id_bitacora'] in ids_previos:
+                    ya_archivadas.append(fila['id_bitacora'])
+                    continue
+                comprimido.write(_linea(fila))
+                conteo[fila['accion']] += 1
+                movidas.append(fila['id_bitacora'])
+        destino.flush()
+        os.fsync(destino.fileno())
+
+    # Primero el archivo completo en su lugar, luego el borrado: si el proceso
+    # se corta entre ambos, la siguiente ejecución no duplica filas (ids_previos)
+    if movidas:
+        os.replace(temporal, ruta)
+    else:
+        os.remove(temporal)
+        if not ya_archivadas:
+            return 0
+
+    borrar = movidas + ya_archivadas
+    with transaction.atomic():
+        BitacoraArchivo.objects.update_or_create(
+            mes=mes,
+            defaults={
+                'archivo': nombre,
+                'filas': len(previas) + len(movidas),
+                'conteo_acciones': dict(conteo),
+            }
+        )
+        for inicio in range(0, len(borrar), lote):
+            Bitacora.objects.filter(id_bitacora__in=borrar[inicio:inicio + lote]).delete()
+
+    logger.info(f"Bitácora {mes:%Y-%m} archivada: {len(movidas)} filas en {nombre}")
+    return len(movidas)
+
+
+def _linea(fila):
+    fila = {**fila, 'fecha': fila['fecha'].isoformat()}
+    return (json.dumps(fila, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def archivar_antiguos(meses_activos=MESES_ACTIVOS, lote=FILAS_POR_LOTE):
+    """Archiva todos los meses anteriores a los `meses_activos` más recientes"""
+    frontera = frontera_activa(meses_activos)
+    primera = (
+        Bitacora.objects.filter(fecha__lt=_a_datetime(frontera))
+        .order_by('fecha')
+        .values_list('fecha', flat=True)
+        .first()
+    )
+    resumen = {'meses': 0, 'filas': 0, 'frontera': frontera}
+    if primera is None:
+        return resumen
+
+    mes = inicio_mes(primera)
+    while mes < frontera:
+        movidas = archivar_mes(mes, lote)
+        if movidas:
+            resumen['meses'] += 1
+            resumen['filas'] += movidas
+        mes = mes_siguiente(mes)
+    return resumen
+
+
+# ==========================================================
+# LECTURA (TABLA + ARCHIVO)
+# ==========================================================
+
+def _archivos(desde, hasta):
+    """Meses archivados que se cruzan con [desde, hasta)"""
+    if desde is not None and desde >= _a_datetime(frontera_activa(1)):
+        # El mes en curso nunca se archiva
+        return BitacoraArchivo.objects.none()
+    archivos = BitacoraArchivo.objects.all()
+    if desde is not None:
+        archivos = archivos.filter(mes__gte=inicio_mes(desde))
+    if hasta is not None:
+        archivos = archivos.filter(mes__lt=timezone.localtime(hasta).date())
+    return archivos
+
+
+def _sin_meses_archivados(filas, archivos):
+    """
+    Excluye de la tabla los meses ya archivados: si quedaron filas tras un corte
+    entre el reemplazo del archivo y el borrado, el archivo ya las tiene
+    """
+    for archivo in archivos:
+        filas = filas.exclude(fecha__gte=_a_datetime(archivo.mes), fecha__lt=_a_datetime(mes_siguiente(archivo.mes)))
+    return filas
+
+
+def _cubre_mes(mes, desde, hasta):
+    return (desde is None or desde <= _a_datetime(mes)) and (hasta is None or hasta >= _a_datetime(mes_siguiente(mes)))
+
+
+def _coincide(fila, desde, hasta, accion, usuario_id):
+    return (
+        (desde is None or fila['fecha'] >= desde)
+        and (hasta is None or fila['fecha'] < hasta)
+        and (accion is None or fila['accion'] == accion)
+        and (usuario_id is None or fila['id_usuario'] == usuario_id)
+    )
+
+
+def consultar(desde=None, hasta=None, accion=None, usuario_id=None, limite=None):
+    """
+    Entradas de bitácora en [desde, hasta) (datetimes con zona horaria) de la
+    tabla y del archivo, de la más reciente a la más antigua, como dicts con
+    los campos de CAMPOS.
+    """
+    archivos = list(_archivos(desde, hasta).order_by('-mes'))
+    filas = _sin_meses_archivados(Bitacora.objects.order_by('-fecha', '-id_bitacora'), archivos)
+    if desde is not None:
+        filas = filas.filter(fecha__gte=desde)
+    if hasta is not None:
+        filas = filas.filter(fecha__lt=hasta)
+    if accion is not None:
+        filas = filas.filter(accion=accion)
+    if usuario_id is not None:
+        filas = filas.filter(id_usuario_id=usuario_id)
+    if limite is not None:
+        filas = filas[:limite]
+    resultado = [dict(zip(CAMPOS, valores)) for valores in filas.values_list(*CAMPOS)]
+
+    for archivo in archivos:
+        if limite is not None and len(resultado) >= limite:
+            break
+        if accion is not None and not archivo.conteo_acciones.get(accion):
+            continue
+        filas_archivo = _filas_archivo(archivo)
+        if filas_archivo is None:
+            continue
+        del_mes = [fila for fila in filas_archivo if _coincide(fila, desde, hasta, accion, usuario_id)]
+        del_mes.sort(key=lambda fila: (fila['fecha'], fila['id_bitacora']), reverse=True)
+        resultado.extend(del_mes)
+
+    return resultado[:limite] if limite is not None else resultado
+
+
+def contar_por_mes(accion=None, desde=None, hasta=None):
+    """{mes (date): filas} de la tabla y del archivo en [desde, hasta)"""
+    archivos = list(_archivos(desde, hasta))
+    filas = _sin_meses_archivados(Bitacora.objects.all(), archivos)
+    if accion is not None:
+        filas = filas.filter(accion=accion)
+    if desde is not None:
+        filas = filas.filter(fecha__gte=desde)
+    if hasta is not None:
+        filas = filas.filter(fecha__lt=hasta)
+    por_mes = (
+        filas.annotate(mes=TruncMonth('fecha', tzinfo=timezone.get_current_timezone()))
+        .values('mes')
+        .annotate(filas=Count('pk'))
+        .order_by()
+    )
+    conteo = Counter({inicio_mes(fila['mes']): fila['filas'] for fila in por_mes})
+
+    for archivo in archivos:
+        del_mes = archivo.filas if accion is None else archivo.conteo_acciones.get(accion, 0)
+        if not del_mes or _cubre_mes(archivo.mes, desde, hasta):
+            conteo[archivo.mes] += del_mes
+            continue
+        filas_archivo = _filas_archivo(archivo)
+        if filas_archivo is None:
+            # Sin el archivo no se puede recortar el mes: se cuenta completo
+            conteo[archivo.mes] += del_mes
+            continue
+        conteo[archivo.mes] += sum(1 for fila in filas_archivo if _coincide(fila, desde, hasta, accion, None))
+    return dict(conteo)
@@ -0,0 +1,205 @@
+"""
+Escritura diferida de la bitácora (tabla `bitacora`).
+
+Las vistas no insertan la entrada durante la petición: `registrar()` la deja en
+un buffer en memoria del proceso y un hilo la escribe junto con las demás en un
+solo bulk_create cuando se juntan BITACORA_LOTE entradas o cada
+BITACORA_FLUSH_SEGUNDOS. Al terminar el worker (atexit) se escribe lo que quede.
+
+- La fecha de la entrada se toma al registrar, no al escribir.
+- Dentro de una transacción la entrada se encola al confirmarla (on_commit),
+  igual que antes una entrada de una transacción revertida no quedaba escrita.
+- Si el buffer está lleno (BITACORA_BUFFER_MAX, p. ej. porque la base de datos
+  no responde) la entrada se escribe de forma síncrona en la propia petición.
+- Si un lote falla se reintenta fila por fila; las que vuelven a fallar se
+  descartan, se registran en el log y se cuentan.
+
+`estado()` expone, por proceso, las entradas pendientes, escritas, síncronas y
+descartadas y la latencia de los flush. Con BITACORA_ASINCRONA=False todas las
+entradas se escriben en el momento.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import Bitacora
+
+logger = logging.getLogger(__name__)
+
+ASINCRONA = getattr(settings, 'BITACORA_ASINCRONA', True)
+LOTE = getattr(settings, 'BITACORA_LOTE', 100)
+FLUSH_SEGUNDOS = getattr(settings, 'BITACORA_FLUSH_SEGUNDOS', 2.0)
+BUFFER_MAX = getattr(settings, 'BITACORA_BUFFER_MAX', 5000)
+
+
+class _Buffer:
+    """Cola de entradas pendientes del proceso y el hilo que las escribe"""
+
+    def __init__(self):
+        self._condicion = threading.Condition()
+        self._entradas = deque()
+        self._hilo = None
+        self._pid = None
+        self._escritas = 0
+        self._flushes = 0
+        self._sincronas = 0
+        self._descartadas = 0
+        self._flush_ultimo = 0.0
+        self._flush_max = 0.0
+        self._flush_total = 0.0
+
+    def _asegurar_hilo(self):
+        # Tras un fork (workers de gunicorn con --preload) el hilo del padre no
+        # existe en el hijo ni deben escribirse las entradas que el padre tenía
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._entradas.clear()
+            self._hilo = None
+        if self._hilo is None or not self._hilo.is_alive():
+            self._hilo = threading.Thread(target=self._ejecutar, name='bitacora-flush', daemon=True)
+            self._hilo.start()
+
+    def agregar(self, entrada):
+        with self._condicion:
+            self._asegurar_hilo()
+            saturado = len(self._entradas) >= BUFFER_MAX
+            if not saturado:
+                self._entradas.append(entrada)
+                if len(self._entradas) >= LOTE:
+                    self._condicion.notify()
+        if saturado:
+            self.escribir_sincrona(entrada)
+
+    def escribir_sincrona(self, entrada):
+        try:
+            entrada.save()
+            with self._condicion:
+                self._sincronas += 1
+        except Exception as e:
+            self._descartar([entrada], e)
+
+    def _tomar(self):
+        with self._condicion:
+            lote = list(self._entradas)
+            self._entradas.clear()
+        return lote
+
+    def _ejecutar(self):
+        while True:
+            with self._condicion:
+                self._condicion.wait_for(lambda: len(self._entradas) >= LOTE, timeout=FLUSH_SEGUNDOS)
+            try:
+                self.vaciar()
+            except Exception as e:
+                # El hilo no debe morir: el próximo ciclo vuelve a intentarlo
+                logger.error(f"Error vaciando la bitácora: {str(e)}")
+
+    def vaciar(self):
+        """Escribe todas las entradas pendientes; retorna cuántas se escribieron"""
+        lote = self._tomar()
+        if not lote:
+            return 0
+
+        close_old_connections()
+        inicio = time.perf_counter()
+        try:
+            Bitacora.objects.bulk_create(lote, batch_size=LOTE)
+            escritas = len(lote)
+        except Exception as e:
+            logger.warning(f"Lote de bitácora ({len(lote)} entradas) falló, se reintenta por fila: {str(e)}")
+            escritas = self._escribir_por_fila(lote)
+        finally:
+            duracion = (time.perf_counter() - inicio) * 1000
+            if threading.current_thread() is self._hilo:
+                close_old_connections()
+
+        with self._condicion:
+            self._escritas += escritas
+            self._flushes += 1
+            self._flush_ultimo = duracion
+            self._flush_max = max(self._flush_max, duracion)
+            self._flush_total += duracion
+        return escritas
+
+    def _escribir_por_fila(self, lote):
+        escritas = 0
+        for entrada in lote:
+            try:
+                entrada.save()
+                escritas += 1
+            except Exception as e:
+                self._descartar([entrada], e)
+        return escritas
+
+    def _descartar(self, entradas, error):
+        with self._condicion:
+            self._descartadas += len(entradas)
+        for entrada in entradas:
+            logger.error(
+                f"Entrada de bitácora descartada ({entrada.accion}, usuario {entrada.id_usuario_id}, "
+                f"{entrada.fecha.isoformat()}): {str(error)}"
+            )
+
+    def estado(self):
+        with self._condicion:
+            return {
+                'pid': os.getpid(),
+                'asincrona': ASINCRONA,
+                'pendientes': len(self._entradas) if self._pid == os.getpid() else 0,
+                'escritas': self._escritas,
+                'sincronas': self._sincronas,
+                'descartadas': self._descartadas,
+                'flushes': self._flushes,
+                'flush_ultimo_ms': round(self._flush_ultimo, 2),
+                'flush_max_ms': round(self._flush_max, 2),
+                'flush_promedio_ms': round(self._flush_total / self._flushes, 2) if self._flushes else 0.0,
+                'limites': {'lote': LOTE, 'flush_segundos': FLUSH_SEGUNDOS, 'buffer_max': BUFFER_MAX},
+            }
+
+
+_buffer = _Buffer()
+
+
+def registrar(usuario_id, accion, modulo, descripcion=None, ip=None):
+    """Registra una acción del usuario en la bitácora (escritura diferida)"""
+    entrada = Bitacora(
+        id_usuario_id=usuario_id,
+        accion=accion,
+        modulo=modulo,
+        descripcion=descripcion,
+        ip=ip,
+        fecha=timezone.now()
+    )
+    if not ASINCRONA:
+        _buffer.escribir_sincrona(entrada)
+        return
+    transaction.on_commit(lambda: _buffer.agregar(entrada))
+
+
+def vaciar():
+    """Escribe ya las entradas pendientes de este proceso"""
+    return _buffer.vaciar()
+
+
+def estado():
+    """Contadores del buffer de este proceso"""
+    return _buffer.estado()
+
+
+@atexit.register
+def _vaciar_al_salir():
+    if _buffer._pid != os.getpid():
+        return
+    try:
+        escritas = _buffer.vaciar()
+        if escritas:
+            logger.info(f"Bitácora: {escritas} entradas escritas al cerrar el proceso")
+    except Exception as e:
+        logger.error(f"Error vaciando la bitácora al cerrar el proceso: {str(e)}")
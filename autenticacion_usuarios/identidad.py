@@ -0,0 +1,107 @@
+"""
+Foto de identidad del usuario guardada en la sesión.
+
+El frontend llama a CheckSessionView en cada cambio de ruta. En lugar de leer
+usuario y rol en cada llamada, la vista responde con la foto (id, nombre,
+apellido, email, rol, telefono) que se guardó en la sesión al iniciarla.
+
+Cada usuario tiene una versión en la caché compartida y la foto guarda la
+versión con la que se tomó: solo se vuelve a leer de la base de datos cuando no
+coinciden. La versión cambia al editar al usuario (ClienteDetailView.put), al
+cambiar su rol o el nombre del rol desde el admin, o si la caché la perdió.
+Las versiones expiran a los VERSION_TTL segundos (la vigencia de la cookie de
+sesión); una versión expirada solo provoca una relectura.
+
+Sin caché compartida (CACHE_COMPARTIDA) cada worker tendría su propia versión
+y no vería las invalidaciones de los demás: en ese caso la foto nunca se da por
+vigente, se relee la base de datos y la versión es una huella de los datos (la
+misma en todos los workers, así el ETag no cambia si los datos no cambian).
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+CLAVE_SESION = 'identidad'
+PREFIJO_VERSION = 'identidad:version:'
+
+CAMPOS_USUARIO = ('id', 'nombre', 'apellido', 'email', 'rol', 'telefono')
+
+CACHE_COMPARTIDA = getattr(settings, 'CACHE_COMPARTIDA', False)
+VERSION_TTL = settings.SESSION_COOKIE_AGE
+
+
+def _clave_version(usuario_id):
+    return f'{PREFIJO_VERSION}{usuario_id}'
+
+
+def version(usuario_id):
+    """
+    Versión vigente de la identidad del usuario (se crea si la caché no la
+    tiene), o None sin caché compartida
+    """
+    if not CACHE_COMPARTIDA:
+        return None
+    clave = _clave_version(usuario_id)
+    actual = cache.get(clave)
+    if actual is None:
+        # add: si otro proceso la creó al mismo tiempo, gana la primera
+        cache.add(clave, time.time_ns(), VERSION_TTL)
+        actual = cache.get(clave)
+    return actual
+
+
+def invalidar(*usuario_ids):
+    """Cambia la versión de esos usuarios: su próxima verificación relee la base de datos"""
+    if usuario_ids and CACHE_COMPARTIDA:
+        nueva = time.time_ns()
+        cache.set_many({_clave_version(usuario_id): nueva for usuario_id in usuario_ids}, VERSION_TTL)
+
+
+def _huella(foto):
+    datos = json.dumps([foto[campo] for campo in CAMPOS_USUARIO], default=str)
+    return hashlib.sha1(datos.encode('utf-8')).hexdigest()[:16]
+
+
+def guardar(session, usuario, version_actual=None):
+    """
+    Toma la foto de `usuario` (con id_rol cargado) y la guarda en la sesión.
+    `version_actual` debe leerse antes que el usuario para no asociar datos
+    viejos a una versión nueva.
+    """
+    foto = {
+        'id': usuario.id,
+        'nombre': usuario.nombre,
+        'apellido': usuario.apellido,
+        'email': usuario.email,
+        'rol': usuario.id_rol.nombre,
+        'telefono': usuario.telefono,
+    }
+    if version_actual is None:
+        version_actual = version(usuario.id)
+    foto['version'] = _huella(foto) if version_actual is None else version_actual
+    # Sin cambios no se marca la sesión como modificada (no se reescribe)
+    if session.get(CLAVE_SESION) != foto:
+        session[CLAVE_SESION] = foto
+    return foto
+
+
+def vigente(session):
+    """Foto de la sesión si sigue al día con la versión del usuario, o None"""
+    foto = session.get(CLAVE_SESION)
+    if not CACHE_COMPARTIDA or not foto or foto.get('id') != session.get('user_id'):
+        return None
+    if cache.get(_clave_version(foto['id'])) != foto.get('version'):
+        return None
+    return foto
+
+
+def datos_usuario(foto):
+    """Campos del usuario tal como los devuelve la API"""
+    return {campo: foto[campo] for campo in CAMPOS_USUARIO}
+
+
+def etag(foto):
+    return f'"{foto["id"]}-{foto["version"]}"'
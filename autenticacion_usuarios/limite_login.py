@@ -0,0 +1,109 @@
+"""
+Límite de intentos de inicio de sesión por IP y por cuenta desde cada IP.
+
+Verificar una contraseña cuesta un hash PBKDF2 deliberadamente lento, así que
+una ráfaga de credenciales probadas en masa satura los workers solo calculando
+hashes. LoginView consulta `espera()` antes de buscar al usuario: si la IP o la
+cuenta (desde esa IP) están bloqueadas responde 429 sin hashear nada.
+
+Los fallos se cuentan en la caché compartida durante LOGIN_VENTANA_SEGUNDOS.
+Al llegar al umbral (LOGIN_INTENTOS_IP o LOGIN_INTENTOS_CUENTA) cada nuevo
+fallo bloquea el doble que el anterior, empezando en LOGIN_BLOQUEO_BASE_SEGUNDOS
+y hasta LOGIN_BLOQUEO_MAX_SEGUNDOS. Un inicio de sesión correcto limpia los
+contadores de la cuenta en esa IP; los de la IP solo expiran, para que un
+atacante con una cuenta propia no pueda reiniciarlos.
+
+El contador de la cuenta se lleva por (cuenta, IP): si fuera global, cualquiera
+podría bloquear a un usuario con fallos a propósito desde su propia IP, y el
+usuario tampoco podría entrar desde la suya. Un ataque repartido entre muchas
+IPs sobre una cuenta queda limitado por el contador de cada IP.
+
+X-Forwarded-For solo se usa si LOGIN_PROXIES_CONFIABLES > 0 (en Render, 1):
+sin un proxy que lo agregue, el cliente podría inventar una IP por intento.
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+ACTIVO = getattr(settings, 'LOGIN_LIMITE_ACTIVO', True)
+INTENTOS_IP = getattr(settings, 'LOGIN_INTENTOS_IP', 30)
+INTENTOS_CUENTA = getattr(settings, 'LOGIN_INTENTOS_CUENTA', 5)
+VENTANA_SEGUNDOS = getattr(settings, 'LOGIN_VENTANA_SEGUNDOS', 15 * 60)
+BLOQUEO_BASE_SEGUNDOS = getattr(settings, 'LOGIN_BLOQUEO_BASE_SEGUNDOS', 1)
+BLOQUEO_MAX_SEGUNDOS = getattr(settings, 'LOGIN_BLOQUEO_MAX_SEGUNDOS', 15 * 60)
+PROXIES_CONFIABLES = getattr(settings, 'LOGIN_PROXIES_CONFIABLES', 0)
+
+PREFIJO = 'login:'
+
+
+def ip_cliente(request):
+    """
+    IP para los contadores. Se toma la entrada de X-Forwarded-For que agregó el
+    proxy de confianza más externo (las anteriores las puede inventar el cliente).
+    """
+    if PROXIES_CONFIABLES > 0:
+        ips = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+        if len(ips) >= PROXIES_CONFIABLES:
+            return ips[-PROXIES_CONFIABLES]
+    return request.META.get('REMOTE_ADDR') or 'desconocida'
+
+
+def _clave(tipo, ambito, valor):
+    # Hash: emails e IPv6 pueden tener caracteres no válidos en algunas cachés
+    return f'{PREFIJO}{tipo}:{ambito}:{hashlib.sha1(str(valor).encode("utf-8")).hexdigest()}'
+
+
+def _cuenta(ip, email):
+    return f'{email}|{ip}'
+
+
+def espera(ip, email):
+    """Segundos que faltan para que la IP o la cuenta desde esa IP puedan volver a intentar (0 = sin bloqueo)"""
+    if not ACTIVO:
+        return 0
+    bloqueos = cache.get_many([_clave('bloqueo', 'ip', ip), _clave('bloqueo', 'cuenta', _cuenta(ip, email))])
+    restante = max((hasta - time.time() for hasta in bloqueos.values()), default=0)
+    return math.ceil(restante) if restante > 0 else 0
+
+
+def _contar_fallo(ambito, valor, umbral):
+    clave = _clave('fallos', ambito, valor)
+    cache.add(clave, 0, VENTANA_SEGUNDOS)
+    try:
+        fallos = cache.incr(clave)
+    except ValueError:
+        # Expiró entre add e incr
+        cache.set(clave, 1, VENTANA_SEGUNDOS)
+        fallos = 1
+
+    if fallos >= umbral:
+        segundos = min(BLOQUEO_BASE_SEGUNDOS * 2 ** min(fallos - umbral, 30), BLOQUEO_MAX_SEGUNDOS)
+        cache.set(_clave('bloqueo', ambito, valor), time.time() + segundos, segundos)
+
+
+def registrar_fallo(ip, email):
+    """Cuenta un intento fallido para la IP y para la cuenta desde esa IP"""
+    if not ACTIVO:
+        return
+    _contar_fallo('ip', ip, INTENTOS_IP)
+    _contar_fallo('cuenta', _cuenta(ip, email), INTENTOS_CUENTA)
+
+
+def registrar_exito(ip, email):
+    """Limpia los fallos y el bloqueo de la cuenta en esa IP tras un inicio de sesión correcto"""
+    if not ACTIVO:
+        return
+    cuenta = _cuenta(ip, email)
+    cache.delete_many([_clave('fallos', 'cuenta', cuenta), _clave('bloqueo', 'cuenta', cuenta)])
+
+
+def reiniciar(ip, email=None):
+    """Borra contadores y bloqueos de una IP y, si se indica, de una cuenta en esa IP (soporte y benchmark)"""
+    claves = [_clave('fallos', 'ip', ip), _clave('bloqueo', 'ip', ip)]
+    if email is not None:
+        cuenta = _cuenta(ip, email)
+        claves += [_clave('fallos', 'cuenta', cuenta), _clave('bloqueo', 'cuenta', cuenta)]
+    cache.delete_many(claves)
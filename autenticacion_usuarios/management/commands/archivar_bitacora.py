@@ -0,0 +1,43 @@
+"""
+Comando para mover los meses antiguos de la bitácora a archivos NDJSON
+comprimidos (ver autenticacion_usuarios/archivo_bitacora.py). Pensado para
+ejecutarse una vez al mes o cada noche (cron); repetirlo no duplica filas.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from autenticacion_usuarios import archivo_bitacora
+
+
+class Command(BaseCommand):
+    help = 'Archiva en BITACORA_ARCHIVO_DIR los meses de bitácora anteriores a los meses activos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--meses',
+            type=int,
+            default=archivo_bitacora.MESES_ACTIVOS,
+            help=f'Meses (incluido el actual) que quedan en la tabla (default: {archivo_bitacora.MESES_ACTIVOS})'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=archivo_bitacora.FILAS_POR_LOTE,
+            help=f'Filas leídas y borradas por lote (default: {archivo_bitacora.FILAS_POR_LOTE})'
+        )
+
+    def handle(self, *args, **options):
+        if options['meses'] < 1:
+            raise CommandError('--meses debe ser al menos 1 (el mes en curso no se archiva)')
+
+        try:
+            archivo_bitacora.verificar_directorio()
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+
+        resumen = archivo_bitacora.archivar_antiguos(options['meses'], options['lote'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✓ {resumen['filas']} filas archivadas, meses: {resumen['meses']} "
+                f"(la tabla conserva desde {resumen['frontera']:%Y-%m})"
+            )
+        )
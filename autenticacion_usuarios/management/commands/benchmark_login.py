@@ -0,0 +1,129 @@
+"""
+Comando para medir cuántos intentos de login por segundo atiende un worker
+bajo un ataque de credenciales, con y sin el límite de intentos
+(ver autenticacion_usuarios/limite_login.py).
+
+Crea dos usuarios temporales: la víctima, que recibe contraseñas incorrectas
+desde unas pocas IPs, y un usuario legítimo que inicia sesión correctamente de
+vez en cuando desde otra IP. Los usuarios y sus contadores se eliminan al final.
+"""
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils.module_loading import import_string
+
+from autenticacion_usuarios import bitacora, limite_login
+from autenticacion_usuarios.models import Rol, Usuario
+from autenticacion_usuarios.views import LoginView
+
+
+class Command(BaseCommand):
+    help = 'Mide logins/s por worker bajo tráfico de ataque, con y sin límite de intentos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intentos',
+            type=int,
+            default=60,
+            help='Intentos de login por escenario (default: 60)'
+        )
+        parser.add_argument(
+            '--ips',
+            type=int,
+            default=3,
+            help='IPs distintas desde las que ataca (default: 3)'
+        )
+        parser.add_argument(
+            '--legitimo-cada',
+            type=int,
+            default=10,
+            help='Cada cuántos intentos hay un login legítimo (default: 10)'
+        )
+
+    def handle(self, *args, **options):
+        sufijo = time.time_ns()
+        victima_email = f'victima-{sufijo}@benchmark.local'
+        legitimo_email = f'legitimo-{sufijo}@benchmark.local'
+        ips = [f'10.255.0.{i + 1}' for i in range(max(options['ips'], 1))]
+        ip_legitima = '10.255.1.1'
+
+        rol, _ = Rol.objects.get_or_create(nombre='Cliente')
+        usuarios = []
+        for email in (victima_email, legitimo_email):
+            usuario = Usuario(nombre='Benchmark', email=email, id_rol=rol, estado=True)
+            usuario.set_password('clave-correcta')
+            usuario.save()
+            usuarios.append(usuario)
+
+        activo_original = limite_login.ACTIVO
+        try:
+            for activo in (False, True):
+                limite_login.ACTIVO = activo
+                for ip in ips:
+                    limite_login.reiniciar(ip, victima_email)
+                limite_login.reiniciar(ip_legitima, legitimo_email)
+
+                resultado = self._escenario(
+                    options['intentos'], ips, ip_legitima, victima_email, legitimo_email, options['legitimo_cada']
+                )
+                self._imprimir('con límite' if activo else 'sin límite', resultado)
+        finally:
+            limite_login.ACTIVO = activo_original
+            for ip in ips:
+                limite_login.reiniciar(ip, victima_email)
+            limite_login.reiniciar(ip_legitima, legitimo_email)
+            # Las entradas de bitácora pendientes apuntan a los usuarios temporales
+            bitacora.vaciar()
+            with transaction.atomic():
+                Usuario.objects.filter(id__in=[usuario.id for usuario in usuarios]).delete()
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark de login completado'))
+
+    def _escenario(self, intentos, ips, ip_legitima, victima_email, legitimo_email, legitimo_cada):
+        factory = RequestFactory()
+        vista = LoginView.as_view()
+        session_store = import_string(f'{settings.SESSION_ENGINE}.SessionStore')
+        estados = {}
+        legitimos = legitimos_ok = 0
+
+        inicio = time.perf_counter()
+        for i in range(intentos):
+            legitimo = legitimo_cada > 0 and i % legitimo_cada == legitimo_cada - 1
+            if legitimo:
+                datos, ip = {'email': legitimo_email, 'contrasena': 'clave-correcta'}, ip_legitima
+            else:
+                datos, ip = {'email': victima_email, 'contrasena': f'incorrecta-{i}'}, ips[i % len(ips)]
+            request = factory.post(
+                '/api/login/', json.dumps(datos), content_type='application/json',
+                REMOTE_ADDR=ip, HTTP_X_FORWARDED_FOR=ip
+            )
+            request.session = session_store()
+            response = vista(request)
+            estados[response.status_code] = estados.get(response.status_code, 0) + 1
+            if legitimo:
+                legitimos += 1
+                legitimos_ok += response.status_code == 200
+        duracion = time.perf_counter() - inicio
+
+        return {
+            'intentos': intentos,
+            'duracion': duracion,
+            'estados': estados,
+            'legitimos': legitimos,
+            'legitimos_ok': legitimos_ok,
+        }
+
+    def _imprimir(self, nombre, resultado):
+        estados = resultado['estados']
+        # Solo las respuestas 200 y 401 llegaron a calcular un hash
+        hashes = estados.get(200, 0) + estados.get(401, 0)
+        self.stdout.write(
+            f"{nombre:>11}: {resultado['intentos'] / resultado['duracion']:8.1f} intentos/s | "
+            f"{resultado['duracion'] * 1000 / resultado['intentos']:7.1f} ms/intento | "
+            f"hashes {hashes} | 401 {estados.get(401, 0)} | 429 {estados.get(429, 0)} | "
+            f"legítimos {resultado['legitimos_ok']}/{resultado['legitimos']}"
+        )
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:18
+
+from django.db import migrations, transaction
+
+
+# Índices de trigramas para la búsqueda incremental de filtros (ventas_carrito.busqueda):
+# icontains genera UPPER(campo::text) LIKE UPPER('%texto%'), que PostgreSQL resuelve con
+# un índice GIN gin_trgm_ops sobre la misma expresión. En otras bases no se crean.
+INDICES = [
+    ('usuario_nombre_trgm_idx', 'nombre'),
+    ('usuario_apellido_trgm_idx', 'apellido'),
+    ('usuario_email_trgm_idx', 'email'),
+]
+
+
+def crear_extension_trgm(apps, schema_editor):
+    # Única migración que crea pg_trgm; las de índices de otras apps dependen de esta
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except Exception as e:
+        print(f"Warning: pg_trgm no disponible, la búsqueda funcionará sin índices: {e}")
+
+
+def trgm_disponible(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def crear_indices_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql' or not trgm_disponible(schema_editor):
+        return
+    for nombre, columna in INDICES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {nombre} ON usuario USING gin (UPPER({columna}::text) gin_trgm_ops)'
+        )
+
+
+def eliminar_indices_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for nombre, _ in INDICES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {nombre}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autenticacion_usuarios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_extension_trgm, migrations.RunPython.noop),
+        migrations.RunPython(crear_indices_busqueda, eliminar_indices_busqueda),
+    ]
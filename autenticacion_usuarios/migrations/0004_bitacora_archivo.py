@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autenticacion_usuarios', '0003_bitacora_fecha_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BitacoraArchivo',
+            fields=[
+                ('id_archivo', models.AutoField(primary_key=True, serialize=False)),
+                ('mes', models.DateField(unique=True)),
+                ('archivo', models.CharField(max_length=255)),
+                ('filas', models.IntegerField(default=0)),
+                ('conteo_acciones', models.JSONField(default=dict)),
+                ('fecha_archivado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Archivo de bitácora',
+                'verbose_name_plural': 'Archivos de bitácora',
+                'db_table': 'bitacora_archivo',
+                'ordering': ['-mes'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='bitacora',
+            index=models.Index(fields=['accion', 'fecha'], name='bitacora_accion_fecha_idx'),
+        ),
+    ]
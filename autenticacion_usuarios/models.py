@@ -1,5 +1,7 @@
 from django.db import models
-from django.contrib.auth.hashers import make_password, check_password
+from django.utils import timezone
+from django.contrib.auth.hashers import make_password, check_password, identify_hasher
+from django.utils.crypto import constant_time_compare
 
 # ==========================================================
 # MODELOS DE AUTENTICACIÓN
@@ -42,8 +44,28 @@ class Usuario(models.Model):
         self.contrasena = make_password(raw_password)
     
     def check_password(self, raw_password):
-        """Verificar contraseña"""
-        return check_password(raw_password, self.contrasena)
+        """Verificar contraseña (si el hash es de otro hasher o con menos iteraciones, se regenera)"""
+        return check_password(raw_password, self.contrasena, setter=self._actualizar_hash)
+    
+    def verificar_contrasena(self, raw_password):
+        """
+        Verificar contraseña hasheada o, en filas antiguas, guardada en texto
+        plano (entorno académico). Si coincide, la fila queda con el hasher
+        configurado (PASSWORD_HASHERS).
+        """
+        try:
+            identify_hasher(self.contrasena)
+        except ValueError:
+            # No es un hash reconocible: se compara como texto plano
+            if self.contrasena and constant_time_compare(raw_password, self.contrasena):
+                self._actualizar_hash(raw_password)
+                return True
+            return False
+        return self.check_password(raw_password)
+    
+    def _actualizar_hash(self, raw_password):
+        self.set_password(raw_password)
+        Usuario.objects.filter(pk=self.pk).update(contrasena=self.contrasena)
     
     def is_active(self):
         """Verificar si el usuario está activo"""
@@ -76,7 +98,8 @@ class Cliente(models.Model):
 class Bitacora(models.Model):
     """Modelo para registrar acciones de usuario"""
     id_bitacora = models.AutoField(primary_key=True)
-    fecha = models.DateTimeField(auto_now_add=True)
+    # Se asigna al registrar la acción: la escritura puede ser diferida (ver bitacora.py)
+    fecha = models.DateTimeField(default=timezone.now)
     ip = models.CharField(max_length=50, blank=True, null=True)
     accion = models.CharField(max_length=100)
     modulo = models.CharField(max_length=100)
@@ -88,10 +111,31 @@ class Bitacora(models.Model):
         verbose_name = 'Bitácora'
         verbose_name_plural = 'Bitácoras'
         ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['accion', 'fecha'], name='bitacora_accion_fecha_idx'),
+        ]
     
     def __str__(self):
         return f"{self.accion} - {self.id_usuario.nombre} ({self.fecha})"
 
+class BitacoraArchivo(models.Model):
+    """Mes de bitácora movido de la tabla a un archivo NDJSON comprimido (ver archivo_bitacora.py)"""
+    id_archivo = models.AutoField(primary_key=True)
+    mes = models.DateField(unique=True)  # Primer día del mes (hora local)
+    archivo = models.CharField(max_length=255)  # Nombre dentro de BITACORA_ARCHIVO_DIR
+    filas = models.IntegerField(default=0)
+    conteo_acciones = models.JSONField(default=dict)  # {accion: filas} para contar sin leer el archivo
+    fecha_archivado = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'bitacora_archivo'
+        verbose_name = 'Archivo de bitácora'
+        verbose_name_plural = 'Archivos de bitácora'
+        ordering = ['-mes']
+    
+    def __str__(self):
+        return f"Bitácora {self.mes:%Y-%m} ({self.filas} filas)"
+
 class Notificacion(models.Model):
     """Modelo para notificaciones de usuario"""
     id_notificacion = models.AutoField(primary_key=True)
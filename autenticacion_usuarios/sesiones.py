@@ -0,0 +1,187 @@
+"""
+Backend de sesiones con caché en dos niveles delante de la tabla django_session
+(SESSION_ENGINE = 'autenticacion_usuarios.sesiones', ver SESION_MODO en settings).
+
+Casi todas las vistas leen la sesión (is_authenticated, user_id) y con el
+backend de base de datos cada petición hacía un SELECT sobre django_session.
+Aquí la lectura se resuelve, en orden, desde:
+
+1. Un LRU en memoria del proceso (SESION_LRU_MAX entradas, cada una válida
+   SESION_LRU_SEGUNDOS). Ese plazo es lo que otro worker puede tardar en ver
+   un cierre de sesión o un cambio hecho en otro worker.
+2. La caché compartida (Redis; este modo exige REDIS_URL).
+3. La base de datos, que sigue siendo la fuente de verdad: cada escritura se
+   hace primero en django_session y luego en ambos niveles.
+
+Escrituras agrupadas: si una vista marca la sesión como modificada pero los
+datos son los mismos que se cargaron, no se escribe nada mientras a la sesión
+le quede más de la mitad de su vigencia (después sí, para extender la
+expiración igual que la cookie).
+"""
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+LRU_MAX = getattr(settings, 'SESION_LRU_MAX', 10000)
+LRU_SEGUNDOS = getattr(settings, 'SESION_LRU_SEGUNDOS', 5)
+
+CACHE_PREFIJO = 'sesion:'
+
+
+class _LRU:
+    """Sesiones recientes del proceso: {clave: (vence, (datos, expira))}"""
+
+    def __init__(self, maximo, segundos):
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.maximo = maximo
+        self.segundos = segundos
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            vence, valor = entrada
+            if vence <= time.monotonic():
+                del self._entradas[clave]
+                return None
+            self._entradas.move_to_end(clave)
+            return valor
+
+    def guardar(self, clave, valor):
+        if self.maximo <= 0:
+            return
+        datos, expira = valor
+        # Nunca más allá de la expiración de la propia sesión
+        vence = time.monotonic() + max(min(self.segundos, expira - time.time()), 0)
+        with self._lock:
+            self._entradas[clave] = (vence, valor)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+
+    def eliminar(self, clave):
+        with self._lock:
+            self._entradas.pop(clave, None)
+
+
+_lru = _LRU(LRU_MAX, LRU_SEGUNDOS)
+
+
+def _firma(datos):
+    return hashlib.sha1(json.dumps(datos, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class SessionStore(DBStore):
+    """Sesiones en base de datos con LRU del proceso y caché compartida delante"""
+
+    cache_key_prefix = CACHE_PREFIJO
+
+    def __init__(self, session_key=None):
+        self._cache = caches[settings.SESSION_CACHE_ALIAS]
+        self._firma_cargada = None
+        self._expira = None
+        super().__init__(session_key)
+
+    @property
+    def cache_key(self):
+        return self.cache_key_prefix + self._get_or_create_session_key()
+
+    def _leer_cache(self, clave):
+        try:
+            return self._cache.get(clave)
+        except Exception:
+            # Algunos backends fallan con claves inválidas: se trata como sesión no cacheada
+            return None
+
+    def load(self):
+        clave = self.cache_key
+        entrada = _lru.obtener(clave)
+        if entrada is None:
+            entrada = self._leer_cache(clave)
+            if entrada is None:
+                sesion = self._get_session_from_db()
+                if sesion is None:
+                    return {}
+                entrada = (self.decode(sesion.session_data), sesion.expire_date.timestamp())
+                self._cache.set(clave, entrada, self.get_expiry_age(expiry=sesion.expire_date))
+            _lru.guardar(clave, entrada)
+
+        datos, self._expira = entrada
+        # Copia: el LRU comparte el objeto entre peticiones del proceso
+        datos = copy.deepcopy(datos)
+        self._firma_cargada = _firma(datos)
+        return datos
+
+    def _sin_cambios(self, must_create):
+        if must_create or self.session_key is None or self._firma_cargada is None:
+            return False
+        if self._expira - time.time() <= self.get_expiry_age() / 2:
+            return False
+        return _firma(self._session) == self._firma_cargada
+
+    def save(self, must_create=False):
+        if self._sin_cambios(must_create):
+            return
+        super().save(must_create)
+
+        expira = time.time() + self.get_expiry_age()
+        entrada = (self._session, expira)
+        try:
+            self._cache.set(self.cache_key, entrada, self.get_expiry_age())
+        except Exception as e:
+            logger.error(f"Error guardando la sesión en caché: {str(e)}")
+        _lru.guardar(self.cache_key, copy.deepcopy(entrada))
+        self._firma_cargada = _firma(self._session)
+        self._expira = expira
+
+    def exists(self, session_key):
+        if not session_key:
+            return False
+        clave = self.cache_key_prefix + session_key
+        return _lru.obtener(clave) is not None or clave in self._cache or super().exists(session_key)
+
+    def delete(self, session_key=None):
+        super().delete(session_key)
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        clave = self.cache_key_prefix + session_key
+        _lru.eliminar(clave)
+        self._cache.delete(clave)
+
+    def flush(self):
+        """Elimina la sesión actual de los tres niveles y regenera la clave"""
+        self.clear()
+        self.delete(self.session_key)
+        self._session_key = None
+
+    # La aplicación corre en WSGI; las variantes async pasan por los mismos
+    # métodos para no saltarse la caché
+    async def aload(self):
+        return await sync_to_async(self.load)()
+
+    async def asave(self, must_create=False):
+        return await sync_to_async(self.save)(must_create)
+
+    async def aexists(self, session_key):
+        return await sync_to_async(self.exists)(session_key)
+
+    async def adelete(self, session_key=None):
+        return await sync_to_async(self.delete)(session_key)
+
+    async def aflush(self):
+        return await sync_to_async(self.flush)()
@@ -1,3 +1,51 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from ventas_carrito.models import Venta
+from .models import Cliente, Rol, Usuario
+
+
+# Sesión en cookie firmada: las consultas medidas son solo las de la vista
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+class ClientesListConsultasTest(TestCase):
+    """ClientesListView hace las mismas consultas sin importar cuántos clientes lista"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rol_cliente = Rol.objects.create(nombre='Cliente')
+        rol_admin = Rol.objects.create(nombre='Administrador')
+        cls.admin = Usuario.objects.create(nombre='Admin', email='admin@test.com', contrasena='x', id_rol=rol_admin)
+
+    def setUp(self):
+        session = self.client.session
+        session.update({'is_authenticated': True, 'user_id': self.admin.id})
+        session.save()
+        self.client.cookies['sessionid'] = session.session_key
+        self.creados = 0
+
+    def _crear_clientes(self, cantidad):
+        for _ in range(cantidad):
+            self.creados += 1
+            usuario = Usuario.objects.create(
+                nombre=f'Cliente {self.creados}', email=f'cliente{self.creados}@test.com',
+                contrasena='x', id_rol=self.rol_cliente
+            )
+            cliente = Cliente.objects.create(id=usuario, ciudad='La Paz')
+            Venta.objects.create(cliente=cliente, total=Decimal('20.00'), estado='completada')
+
+    def _listar(self, consultas):
+        with self.assertNumQueries(consultas):
+            respuesta = self.client.get('/api/clientes/', {'page_size': 200, 'sort_by': 'monto_total'})
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def test_consultas_constantes(self):
+        # Usuario con rol, COUNT de clientes y la página con sus estadísticas
+        self._crear_clientes(5)
+        datos = self._listar(3)
+        self.assertEqual((datos['total'], len(datos['clientes'])), (5, 5))
+
+        self._crear_clientes(45)
+        datos = self._listar(3)
+        self.assertEqual((datos['total'], len(datos['clientes'])), (50, 50))
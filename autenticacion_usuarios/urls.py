@@ -22,6 +22,10 @@ urlpatterns = [
     path('clientes/<int:cliente_id>/', views.ClienteDetailView.as_view(), name='cliente_detail'),
     path('clientes/<int:cliente_id>/ventas/', views.ClienteVentasView.as_view(), name='cliente_ventas'),
     
+    # Bitácora (incluye meses archivados) y estado de la escritura diferida (por worker)
+    path('bitacora/', views.BitacoraView.as_view(), name='bitacora'),
+    path('bitacora/estado/', views.BitacoraEstadoView.as_view(), name='bitacora_estado'),
+    
     # Notificaciones
     path('notificaciones/', notificaciones_views.NotificacionesView.as_view(), name='notificaciones'),
     path('notificaciones/<int:notificacion_id>/', notificaciones_views.NotificacionDetailView.as_view(), name='notificacion_detail'),
@@ -1,19 +1,26 @@
-from django.http import JsonResponse
+from django.http import HttpResponseNotModified, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views import View
-from django.db.models import Sum, Count, Avg, Max, Q
+from django.core.paginator import Paginator
+from django.db.models import Sum, Count, Avg, Max, Q, F, Value, DecimalField
+from django.db.models.functions import Coalesce, Lower
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.http import parse_etags
+from datetime import datetime, timedelta
 import json
 import logging
 
-from .models import Usuario, Rol, Bitacora, Cliente
+from .models import Usuario, Rol, Cliente
+from . import archivo_bitacora, bitacora, identidad, limite_login
+from ventas_carrito import busqueda
 
 # Importar modelos de ventas si existen
 try:
+    from ventas_carrito import resumen_clientes
     from ventas_carrito.models import Venta, DetalleVenta
 except ImportError:
+    resumen_clientes = None
     Venta = None
     DetalleVenta = None
 
@@ -58,10 +65,23 @@ class LoginView(View):
                     'message': 'Email y contraseña son requeridos'
                 }, status=400)
             
+            # Rechazar antes de hashear si la IP o la cuenta están bloqueadas
+            ip_limite = limite_login.ip_cliente(request)
+            espera = limite_login.espera(ip_limite, email)
+            if espera:
+                response = JsonResponse({
+                    'success': False,
+                    'message': f'Demasiados intentos fallidos. Intente nuevamente en {espera} segundos.',
+                    'retry_after': espera
+                }, status=429)
+                response['Retry-After'] = str(espera)
+                return response
+            
             # Buscar usuario por email
             try:
                 usuario = Usuario.objects.get(email=email)
             except Usuario.DoesNotExist:
+                limite_login.registrar_fallo(ip_limite, email)
                 return JsonResponse({
                     'success': False,
                     'message': 'Credenciales inválidas'
@@ -74,19 +94,22 @@ class LoginView(View):
                     'message': 'Usuario inactivo. Contacte al administrador.'
                 }, status=401)
             
-            # Verificar contraseña (hash o texto plano para entorno académico)
-            if not (usuario.check_password(contrasena) or usuario.contrasena == contrasena):
+            # Verificar contraseña (hash o texto plano para entorno académico; en
+            # ambos casos queda guardada con el hasher configurado)
+            if not usuario.verificar_contrasena(contrasena):
+                limite_login.registrar_fallo(ip_limite, email)
                 return JsonResponse({
                     'success': False,
                     'message': 'Credenciales inválidas'
                 }, status=401)
+            limite_login.registrar_exito(ip_limite, email)
             
             # Obtener IP del cliente
             ip_address = self.get_client_ip(request)
             
             # Registrar en bitácora
-            Bitacora.objects.create(
-                id_usuario=usuario,
+            bitacora.registrar(
+                usuario.id,
                 accion='INICIO_SESION',
                 modulo='AUTENTICACION',
                 descripcion=f'Usuario {usuario.nombre} inició sesión',
@@ -99,6 +122,7 @@ class LoginView(View):
             request.session['user_nombre'] = usuario.nombre
             request.session['user_rol'] = usuario.id_rol.nombre
             request.session['is_authenticated'] = True
+            identidad.guardar(request.session, usuario)
             
             # Respuesta exitosa
             response_data = {
@@ -183,19 +207,15 @@ class LogoutView(View):
             # Obtener IP del cliente
             ip_address = self.get_client_ip(request)
             
-            # Registrar en bitácora
+            # Registrar en bitácora (el nombre ya está en la sesión)
             if user_id:
-                try:
-                    usuario = Usuario.objects.get(id=user_id)
-                    Bitacora.objects.create(
-                        id_usuario=usuario,
-                        accion='CIERRE_SESION',
-                        modulo='AUTENTICACION',
-                        descripcion=f'Usuario {usuario.nombre} cerró sesión',
-                        ip=ip_address
-                    )
-                except Usuario.DoesNotExist:
-                    pass  # Si no existe el usuario, continuar con el logout
+                bitacora.registrar(
+                    user_id,
+                    accion='CIERRE_SESION',
+                    modulo='AUTENTICACION',
+                    descripcion=f'Usuario {user_nombre} cerró sesión',
+                    ip=ip_address
+                )
             
             # Limpiar sesión
             request.session.flush()
@@ -229,43 +249,56 @@ class LogoutView(View):
 class CheckSessionView(View):
     """
     Vista auxiliar para verificar si hay una sesión activa
+    Responde desde la foto de identidad de la sesión (ver identidad.py), con
+    ETag para que el frontend pueda revalidar con If-None-Match (304)
     """
     
+    ETAG_ANONIMO = '"anonimo"'
+    
     def get(self, request):
         try:
             if request.session.get('is_authenticated'):
                 user_id = request.session.get('user_id')
-                try:
-                    usuario = Usuario.objects.get(id=user_id)
-                    return JsonResponse({
-                        'success': True,
-                        'authenticated': True,
-                        'user': {
-                            'id': usuario.id,
-                            'nombre': usuario.nombre,
-                            'apellido': usuario.apellido,
-                            'email': usuario.email,
-                            'rol': usuario.id_rol.nombre,
-                            'telefono': usuario.telefono
-                        }
-                    })
-                except Usuario.DoesNotExist:
-                    request.session.flush()
-                    return JsonResponse({
-                        'success': True,
-                        'authenticated': False
-                    })
+                foto = identidad.vigente(request.session)
+                if foto is None:
+                    version = identidad.version(user_id)
+                    try:
+                        usuario = Usuario.objects.select_related('id_rol').get(id=user_id)
+                    except Usuario.DoesNotExist:
+                        request.session.flush()
+                        return self._responder(request, {
+                            'success': True,
+                            'authenticated': False
+                        }, self.ETAG_ANONIMO)
+                    foto = identidad.guardar(request.session, usuario, version)
+                
+                return self._responder(request, {
+                    'success': True,
+                    'authenticated': True,
+                    'user': identidad.datos_usuario(foto)
+                }, identidad.etag(foto))
             else:
-                return JsonResponse({
+                return self._responder(request, {
                     'success': True,
                     'authenticated': False
-                })
+                }, self.ETAG_ANONIMO)
         except Exception as e:
             logger.error(f"Error verificando sesión: {str(e)}")
             return JsonResponse({
                 'success': False,
                 'message': 'Error interno del servidor'
             }, status=500)
+    
+    def _responder(self, request, datos, etag):
+        """JsonResponse con ETag, o 304 si el cliente ya tiene esa versión"""
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = JsonResponse(datos)
+        response['ETag'] = etag
+        # Depende de la cookie de sesión: el navegador debe revalidar siempre
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
 
 # ==========================================================
@@ -398,6 +431,7 @@ class RegisterView(View):
                     cliente.direccion = direccion
                     cliente.ciudad = ciudad
                     cliente.save()
+                busqueda.invalidar_sugerencias('clientes')
             
             # Obtener IP del cliente
             ip_address = self.get_client_ip(request)
@@ -406,8 +440,8 @@ class RegisterView(View):
             accion_bitacora = 'REGISTRO_CLIENTE' if tipo_cuenta_normalizado == 'Cliente' else 'REGISTRO_ADMINISTRADOR'
             descripcion_bitacora = f'Nuevo {tipo_cuenta_normalizado.lower()} registrado: {usuario.nombre} {usuario.apellido}'
             
-            Bitacora.objects.create(
-                id_usuario=usuario,
+            bitacora.registrar(
+                usuario.id,
                 accion=accion_bitacora,
                 modulo='AUTENTICACION',
                 descripcion=descripcion_bitacora,
@@ -420,6 +454,7 @@ class RegisterView(View):
             request.session['user_nombre'] = usuario.nombre
             request.session['user_rol'] = tipo_cuenta_normalizado
             request.session['is_authenticated'] = True
+            identidad.guardar(request.session, usuario)
 
             # Preparar respuesta
             user_response = {
@@ -477,8 +512,8 @@ class RegisterView(View):
 @method_decorator(csrf_exempt, name='dispatch')
 class ClientesListView(View):
     """
-    Listar todos los clientes
-    GET: Obtener lista de clientes
+    Listar clientes con sus estadísticas de compra
+    GET: Obtener lista paginada de clientes (page, page_size, sort_by, sort_order)
     """
     
     def get(self, request):
@@ -492,7 +527,7 @@ class ClientesListView(View):
             
             user_id = request.session.get('user_id')
             try:
-                usuario = Usuario.objects.get(id=user_id)
+                usuario = Usuario.objects.select_related('id_rol').get(id=user_id)
                 if usuario.id_rol.nombre.lower() != 'administrador':
                     return JsonResponse({
                         'success': False,
@@ -509,7 +544,17 @@ class ClientesListView(View):
             estado_filter = request.GET.get('estado', '').strip()
             ciudad_filter = request.GET.get('ciudad', '').strip()
             
-            # Obtener todos los clientes con información del usuario
+            # Paginación
+            try:
+                page = int(request.GET.get('page', 1))
+                page_size = min(max(int(request.GET.get('page_size', 50)), 1), 200)
+            except ValueError:
+                return JsonResponse({
+                    'success': False,
+                    'message': 'page y page_size deben ser números enteros'
+                }, status=400)
+            
+            # Clientes con información del usuario
             clientes = Cliente.objects.select_related('id').all()
             
             # Aplicar filtros de búsqueda
@@ -528,14 +573,43 @@ class ClientesListView(View):
             if ciudad_filter:
                 clientes = clientes.filter(ciudad__icontains=ciudad_filter)
             
-            # Obtener estadísticas básicas de ventas para cada cliente
+            # El total se cuenta antes de agregar las estadísticas (COUNT sin JOIN a venta)
+            total = clientes.count()
+            
+            # Estadísticas de compra en la misma consulta; como en el detalle del
+            # cliente (ClienteResumen), solo cuentan las ventas completadas
+            completadas = Q(venta__estado='completada')
+            clientes = clientes.annotate(
+                total_compras=Count('venta', filter=completadas),
+                monto_total=Coalesce(Sum('venta__total', filter=completadas), Value(0), output_field=DecimalField()),
+                ultima_compra=Max('venta__fecha_venta', filter=completadas)
+            )
+            
+            # Ordenamiento en la base de datos (el id desempata para que la paginación sea estable)
+            sort_by = request.GET.get('sort_by', 'id')
+            sort_order = request.GET.get('sort_order', 'asc')
+            descendente = sort_order == 'desc'
+            
+            if sort_by == 'nombre':
+                orden = [Lower('id__nombre'), Lower('id__apellido')]
+            elif sort_by in ('monto_total', 'total_compras', 'ultima_compra'):
+                orden = [F(sort_by)]
+            else:
+                orden = []
+            orden = [
+                campo.desc(nulls_last=True) if descendente else campo.asc(nulls_first=True)
+                for campo in orden + [F('id')]
+            ]
+            clientes = clientes.order_by(*orden)
+            
+            # Paginación
+            paginator = Paginator(clientes, page_size)
+            paginator.count = total
+            clientes_page = paginator.get_page(page)
+            
             clientes_data = []
-            for cliente in clientes:
+            for cliente in clientes_page:
                 usuario_cliente = cliente.id
-                
-                # Calcular estadísticas básicas de ventas
-                stats = self._get_cliente_stats_basic(cliente)
-                
                 clientes_data.append({
                     'id': usuario_cliente.id,
                     'nombre': f"{usuario_cliente.nombre} {usuario_cliente.apellido or ''}".strip(),
@@ -545,26 +619,22 @@ class ClientesListView(View):
                     'direccion': cliente.direccion or '',
                     'ciudad': cliente.ciudad or '',
                     'estado': 'Activo' if usuario_cliente.estado else 'Inactivo',
-                    'total_compras': stats['total_compras'],
-                    'monto_total': float(stats['monto_total']),
-                    'ultima_compra': stats['ultima_compra']
+                    'total_compras': cliente.total_compras,
+                    'monto_total': float(cliente.monto_total),
+                    'ultima_compra': cliente.ultima_compra.strftime('%Y-%m-%d') if cliente.ultima_compra else None
                 })
             
-            # Ordenamiento
-            sort_by = request.GET.get('sort_by', 'id')
-            sort_order = request.GET.get('sort_order', 'asc')
-            
-            if sort_by == 'nombre':
-                clientes_data.sort(key=lambda x: x['nombre'].lower(), reverse=(sort_order == 'desc'))
-            elif sort_by == 'monto_total':
-                clientes_data.sort(key=lambda x: x['monto_total'], reverse=(sort_order == 'desc'))
-            elif sort_by == 'total_compras':
-                clientes_data.sort(key=lambda x: x['total_compras'], reverse=(sort_order == 'desc'))
-            
             return JsonResponse({
                 'success': True,
                 'clientes': clientes_data,
-                'total': len(clientes_data)
+                'total': total,
+                'paginacion': {
+                    'page': clientes_page.number,
+                    'page_size': page_size,
+                    'total_pages': paginator.num_pages,
+                    'has_next': clientes_page.has_next(),
+                    'has_previous': clientes_page.has_previous()
+                }
             }, status=200)
             
         except Exception as e:
@@ -573,31 +643,6 @@ class ClientesListView(View):
                 'success': False,
                 'message': f'Error interno: {str(e)}'
             }, status=500)
-    
-    def _get_cliente_stats_basic(self, cliente):
-        """Obtener estadísticas básicas de un cliente"""
-        stats = {
-            'total_compras': 0,
-            'monto_total': 0.0,
-            'ultima_compra': None
-        }
-        
-        if Venta:
-            try:
-                ventas = Venta.objects.filter(cliente=cliente)
-                stats['total_compras'] = ventas.count()
-                
-                if stats['total_compras'] > 0:
-                    total = ventas.aggregate(Sum('total'))['total__sum'] or 0.0
-                    stats['monto_total'] = float(total)
-                    
-                    ultima_venta = ventas.order_by('-fecha_venta').first()
-                    if ultima_venta:
-                        stats['ultima_compra'] = ultima_venta.fecha_venta.strftime('%Y-%m-%d')
-            except Exception as e:
-                logger.error(f"Error obteniendo stats básicas: {str(e)}")
-        
-        return stats
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -634,7 +679,7 @@ class ClienteDetailView(View):
             
             # Obtener cliente
             try:
-                cliente = Cliente.objects.select_related('id').get(id=cliente_id)
+                cliente = Cliente.objects.select_related('id', 'resumen').get(id=cliente_id)
             except Cliente.DoesNotExist:
                 return JsonResponse({
                     'success': False,
@@ -671,7 +716,7 @@ class ClienteDetailView(View):
             }, status=500)
     
     def _get_cliente_stats_detailed(self, cliente):
-        """Obtener estadísticas detalladas de un cliente"""
+        """Obtener estadísticas detalladas de un cliente (desde su ClienteResumen)"""
         stats = {
             'total_compras': 0,
             'monto_total': 0.0,
@@ -681,47 +726,30 @@ class ClienteDetailView(View):
             'compras_mes_actual': 0,
             'monto_mes_actual': 0.0,
             'dias_desde_ultima_compra': None,
-            'antiguedad_dias': None
+            'antiguedad_dias': None,
+            'segmento': 'sin_compras'
         }
         
-        if Venta:
-            try:
-                ventas = Venta.objects.filter(cliente=cliente)
-                total_ventas = ventas.count()
-                stats['total_compras'] = total_ventas
-                
-                if total_ventas > 0:
-                    # Monto total
-                    total = ventas.aggregate(Sum('total'))['total__sum'] or 0.0
-                    stats['monto_total'] = float(total)
-                    
-                    # Promedio
-                    stats['promedio_compra'] = float(total / total_ventas)
-                    
-                    # Última compra
-                    ultima_venta = ventas.order_by('-fecha_venta').first()
-                    if ultima_venta:
-                        stats['ultima_compra'] = ultima_venta.fecha_venta.strftime('%Y-%m-%d %H:%M:%S')
-                        dias_desde = (timezone.now() - ultima_venta.fecha_venta).days
-                        stats['dias_desde_ultima_compra'] = dias_desde
-                    
-                    # Primera compra
-                    primera_venta = ventas.order_by('fecha_venta').first()
-                    if primera_venta:
-                        stats['primera_compra'] = primera_venta.fecha_venta.strftime('%Y-%m-%d')
-                        antiguedad = (timezone.now() - primera_venta.fecha_venta).days
-                        stats['antiguedad_dias'] = antiguedad
-                    
-                    # Compras del mes actual
-                    inicio_mes = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                    ventas_mes = ventas.filter(fecha_venta__gte=inicio_mes)
-                    stats['compras_mes_actual'] = ventas_mes.count()
-                    
-                    if stats['compras_mes_actual'] > 0:
-                        monto_mes = ventas_mes.aggregate(Sum('total'))['total__sum'] or 0.0
-                        stats['monto_mes_actual'] = float(monto_mes)
-            except Exception as e:
-                logger.error(f"Error obteniendo stats detalladas: {str(e)}")
+        resumen = getattr(cliente, 'resumen', None)
+        if resumen is None or resumen.total_compras == 0:
+            return stats
+        
+        ahora = timezone.now()
+        stats['total_compras'] = resumen.total_compras
+        stats['monto_total'] = float(resumen.monto_total)
+        stats['promedio_compra'] = float(resumen.monto_total / resumen.total_compras)
+        stats['segmento'] = resumen.segmento
+        
+        # Última y primera compra
+        stats['ultima_compra'] = resumen.ultima_compra.strftime('%Y-%m-%d %H:%M:%S')
+        stats['dias_desde_ultima_compra'] = (ahora - resumen.ultima_compra).days
+        stats['primera_compra'] = resumen.primera_compra.strftime('%Y-%m-%d')
+        stats['antiguedad_dias'] = (ahora - resumen.primera_compra).days
+        
+        # Compras del mes actual
+        compras_mes, monto_mes = resumen_clientes.compras_del_mes(resumen)
+        stats['compras_mes_actual'] = compras_mes
+        stats['monto_mes_actual'] = float(monto_mes)
         
         return stats
     
@@ -793,10 +821,14 @@ class ClienteDetailView(View):
             
             cliente.save()
             
+            # Las sesiones del cliente releen su identidad en la próxima verificación
+            identidad.invalidar(usuario_cliente.id)
+            busqueda.invalidar_sugerencias('clientes')
+            
             # Registrar en bitácora
             ip_address = self.get_client_ip(request)
-            Bitacora.objects.create(
-                id_usuario=usuario,
+            bitacora.registrar(
+                usuario.id,
                 accion='ACTUALIZAR_CLIENTE',
                 modulo='GESTION_CLIENTES',
                 descripcion=f'Cliente {usuario_cliente.nombre} actualizado',
@@ -870,8 +902,8 @@ class ClienteDetailView(View):
             
             # Registrar en bitácora
             ip_address = self.get_client_ip(request)
-            Bitacora.objects.create(
-                id_usuario=usuario,
+            bitacora.registrar(
+                usuario.id,
                 accion='DESACTIVAR_CLIENTE',
                 modulo='GESTION_CLIENTES',
                 descripcion=f'Cliente {usuario_cliente.nombre} desactivado',
@@ -1017,3 +1049,109 @@ class ClienteVentasView(View):
                 'message': f'Error interno: {str(e)}'
             }, status=500)
 
+
+
+# ==========================================================
+# CONSULTA Y ESTADO DE LA BITÁCORA
+# ==========================================================
+
+@method_decorator(csrf_exempt, name='dispatch')
+class BitacoraView(View):
+    """
+    Consultar la bitácora, incluidos los meses ya archivados
+    GET: desde, hasta (AAAA-MM-DD, inclusive), accion, usuario_id, limite
+    """
+    
+    LIMITE_DEFECTO = 100
+    LIMITE_MAXIMO = 1000
+    
+    def get(self, request):
+        try:
+            if not request.session.get('is_authenticated'):
+                return JsonResponse({
+                    'success': False,
+                    'message': 'No autenticado'
+                }, status=401)
+            
+            usuario = Usuario.objects.select_related('id_rol').filter(id=request.session.get('user_id')).first()
+            if usuario is None or usuario.id_rol.nombre.lower() != 'administrador':
+                return JsonResponse({
+                    'success': False,
+                    'message': 'No autorizado'
+                }, status=403)
+            
+            # Rango de fechas en hora local; `hasta` incluye el día completo
+            try:
+                desde = request.GET.get('desde', '').strip()
+                hasta = request.GET.get('hasta', '').strip()
+                desde = timezone.make_aware(datetime.strptime(desde, '%Y-%m-%d')) if desde else None
+                hasta = timezone.make_aware(datetime.strptime(hasta, '%Y-%m-%d') + timedelta(days=1)) if hasta else None
+                usuario_id = request.GET.get('usuario_id', '').strip()
+                usuario_id = int(usuario_id) if usuario_id else None
+                limite = int(request.GET.get('limite', self.LIMITE_DEFECTO))
+            except ValueError:
+                return JsonResponse({
+                    'success': False,
+                    'message': 'Parámetros inválidos (fechas AAAA-MM-DD, usuario_id y limite enteros)'
+                }, status=400)
+            limite = max(1, min(limite, self.LIMITE_MAXIMO))
+            
+            entradas = archivo_bitacora.consultar(
+                desde=desde,
+                hasta=hasta,
+                accion=request.GET.get('accion', '').strip() or None,
+                usuario_id=usuario_id,
+                limite=limite
+            )
+            
+            return JsonResponse({
+                'success': True,
+                'bitacora': [
+                    {**entrada, 'fecha': timezone.localtime(entrada['fecha']).isoformat()}
+                    for entrada in entradas
+                ],
+                'total': len(entradas),
+                'limite': limite
+            }, status=200)
+            
+        except Exception as e:
+            logger.error(f"Error consultando la bitácora: {str(e)}")
+            return JsonResponse({
+                'success': False,
+                'message': 'Error interno del servidor'
+            }, status=500)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class BitacoraEstadoView(View):
+    """
+    Contadores del buffer de bitácora del worker que atiende la petición
+    GET: pendientes, escritas, síncronas, descartadas y latencia de los flush
+    """
+    
+    def get(self, request):
+        try:
+            if not request.session.get('is_authenticated'):
+                return JsonResponse({
+                    'success': False,
+                    'message': 'No autenticado'
+                }, status=401)
+            
+            usuario = Usuario.objects.select_related('id_rol').filter(id=request.session.get('user_id')).first()
+            if usuario is None or usuario.id_rol.nombre.lower() != 'administrador':
+                return JsonResponse({
+                    'success': False,
+                    'message': 'No autorizado'
+                }, status=403)
+            
+            return JsonResponse({
+                'success': True,
+                'bitacora': bitacora.estado()
+            }, status=200)
+            
+        except Exception as e:
+            logger.error(f"Error obteniendo estado de la bitácora: {str(e)}")
+            return JsonResponse({
+                'success': False,
+                'message': 'Error interno del servidor'
+            }, status=500)
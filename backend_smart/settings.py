@@ -9,6 +9,7 @@ Base de Datos: PostgreSQL (Render)
 import os
 from pathlib import Path
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 import dj_database_url
 
 # -------------------------------
@@ -29,6 +30,17 @@ STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='')
 STRIPE_PUBLISHABLE_KEY = config('STRIPE_PUBLISHABLE_KEY', default='')
 STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='')
 
+# Minutos que se retiene el stock de una venta Stripe pendiente de pago
+RESERVA_STOCK_TTL_MINUTOS = config('RESERVA_STOCK_TTL_MINUTOS', default=15, cast=int)
+
+# Numeración de comprobantes: 1 = sin huecos (bloqueo de fila por venta);
+# >1 = cada worker reserva bloques de N números (puede dejar huecos)
+COMPROBANTE_NUMERACION_BLOQUE = config('COMPROBANTE_NUMERACION_BLOQUE', default=1, cast=int)
+COMPROBANTE_NUMERACION_POR_ANIO = config('COMPROBANTE_NUMERACION_POR_ANIO', default=False, cast=bool)
+
+# Máximo de filas de detalle en el PDF de un reporte dinámico (el Excel incluye todas)
+REPORTE_PDF_MAX_FILAS = config('REPORTE_PDF_MAX_FILAS', default=5000, cast=int)
+
 # Token opcional para generar datos de prueba sin sesión (Render)
 DATA_GENERATION_TOKEN = config('DATA_GENERATION_TOKEN', default='')
 
@@ -176,6 +188,94 @@ DATABASES = {
 }
 
 
+# -------------------------------
+# CACHÉ
+# -------------------------------
+# Sin REDIS_URL se usa caché en memoria por proceso (suficiente con un worker)
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'smart-backend',
+        }
+    }
+# Solo con Redis la caché la comparten todos los workers; sin ella, lo que
+# depende de invalidar entre procesos (sesiones, identidad, dashboard) se
+# resuelve contra la base de datos
+CACHE_COMPARTIDA = bool(REDIS_URL)
+
+
+# -------------------------------
+# SESIONES
+# -------------------------------
+# 'cache': django_session con LRU del proceso y caché compartida delante (sin
+#          consultas por petición una vez cargada la sesión)
+# 'firmada': los datos viajan en una cookie firmada con SECRET_KEY; no hay estado
+#          en el servidor (escala horizontalmente, pero cerrar sesión solo borra
+#          la cookie del navegador)
+# 'db': backend por defecto de Django
+# 'cache' necesita la caché compartida: con caché por proceso, un cierre de
+# sesión en un worker no se vería en los demás
+SESION_MODO = config('SESION_MODO', default='') or ('cache' if CACHE_COMPARTIDA else 'db')
+if SESION_MODO == 'cache' and not CACHE_COMPARTIDA:
+    raise ImproperlyConfigured("SESION_MODO='cache' requiere REDIS_URL (caché compartida entre workers)")
+SESSION_ENGINE = {
+    'cache': 'autenticacion_usuarios.sesiones',
+    'firmada': 'django.contrib.sessions.backends.signed_cookies',
+    'db': 'django.contrib.sessions.backends.db',
+}[SESION_MODO]
+# Sesiones por proceso en el LRU y segundos que cada una se reutiliza sin
+# consultar la caché compartida (demora máxima en ver un logout de otro worker)
+SESION_LRU_MAX = config('SESION_LRU_MAX', default=10000, cast=int)
+SESION_LRU_SEGUNDOS = config('SESION_LRU_SEGUNDOS', default=5, cast=int)
+
+# Segundos que se reutiliza el estado no terminal de un PaymentIntent entre polls
+STRIPE_VERIFICACION_CACHE_TTL = config('STRIPE_VERIFICACION_CACHE_TTL', default=3, cast=int)
+# Segundos que se reutiliza un estado terminal (succeeded/canceled); acotado para
+# que un reembolso o una corrección manual se vean sin limpiar la caché
+STRIPE_VERIFICACION_TERMINAL_TTL = config('STRIPE_VERIFICACION_TERMINAL_TTL', default=3600, cast=int)
+
+# Segundos que se reutilizan las estadísticas del dashboard (se invalidan al completar ventas)
+DASHBOARD_STATS_CACHE_TTL = config('DASHBOARD_STATS_CACHE_TTL', default=60, cast=int)
+
+# Bitácora con escritura diferida: lote por bulk_create, segundos entre flush y
+# tope del buffer por proceso (lleno = escritura síncrona)
+BITACORA_ASINCRONA = config('BITACORA_ASINCRONA', default=True, cast=bool)
+BITACORA_LOTE = config('BITACORA_LOTE', default=100, cast=int)
+BITACORA_FLUSH_SEGUNDOS = config('BITACORA_FLUSH_SEGUNDOS', default=2.0, cast=float)
+BITACORA_BUFFER_MAX = config('BITACORA_BUFFER_MAX', default=5000, cast=int)
+
+# Meses de bitácora que quedan en la tabla; los anteriores se archivan en
+# BITACORA_ARCHIVO_DIR como NDJSON comprimido (comando archivar_bitacora)
+BITACORA_MESES_ACTIVOS = config('BITACORA_MESES_ACTIVOS', default=6, cast=int)
+BITACORA_ARCHIVO_DIR = config('BITACORA_ARCHIVO_DIR', default='')
+
+
+# -------------------------------
+# LÍMITE DE INTENTOS DE LOGIN
+# -------------------------------
+# Fallos por IP y por cuenta (desde cada IP) dentro de la ventana antes de bloquear; cada fallo
+# posterior duplica el bloqueo (desde BASE hasta MAX segundos)
+LOGIN_LIMITE_ACTIVO = config('LOGIN_LIMITE_ACTIVO', default=True, cast=bool)
+LOGIN_INTENTOS_IP = config('LOGIN_INTENTOS_IP', default=30, cast=int)
+LOGIN_INTENTOS_CUENTA = config('LOGIN_INTENTOS_CUENTA', default=5, cast=int)
+LOGIN_VENTANA_SEGUNDOS = config('LOGIN_VENTANA_SEGUNDOS', default=900, cast=int)
+LOGIN_BLOQUEO_BASE_SEGUNDOS = config('LOGIN_BLOQUEO_BASE_SEGUNDOS', default=1, cast=int)
+LOGIN_BLOQUEO_MAX_SEGUNDOS = config('LOGIN_BLOQUEO_MAX_SEGUNDOS', default=900, cast=int)
+# Proxies delante de la app que agregan X-Forwarded-For (Render: 1, ver
+# render.yaml). Con 0 se usa REMOTE_ADDR: sin proxy el cliente inventaría la IP
+LOGIN_PROXIES_CONFIABLES = config('LOGIN_PROXIES_CONFIABLES', default=0, cast=int)
+
+
 # -------------------------------
 # VALIDACIÓN DE CONTRASEÑAS
 # -------------------------------
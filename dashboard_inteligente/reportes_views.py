@@ -8,17 +8,15 @@ from django.utils import timezone
 from datetime import datetime
 from io import BytesIO
 from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from reportlab.platypus import Paragraph, Spacer, PageBreak
 from openpyxl.chart import BarChart, LineChart, Reference
+from reportes_dinamicos import pdf
+from reportes_dinamicos.excel import ALTO_FILA_CM, ExcelWriteOnly
 from dashboard_inteligente.views import GenerarPrediccionesView
 from productos.models import Producto
-from ventas_carrito.models import Venta
+from ventas_carrito import resumen_clientes
+from ventas_carrito.models import ClienteResumen, Venta
 
 logger = logging.getLogger(__name__)
 
@@ -74,18 +72,17 @@ class ExportarDashboardVentasView(View):
                 num_ventas=Count('venta', distinct=True)
             ).order_by('-total_ventas')[:10]
             
-            # Clientes más activos
-            clientes_activos = Venta.objects.filter(
-                fecha_venta__gte=inicio_mes_actual,
-                estado='completada'
+            # Clientes más activos del mes (resumen por cliente, sin recorrer las ventas)
+            clientes_activos = ClienteResumen.objects.filter(
+                mes=resumen_clientes.inicio_mes_actual(),
+                compras_mes__gt=0
             ).values(
                 'cliente__id__nombre',
                 'cliente__id__apellido',
-                'cliente__id__email'
-            ).annotate(
-                total_compras=Sum('total'),
-                num_compras=Count('id_venta')
-            ).order_by('-total_compras')[:10]
+                'cliente__id__email',
+                'monto_mes',
+                'compras_mes'
+            ).order_by('-monto_mes')[:10]
             
             # Agregar datos adicionales al stats_data
             stats_data['ventas_por_categoria'] = [
@@ -102,8 +99,8 @@ class ExportarDashboardVentasView(View):
                 {
                     'nombre': f"{item['cliente__id__nombre']} {item['cliente__id__apellido'] or ''}".strip(),
                     'email': item['cliente__id__email'],
-                    'total_compras': float(item['total_compras']),
-                    'num_compras': item['num_compras']
+                    'total_compras': float(item['monto_mes']),
+                    'num_compras': item['compras_mes']
                 }
                 for item in clientes_activos
             ]
@@ -128,34 +125,20 @@ class ExportarDashboardVentasView(View):
     def _generar_pdf(self, stats_data, periodo):
         """Generar PDF del dashboard de ventas"""
         buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
-        story = []
-        
-        styles = getSampleStyleSheet()
-        
-        # Estilos personalizados
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            textColor=colors.HexColor('#0066FF'),
-            spaceAfter=30,
-            alignment=TA_CENTER,
-            fontName='Helvetica-Bold'
-        )
+        pdf.renderizar(self._story_pdf(stats_data, periodo), buffer, 'dashboard')
+        buffer.seek(0)
         
-        heading_style = ParagraphStyle(
-            'CustomHeading',
-            parent=styles['Heading2'],
-            fontSize=16,
-            textColor=colors.HexColor('#1F2937'),
-            spaceAfter=12,
-            spaceBefore=20,
-            fontName='Helvetica-Bold'
-        )
+        response = HttpResponse(buffer, content_type='application/pdf')
+        response['Content-Disposition'] = f'inline; filename="dashboard_ventas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf"'
+        return response
+    
+    def _story_pdf(self, stats_data, periodo):
+        """Contenido del PDF del dashboard de ventas"""
+        story = []
+        heading_style = pdf.estilo('Seccion')
         
         # Título
-        story.append(Paragraph("Reporte de Dashboard de Ventas", title_style))
+        story.append(Paragraph("Reporte de Dashboard de Ventas", pdf.estilo('DashboardTitulo')))
         story.append(Spacer(1, 0.2*inch))
         
         # Información del reporte
@@ -164,19 +147,7 @@ class ExportarDashboardVentasView(View):
             ['Fecha de Generación:', fecha_actual],
             ['Período Analizado:', f'Últimos {periodo} meses'],
         ]
-        
-        info_table = Table(info_data, colWidths=[2*inch, 4*inch])
-        info_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F3F4F6')),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#1F2937')),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ]))
-        story.append(info_table)
+        story.append(pdf.tabla(info_data, [2*inch, 4*inch], pdf.estilo_tabla_info()))
         story.append(Spacer(1, 0.3*inch))
         
         # Estadísticas principales
@@ -197,45 +168,22 @@ class ExportarDashboardVentasView(View):
                     stats['ventas_mes']['trend'].upper()
                 ])
             
-            if stats.get('total_pedidos'):
-                stats_data_table.append([
-                    'Total Pedidos',
-                    str(stats['total_pedidos']['value']),
-                    f"{stats['total_pedidos']['change']:+.1f}%",
-                    stats['total_pedidos']['trend'].upper()
-                ])
-            
-            if stats.get('nuevos_clientes'):
-                stats_data_table.append([
-                    'Nuevos Clientes',
-                    str(stats['nuevos_clientes']['value']),
-                    f"{stats['nuevos_clientes']['change']:+.1f}%",
-                    stats['nuevos_clientes']['trend'].upper()
-                ])
-            
-            if stats.get('productos_activos'):
-                stats_data_table.append([
-                    'Productos Activos',
-                    str(stats['productos_activos']['value']),
-                    f"{stats['productos_activos']['change']:+.1f}%",
-                    stats['productos_activos']['trend'].upper()
-                ])
+            for clave, etiqueta in [
+                ('total_pedidos', 'Total Pedidos'),
+                ('nuevos_clientes', 'Nuevos Clientes'),
+                ('productos_activos', 'Productos Activos'),
+            ]:
+                if stats.get(clave):
+                    stats_data_table.append([
+                        etiqueta,
+                        str(stats[clave]['value']),
+                        f"{stats[clave]['change']:+.1f}%",
+                        stats[clave]['trend'].upper()
+                    ])
             
-            stats_table = Table(stats_data_table, colWidths=[2*inch, 2*inch, 1.5*inch, 1.5*inch])
-            stats_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0066FF')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('FONTSIZE', (0, 1), (-1, -1), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                ('TOPPADDING', (0, 0), (-1, -1), 8),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#F9FAFB')),
-                ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F9FAFB')]),
-            ]))
-            story.append(stats_table)
+            story.append(pdf.tabla(
+                stats_data_table, [2*inch, 2*inch, 1.5*inch, 1.5*inch], pdf.estilo_tabla_datos(pdf.AZUL)
+            ))
             story.append(Spacer(1, 0.3*inch))
             
             # Ventas mensuales
@@ -255,21 +203,7 @@ class ExportarDashboardVentasView(View):
                                 f"Bs. {values[i]:,.2f}"
                             ])
                     
-                    ventas_table = Table(ventas_table_data, colWidths=[3*inch, 3*inch])
-                    ventas_table.setStyle(TableStyle([
-                        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10B981')),
-                        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                        ('FONTSIZE', (0, 0), (-1, 0), 12),
-                        ('FONTSIZE', (0, 1), (-1, -1), 10),
-                        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                        ('TOPPADDING', (0, 0), (-1, -1), 8),
-                        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#F9FAFB')),
-                        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F9FAFB')]),
-                    ]))
-                    story.append(ventas_table)
+                    story.append(pdf.tabla(ventas_table_data, [3*inch, 3*inch], pdf.estilo_tabla_datos(pdf.VERDE)))
                     story.append(Spacer(1, 0.3*inch))
             
             # Productos top
@@ -302,21 +236,11 @@ class ExportarDashboardVentasView(View):
                         f"Bs. {promedio:,.2f}"
                     ])
                 
-                productos_table = Table(productos_table_data, colWidths=[0.5*inch, 3*inch, 1.5*inch, 1.5*inch, 1.5*inch])
-                productos_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#F59E0B')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 12),
-                    ('FONTSIZE', (0, 1), (-1, -1), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                    ('TOPPADDING', (0, 0), (-1, -1), 8),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#F9FAFB')),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F9FAFB')]),
-                ]))
-                story.append(productos_table)
+                story.append(pdf.tabla(
+                    productos_table_data,
+                    [0.5*inch, 3*inch, 1.5*inch, 1.5*inch, 1.5*inch],
+                    pdf.estilo_tabla_datos(pdf.NARANJA)
+                ))
                 story.append(Spacer(1, 0.3*inch))
             
             # Clientes más activos
@@ -335,209 +259,140 @@ class ExportarDashboardVentasView(View):
                         str(cliente.get('num_compras', 0))
                     ])
                 
-                clientes_table = Table(clientes_table_data, colWidths=[0.5*inch, 2*inch, 2*inch, 1.5*inch, 1*inch])
-                clientes_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10B981')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (0, -1), 'CENTER'),  # Columna #
-                    ('ALIGN', (1, 0), (2, -1), 'LEFT'),    # Columnas Cliente y Email
-                    ('ALIGN', (3, 0), (-1, -1), 'CENTER'), # Resto de columnas
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 11),
-                    ('FONTSIZE', (0, 1), (-1, -1), 9),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                    ('TOPPADDING', (0, 0), (-1, -1), 6),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#F9FAFB')),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F9FAFB')]),
-                ]))
-                story.append(clientes_table)
+                story.append(pdf.tabla(
+                    clientes_table_data,
+                    [0.5*inch, 2*inch, 2*inch, 1.5*inch, 1*inch],
+                    pdf.estilo_tabla_datos(pdf.VERDE, fuente_encabezado=11, fuente_cuerpo=9, relleno=6),
+                    comandos_extra=[('ALIGN', (1, 0), (2, -1), 'LEFT')]  # Columnas Cliente y Email
+                ))
                 story.append(Spacer(1, 0.3*inch))
         
         # Pie de página
         story.append(Spacer(1, 0.5*inch))
         story.append(Paragraph(
             f"<i>Reporte generado el {fecha_actual} - SmartSales365</i>",
-            styles['Normal']
+            pdf.estilo('Normal')
         ))
         
-        doc.build(story)
-        buffer.seek(0)
-        
-        response = HttpResponse(buffer, content_type='application/pdf')
-        response['Content-Disposition'] = f'inline; filename="dashboard_ventas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf"'
-        return response
+        return story
     
     def _generar_excel(self, stats_data, periodo):
         """Generar Excel del dashboard de ventas"""
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Dashboard Ventas"
+        excel = ExcelWriteOnly("Dashboard Ventas", anchos={
+            'A': 25, 'B': 30, 'C': 20, 'D': 18, 'E': 18, 'F': 25, 'G': 25
+        })
         
         # Título
-        ws['A1'] = "Reporte de Dashboard de Ventas"
-        ws['A1'].font = Font(bold=True, size=18, color="0066FF")
-        ws['A1'].alignment = Alignment(horizontal='center', vertical='center')
-        ws.merge_cells('A1:D1')
-        ws.row_dimensions[1].height = 30
+        excel.escribir_fila([excel.celda("Reporte de Dashboard de Ventas", 'titulo')], alto=30)
+        excel.filas_vacias()
         
         # Información del reporte
         fecha_actual = timezone.now().strftime('%d/%m/%Y %H:%M:%S')
-        ws['A3'] = 'Fecha de Generación:'
-        ws['B3'] = fecha_actual
-        ws['A4'] = 'Período Analizado:'
-        ws['B4'] = f'Últimos {periodo} meses'
-        
-        row = 6
+        excel.escribir_fila(['Fecha de Generación:', fecha_actual])
+        excel.escribir_fila(['Período Analizado:', f'Últimos {periodo} meses'])
+        excel.filas_vacias()
         
         if stats_data.get('success') and stats_data.get('stats'):
             stats = stats_data['stats']
             
             # Estadísticas principales
-            ws[f'A{row}'] = 'Estadísticas Principales'
-            ws[f'A{row}'].font = Font(bold=True, size=14, color="1F2937")
-            row += 1
-            
-            headers = ['Métrica', 'Valor', 'Cambio %', 'Tendencia']
-            ws.append(headers)
-            
-            # Estilo para encabezados
-            for col in range(1, 5):
-                cell = ws.cell(row=row, column=col)
-                cell.font = Font(bold=True, color="FFFFFF")
-                cell.fill = PatternFill(start_color="0066FF", end_color="0066FF", fill_type="solid")
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-            row += 1
+            excel.escribir_fila([excel.celda('Estadísticas Principales', 'subtitulo')])
+            excel.escribir_fila(['Métrica', 'Valor', 'Cambio %', 'Tendencia'], estilo='encabezado')
             
             # Datos de estadísticas
             if stats.get('ventas_mes'):
-                ws.append([
+                excel.escribir_fila([
                     'Ventas del Mes',
                     f"Bs. {stats['ventas_mes']['value']:,.2f}",
                     f"{stats['ventas_mes']['change']:+.1f}%",
                     stats['ventas_mes']['trend'].upper()
                 ])
-                row += 1
             
-            if stats.get('total_pedidos'):
-                ws.append([
-                    'Total Pedidos',
-                    stats['total_pedidos']['value'],
-                    f"{stats['total_pedidos']['change']:+.1f}%",
-                    stats['total_pedidos']['trend'].upper()
-                ])
-                row += 1
-            
-            if stats.get('nuevos_clientes'):
-                ws.append([
-                    'Nuevos Clientes',
-                    stats['nuevos_clientes']['value'],
-                    f"{stats['nuevos_clientes']['change']:+.1f}%",
-                    stats['nuevos_clientes']['trend'].upper()
-                ])
-                row += 1
-            
-            if stats.get('productos_activos'):
-                ws.append([
-                    'Productos Activos',
-                    stats['productos_activos']['value'],
-                    f"{stats['productos_activos']['change']:+.1f}%",
-                    stats['productos_activos']['trend'].upper()
-                ])
-                row += 1
+            for clave, etiqueta in [
+                ('total_pedidos', 'Total Pedidos'),
+                ('nuevos_clientes', 'Nuevos Clientes'),
+                ('productos_activos', 'Productos Activos'),
+            ]:
+                if stats.get(clave):
+                    excel.escribir_fila([
+                        etiqueta,
+                        stats[clave]['value'],
+                        f"{stats[clave]['change']:+.1f}%",
+                        stats[clave]['trend'].upper()
+                    ])
             
-            row += 2
+            excel.filas_vacias(2)
             
             # Ventas mensuales
             if stats.get('ventas_mensuales'):
-                ws[f'A{row}'] = 'Ventas Mensuales'
-                ws[f'A{row}'].font = Font(bold=True, size=14, color="1F2937")
-                row += 1
+                excel.escribir_fila([excel.celda('Ventas Mensuales', 'subtitulo')])
                 
                 ventas_mensuales = stats['ventas_mensuales']
                 labels = ventas_mensuales.get('labels', [])
                 values = ventas_mensuales.get('values', [])
                 
-                ws.append(['Mes', 'Ventas (Bs.)'])
-                # Estilo encabezado
-                for col in range(1, 3):
-                    cell = ws.cell(row=row, column=col)
-                    cell.font = Font(bold=True, color="FFFFFF")
-                    cell.fill = PatternFill(start_color="10B981", end_color="10B981", fill_type="solid")
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
-                row += 1
-                
-                for i, label in enumerate(labels):
-                    if i < len(values):
-                        ws.append([label, values[i]])
-                        row += 1
+                excel.escribir_fila(['Mes', 'Ventas (Bs.)'], estilo='encabezado_verde')
+                primera, ultima = excel.escribir_filas(
+                    [label, excel.celda(values[i], 'moneda')]
+                    for i, label in enumerate(labels) if i < len(values)
+                )
                 
                 # Crear gráfico de barras
-                chart = BarChart()
-                chart.type = "col"
-                chart.style = 10
-                chart.title = "Ventas Mensuales"
-                chart.y_axis.title = 'Ventas (Bs.)'
-                chart.x_axis.title = 'Mes'
-                
-                data = Reference(ws, min_col=2, min_row=row-len(labels), max_row=row-1)
-                cats = Reference(ws, min_col=1, min_row=row-len(labels), max_row=row-1)
-                chart.add_data(data, titles_from_data=False)
-                chart.set_categories(cats)
-                
-                ws.add_chart(chart, f"E{row-len(labels)}")
-                row += len(labels) + 5
+                if ultima >= primera:
+                    chart = BarChart()
+                    chart.type = "col"
+                    chart.style = 10
+                    chart.title = "Ventas Mensuales"
+                    chart.y_axis.title = 'Ventas (Bs.)'
+                    chart.x_axis.title = 'Mes'
+                    
+                    data = Reference(excel.ws, min_col=2, min_row=primera, max_row=ultima)
+                    cats = Reference(excel.ws, min_col=1, min_row=primera, max_row=ultima)
+                    chart.add_data(data, titles_from_data=False)
+                    chart.set_categories(cats)
+                    
+                    excel.agregar_grafico(chart, 'E', primera)
+                    excel.saltar_graficos()
             
             # Ventas por categoría
             if stats_data.get('ventas_por_categoria'):
-                row += 2
-                ws[f'A{row}'] = 'Ventas por Categoría'
-                ws[f'A{row}'].font = Font(bold=True, size=14, color="1F2937")
-                row += 1
-                
-                ws.append(['Categoría', 'Total Ventas (Bs.)', 'Cantidad Vendida', 'N° Ventas'])
-                
-                # Estilo encabezado
-                for col in range(1, 5):
-                    cell = ws.cell(row=row, column=col)
-                    cell.font = Font(bold=True, color="FFFFFF")
-                    cell.fill = PatternFill(start_color="8B5CF6", end_color="8B5CF6", fill_type="solid")
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
-                row += 1
-                
-                for cat in stats_data['ventas_por_categoria']:
-                    ws.append([
+                excel.filas_vacias(2)
+                excel.escribir_fila([excel.celda('Ventas por Categoría', 'subtitulo')])
+                excel.escribir_fila(
+                    ['Categoría', 'Total Ventas (Bs.)', 'Cantidad Vendida', 'N° Ventas'],
+                    estilo='encabezado_morado'
+                )
+                primera, ultima = excel.escribir_filas(
+                    [
                         cat.get('categoria', 'N/A'),
-                        cat.get('total_ventas', 0),
+                        excel.celda(cat.get('total_ventas', 0), 'moneda'),
                         cat.get('cantidad_vendida', 0),
                         cat.get('num_ventas', 0)
-                    ])
-                    row += 1
+                    ]
+                    for cat in stats_data['ventas_por_categoria']
+                )
                 
                 # Crear gráfico de barras para categorías
-                if len(stats_data['ventas_por_categoria']) > 0:
-                    chart_cat = BarChart()
-                    chart_cat.type = "col"
-                    chart_cat.style = 10
-                    chart_cat.title = "Ventas por Categoría"
-                    chart_cat.y_axis.title = 'Ventas (Bs.)'
-                    chart_cat.x_axis.title = 'Categoría'
-                    
-                    data_cat = Reference(ws, min_col=2, min_row=row-len(stats_data['ventas_por_categoria']), max_row=row-1)
-                    cats_cat = Reference(ws, min_col=1, min_row=row-len(stats_data['ventas_por_categoria']), max_row=row-1)
-                    chart_cat.add_data(data_cat, titles_from_data=False)
-                    chart_cat.set_categories(cats_cat)
-                    
-                    ws.add_chart(chart_cat, f"F{row-len(stats_data['ventas_por_categoria'])}")
-                    row += len(stats_data['ventas_por_categoria']) + 5
+                chart_cat = BarChart()
+                chart_cat.type = "col"
+                chart_cat.style = 10
+                chart_cat.title = "Ventas por Categoría"
+                chart_cat.y_axis.title = 'Ventas (Bs.)'
+                chart_cat.x_axis.title = 'Categoría'
+                
+                data_cat = Reference(excel.ws, min_col=2, min_row=primera, max_row=ultima)
+                cats_cat = Reference(excel.ws, min_col=1, min_row=primera, max_row=ultima)
+                chart_cat.add_data(data_cat, titles_from_data=False)
+                chart_cat.set_categories(cats_cat)
+                
+                excel.agregar_grafico(chart_cat, 'F', primera)
+                excel.saltar_graficos()
             
             # Productos top
             productos_top = stats_data.get('top_products') or stats.get('productos_top') or []
             if productos_top:
-                row += 2
-                ws[f'A{row}'] = 'Productos Más Vendidos (Top 15)'
-                ws[f'A{row}'].font = Font(bold=True, size=14, color="1F2937")
-                row += 1
+                excel.filas_vacias(2)
+                excel.escribir_fila([excel.celda('Productos Más Vendidos (Top 15)', 'subtitulo')])
                 
                 # Normalizar formato de productos
                 productos_normalizados = []
@@ -550,28 +405,24 @@ class ExportarDashboardVentasView(View):
                         })
                 
                 productos_top = productos_normalizados
-                ws.append(['#', 'Producto', 'Unidades Vendidas', 'Total (Bs.)', 'Promedio/Unidad'])
-                
-                # Estilo encabezado
-                for col in range(1, 6):
-                    cell = ws.cell(row=row, column=col)
-                    cell.font = Font(bold=True, color="FFFFFF")
-                    cell.fill = PatternFill(start_color="F59E0B", end_color="F59E0B", fill_type="solid")
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
-                row += 1
+                excel.escribir_fila(
+                    ['#', 'Producto', 'Unidades Vendidas', 'Total (Bs.)', 'Promedio/Unidad'],
+                    estilo='encabezado_naranja'
+                )
                 
+                filas_productos = []
                 for idx, prod in enumerate(productos_top, 1):
                     cantidad = prod.get('cantidad', 0)
                     total = prod.get('total', 0)
                     promedio = total / cantidad if cantidad > 0 else 0
-                    ws.append([
+                    filas_productos.append([
                         idx,
                         prod.get('nombre', 'N/A'),
                         cantidad,
-                        total,
-                        promedio
+                        excel.celda(total, 'moneda'),
+                        excel.celda(promedio, 'moneda')
                     ])
-                    row += 1
+                primera, ultima = excel.escribir_filas(filas_productos)
                 
                 # Crear gráfico de barras para productos
                 if len(productos_top) > 0:
@@ -582,79 +433,61 @@ class ExportarDashboardVentasView(View):
                     chart_prod.y_axis.title = 'Total (Bs.)'
                     chart_prod.x_axis.title = 'Producto'
                     
-                    data_prod = Reference(ws, min_col=4, min_row=row-len(productos_top), max_row=row-1)
-                    cats_prod = Reference(ws, min_col=2, min_row=row-len(productos_top), max_row=row-1)
+                    data_prod = Reference(excel.ws, min_col=4, min_row=primera, max_row=ultima)
+                    cats_prod = Reference(excel.ws, min_col=2, min_row=primera, max_row=ultima)
                     chart_prod.add_data(data_prod, titles_from_data=False)
                     chart_prod.set_categories(cats_prod)
                     
-                    ws.add_chart(chart_prod, f"G{row-len(productos_top)}")
-                    row += len(productos_top) + 5
+                    excel.agregar_grafico(chart_prod, 'G', primera)
+                    excel.saltar_graficos()
             
             # Clientes más activos
             if stats_data.get('clientes_activos'):
-                row += 2
-                ws[f'A{row}'] = 'Clientes Más Activos (Top 10)'
-                ws[f'A{row}'].font = Font(bold=True, size=14, color="1F2937")
-                row += 1
-                
-                ws.append(['#', 'Cliente', 'Email', 'Total Compras (Bs.)', 'N° Compras'])
-                
-                # Estilo encabezado
-                for col in range(1, 6):
-                    cell = ws.cell(row=row, column=col)
-                    cell.font = Font(bold=True, color="FFFFFF")
-                    cell.fill = PatternFill(start_color="10B981", end_color="10B981", fill_type="solid")
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
-                row += 1
-                
-                for idx, cliente in enumerate(stats_data['clientes_activos'], 1):
-                    ws.append([
+                excel.filas_vacias(2)
+                excel.escribir_fila([excel.celda('Clientes Más Activos (Top 10)', 'subtitulo')])
+                excel.escribir_fila(
+                    ['#', 'Cliente', 'Email', 'Total Compras (Bs.)', 'N° Compras'],
+                    estilo='encabezado_verde'
+                )
+                primera, ultima = excel.escribir_filas(
+                    [
                         idx,
                         cliente.get('nombre', 'N/A'),
                         cliente.get('email', 'N/A'),
-                        cliente.get('total_compras', 0),
+                        excel.celda(cliente.get('total_compras', 0), 'moneda'),
                         cliente.get('num_compras', 0)
-                    ])
-                    row += 1
+                    ]
+                    for idx, cliente in enumerate(stats_data['clientes_activos'], 1)
+                )
                 
                 # Crear gráfico de barras para clientes
-                if len(stats_data['clientes_activos']) > 0:
-                    chart_cli = BarChart()
-                    chart_cli.type = "col"
-                    chart_cli.style = 10
-                    chart_cli.title = "Top Clientes por Compras"
-                    chart_cli.y_axis.title = 'Total Compras (Bs.)'
-                    chart_cli.x_axis.title = 'Cliente'
-                    
-                    data_cli = Reference(ws, min_col=4, min_row=row-len(stats_data['clientes_activos']), max_row=row-1)
-                    cats_cli = Reference(ws, min_col=2, min_row=row-len(stats_data['clientes_activos']), max_row=row-1)
-                    chart_cli.add_data(data_cli, titles_from_data=False)
-                    chart_cli.set_categories(cats_cli)
-                    
-                    ws.add_chart(chart_cli, f"G{row-len(stats_data['clientes_activos'])}")
-                    row += len(stats_data['clientes_activos']) + 5
+                chart_cli = BarChart()
+                chart_cli.type = "col"
+                chart_cli.style = 10
+                chart_cli.title = "Top Clientes por Compras"
+                chart_cli.y_axis.title = 'Total Compras (Bs.)'
+                chart_cli.x_axis.title = 'Cliente'
+                
+                data_cli = Reference(excel.ws, min_col=4, min_row=primera, max_row=ultima)
+                cats_cli = Reference(excel.ws, min_col=2, min_row=primera, max_row=ultima)
+                chart_cli.add_data(data_cli, titles_from_data=False)
+                chart_cli.set_categories(cats_cli)
+                
+                excel.agregar_grafico(chart_cli, 'G', primera)
+                excel.saltar_graficos()
             
             # Análisis de tendencias
             if stats.get('ventas_mensuales'):
-                row += 2
-                ws[f'A{row}'] = 'Análisis de Tendencias Mensuales'
-                ws[f'A{row}'].font = Font(bold=True, size=14, color="1F2937")
-                row += 1
+                excel.filas_vacias(2)
+                excel.escribir_fila([excel.celda('Análisis de Tendencias Mensuales', 'subtitulo')])
                 
                 ventas_mensuales = stats['ventas_mensuales']
                 labels = ventas_mensuales.get('labels', [])
                 values = ventas_mensuales.get('values', [])
                 
-                ws.append(['Mes', 'Ventas (Bs.)', 'Crecimiento %', 'Tendencia'])
-                
-                # Estilo encabezado
-                for col in range(1, 5):
-                    cell = ws.cell(row=row, column=col)
-                    cell.font = Font(bold=True, color="FFFFFF")
-                    cell.fill = PatternFill(start_color="3B82F6", end_color="3B82F6", fill_type="solid")
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
-                row += 1
+                excel.escribir_fila(['Mes', 'Ventas (Bs.)', 'Crecimiento %', 'Tendencia'], estilo='encabezado_azul')
                 
+                filas_tendencia = []
                 for i, label in enumerate(labels):
                     if i < len(values):
                         valor_actual = values[i]
@@ -665,43 +498,24 @@ class ExportarDashboardVentasView(View):
                                 crecimiento = ((valor_actual - valor_anterior) / valor_anterior) * 100
                         
                         tendencia = '↑' if crecimiento > 0 else '↓' if crecimiento < 0 else '→'
-                        ws.append([label, valor_actual, f"{crecimiento:+.1f}%", tendencia])
-                        row += 1
+                        filas_tendencia.append([label, excel.celda(valor_actual, 'moneda'), f"{crecimiento:+.1f}%", tendencia])
+                primera, ultima = excel.escribir_filas(filas_tendencia)
                 
                 # Crear gráfico de línea para tendencias
-                if len(labels) > 0:
+                if filas_tendencia:
                     chart_tend = LineChart()
                     chart_tend.title = "Tendencia de Ventas Mensuales"
                     chart_tend.y_axis.title = 'Ventas (Bs.)'
                     chart_tend.x_axis.title = 'Mes'
                     
-                    data_tend = Reference(ws, min_col=2, min_row=row-len(labels), max_row=row-1)
-                    cats_tend = Reference(ws, min_col=1, min_row=row-len(labels), max_row=row-1)
+                    data_tend = Reference(excel.ws, min_col=2, min_row=primera, max_row=ultima)
+                    cats_tend = Reference(excel.ws, min_col=1, min_row=primera, max_row=ultima)
                     chart_tend.add_data(data_tend, titles_from_data=False)
                     chart_tend.set_categories(cats_tend)
                     
-                    ws.add_chart(chart_tend, f"F{row-len(labels)}")
-                    row += len(labels) + 5
-        
-        # Ajustar ancho de columnas dinámicamente
-        ws.column_dimensions['A'].width = 25
-        ws.column_dimensions['B'].width = 30
-        ws.column_dimensions['C'].width = 20
-        ws.column_dimensions['D'].width = 18
-        ws.column_dimensions['E'].width = 18
-        ws.column_dimensions['F'].width = 25
-        ws.column_dimensions['G'].width = 25
+                    excel.agregar_grafico(chart_tend, 'F', primera)
         
-        buffer = BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
-        
-        response = HttpResponse(
-            buffer,
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = f'attachment; filename="dashboard_ventas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx"'
-        return response
+        return excel.respuesta(f'dashboard_ventas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx')
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -837,43 +651,20 @@ class ExportarPrediccionesView(View):
     def _generar_pdf(self, predicciones_data, modelo_data):
         """Generar PDF de predicciones con detalles mejorados"""
         buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
-        story = []
-        
-        styles = getSampleStyleSheet()
-        
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            textColor=colors.HexColor('#8B5CF6'),
-            spaceAfter=30,
-            alignment=TA_CENTER,
-            fontName='Helvetica-Bold'
-        )
-        
-        heading_style = ParagraphStyle(
-            'CustomHeading',
-            parent=styles['Heading2'],
-            fontSize=16,
-            textColor=colors.HexColor('#1F2937'),
-            spaceAfter=12,
-            spaceBefore=20,
-            fontName='Helvetica-Bold'
-        )
+        pdf.renderizar(self._story_pdf(predicciones_data, modelo_data), buffer, 'dashboard')
+        buffer.seek(0)
         
-        subheading_style = ParagraphStyle(
-            'CustomSubHeading',
-            parent=styles['Heading3'],
-            fontSize=14,
-            textColor=colors.HexColor('#4B5563'),
-            spaceAfter=8,
-            spaceBefore=12,
-            fontName='Helvetica-Bold'
-        )
+        response = HttpResponse(buffer, content_type='application/pdf')
+        response['Content-Disposition'] = f'inline; filename="predicciones_ia_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf"'
+        return response
+    
+    def _story_pdf(self, predicciones_data, modelo_data):
+        """Contenido del PDF de predicciones"""
+        story = []
+        heading_style = pdf.estilo('Seccion')
         
         # Título
-        story.append(Paragraph("Reporte de Predicciones de IA", title_style))
+        story.append(Paragraph("Reporte de Predicciones de IA", pdf.estilo('PrediccionesTitulo')))
         story.append(Spacer(1, 0.2*inch))
         
         fecha_actual = timezone.now().strftime('%d/%m/%Y %H:%M:%S')
@@ -890,18 +681,7 @@ class ExportarPrediccionesView(View):
             if modelo.get('registros_entrenamiento'):
                 info_data.append(['Registros de Entrenamiento:', f"{modelo['registros_entrenamiento']:,}"])
         
-        info_table = Table(info_data, colWidths=[2.5*inch, 3.5*inch])
-        info_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F3F4F6')),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#1F2937')),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ]))
-        story.append(info_table)
+        story.append(pdf.tabla(info_data, [2.5*inch, 3.5*inch], pdf.estilo_tabla_info()))
         story.append(Spacer(1, 0.3*inch))
         
         # Resumen de predicciones
@@ -925,27 +705,18 @@ class ExportarPrediccionesView(View):
                 if tendencias.get('ventas_anteriores_30_dias'):
                     resumen_data.append(['Ventas 30 Días Anteriores:', f"Bs. {tendencias.get('ventas_anteriores_30_dias', 0):,.2f}"])
             
-            resumen_table = Table(resumen_data, colWidths=[3*inch, 3*inch])
-            resumen_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#8B5CF6')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('FONTSIZE', (0, 1), (-1, -1), 11),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                ('TOPPADDING', (0, 0), (-1, -1), 8),
-                ('BACKGROUND', (0, 1), (0, -1), colors.HexColor('#F3F4F6')),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F9FAFB')]),
-            ]))
-            story.append(resumen_table)
+            story.append(pdf.tabla(
+                resumen_data,
+                [3*inch, 3*inch],
+                pdf.estilo_tabla_datos(pdf.MORADO, fuente_cuerpo=11, grilla=0.5, alineacion='LEFT', fondo_cuerpo=False),
+                comandos_extra=[('BACKGROUND', (0, 1), (0, -1), colors.HexColor(pdf.GRIS_CLARO))]
+            ))
             story.append(Spacer(1, 0.3*inch))
         
         # Análisis por categoría (si hay múltiples categorías)
+        categorias_dict = {}
         if predicciones_data.get('success') and predicciones_data.get('predicciones'):
             predicciones = predicciones_data['predicciones']
-            categorias_dict = {}
             for pred in predicciones:
                 cat_nombre = pred.get('categoria', {}).get('nombre', 'General') if pred.get('categoria') else 'General'
                 if cat_nombre not in categorias_dict:
@@ -968,32 +739,16 @@ class ExportarPrediccionesView(View):
                         f"{confianza_avg:.1f}%"
                     ])
                 
-                categoria_table = Table(categoria_table_data, colWidths=[2*inch, 1.5*inch, 1.5*inch, 1.5*inch])
-                categoria_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10B981')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 11),
-                    ('FONTSIZE', (0, 1), (-1, -1), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                    ('TOPPADDING', (0, 0), (-1, -1), 8),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F9FAFB')]),
-                ]))
-                story.append(categoria_table)
+                story.append(pdf.tabla(
+                    categoria_table_data,
+                    [2*inch, 1.5*inch, 1.5*inch, 1.5*inch],
+                    pdf.estilo_tabla_datos(pdf.VERDE, fuente_encabezado=11, fondo_cuerpo=False)
+                ))
                 story.append(Spacer(1, 0.3*inch))
         
         # Lista detallada de predicciones
         if predicciones_data.get('success') and predicciones_data.get('predicciones'):
             predicciones = predicciones_data['predicciones']
-            # Verificar si categorias_dict existe (se crea en el bloque anterior)
-            categorias_dict = {}
-            if predicciones:
-                for pred in predicciones:
-                    cat_nombre = pred.get('categoria', {}).get('nombre', 'General') if pred.get('categoria') else 'General'
-                    if cat_nombre not in categorias_dict:
-                        categorias_dict[cat_nombre] = {'total': 0, 'count': 0, 'confianza_promedio': 0}
             
             story.append(PageBreak() if len(categorias_dict) > 1 else Spacer(1, 0.3*inch))
             story.append(Paragraph("Predicciones Detalladas", heading_style))
@@ -1011,127 +766,76 @@ class ExportarPrediccionesView(View):
                     pred.get('categoria', {}).get('nombre', 'General') if pred.get('categoria') else 'General'
                 ])
             
-            predicciones_table = Table(predicciones_table_data, colWidths=[1.5*inch, 2*inch, 1.5*inch, 2*inch])
-            predicciones_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#8B5CF6')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 11),
-                ('FONTSIZE', (0, 1), (-1, -1), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                ('TOPPADDING', (0, 0), (-1, -1), 6),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#F9FAFB')),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F9FAFB')]),
-            ]))
-            story.append(predicciones_table)
+            story.append(pdf.tabla(
+                predicciones_table_data,
+                [1.5*inch, 2*inch, 1.5*inch, 2*inch],
+                pdf.estilo_tabla_datos(pdf.MORADO, fuente_encabezado=11, fuente_cuerpo=9, relleno=6, grilla=0.5)
+            ))
             
             if len(predicciones) > 100:
                 story.append(Spacer(1, 0.2*inch))
                 story.append(Paragraph(
                     f"<i>Nota: Se muestran 100 de {len(predicciones)} predicciones totales.</i>",
-                    styles['Normal']
+                    pdf.estilo('Normal')
                 ))
         
         story.append(Spacer(1, 0.5*inch))
         story.append(Paragraph(
             f"<i>Reporte generado el {fecha_actual} - SmartSales365 - Sistema de Predicciones con IA</i>",
-            styles['Normal']
+            pdf.estilo('Normal')
         ))
         
-        doc.build(story)
-        buffer.seek(0)
-        
-        response = HttpResponse(buffer, content_type='application/pdf')
-        response['Content-Disposition'] = f'inline; filename="predicciones_ia_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf"'
-        return response
+        return story
     
     def _generar_excel(self, predicciones_data, modelo_data):
         """Generar Excel de predicciones con detalles mejorados y gráficos"""
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Predicciones IA"
+        excel = ExcelWriteOnly("Predicciones IA", anchos={
+            'A': 25, 'B': 30, 'C': 20, 'D': 25, 'E': 15, 'F': 15
+        })
         
         # Título
-        ws['A1'] = "Reporte de Predicciones de IA"
-        ws['A1'].font = Font(bold=True, size=18, color="8B5CF6")
-        ws['A1'].alignment = Alignment(horizontal='center', vertical='center')
-        ws.merge_cells('A1:D1')
-        ws.row_dimensions[1].height = 30
+        excel.escribir_fila([excel.celda("Reporte de Predicciones de IA", 'titulo_morado')], alto=30)
+        excel.filas_vacias()
         
         fecha_actual = timezone.now().strftime('%d/%m/%Y %H:%M:%S')
-        ws['A3'] = 'Fecha de Generación:'
-        ws['A3'].font = Font(bold=True)
-        ws['B3'] = fecha_actual
-        
-        row = 5
+        excel.escribir_fila([excel.celda('Fecha de Generación:', 'etiqueta'), fecha_actual])
+        excel.filas_vacias()
         
         # Información del modelo
         if modelo_data and modelo_data.get('modelo'):
             modelo = modelo_data['modelo']
-            ws[f'A{row}'] = 'Información del Modelo'
-            ws[f'A{row}'].font = Font(bold=True, size=14, color="1F2937")
-            row += 1
+            excel.escribir_fila([excel.celda('Información del Modelo', 'subtitulo')])
+            excel.escribir_fila(['Campo', 'Valor'], estilo='encabezado_morado')
             
-            ws.append(['Campo', 'Valor'])
-            for col in range(1, 3):
-                cell = ws.cell(row=row, column=col)
-                cell.font = Font(bold=True, color="FFFFFF")
-                cell.fill = PatternFill(start_color="8B5CF6", end_color="8B5CF6", fill_type="solid")
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-            row += 1
-            
-            ws.append(['Nombre', modelo.get('nombre', 'N/A')])
-            row += 1
-            ws.append(['Versión', modelo.get('version', 'N/A')])
-            row += 1
-            ws.append(['Estado', modelo.get('estado', 'N/A').upper()])
-            row += 1
+            excel.escribir_fila(['Nombre', modelo.get('nombre', 'N/A')])
+            excel.escribir_fila(['Versión', modelo.get('version', 'N/A')])
+            excel.escribir_fila(['Estado', modelo.get('estado', 'N/A').upper()])
             if modelo.get('r2_score'):
-                ws.append(['R² Score (Calidad)', f"{modelo['r2_score']:.3f}"])
-                row += 1
+                excel.escribir_fila(['R² Score (Calidad)', f"{modelo['r2_score']:.3f}"])
             if modelo.get('registros_entrenamiento'):
-                ws.append(['Registros de Entrenamiento', f"{modelo['registros_entrenamiento']:,}"])
-                row += 1
-            row += 2
+                excel.escribir_fila(['Registros de Entrenamiento', f"{modelo['registros_entrenamiento']:,}"])
+            excel.filas_vacias(2)
         
         # Resumen ejecutivo
         if predicciones_data.get('success') and predicciones_data.get('resumen'):
             resumen = predicciones_data['resumen']
-            ws[f'A{row}'] = 'Resumen Ejecutivo de Predicciones'
-            ws[f'A{row}'].font = Font(bold=True, size=14, color="1F2937")
-            row += 1
-            
-            ws.append(['Métrica', 'Valor'])
-            for col in range(1, 3):
-                cell = ws.cell(row=row, column=col)
-                cell.font = Font(bold=True, color="FFFFFF")
-                cell.fill = PatternFill(start_color="10B981", end_color="10B981", fill_type="solid")
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-            row += 1
+            excel.escribir_fila([excel.celda('Resumen Ejecutivo de Predicciones', 'subtitulo')])
+            excel.escribir_fila(['Métrica', 'Valor'], estilo='encabezado_verde')
             
-            ws.append(['Total Predicciones', resumen.get('total_predicciones', 0)])
-            row += 1
-            ws.append(['Total Valor Predicho', f"Bs. {resumen.get('total_valor_predicho', 0):,.2f}"])
-            row += 1
-            ws.append(['Confianza Promedio', f"{resumen.get('confianza_promedio', 0) * 100:.1f}%"])
-            row += 1
+            excel.escribir_fila(['Total Predicciones', resumen.get('total_predicciones', 0)])
+            excel.escribir_fila(['Total Valor Predicho', f"Bs. {resumen.get('total_valor_predicho', 0):,.2f}"])
+            excel.escribir_fila(['Confianza Promedio', f"{resumen.get('confianza_promedio', 0) * 100:.1f}%"])
             
             if resumen.get('tendencias'):
                 tendencias = resumen['tendencias']
-                ws.append(['Factor de Crecimiento', f"{tendencias.get('factor_crecimiento', 0):+.1f}%"])
-                row += 1
-                ws.append(['Promedio Mensual Histórico', f"Bs. {tendencias.get('promedio_mensual_historico', 0):,.2f}"])
-                row += 1
+                excel.escribir_fila(['Factor de Crecimiento', f"{tendencias.get('factor_crecimiento', 0):+.1f}%"])
+                excel.escribir_fila(['Promedio Mensual Histórico', f"Bs. {tendencias.get('promedio_mensual_historico', 0):,.2f}"])
                 if tendencias.get('ventas_ultimos_30_dias'):
-                    ws.append(['Ventas Últimos 30 Días', f"Bs. {tendencias.get('ventas_ultimos_30_dias', 0):,.2f}"])
-                    row += 1
+                    excel.escribir_fila(['Ventas Últimos 30 Días', f"Bs. {tendencias.get('ventas_ultimos_30_dias', 0):,.2f}"])
                 if tendencias.get('ventas_anteriores_30_dias'):
-                    ws.append(['Ventas 30 Días Anteriores', f"Bs. {tendencias.get('ventas_anteriores_30_dias', 0):,.2f}"])
-                    row += 1
+                    excel.escribir_fila(['Ventas 30 Días Anteriores', f"Bs. {tendencias.get('ventas_anteriores_30_dias', 0):,.2f}"])
             
-            row += 2
+            excel.filas_vacias(2)
         
         # Análisis por categoría
         if predicciones_data.get('success') and predicciones_data.get('predicciones'):
@@ -1146,73 +850,57 @@ class ExportarPrediccionesView(View):
                 categorias_dict[cat_nombre]['confianza_promedio'] += pred.get('confianza', 0)
             
             if len(categorias_dict) > 1:
-                ws[f'A{row}'] = 'Análisis por Categoría'
-                ws[f'A{row}'].font = Font(bold=True, size=14, color="1F2937")
-                row += 1
-                
-                ws.append(['Categoría', 'Total Predicho (Bs.)', 'N° Predicciones', 'Confianza Promedio (%)'])
-                for col in range(1, 5):
-                    cell = ws.cell(row=row, column=col)
-                    cell.font = Font(bold=True, color="FFFFFF")
-                    cell.fill = PatternFill(start_color="10B981", end_color="10B981", fill_type="solid")
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
-                row += 1
+                excel.escribir_fila([excel.celda('Análisis por Categoría', 'subtitulo')])
+                excel.escribir_fila(
+                    ['Categoría', 'Total Predicho (Bs.)', 'N° Predicciones', 'Confianza Promedio (%)'],
+                    estilo='encabezado_verde'
+                )
                 
+                filas_categoria = []
                 for cat_nombre, datos in sorted(categorias_dict.items(), key=lambda x: x[1]['total'], reverse=True):
                     confianza_avg = (datos['confianza_promedio'] / datos['count']) * 100 if datos['count'] > 0 else 0
-                    ws.append([
+                    filas_categoria.append([
                         cat_nombre,
-                        datos['total'],
+                        excel.celda(datos['total'], 'moneda'),
                         datos['count'],
                         round(confianza_avg, 1)
                     ])
-                    row += 1
+                primera, ultima = excel.escribir_filas(filas_categoria)
                 
                 # Gráfico de barras por categoría
-                if len(categorias_dict) > 0:
-                    chart_cat = BarChart()
-                    chart_cat.title = "Predicciones por Categoría"
-                    chart_cat.y_axis.title = 'Valor Predicho (Bs.)'
-                    chart_cat.x_axis.title = 'Categoría'
-                    
-                    data_cat = Reference(ws, min_col=2, min_row=row-len(categorias_dict), max_row=row-1)
-                    cats_ref = Reference(ws, min_col=1, min_row=row-len(categorias_dict), max_row=row-1)
-                    chart_cat.add_data(data_cat, titles_from_data=False)
-                    chart_cat.set_categories(cats_ref)
-                    chart_cat.width = 12
-                    chart_cat.height = 7
-                    
-                    ws.add_chart(chart_cat, f"F{row-len(categorias_dict)}")
-                    row += 10
+                chart_cat = BarChart()
+                chart_cat.title = "Predicciones por Categoría"
+                chart_cat.y_axis.title = 'Valor Predicho (Bs.)'
+                chart_cat.x_axis.title = 'Categoría'
+                
+                data_cat = Reference(excel.ws, min_col=2, min_row=primera, max_row=ultima)
+                cats_ref = Reference(excel.ws, min_col=1, min_row=primera, max_row=ultima)
+                chart_cat.add_data(data_cat, titles_from_data=False)
+                chart_cat.set_categories(cats_ref)
+                chart_cat.width = 12
+                chart_cat.height = 7
+                
+                excel.agregar_grafico(chart_cat, 'F', primera)
+                excel.saltar_graficos()
         
         # Predicciones detalladas
         if predicciones_data.get('success') and predicciones_data.get('predicciones'):
             predicciones = predicciones_data['predicciones']
-            row += 2
-            ws[f'A{row}'] = 'Predicciones Detalladas'
-            ws[f'A{row}'].font = Font(bold=True, size=14, color="1F2937")
-            row += 1
-            
-            ws.append(['Fecha', 'Valor Predicho (Bs.)', 'Confianza (%)', 'Categoría'])
-            for col in range(1, 5):
-                cell = ws.cell(row=row, column=col)
-                cell.font = Font(bold=True, color="FFFFFF")
-                cell.fill = PatternFill(start_color="8B5CF6", end_color="8B5CF6", fill_type="solid")
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-            row += 1
+            excel.filas_vacias(2)
+            excel.escribir_fila([excel.celda('Predicciones Detalladas', 'subtitulo')])
+            excel.escribir_fila(['Fecha', 'Valor Predicho (Bs.)', 'Confianza (%)', 'Categoría'], estilo='encabezado_morado')
             
             # Ordenar por fecha
             predicciones_ordenadas = sorted(predicciones, key=lambda x: x.get('fecha_prediccion', ''))
-            start_row = row
-            
-            for pred in predicciones_ordenadas:
-                ws.append([
+            primera, ultima = excel.escribir_filas(
+                [
                     pred.get('fecha_prediccion', 'N/A')[:10] if pred.get('fecha_prediccion') else 'N/A',
-                    pred.get('valor_predicho', 0),
+                    excel.celda(pred.get('valor_predicho', 0), 'moneda'),
                     round(pred.get('confianza', 0) * 100, 1),
                     pred.get('categoria', {}).get('nombre', 'General') if pred.get('categoria') else 'General'
-                ])
-                row += 1
+                ]
+                for pred in predicciones_ordenadas
+            )
             
             # Gráfico de línea - Evolución de predicciones
             if len(predicciones_ordenadas) > 0:
@@ -1223,15 +911,14 @@ class ExportarPrediccionesView(View):
                 chart.width = 15
                 chart.height = 8
                 
-                data = Reference(ws, min_col=2, min_row=start_row, max_row=row-1)
-                cats = Reference(ws, min_col=1, min_row=start_row, max_row=row-1)
+                data = Reference(excel.ws, min_col=2, min_row=primera, max_row=ultima)
+                cats = Reference(excel.ws, min_col=1, min_row=primera, max_row=ultima)
                 chart.add_data(data, titles_from_data=False)
                 chart.set_categories(cats)
                 
-                ws.add_chart(chart, f"F{start_row}")
+                excel.agregar_grafico(chart, 'F', primera)
                 
-                # Gráfico de barras - Confianza promedio
-                row_chart = row + 2
+                # Gráfico de barras - Confianza promedio (debajo del anterior)
                 chart_conf = BarChart()
                 chart_conf.title = "Nivel de Confianza de Predicciones"
                 chart_conf.y_axis.title = 'Confianza (%)'
@@ -1239,28 +926,11 @@ class ExportarPrediccionesView(View):
                 chart_conf.width = 15
                 chart_conf.height = 8
                 
-                data_conf = Reference(ws, min_col=3, min_row=start_row, max_row=row-1)
+                data_conf = Reference(excel.ws, min_col=3, min_row=primera, max_row=ultima)
                 chart_conf.add_data(data_conf, titles_from_data=False)
                 chart_conf.set_categories(cats)
                 
-                ws.add_chart(chart_conf, f"F{row_chart}")
-        
-        # Ajustar ancho de columnas
-        ws.column_dimensions['A'].width = 25
-        ws.column_dimensions['B'].width = 30
-        ws.column_dimensions['C'].width = 20
-        ws.column_dimensions['D'].width = 25
-        ws.column_dimensions['E'].width = 15
-        ws.column_dimensions['F'].width = 15
-        
-        buffer = BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
+                excel.agregar_grafico(chart_conf, 'F', max(ultima, primera + int(chart.height / ALTO_FILA_CM)) + 2)
         
-        response = HttpResponse(
-            buffer,
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = f'attachment; filename="predicciones_ia_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx"'
-        return response
+        return excel.respuesta(f'predicciones_ia_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx')
 
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:18
+
+from django.db import migrations
+
+
+# Índices de trigramas para la búsqueda incremental de filtros (ventas_carrito.busqueda):
+# icontains genera UPPER(campo::text) LIKE UPPER('%texto%'), que PostgreSQL resuelve con
+# un índice GIN gin_trgm_ops sobre la misma expresión. En otras bases no se crean.
+INDICES = [
+    ('producto_nombre_trgm_idx', 'nombre'),
+]
+
+
+def crear_indices_busqueda(apps, schema_editor):
+    # La extensión pg_trgm la crea autenticacion_usuarios 0002_indices_busqueda
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    for nombre, columna in INDICES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {nombre} ON producto USING gin (UPPER({columna}::text) gin_trgm_ops)'
+        )
+
+
+def eliminar_indices_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for nombre, _ in INDICES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {nombre}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0005_cupondescuento_oferta'),
+        ('autenticacion_usuarios', '0002_indices_busqueda'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices_busqueda, eliminar_indices_busqueda),
+    ]
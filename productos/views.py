@@ -11,6 +11,7 @@ import base64
 import logging
 
 from .models import Producto, Categoria, Marca, Proveedor, Stock
+from ventas_carrito import busqueda
 
 logger = logging.getLogger(__name__)
 
@@ -337,6 +338,7 @@ class ProductoAdminView(View):
                 marca=marca,
                 proveedor=proveedor
             )
+            busqueda.invalidar_sugerencias('productos')
 
             # Crear stock inicial
             stock_cantidad = data.get('stock', 0)
@@ -404,6 +406,7 @@ class ProductoAdminView(View):
                     producto.proveedor = None
 
             producto.save()
+            busqueda.invalidar_sugerencias('productos')
 
             # Actualizar stock
             if 'stock' in data:
@@ -439,6 +442,7 @@ class ProductoAdminView(View):
             
             # Eliminar producto
             producto.delete()
+            busqueda.invalidar_sugerencias('productos')
 
             return JsonResponse({
                 'success': True,
@@ -572,6 +576,7 @@ class CategoriaListView(View):
                 nombre=data['nombre'],
                 descripcion=data.get('descripcion', '')
             )
+            busqueda.invalidar_categorias()
             
             return JsonResponse({
                 'success': True,
@@ -608,6 +613,7 @@ class CategoriaListView(View):
                 categoria.descripcion = data['descripcion']
             
             categoria.save()
+            busqueda.invalidar_categorias()
             
             return JsonResponse({
                 'success': True,
@@ -641,6 +647,7 @@ class CategoriaListView(View):
                 }, status=400)
             
             categoria.delete()
+            busqueda.invalidar_categorias()
             
             return JsonResponse({
                 'success': True,
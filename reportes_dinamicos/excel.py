@@ -0,0 +1,167 @@
+"""
+Escritor de Excel compartido en modo write-only de openpyxl.
+
+Las filas se escriben en orden y openpyxl las vuelca a disco a medida que se
+agregan, así que la memoria no crece con el número de filas. Los estilos se
+registran una sola vez por libro como estilos con nombre; las celdas solo
+referencian el nombre. El libro terminado se guarda en un archivo temporal y se
+envía en bloques con FileResponse.
+
+Restricciones del modo write-only: no se puede volver a una fila ya escrita ni
+combinar celdas, y los anchos de columna deben fijarse antes de escribir.
+"""
+import tempfile
+
+from django.http import FileResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import Cell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+
+CONTENT_TYPE_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+FORMATO_MONEDA = '#,##0.00'
+FORMATO_ENTERO = '#,##0'
+
+# Alto aproximado de una fila por defecto en cm (15 pt), para ubicar gráficos
+ALTO_FILA_CM = 0.53
+
+ALINEACION_IZQUIERDA = Alignment(horizontal='left', vertical='center', wrap_text=True)
+ALINEACION_CENTRO = Alignment(horizontal='center', vertical='center', wrap_text=True)
+
+_BORDE_FINO = Side(style='thin')
+_BORDE_GRIS = Side(style='thin', color='CCCCCC')
+
+# Colores de encabezado usados por los reportes existentes
+COLORES_ENCABEZADO = {
+    'encabezado': '0066FF',
+    'encabezado_verde': '10B981',
+    'encabezado_morado': '8B5CF6',
+    'encabezado_naranja': 'F59E0B',
+    'encabezado_azul': '3B82F6',
+}
+
+
+def _relleno(color):
+    return PatternFill(start_color=color, end_color=color, fill_type='solid')
+
+
+def _crear_estilos():
+    """Estilos con nombre disponibles en todos los libros"""
+    estilos = [
+        NamedStyle(
+            name='titulo',
+            font=Font(bold=True, size=16, color='0066FF'),
+            alignment=Alignment(horizontal='left', vertical='center')
+        ),
+        NamedStyle(name='titulo_morado', font=Font(bold=True, size=18, color='8B5CF6')),
+        NamedStyle(name='subtitulo', font=Font(bold=True, size=14, color='1F2937')),
+        NamedStyle(name='seccion', font=Font(bold=True, size=12, color='0066FF')),
+        NamedStyle(name='etiqueta', font=Font(bold=True)),
+        NamedStyle(name='empresa', font=Font(bold=True, size=14)),
+        NamedStyle(name='total', font=Font(bold=True, size=12)),
+        NamedStyle(
+            name='total_moneda',
+            font=Font(bold=True, size=12),
+            number_format=FORMATO_MONEDA
+        ),
+        NamedStyle(name='moneda', number_format=FORMATO_MONEDA),
+        NamedStyle(
+            name='celda',
+            fill=_relleno('FFFFFF'),
+            alignment=ALINEACION_CENTRO,
+            border=Border(left=_BORDE_GRIS, right=_BORDE_GRIS, top=_BORDE_GRIS, bottom=_BORDE_GRIS)
+        ),
+        NamedStyle(
+            name='celda_alterna',
+            fill=_relleno('F9FAFB'),
+            alignment=ALINEACION_CENTRO,
+            border=Border(left=_BORDE_GRIS, right=_BORDE_GRIS, top=_BORDE_GRIS, bottom=_BORDE_GRIS)
+        ),
+    ]
+    for nombre, color in COLORES_ENCABEZADO.items():
+        estilos.append(NamedStyle(
+            name=nombre,
+            font=Font(bold=True, color='FFFFFF'),
+            fill=_relleno(color),
+            alignment=ALINEACION_CENTRO,
+            border=Border(left=_BORDE_FINO, right=_BORDE_FINO, top=_BORDE_FINO, bottom=_BORDE_FINO)
+        ))
+    return estilos
+
+
+class ExcelWriteOnly:
+    """
+    Libro de una hoja en modo write-only.
+
+    `anchos` es un diccionario {letra_columna: ancho}; debe conocerse antes de
+    escribir la primera fila.
+    """
+
+    def __init__(self, titulo_hoja, anchos=None):
+        self.wb = Workbook(write_only=True)
+        for estilo in _crear_estilos():
+            self.wb.add_named_style(estilo)
+        self.ws = self.wb.create_sheet(titulo_hoja)
+        for letra, ancho in (anchos or {}).items():
+            self.ws.column_dimensions[letra].width = ancho
+        self.fila_actual = 0
+        self._fin_graficos = 0
+
+    def celda(self, valor, estilo=None, number_format=None, alignment=None):
+        """Celda con estilo con nombre y, opcionalmente, formato/alineación propios"""
+        cell = WriteOnlyCell(self.ws, value=valor)
+        if estilo:
+            cell.style = estilo
+        if number_format:
+            cell.number_format = number_format
+        if alignment:
+            cell.alignment = alignment
+        return cell
+
+    def escribir_fila(self, valores=(), estilo=None, alto=None):
+        """Agrega una fila y retorna su número. Con `estilo` se aplica a todas las celdas"""
+        if estilo:
+            valores = [v if isinstance(v, Cell) else self.celda(v, estilo) for v in valores]
+        self.fila_actual += 1
+        if alto:
+            self.ws.row_dimensions[self.fila_actual].height = alto
+        self.ws.append(list(valores))
+        return self.fila_actual
+
+    def filas_vacias(self, cantidad=1):
+        for _ in range(cantidad):
+            self.escribir_fila()
+
+    def escribir_filas(self, filas, estilo=None):
+        """Escribe un iterable de filas (p. ej. generado desde `.iterator()`); retorna (primera, ultima)"""
+        primera = self.fila_actual + 1
+        for valores in filas:
+            self.escribir_fila(valores, estilo)
+        return primera, self.fila_actual
+
+    def agregar_grafico(self, grafico, columna, fila):
+        """Ancla un gráfico en la celda columna+fila y recuerda hasta qué fila ocupa"""
+        self.ws.add_chart(grafico, f'{columna}{fila}')
+        self._fin_graficos = max(self._fin_graficos, fila + int(grafico.height / ALTO_FILA_CM) + 1)
+
+    def saltar_graficos(self):
+        """Avanza con filas vacías hasta pasar el último gráfico, para no taparlo con la siguiente sección"""
+        self.filas_vacias(max(0, self._fin_graficos - self.fila_actual))
+
+    def respuesta(self, nombre_archivo):
+        """Guarda el libro en un archivo temporal y lo envía en bloques"""
+        archivo = tempfile.TemporaryFile()
+        try:
+            self.wb.save(archivo)
+            archivo.seek(0)
+        except Exception:
+            archivo.close()
+            raise
+        # FileResponse cierra (y así elimina) el archivo temporal al terminar el envío
+        return FileResponse(
+            archivo,
+            as_attachment=True,
+            filename=nombre_archivo,
+            content_type=CONTENT_TYPE_XLSX
+        )
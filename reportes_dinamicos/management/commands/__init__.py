@@ -0,0 +1,5 @@
+# Management commands
+
+
+
+
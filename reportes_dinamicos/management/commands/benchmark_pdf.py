@@ -0,0 +1,155 @@
+"""
+Comando para medir el tiempo de renderizado por documento de los cuatro PDFs
+(comprobante, reporte dinámico, dashboard de ventas y predicciones).
+
+Compara construir los estilos en cada documento (como hacía cada vista antes
+del servicio compartido) contra reutilizar los estilos cacheados de
+reportes_dinamicos.pdf. Los documentos se renderizan en memoria: no escribe
+archivos ni modifica la base de datos.
+"""
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from reportes_dinamicos import pdf
+from reportes_dinamicos.models import Reporte
+
+
+def _datos_reporte(filas):
+    return {
+        'resumen': {
+            'total_general': 15230.5,
+            'cantidad_compras': filas,
+            'promedio_compra': 15230.5 / max(filas, 1),
+        },
+        'datos': [
+            {
+                'nombre': f'Producto {i}',
+                'fecha': '2025-01-15',
+                'total': 100.0 + i,
+                'cantidad': i % 7 + 1,
+                'categoria': f'Categoría {i % 5}',
+            }
+            for i in range(filas)
+        ],
+    }
+
+
+def _datos_dashboard():
+    meses = ['Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic']
+    tendencia = {'value': 1200, 'change': 4.5, 'trend': 'up'}
+    return {
+        'success': True,
+        'stats': {
+            'ventas_mes': {'value': 15230.5, 'change': 12.3, 'trend': 'up'},
+            'total_pedidos': tendencia,
+            'nuevos_clientes': tendencia,
+            'productos_activos': tendencia,
+            'ventas_mensuales': {'labels': meses, 'values': [1000.0 + 50 * i for i in range(12)]},
+        },
+        'top_products': [
+            {'name': f'Producto {i}', 'sales': 40 - i, 'revenue': 800.0 - 20 * i} for i in range(15)
+        ],
+        'clientes_activos': [
+            {'nombre': f'Cliente {i}', 'email': f'cliente{i}@mail.com', 'total_compras': 500.0 - i, 'num_compras': 10 - i}
+            for i in range(10)
+        ],
+    }
+
+
+def _datos_predicciones():
+    predicciones = [
+        {
+            'fecha_prediccion': f'2025-{i % 12 + 1:02d}-01T00:00:00',
+            'valor_predicho': 1000.0 + i,
+            'confianza': 0.8,
+            'categoria': {'nombre': f'Categoría {i % 3}'},
+        }
+        for i in range(60)
+    ]
+    resumen = {
+        'total_predicciones': len(predicciones),
+        'total_valor_predicho': sum(p['valor_predicho'] for p in predicciones),
+        'confianza_promedio': 0.8,
+        'tendencias': {'factor_crecimiento': 5.0, 'promedio_mensual_historico': 1200.0},
+    }
+    modelo = {'modelo': {'nombre': 'Modelo de Predicción de Ventas', 'version': '1.0', 'estado': 'activo', 'r2_score': 0.87}}
+    return {'success': True, 'predicciones': predicciones, 'resumen': resumen}, modelo
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo de renderizado por documento de los PDFs con y sin estilos cacheados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iteraciones',
+            type=int,
+            default=20,
+            help='Documentos renderizados por tipo y modo (default: 20)'
+        )
+        parser.add_argument(
+            '--filas',
+            type=int,
+            default=100,
+            help='Filas de la tabla de detalles del reporte dinámico (default: 100)'
+        )
+
+    def _documentos(self, filas):
+        from dashboard_inteligente.reportes_views import ExportarDashboardVentasView, ExportarPrediccionesView
+        from reportes_dinamicos.views import DescargarReporteView
+        from ventas_carrito.comprobantes_views import ComprobanteView
+        from ventas_carrito.models import Venta
+
+        documentos = []
+
+        venta = (
+            Venta.objects.filter(comprobante__isnull=False)
+            .select_related('cliente', 'cliente__id', 'comprobante')
+            .prefetch_related('detalles', 'detalles__producto')
+            .order_by('-id_venta')
+            .first()
+        )
+        if venta:
+            comprobante_view = ComprobanteView()
+            documentos.append(('comprobante', 'factura', lambda: comprobante_view._story_pdf(venta.comprobante, venta)))
+        else:
+            self.stdout.write(self.style.WARNING('  Sin ventas con comprobante: se omite el comprobante'))
+
+        reporte = Reporte(nombre='Benchmark', datos=_datos_reporte(filas), fecha_generacion=timezone.now())
+        reporte_view = DescargarReporteView()
+        documentos.append(('reporte', 'reporte', lambda: reporte_view._story_pdf(reporte)))
+
+        dashboard_view = ExportarDashboardVentasView()
+        stats_data = _datos_dashboard()
+        documentos.append(('dashboard', 'dashboard', lambda: dashboard_view._story_pdf(stats_data, '12')))
+
+        predicciones_view = ExportarPrediccionesView()
+        predicciones_data, modelo_data = _datos_predicciones()
+        documentos.append(
+            ('predicciones', 'dashboard', lambda: predicciones_view._story_pdf(predicciones_data, modelo_data))
+        )
+        return documentos
+
+    def _medir(self, construir_story, plantilla, iteraciones, con_cache):
+        pdf.renderizar(construir_story(), BytesIO(), plantilla)  # Calentamiento
+        inicio = time.perf_counter()
+        for _ in range(iteraciones):
+            if not con_cache:
+                pdf.limpiar_cache()
+            pdf.renderizar(construir_story(), BytesIO(), plantilla)
+        return (time.perf_counter() - inicio) / iteraciones * 1000
+
+    def handle(self, *args, **options):
+        iteraciones = options['iteraciones']
+        self.stdout.write(f'Renderizando {iteraciones} documentos por tipo y modo...')
+        self.stdout.write(f"  {'Documento':<14}{'Sin caché (ms)':>16}{'Con caché (ms)':>16}{'Mejora':>10}")
+
+        for nombre, plantilla, construir_story in self._documentos(options['filas']):
+            sin_cache = self._medir(construir_story, plantilla, iteraciones, con_cache=False)
+            con_cache = self._medir(construir_story, plantilla, iteraciones, con_cache=True)
+            mejora = (1 - con_cache / sin_cache) * 100 if sin_cache else 0
+            self.stdout.write(f"  {nombre:<14}{sin_cache:>16.2f}{con_cache:>16.2f}{mejora:>9.1f}%")
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark completado'))
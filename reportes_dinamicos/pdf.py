@@ -0,0 +1,453 @@
+"""
+Servicio compartido de renderizado PDF (reportlab).
+
+Las hojas de estilo, los ParagraphStyle propios y los TableStyle se construyen
+una sola vez por proceso y se reutilizan en cada documento (son de solo lectura
+durante el armado). Las plantillas de página fijan tamaño y márgenes de cada
+tipo de documento. Las fuentes usadas son las estándar de PDF (Helvetica), que
+no requieren registro.
+"""
+from functools import lru_cache
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
+
+# Paleta de reportes y dashboard
+AZUL = '#0066FF'
+VERDE = '#10B981'
+MORADO = '#8B5CF6'
+NARANJA = '#F59E0B'
+GRIS_OSCURO = '#1F2937'
+GRIS_CLARO = '#F3F4F6'
+GRIS_FONDO = '#F9FAFB'
+
+# Paleta del comprobante
+FACTURA_PRIMARIO = colors.HexColor('#2563eb')  # Azul moderno
+FACTURA_FONDO = colors.HexColor('#f8fafc')  # Gris muy claro
+FACTURA_TEXTO = colors.HexColor('#1e293b')  # Gris oscuro
+FACTURA_BORDE = colors.HexColor('#e2e8f0')  # Gris claro
+FACTURA_TENUE = colors.HexColor('#64748b')
+
+# Plantillas de página: tamaño y márgenes por tipo de documento
+PLANTILLAS = {
+    'factura': {
+        'pagesize': A4,
+        'rightMargin': 72, 'leftMargin': 72, 'topMargin': 72, 'bottomMargin': 72,
+    },
+    'reporte': {
+        'pagesize': A4,
+        'topMargin': 0.5*inch, 'bottomMargin': 0.5*inch, 'leftMargin': 0.5*inch, 'rightMargin': 0.5*inch,
+    },
+    'dashboard': {
+        'pagesize': A4,
+        'topMargin': 0.5*inch, 'bottomMargin': 0.5*inch,
+    },
+}
+
+
+# ==========================================================
+# ESTILOS DE PÁRRAFO
+# ==========================================================
+
+@lru_cache(maxsize=None)
+def hoja_estilos():
+    """Hoja de estilos de muestra de reportlab, construida una vez por proceso"""
+    return getSampleStyleSheet()
+
+
+@lru_cache(maxsize=None)
+def _estilos_parrafo():
+    base = hoja_estilos()
+    definiciones = [
+        # Reportes dinámicos
+        ParagraphStyle(
+            'ReporteTitulo',
+            parent=base['Heading1'],
+            fontSize=20,
+            textColor=colors.HexColor(AZUL),
+            spaceAfter=12,
+            alignment=TA_LEFT
+        ),
+        # Dashboard y predicciones
+        ParagraphStyle(
+            'DashboardTitulo',
+            parent=base['Heading1'],
+            fontSize=24,
+            textColor=colors.HexColor(AZUL),
+            spaceAfter=30,
+            alignment=TA_CENTER,
+            fontName='Helvetica-Bold'
+        ),
+        ParagraphStyle(
+            'PrediccionesTitulo',
+            parent=base['Heading1'],
+            fontSize=24,
+            textColor=colors.HexColor(MORADO),
+            spaceAfter=30,
+            alignment=TA_CENTER,
+            fontName='Helvetica-Bold'
+        ),
+        ParagraphStyle(
+            'Seccion',
+            parent=base['Heading2'],
+            fontSize=16,
+            textColor=colors.HexColor(GRIS_OSCURO),
+            spaceAfter=12,
+            spaceBefore=20,
+            fontName='Helvetica-Bold'
+        ),
+        # Comprobante
+        ParagraphStyle(
+            'FacturaSubtitulo',
+            parent=base['Heading2'],
+            fontSize=14,
+            textColor=FACTURA_TEXTO,
+            spaceAfter=12,
+            fontName='Helvetica-Bold',
+            leading=18
+        ),
+        ParagraphStyle(
+            'FacturaNormal',
+            parent=base['Normal'],
+            fontSize=10,
+            textColor=FACTURA_TEXTO,
+            leading=14,
+            fontName='Helvetica'
+        ),
+        ParagraphStyle(
+            'FacturaPequeno',
+            parent=base['Normal'],
+            fontSize=9,
+            textColor=FACTURA_TENUE,
+            leading=12,
+            fontName='Helvetica'
+        ),
+        ParagraphStyle('FacturaCabeceraIzq', fontSize=12, textColor=FACTURA_TEXTO, fontName='Helvetica-Bold', leading=16),
+        ParagraphStyle(
+            'FacturaCabeceraDer',
+            fontSize=12,
+            textColor=FACTURA_TEXTO,
+            alignment=TA_RIGHT,
+            fontName='Helvetica-Bold',
+            leading=16
+        ),
+        ParagraphStyle('FacturaEncabezado', fontSize=10, textColor=colors.white, fontName='Helvetica-Bold', alignment=TA_CENTER),
+        ParagraphStyle('FacturaCeldaCentro', fontSize=10, textColor=FACTURA_TEXTO, alignment=TA_CENTER),
+        ParagraphStyle('FacturaCeldaDerecha', fontSize=10, textColor=FACTURA_TEXTO, alignment=TA_RIGHT),
+        ParagraphStyle(
+            'FacturaCeldaDerechaNegrita',
+            fontSize=10,
+            textColor=FACTURA_TEXTO,
+            fontName='Helvetica-Bold',
+            alignment=TA_RIGHT
+        ),
+        ParagraphStyle('FacturaSubtotal', fontSize=11, textColor=FACTURA_TEXTO, fontName='Helvetica', alignment=TA_RIGHT),
+        ParagraphStyle(
+            'FacturaTotal',
+            fontSize=14,
+            textColor=FACTURA_PRIMARIO,
+            fontName='Helvetica-Bold',
+            alignment=TA_RIGHT
+        ),
+        ParagraphStyle(
+            'FacturaPie',
+            fontSize=8,
+            textColor=colors.HexColor('#94a3b8'),
+            alignment=TA_CENTER,
+            fontName='Helvetica',
+            leading=10
+        ),
+    ]
+    estilos = {nombre: base[nombre] for nombre in ('Normal', 'Heading2')}
+    estilos.update({e.name: e for e in definiciones})
+    return estilos
+
+
+def estilo(nombre):
+    """ParagraphStyle compartido por nombre ('Normal', 'Seccion', 'FacturaNormal', ...)"""
+    return _estilos_parrafo()[nombre]
+
+
+# ==========================================================
+# ESTILOS DE TABLA
+# ==========================================================
+
+@lru_cache(maxsize=None)
+def estilo_tabla_datos(color_encabezado, fuente_encabezado=12, fuente_cuerpo=10, relleno=8,
+                       grilla=1, alineacion='CENTER', fondo_cuerpo=True):
+    """Tabla con fila de encabezado de color y filas alternadas (dashboard y predicciones)"""
+    comandos = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(color_encabezado)),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), alineacion),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), fuente_encabezado),
+        ('FONTSIZE', (0, 1), (-1, -1), fuente_cuerpo),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), relleno),
+        ('TOPPADDING', (0, 0), (-1, -1), relleno),
+    ]
+    if fondo_cuerpo:
+        comandos.append(('BACKGROUND', (0, 1), (-1, -1), colors.HexColor(GRIS_FONDO)))
+    comandos += [
+        ('GRID', (0, 0), (-1, -1), grilla, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor(GRIS_FONDO)]),
+    ]
+    return TableStyle(comandos)
+
+
+@lru_cache(maxsize=None)
+def estilo_tabla_info(fuente=11, relleno=8, grilla=0.5):
+    """Tabla de dos columnas etiqueta/valor con la etiqueta sombreada"""
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor(GRIS_CLARO)),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor(GRIS_OSCURO)),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), fuente),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), relleno),
+        ('TOPPADDING', (0, 0), (-1, -1), relleno),
+        ('GRID', (0, 0), (-1, -1), grilla, colors.grey),
+    ])
+
+
+@lru_cache(maxsize=None)
+def estilo_tabla(nombre):
+    """TableStyle fijos de los documentos, por nombre"""
+    return TableStyle(_ESTILOS_TABLA[nombre])
+
+
+_ESTILOS_TABLA = {
+    'reporte_info': [
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor(GRIS_CLARO)),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ],
+    'reporte_resumen': [
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(AZUL)),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor(GRIS_FONDO)),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+    ],
+    'reporte_detalles': [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(AZUL)),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),  # Encabezados centrados
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),  # Verticalmente centrado
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('TOPPADDING', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 10),
+        ('TOPPADDING', (0, 1), (-1, -1), 10),
+        ('LEFTPADDING', (0, 0), (-1, -1), 8),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor(GRIS_FONDO)]),
+        ('WORDWRAP', (0, 0), (-1, -1), True),  # Permitir salto de línea
+        ('ALIGN', (0, 1), (-1, -1), 'CENTER'),
+    ],
+    'factura_cabecera': [
+        ('BACKGROUND', (0, 0), (-1, -1), FACTURA_FONDO),
+        ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('LEFTPADDING', (0, 0), (-1, -1), 15),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 15),
+        ('TOPPADDING', (0, 0), (-1, -1), 20),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 20),
+        ('BOTTOMBORDER', (0, 0), (-1, -1), 2, FACTURA_PRIMARIO),
+    ],
+    'factura_partes': [
+        ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+        ('ALIGN', (1, 0), (1, 0), 'LEFT'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('LEFTPADDING', (0, 0), (-1, -1), 0),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+        ('TOPPADDING', (0, 0), (-1, -1), 0),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
+    ],
+    'factura_datos': [
+        ('BACKGROUND', (0, 0), (-1, -1), FACTURA_FONDO),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('LEFTPADDING', (0, 0), (-1, -1), 12),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 12),
+        ('TOPPADDING', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+        ('BOTTOMBORDER', (0, 0), (-1, -1), 1, FACTURA_BORDE),
+    ],
+    'factura_detalles': [
+        # Header
+        ('BACKGROUND', (0, 0), (-1, 0), FACTURA_PRIMARIO),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 14),
+        ('TOPPADDING', (0, 0), (-1, 0), 14),
+        # Filas de datos
+        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+        ('TEXTCOLOR', (0, 1), (-1, -1), FACTURA_TEXTO),
+        ('ALIGN', (0, 1), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 1), (1, -1), 'CENTER'),
+        ('ALIGN', (2, 1), (-1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 10),
+        ('TOPPADDING', (0, 1), (-1, -1), 10),
+        ('LEFTPADDING', (0, 0), (-1, -1), 12),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 12),
+        # Bordes
+        ('GRID', (0, 0), (-1, -1), 1, FACTURA_BORDE),
+        ('LINEBELOW', (0, 0), (-1, 0), 2, colors.white),
+        # Alternar colores de filas
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, FACTURA_FONDO]),
+    ],
+    'factura_totales': [
+        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+        ('FONTNAME', (1, 0), (1, 0), 'Helvetica'),
+        ('FONTSIZE', (1, 0), (1, 0), 11),
+        ('FONTNAME', (1, 1), (1, 1), 'Helvetica-Bold'),
+        ('FONTSIZE', (1, 1), (1, 1), 14),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+        ('TOPPADDING', (0, 0), (-1, 0), 8),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 12),
+        ('TOPPADDING', (0, 1), (-1, -1), 12),
+        ('LEFTPADDING', (0, 0), (-1, -1), 0),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 12),
+        ('TOPBORDER', (1, 1), (-1, 1), 2, FACTURA_PRIMARIO),
+        ('BACKGROUND', (1, 1), (-1, 1), FACTURA_FONDO),
+    ],
+    'factura_notas': [
+        ('BACKGROUND', (0, 0), (-1, -1), FACTURA_FONDO),
+        ('LEFTPADDING', (0, 0), (-1, -1), 12),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 12),
+        ('TOPPADDING', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+        ('BOTTOMBORDER', (0, 0), (-1, -1), 1, FACTURA_BORDE),
+    ],
+}
+
+
+# ==========================================================
+# TABLAS GRANDES
+# ==========================================================
+
+# Filas por tabla al trocear tablas grandes (cerca de una página A4 de detalles;
+# un bloque que no entra se parte con el encabezado repetido)
+FILAS_POR_BLOQUE = 25
+
+
+def tablas_por_bloques(encabezado, filas, anchos, estilo_base, comandos_extra=None, filas_por_bloque=FILAS_POR_BLOQUE):
+    """
+    Genera tablas de tamaño fijo, cada una con su fila de encabezado, a partir
+    de un iterable de filas. reportlab maqueta cada tabla por separado, así que
+    el costo crece linealmente y nunca hay una tabla gigante en memoria.
+    """
+    bloque = []
+    for fila in filas:
+        bloque.append(fila)
+        if len(bloque) == filas_por_bloque:
+            yield tabla([encabezado] + bloque, anchos, estilo_base, comandos_extra, repetir_encabezado=1)
+            bloque = []
+    if bloque:
+        yield tabla([encabezado] + bloque, anchos, estilo_base, comandos_extra, repetir_encabezado=1)
+
+
+class HistoriaPerezosa:
+    """
+    Story que se materializa a medida que `doc.build` la consume.
+
+    `doc.build` toma y elimina flowables del inicio de la lista (y a veces
+    reinserta fragmentos); esta clase implementa esas operaciones sobre un
+    búfer pequeño alimentado por un iterable, de modo que los flowables ya
+    dibujados se liberan y los siguientes se crean recién cuando hacen falta.
+    """
+
+    # Flowables por adelantado; se amplía mientras el último tenga keepWithNext
+    ADELANTO = 2
+
+    def __init__(self, flowables):
+        self._fuente = iter(flowables)
+        self._bufer = []
+
+    def _llenar(self, cantidad):
+        while len(self._bufer) < cantidad and self._fuente is not None:
+            try:
+                self._bufer.append(next(self._fuente))
+            except StopIteration:
+                self._fuente = None
+
+    def _indice_maximo(self, indice):
+        if isinstance(indice, slice):
+            return indice.stop if indice.stop is not None else len(self._bufer)
+        return indice + 1
+
+    def __len__(self):
+        self._llenar(self.ADELANTO)
+        while self._fuente is not None and self._bufer[-1].getKeepWithNext():
+            self._llenar(len(self._bufer) + 1)
+        return len(self._bufer)
+
+    def __getitem__(self, indice):
+        self._llenar(self._indice_maximo(indice))
+        return self._bufer[indice]
+
+    def __setitem__(self, indice, valor):
+        self._llenar(self._indice_maximo(indice))
+        self._bufer[indice] = valor
+
+    def __delitem__(self, indice):
+        self._llenar(self._indice_maximo(indice))
+        del self._bufer[indice]
+
+    def insert(self, indice, valor):
+        self._bufer.insert(indice, valor)
+
+
+# ==========================================================
+# CONSTRUCCIÓN DE DOCUMENTOS
+# ==========================================================
+
+def tabla(filas, anchos, estilo_base, comandos_extra=None, repetir_encabezado=0):
+    """Table con un TableStyle compartido más, opcionalmente, comandos propios de esta tabla"""
+    t = Table(filas, colWidths=anchos, repeatRows=repetir_encabezado)
+    t.setStyle(estilo_base)
+    if comandos_extra:
+        t.setStyle(TableStyle(comandos_extra))
+    return t
+
+
+def documento(destino, plantilla):
+    """SimpleDocTemplate con el tamaño y márgenes de la plantilla indicada"""
+    return SimpleDocTemplate(destino, **PLANTILLAS[plantilla])
+
+
+def renderizar(story, destino, plantilla):
+    """
+    Construye el PDF en `destino` (ruta o archivo) y retorna la cantidad de páginas.
+    `story` puede ser una lista o un generador de flowables (se consume de forma perezosa).
+    """
+    if not isinstance(story, list):
+        story = HistoriaPerezosa(story)
+    doc = documento(destino, plantilla)
+    doc.build(story)
+    return doc.page
+
+
+def limpiar_cache():
+    """Descarta los estilos cacheados (p. ej. para medir el costo de construirlos)"""
+    for funcion in (hoja_estilos, _estilos_parrafo, estilo_tabla_datos, estilo_tabla_info, estilo_tabla):
+        funcion.cache_clear()
@@ -1,7 +1,7 @@
 """
 CU14-CU20: Reportes Dinámicos
 """
-from django.http import JsonResponse, HttpResponse, FileResponse
+from django.http import JsonResponse, FileResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views import View
@@ -9,19 +9,20 @@ from django.db.models import Q, Sum, Count, Avg, Max, Min
 from django.utils import timezone
 from django.conf import settings
 from datetime import datetime, timedelta
+import itertools
 import json
 import logging
 import os
-from io import BytesIO
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+import tempfile
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, Spacer
+from openpyxl.utils import get_column_letter
 
 from .models import Reporte, ModeloIA, PrediccionVenta
+from . import pdf
+from .excel import ALINEACION_IZQUIERDA, FORMATO_ENTERO, ExcelWriteOnly
 from .interpreter import ReporteInterpreter
+from ventas_carrito import busqueda, resumen_clientes
 from ventas_carrito.models import Venta, DetalleVenta
 from productos.models import Producto, Categoria
 from autenticacion_usuarios.models import Usuario, Cliente
@@ -749,85 +750,103 @@ class GeneradorReporte:
         # Aplicar fechas si se solicitan (fecha de registro o última compra)
         fechas = parametros.get('fechas', {})
         
-        clientes = query.order_by('id__nombre')[:200]  # Aumentado a 200
+        clientes = list(query.select_related('resumen').order_by('id__nombre')[:200])  # Aumentado a 200
+        cliente_ids = [cliente.pk for cliente in clientes]
         
         datos = []
         total_clientes = query.count()
         total_ventas_general = 0
         total_monto_general = 0.0
         
+        # Filtro de fechas (sobre las compras del cliente)
+        desde_date = None
+        if 'desde' in fechas and fechas['desde']:
+            try:
+                desde_date = fechas['desde']
+                if isinstance(desde_date, str):
+                    try:
+                        desde_date = datetime.fromisoformat(desde_date.replace('Z', '+00:00'))
+                    except:
+                        desde_date = datetime.strptime(desde_date, '%Y-%m-%d')
+            except (ValueError, TypeError, AttributeError) as e:
+                desde_date = None
+                logger.warning(f"Error al parsear fecha 'desde' en reporte clientes: {str(e)}")
+        
+        hasta_date = None
+        if 'hasta' in fechas and fechas['hasta']:
+            try:
+                hasta_date = fechas['hasta']
+                if isinstance(hasta_date, str):
+                    try:
+                        hasta_date = datetime.fromisoformat(hasta_date.replace('Z', '+00:00'))
+                    except:
+                        hasta_date = datetime.strptime(hasta_date, '%Y-%m-%d')
+            except (ValueError, TypeError, AttributeError) as e:
+                hasta_date = None
+                logger.warning(f"Error al parsear fecha 'hasta' en reporte clientes: {str(e)}")
+        
+        # Totales de compras: sin fechas salen del resumen de cada cliente; con
+        # fechas, de una sola consulta agregada para todos los clientes del reporte
+        if desde_date or hasta_date:
+            agregados = resumen_clientes.agregar_ventas(cliente_ids, desde=desde_date, hasta=hasta_date)
+        else:
+            agregados = {
+                cliente.pk: {
+                    'total_compras': cliente.resumen.total_compras,
+                    'monto_total': cliente.resumen.monto_total,
+                    'monto_maximo': cliente.resumen.monto_maximo,
+                    'monto_minimo': cliente.resumen.monto_minimo,
+                    'primera_compra': cliente.resumen.primera_compra,
+                    'ultima_compra': cliente.resumen.ultima_compra,
+                    'ultima_compra_monto': cliente.resumen.ultima_compra_monto,
+                }
+                for cliente in clientes
+                if getattr(cliente, 'resumen', None) and cliente.resumen.total_compras
+            }
+        
+        # Productos más comprados de todos los clientes del reporte en una consulta
+        productos_por_cliente = {}
+        productos_stats = DetalleVenta.objects.filter(
+            venta__cliente_id__in=[cliente_id for cliente_id in cliente_ids if cliente_id in agregados]
+        ).values('venta__cliente_id', 'producto__nombre', 'producto__categoria__nombre').annotate(
+            total_cantidad=Sum('cantidad'),
+            total_monto=Sum('subtotal')
+        ).order_by('venta__cliente_id', '-total_cantidad')
+        for item in productos_stats:
+            productos_cliente = productos_por_cliente.setdefault(item['venta__cliente_id'], [])
+            if len(productos_cliente) < 5:
+                productos_cliente.append({
+                    'producto': item['producto__nombre'],
+                    'categoria': item['producto__categoria__nombre'] or 'Sin categoría',
+                    'cantidad_total': item['total_cantidad'],
+                    'monto_total': float(item['total_monto'])
+                })
+        
         for cliente in clientes:
-            # Obtener todas las ventas del cliente
-            ventas_cliente = Venta.objects.filter(cliente=cliente)
-            
-            # Aplicar filtro de fecha si existe (para última compra)
-            if 'desde' in fechas and fechas['desde']:
-                try:
-                    desde_date = fechas['desde']
-                    if isinstance(desde_date, str):
-                        try:
-                            desde_date = datetime.fromisoformat(desde_date.replace('Z', '+00:00'))
-                        except:
-                            desde_date = datetime.strptime(desde_date, '%Y-%m-%d')
-                    ventas_cliente = ventas_cliente.filter(fecha_venta__gte=desde_date)
-                except (ValueError, TypeError, AttributeError) as e:
-                    logger.warning(f"Error al parsear fecha 'desde' en reporte clientes: {str(e)}")
-            
-            if 'hasta' in fechas and fechas['hasta']:
-                try:
-                    hasta_date = fechas['hasta']
-                    if isinstance(hasta_date, str):
-                        try:
-                            hasta_date = datetime.fromisoformat(hasta_date.replace('Z', '+00:00'))
-                        except:
-                            hasta_date = datetime.strptime(hasta_date, '%Y-%m-%d')
-                    ventas_cliente = ventas_cliente.filter(fecha_venta__lte=hasta_date)
-                except (ValueError, TypeError, AttributeError) as e:
-                    logger.warning(f"Error al parsear fecha 'hasta' en reporte clientes: {str(e)}")
-            
-            ventas_count = ventas_cliente.count()
-            total_compras = float(ventas_cliente.aggregate(Sum('total'))['total__sum'] or 0)
-            promedio_compra = float(ventas_cliente.aggregate(Avg('total'))['total__avg'] or 0) if ventas_count > 0 else 0
-            max_compra = float(ventas_cliente.aggregate(Max('total'))['total__max'] or 0)
-            min_compra = float(ventas_cliente.aggregate(Min('total'))['total__min'] or 0)
-            
-            # Obtener última compra
-            ultima_venta = ventas_cliente.order_by('-fecha_venta').first()
-            ultima_compra_fecha = ultima_venta.fecha_venta.isoformat() if ultima_venta else None
-            ultima_compra_monto = float(ultima_venta.total) if ultima_venta else 0
-            
-            # Obtener primera compra (fecha de registro efectivo como cliente activo)
-            primera_venta = ventas_cliente.order_by('fecha_venta').first()
-            primera_compra_fecha = primera_venta.fecha_venta.isoformat() if primera_venta else None
+            estadisticas = agregados.get(cliente.pk)
+            if estadisticas:
+                ventas_count = estadisticas['total_compras']
+                total_compras = float(estadisticas['monto_total'] or 0)
+                promedio_compra = total_compras / ventas_count
+                max_compra = float(estadisticas['monto_maximo'] or 0)
+                min_compra = float(estadisticas['monto_minimo'] or 0)
+                ultima_compra = estadisticas['ultima_compra']
+                ultima_compra_monto = float(estadisticas['ultima_compra_monto'] or 0)
+                primera_compra = estadisticas['primera_compra']
+            else:
+                ventas_count = 0
+                total_compras = promedio_compra = max_compra = min_compra = ultima_compra_monto = 0.0
+                ultima_compra = primera_compra = None
             
-            # Obtener productos más comprados por este cliente
-            productos_mas_comprados = []
-            if ventas_cliente.exists():
-                from django.db.models import Sum as SumModel
-                productos_stats = DetalleVenta.objects.filter(
-                    venta__cliente=cliente
-                ).values('producto__nombre', 'producto__categoria__nombre').annotate(
-                    total_cantidad=SumModel('cantidad'),
-                    total_monto=SumModel('subtotal')
-                ).order_by('-total_cantidad')[:5]
-                
-                productos_mas_comprados = [
-                    {
-                        'producto': item['producto__nombre'],
-                        'categoria': item['producto__categoria__nombre'] or 'Sin categoría',
-                        'cantidad_total': item['total_cantidad'],
-                        'monto_total': float(item['total_monto'])
-                    }
-                    for item in productos_stats
-                ]
+            ultima_compra_fecha = ultima_compra.isoformat() if ultima_compra else None
+            primera_compra_fecha = primera_compra.isoformat() if primera_compra else None
+            productos_mas_comprados = productos_por_cliente.get(cliente.pk, [])
             
             total_ventas_general += ventas_count
             total_monto_general += total_compras
             
             # Formatear última compra para mostrar
-            ultima_compra_display = None
-            if ultima_venta:
-                ultima_compra_display = ultima_venta.fecha_venta.strftime('%d/%m/%Y')
+            ultima_compra_display = ultima_compra.strftime('%d/%m/%Y') if ultima_compra else None
             
             # Solo incluir información básica y esencial
             datos.append({
@@ -1348,32 +1367,34 @@ class DescargarReporteView(View):
     
     def _generar_pdf(self, reporte: Reporte):
         """Generar PDF del reporte con formato mejorado"""
-        from reportlab.lib.units import inch
-        from reportlab.lib.styles import ParagraphStyle
-        
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch, 
-                               leftMargin=0.5*inch, rightMargin=0.5*inch)
-        story = []
-        styles = getSampleStyleSheet()
-        
-        # Estilos personalizados
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=20,
-            textColor=colors.HexColor('#0066FF'),
-            spaceAfter=12,
-            alignment=0  # Left align
-        )
+        # Se escribe en un archivo temporal (no en memoria) y se envía en bloques
+        archivo = tempfile.TemporaryFile()
+        try:
+            pdf.renderizar(self._story_pdf(reporte), archivo, 'reporte')
+            archivo.seek(0)
+        except Exception as e:
+            archivo.close()
+            logger.error(f"Error al construir PDF: {str(e)}", exc_info=True)
+            raise
         
+        # FileResponse cierra (y así elimina) el archivo temporal al terminar el envío
+        return FileResponse(
+            archivo,
+            filename=f'reporte_{reporte.id_reporte}.pdf',
+            content_type='application/pdf'
+        )
+    
+    def _story_pdf(self, reporte: Reporte):
+        """
+        Contenido del PDF del reporte, generado de forma perezosa: las tablas de
+        detalles se crean recién cuando reportlab llega a ellas.
+        """
         # Título
-        story.append(Paragraph(f"<b>{reporte.nombre}</b>", title_style))
-        story.append(Spacer(1, 0.2*inch))
+        yield Paragraph(f"<b>{reporte.nombre}</b>", pdf.estilo('ReporteTitulo'))
+        yield Spacer(1, 0.2*inch)
         
         # Información del reporte (solo información relevante)
         # Convertir a zona horaria local si está en UTC
-        from django.utils import timezone
         fecha_generacion = reporte.fecha_generacion
         if timezone.is_aware(fecha_generacion):
             fecha_generacion = timezone.localtime(fecha_generacion)
@@ -1387,359 +1408,122 @@ class DescargarReporteView(View):
         if reporte.prompt:
             info_data.append(['Solicitud Original:', reporte.prompt[:100] + ('...' if len(reporte.prompt) > 100 else '')])
         
-        info_table = Table(info_data, colWidths=[2.5*inch, 4.5*inch])
-        info_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F3F4F6')),
-            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ]))
-        story.append(info_table)
-        story.append(Spacer(1, 0.4*inch))
+        yield pdf.tabla(info_data, [2.5*inch, 4.5*inch], pdf.estilo_tabla('reporte_info'))
+        yield Spacer(1, 0.4*inch)
         
         # Datos del reporte
         datos = reporte.datos
-        if isinstance(datos, dict):
-            # Mostrar resumen si existe
-            if 'resumen' in datos and datos['resumen']:
-                story.append(Paragraph("<b>📊 Resumen</b>", styles['Heading2']))
-                story.append(Spacer(1, 0.15*inch))
-                
-                resumen = datos['resumen']
-                resumen_data = []
-                # Campos a excluir del resumen
-                campos_excluir = [
-                    'compras_mostradas', 'compras_totales', 'categorias_analizadas', 
-                    'clientes_mostrados', 'mensaje', 'compras_totales'
-                ]
-                
-                # Campos prioritarios a mostrar primero
-                campos_prioritarios = [
-                    'total_general', 'total_general_formateado',
-                    'cantidad_compras', 'promedio_compra', 'promedio_compra_formateado',
-                    'max_compra', 'max_compra_formateado',
-                    'min_compra', 'min_compra_formateado'
-                ]
-                
-                # Primero agregar campos prioritarios formateados
-                for key in campos_prioritarios:
-                    if key in resumen and key not in campos_excluir:
-                        value = resumen[key]
-                        if isinstance(value, (dict, list)):
-                            continue
-                        
-                        # Si es formateado, usarlo directamente
-                        if key.endswith('_formateado'):
-                            label = key.replace('_formateado', '').replace('_', ' ').title().strip()
-                            resumen_data.append([label, str(value)])
-                        elif isinstance(value, (int, float)):
-                            # Formatear si no hay versión formateada
-                            key_formateado = key + '_formateado'
-                            if key_formateado not in resumen:
-                                if 'total' in key.lower() or 'monto' in key.lower() or 'precio' in key.lower() or 'compra' in key.lower():
-                                    value_str = f"Bs. {value:,.2f}"
-                                else:
-                                    value_str = f"{value:,}"
-                                label = key.replace('_', ' ').title().strip()
-                                resumen_data.append([label, value_str])
-                
-                # Luego agregar otros campos relevantes (no prioritarios, no excluidos)
-                for key, value in resumen.items():
-                    if key in campos_excluir or key in campos_prioritarios:
-                        continue
-                    if isinstance(value, (dict, list)):
-                        continue
-                    
-                    # Si hay versión formateada, usar esa
-                    key_formateado = key + '_formateado'
-                    if key_formateado in resumen:
-                        label = key.replace('_', ' ').title().strip()
-                        resumen_data.append([label, str(resumen[key_formateado])])
-                    elif not key.endswith('_formateado') and not key.endswith('_display'):
-                        # Solo agregar si no es un campo formateado y no tiene versión formateada
-                        if isinstance(value, (int, float)):
-                            if 'total' in key.lower() or 'monto' in key.lower() or 'precio' in key.lower() or 'compra' in key.lower():
-                                value_str = f"Bs. {value:,.2f}"
-                            else:
-                                value_str = f"{value:,}"
-                        else:
-                            value_str = str(value)
-                        label = key.replace('_', ' ').title().strip()
-                        resumen_data.append([label, value_str])
-                
-                if resumen_data:
-                    resumen_table = Table(resumen_data, colWidths=[3*inch, 4*inch])
-                    resumen_table.setStyle(TableStyle([
-                        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-                        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-                        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                        ('FONTSIZE', (0, 0), (-1, -1), 10),
-                        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0066FF')),
-                        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#F9FAFB')),
-                        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                    ]))
-                    story.append(resumen_table)
-                    story.append(Spacer(1, 0.3*inch))
+        if not isinstance(datos, dict):
+            return
+        
+        # Mostrar resumen si existe
+        if datos.get('resumen'):
+            yield Paragraph("<b>📊 Resumen</b>", pdf.estilo('Heading2'))
+            yield Spacer(1, 0.15*inch)
             
-            # Mostrar datos principales
-            if 'datos' in datos and datos['datos']:
-                story.append(Paragraph("<b>📋 Detalles</b>", styles['Heading2']))
-                story.append(Spacer(1, 0.15*inch))
-                
-                datos_lista = datos['datos']
-                if datos_lista:
-                    # Seleccionar columnas principales (excluir objetos complejos)
-                    primera_fila = datos_lista[0]
-                    headers_principales = []
-                    for key in primera_fila.keys():
-                        valor = primera_fila[key]
-                        # Incluir solo valores simples o strings cortos
-                        if not isinstance(valor, (dict, list)) or (isinstance(valor, str) and len(valor) < 100):
-                            headers_principales.append(key)
-                    
-                    if headers_principales:
-                        # Detectar si es reporte de productos
-                        es_reporte_productos = 'precio' in headers_principales and ('stock' in headers_principales or 'categoria' in headers_principales or 'marca' in headers_principales)
-                        
-                        # Si es reporte de productos, usar solo las columnas específicas
-                        if es_reporte_productos:
-                            columnas_productos = [
-                                'nombre',
-                                'precio',
-                                'categoria',
-                                'stock',
-                                'marca',
-                                'monto_total_vendido',
-                                'veces_vendido'
-                            ]
-                            columnas_principales = [col for col in columnas_productos if col in headers_principales]
-                        else:
-                            # Filtrar columnas para mostrar solo las principales (excluir innecesarias)
-                            columnas_principales = []
-                            excluir_columnas = [
-                                'id', 'id_venta', 'id_reporte',  # IDs no necesarios
-                                'fecha_iso', 'fecha_formateada',  # Usar solo 'fecha'
-                                'total_numero', 'monto_total',  # Usar versiones formateadas
-                                'cliente', 'productos',  # Objetos complejos
-                                'productos_count', 'total_productos_cantidad',  # Columnas eliminadas
-                                'notas', 'direccion_entrega',  # Solo en detalles
-                                'fecha_primera_compra', 'veces_comprado',  # Información extra
-                                'precio_unitario_promedio',  # Usar precio_unitario formateado
-                                'cantidad_vendida',  # Excluir cantidad_vendida, solo mostrar monto_total_vendido y veces_vendido
-                            ]
-                            
-                            # Verificar si el usuario es administrador
-                            es_admin = reporte.id_usuario and reporte.id_usuario.id_rol and reporte.id_usuario.id_rol.nombre.lower() == 'administrador'
-                            
-                            # Si no es admin, excluir columnas administrativas
-                            if not es_admin:
-                                excluir_columnas.extend(['estado', 'metodo_pago', 'metodo_pago_display', 'cliente_email', 'cliente_telefono', 'cliente_direccion'])
-                            
-                            # Prioridades para columnas principales - NOMBRE SIEMPRE PRIMERO cuando hay productos
-                            # NOTA: Preferir siempre versiones _display o _formateado sobre originales
-                            if 'nombre' in headers_principales:
-                                prioridades = ['nombre', 'fecha', 'total', 'precio_total', 'precio_unitario', 'cantidad', 'categoria', 'cliente_nombre']
-                            else:
-                                prioridades = ['nombre', 'fecha', 'total', 'precio_total', 'precio_unitario', 'cantidad', 'categoria', 'cliente_nombre']
-                            
-                            # Si es admin, agregar columnas administrativas (sin método de pago - todas son Stripe)
-                            # Preferir estado_display sobre estado
-                            if es_admin:
-                                prioridades.extend(['estado_display', 'cliente_email', 'cliente_telefono'])
-                            
-                            # SIEMPRE incluir 'nombre' primero si existe
-                            if 'nombre' in headers_principales and 'nombre' not in excluir_columnas:
-                                columnas_principales.append('nombre')
-                            
-                            # Luego agregar otras prioridades (preferir versiones formateadas)
-                            # Primero agregar estado_display si existe, no estado
-                            if 'estado_display' in headers_principales and 'estado_display' not in excluir_columnas:
-                                if 'estado_display' not in columnas_principales:
-                                    columnas_principales.append('estado_display')
-                            
-                            for h in prioridades:
-                                if h != 'nombre' and h != 'estado':  # Excluir estado si ya tenemos estado_display
-                                    if h in headers_principales and h not in excluir_columnas and h not in columnas_principales:
-                                        # Si es estado y ya tenemos estado_display, saltar
-                                        if h == 'estado' and 'estado_display' in columnas_principales:
-                                            continue
-                                        columnas_principales.append(h)
-                            
-                            # Luego agregar otras columnas formateadas (evitando duplicados)
-                            for h in headers_principales:
-                                if h not in columnas_principales and h not in excluir_columnas:
-                                    # Priorizar versiones formateadas
-                                    if any(h.endswith(sufijo) for sufijo in ['_formateado', '_display', '_nombre']):
-                                        base = h.replace('_formateado', '').replace('_display', '').replace('_nombre', '')
-                                        # Verificar que no exista ya la base o la versión formateada
-                                        existe_base = any(c.replace('_formateado', '').replace('_display', '').replace('_nombre', '') == base for c in columnas_principales)
-                                        if not existe_base:
-                                            columnas_principales.append(h)
-                                    elif not any(h.startswith(ex) or h == ex for ex in excluir_columnas):
-                                        # Verificar que no exista una versión formateada de esta columna
-                                        tiene_formateado = any(c.replace('_formateado', '').replace('_display', '').replace('_nombre', '') == h for c in columnas_principales)
-                                        if not tiene_formateado:
-                                            columnas_principales.append(h)
-                            
-                            # Limpieza final: eliminar duplicados explícitos
-                            # Si hay estado_display, eliminar estado
-                            if 'estado_display' in columnas_principales and 'estado' in columnas_principales:
-                                columnas_principales.remove('estado')
-                            # Si hay total_formateado, eliminar total
-                            if 'total_formateado' in columnas_principales and 'total' in columnas_principales:
-                                columnas_principales.remove('total')
-                            # Si hay fecha, eliminar fecha_iso
-                            if 'fecha' in columnas_principales and 'fecha_iso' in columnas_principales:
-                                columnas_principales.remove('fecha_iso')
-                            
-                            # Si no hay suficientes columnas, agregar algunas básicas
-                            if len(columnas_principales) < 2:
-                                for h in ['fecha', 'total', 'nombre']:
-                                    if h in headers_principales and h not in columnas_principales:
-                                        columnas_principales.insert(0, h)
-                        
-                        tabla_data = [[h.replace('_', ' ').replace('formateado', '').replace('display', '').replace('_iso', '').replace('_numero', '').title().strip() for h in columnas_principales]]
-                        
-                        # Filas (limitar a 100 para PDF)
-                        for item in datos_lista[:100]:
-                            fila = []
-                            for h in columnas_principales:
-                                valor = item.get(h, '')
-                                # Formatear valores
-                                if isinstance(valor, (int, float)):
-                                    if 'monto_total_vendido' in h.lower() or ('total' in h.lower() and 'vendido' in h.lower()):
-                                        valor_str = f"Bs. {valor:,.2f}"
-                                    elif 'precio' in h.lower():
-                                        valor_str = f"Bs. {valor:,.2f}"
-                                    elif 'veces_vendido' in h.lower() or 'cantidad_vendida' in h.lower() or 'stock' in h.lower():
-                                        valor_str = f"{int(valor):,}"
-                                    else:
-                                        valor_str = f"{valor:,}"
-                                elif isinstance(valor, bool):
-                                    valor_str = 'Sí' if valor else 'No'
-                                elif isinstance(valor, (dict, list)):
-                                    valor_str = f"{len(valor)} items" if isinstance(valor, list) else "Ver detalles"
-                                else:
-                                    # Para nombres, mostrar completo pero limitar si es muy largo
-                                    if 'nombre' in h.lower():
-                                        valor_str = str(valor)  # Nombre completo
-                                    else:
-                                        # Limitar longitud para otras columnas
-                                        valor_str = str(valor)[:60] + ('...' if len(str(valor)) > 60 else '')
-                                fila.append(valor_str)
-                            tabla_data.append(fila)
-                        
-                        # Crear tabla con ancho dinámico y mejor formato
-                        num_cols = len(columnas_principales)
-                        ancho_disponible = 7*inch  # Ancho disponible en A4 con márgenes
-                        
-                        # Anchos más específicos para columnas comunes - ajustados para mejor distribución
-                        anchos_cols = []
-                        for h in columnas_principales:
-                            if 'nombre' in h.lower():
-                                anchos_cols.append(1.8*inch)  # Nombre más ancho sin descripción
-                            elif 'fecha' in h.lower():
-                                anchos_cols.append(1.1*inch)
-                            elif 'monto_total_vendido' in h.lower():
-                                anchos_cols.append(1.4*inch)  # Monto total vendido más ancho
-                            elif 'veces_vendido' in h.lower():
-                                anchos_cols.append(1.1*inch)  # Veces vendido
-                            elif 'total' in h.lower() or 'monto' in h.lower() or 'precio_total' in h.lower():
-                                anchos_cols.append(1.1*inch)
-                            elif 'precio_unitario' in h.lower() or 'precio' in h.lower():
-                                anchos_cols.append(1.1*inch)
-                            elif 'categoria' in h.lower():
-                                anchos_cols.append(1.2*inch)
-                            elif 'stock' in h.lower():
-                                anchos_cols.append(0.9*inch)  # Stock
-                            elif 'marca' in h.lower():
-                                anchos_cols.append(1.2*inch)  # Marca
-                            elif 'cantidad' in h.lower():
-                                anchos_cols.append(1.0*inch)
-                            elif 'cliente' in h.lower():
-                                anchos_cols.append(1.8*inch)
-                            else:
-                                anchos_cols.append(1.0*inch)  # Ancho por defecto
-                        
-                        # Ajustar si hay muchas columnas
-                        total_width = sum(anchos_cols)
-                        if total_width > ancho_disponible:
-                            factor = ancho_disponible / total_width
-                            anchos_cols = [w * factor for w in anchos_cols]
-                        
-                        tabla = Table(tabla_data, colWidths=anchos_cols, repeatRows=1)
-                        # Determinar alineación por columna
-                        alignments = []
-                        for h in columnas_principales:
-                            if 'nombre' in h.lower():
-                                alignments.append('LEFT')
-                            elif 'precio' in h.lower() or 'monto' in h.lower() or 'total' in h.lower() or 'stock' in h.lower() or 'veces_vendido' in h.lower() or 'cantidad_vendida' in h.lower():
-                                alignments.append('CENTER')
-                            elif 'categoria' in h.lower() or 'marca' in h.lower():
-                                alignments.append('CENTER')
-                            else:
-                                alignments.append('CENTER')
-                        
-                        # Crear estilos base
-                        styles_list = [
-                            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0066FF')),
-                            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),  # Encabezados centrados
-                            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),  # Verticalmente centrado
-                            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                            ('FONTSIZE', (0, 0), (-1, 0), 10),  # Tamaño de fuente normal para headers
-                            ('FONTSIZE', (0, 1), (-1, -1), 9),  # Tamaño de fuente normal para datos
-                            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),  # Más espacio vertical para headers
-                            ('TOPPADDING', (0, 0), (-1, 0), 12),
-                            ('BOTTOMPADDING', (0, 1), (-1, -1), 10),  # Más espacio vertical para datos
-                            ('TOPPADDING', (0, 1), (-1, -1), 10),
-                            ('LEFTPADDING', (0, 0), (-1, -1), 8),  # Más espacio lateral
-                            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-                            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F9FAFB')]),
-                            ('WORDWRAP', (0, 0), (-1, -1), True),  # Permitir salto de línea
-                        ]
-                        
-                        # Aplicar alineación específica por columna
-                        for idx, align in enumerate(alignments):
-                            styles_list.append(('ALIGN', (idx, 1), (idx, -1), align))
-                        
-                        tabla.setStyle(TableStyle(styles_list))
-                        story.append(tabla)
-                        
-                        if len(datos_lista) > 100:
-                            story.append(Spacer(1, 0.2*inch))
-                            story.append(Paragraph(f"<i>Nota: Se muestran 100 de {len(datos_lista)} registros totales.</i>", styles['Normal']))
+            resumen_data = [[label, value] for label, value in self._filas_resumen(datos['resumen'])]
+            if resumen_data:
+                yield pdf.tabla(resumen_data, [3*inch, 4*inch], pdf.estilo_tabla('reporte_resumen'))
+                yield Spacer(1, 0.3*inch)
         
-        try:
-            doc.build(story)
-        except Exception as e:
-            logger.error(f"Error al construir PDF: {str(e)}", exc_info=True)
-            raise
-        buffer.seek(0)
+        # Mostrar datos principales
+        datos_lista = datos.get('datos')
+        if not datos_lista:
+            return
         
-        response = HttpResponse(buffer, content_type='application/pdf')
-        response['Content-Disposition'] = f'inline; filename="reporte_{reporte.id_reporte}.pdf"'
-        return response
-    
-    def _generar_excel(self, reporte: Reporte):
-        """Generar Excel del reporte con formato mejorado"""
-        from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+        yield Paragraph("<b>📋 Detalles</b>", pdf.estilo('Heading2'))
+        yield Spacer(1, 0.15*inch)
         
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Reporte"
+        columnas_principales = self._columnas_principales(
+            datos_lista, reporte, minimo_columnas=2, columnas_basicas=('fecha', 'total', 'nombre')
+        )
+        if not columnas_principales:
+            return
+        
+        encabezado = [h.replace('_', ' ').replace('formateado', '').replace('display', '').replace('_iso', '').replace('_numero', '').title().strip() for h in columnas_principales]
         
-        # Título (sin merge para evitar errores)
-        ws['A1'] = reporte.nombre
-        ws['A1'].font = Font(bold=True, size=16, color="0066FF")
-        ws['A1'].alignment = Alignment(horizontal='left', vertical='center')
-        ws.row_dimensions[1].height = 30
+        # Presupuesto de filas del PDF (el Excel incluye todas)
+        max_filas = settings.REPORTE_PDF_MAX_FILAS
+        filas = (
+            [self._valor_pdf(h, item.get(h, '')) for h in columnas_principales]
+            for item in itertools.islice(datos_lista, max_filas)
+        )
+        
+        # Anchos por tipo de columna, ajustados al ancho disponible en A4 con márgenes
+        anchos_cols = [self._ancho_columna_pdf(h) for h in columnas_principales]
+        ancho_disponible = 7*inch
+        total_width = sum(anchos_cols)
+        if total_width > ancho_disponible:
+            factor = ancho_disponible / total_width
+            anchos_cols = [w * factor for w in anchos_cols]
+        
+        # Nombres alineados a la izquierda; el resto queda centrado por el estilo base
+        alineacion_nombres = [
+            ('ALIGN', (idx, 1), (idx, -1), 'LEFT')
+            for idx, h in enumerate(columnas_principales) if 'nombre' in h.lower()
+        ]
+        # Tablas de tamaño fijo con el encabezado repetido, en lugar de una sola tabla enorme
+        yield from pdf.tablas_por_bloques(
+            encabezado, filas, anchos_cols, pdf.estilo_tabla('reporte_detalles'),
+            comandos_extra=alineacion_nombres
+        )
         
+        if len(datos_lista) > max_filas:
+            yield Spacer(1, 0.2*inch)
+            yield Paragraph(
+                f"<i>Nota: Se muestran {max_filas:,} de {len(datos_lista):,} registros totales. "
+                f"Descargue el reporte en Excel para ver todos los registros.</i>",
+                pdf.estilo('Normal')
+            )
+    
+    def _valor_pdf(self, h, valor):
+        """Texto de una celda de la tabla de detalles del PDF"""
+        if isinstance(valor, bool):
+            return 'Sí' if valor else 'No'
+        elif isinstance(valor, (int, float)):
+            if 'monto_total_vendido' in h.lower() or ('total' in h.lower() and 'vendido' in h.lower()):
+                return f"Bs. {valor:,.2f}"
+            elif 'precio' in h.lower():
+                return f"Bs. {valor:,.2f}"
+            elif 'veces_vendido' in h.lower() or 'cantidad_vendida' in h.lower() or 'stock' in h.lower():
+                return f"{int(valor):,}"
+            return f"{valor:,}"
+        elif isinstance(valor, (dict, list)):
+            return f"{len(valor)} items" if isinstance(valor, list) else "Ver detalles"
+        elif 'nombre' in h.lower():
+            return str(valor)  # Nombre completo
+        # Limitar longitud para otras columnas
+        return str(valor)[:60] + ('...' if len(str(valor)) > 60 else '')
+    
+    def _ancho_columna_pdf(self, h):
+        """Ancho de columna del PDF según el tipo de dato"""
+        h = h.lower()
+        if 'nombre' in h:
+            return 1.8*inch  # Nombre más ancho sin descripción
+        elif 'fecha' in h:
+            return 1.1*inch
+        elif 'monto_total_vendido' in h:
+            return 1.4*inch  # Monto total vendido más ancho
+        elif 'veces_vendido' in h:
+            return 1.1*inch  # Veces vendido
+        elif 'total' in h or 'monto' in h or 'precio_total' in h:
+            return 1.1*inch
+        elif 'precio_unitario' in h or 'precio' in h:
+            return 1.1*inch
+        elif 'categoria' in h:
+            return 1.2*inch
+        elif 'stock' in h:
+            return 0.9*inch  # Stock
+        elif 'marca' in h:
+            return 1.2*inch  # Marca
+        elif 'cantidad' in h:
+            return 1.0*inch
+        elif 'cliente' in h:
+            return 1.8*inch
+        return 1.0*inch  # Ancho por defecto
+    
+    def _generar_excel(self, reporte: Reporte):
+        """Generar Excel del reporte con formato mejorado"""
         # Información del reporte (solo información relevante)
         # Convertir a zona horaria local si está en UTC
         fecha_generacion = reporte.fecha_generacion
@@ -1747,307 +1531,265 @@ class DescargarReporteView(View):
             fecha_generacion = timezone.localtime(fecha_generacion)
         fecha_formateada = fecha_generacion.strftime('%d/%m/%Y %H:%M:%S')
         
-        row = 3
         info_items = [
             ('Fecha de Generación:', fecha_formateada),
             ('Origen:', reporte.get_origen_comando_display()),
-
         ]
         
         if reporte.prompt:
             info_items.append(('Solicitud Original:', reporte.prompt[:200]))
         
-        for label, value in info_items:
-            ws[f'A{row}'] = label
-            ws[f'A{row}'].font = Font(bold=True)
-            ws[f'B{row}'] = value
-            row += 1
+        datos = reporte.datos if isinstance(reporte.datos, dict) else {}
+        resumen_items = self._filas_resumen(datos.get('resumen'))
+        datos_lista = (datos.get('datos') or [])[:1000]  # Limitar a 1000
+        columnas_principales = self._columnas_principales(datos_lista, reporte)
         
-        row += 1
+        # En modo write-only los anchos se fijan antes de escribir: se calculan sobre los datos
+        valores_por_columna = [
+            [label for label, _ in info_items + resumen_items],
+            [value for _, value in info_items + resumen_items],
+        ]
+        for col, header in enumerate(columnas_principales):
+            if col >= len(valores_por_columna):
+                valores_por_columna.append([])
+            valores_por_columna[col].extend(item.get(header, '') for item in datos_lista)
         
-        # Datos del reporte
-        datos = reporte.datos
-        if isinstance(datos, dict):
-            # Mostrar resumen si existe
-            if 'resumen' in datos and datos['resumen']:
-                ws[f'A{row}'] = 'RESUMEN'
-                ws[f'A{row}'].font = Font(bold=True, size=12, color="0066FF")
-                row += 1
-                
-                resumen = datos['resumen']
-                # Campos a excluir del resumen
-                campos_excluir = [
-                    'compras_mostradas', 'compras_totales', 'categorias_analizadas', 
-                    'clientes_mostrados', 'mensaje'
-                ]
-                
-                # Campos prioritarios a mostrar primero
-                campos_prioritarios = [
-                    'total_general', 'total_general_formateado',
-                    'cantidad_compras', 'promedio_compra', 'promedio_compra_formateado',
-                    'max_compra', 'max_compra_formateado',
-                    'min_compra', 'min_compra_formateado'
+        anchos = {}
+        for col, valores in enumerate(valores_por_columna):
+            header = columnas_principales[col] if col < len(columnas_principales) else ''
+            max_length = max((len(str(v)) for v in valores if v is not None), default=0)
+            anchos[get_column_letter(col + 1)] = self._ancho_columna_excel(header, max_length)
+        
+        excel = ExcelWriteOnly("Reporte", anchos=anchos)
+        
+        # Título
+        excel.escribir_fila([excel.celda(reporte.nombre, 'titulo')], alto=30)
+        excel.filas_vacias()
+        
+        for label, value in info_items:
+            excel.escribir_fila([excel.celda(label, 'etiqueta'), value])
+        excel.filas_vacias()
+        
+        # Mostrar resumen si existe
+        if resumen_items:
+            excel.escribir_fila([excel.celda('RESUMEN', 'seccion')])
+            for label, value in resumen_items:
+                excel.escribir_fila([excel.celda(label, 'etiqueta'), value])
+            excel.filas_vacias()
+        
+        # Mostrar datos principales
+        if datos_lista and columnas_principales:
+            excel.escribir_fila([excel.celda('DETALLES', 'seccion')])
+            
+            # Encabezados
+            excel.escribir_fila(
+                [
+                    header.replace('_', ' ').replace('formateado', '').replace('display', '').replace('_iso', '').replace('_numero', '').title().strip()
+                    for header in columnas_principales
+                ],
+                estilo='encabezado'
+            )
+            
+            # Filas de datos (alternando colores de fila)
+            excel.escribir_filas(
+                [
+                    self._celda_excel(excel, header, item.get(header, ''), 'celda' if item_idx % 2 == 0 else 'celda_alterna')
+                    for header in columnas_principales
                 ]
+                for item_idx, item in enumerate(datos_lista)
+            )
+        
+        try:
+            return excel.respuesta(f'reporte_{reporte.id_reporte}.xlsx')
+        except Exception as e:
+            logger.error(f"Error al generar Excel: {str(e)}", exc_info=True)
+            raise
+    
+    def _filas_resumen(self, resumen):
+        """Filas (etiqueta, valor) del resumen para PDF y Excel, con campos prioritarios primero"""
+        if not resumen:
+            return []
+        
+        filas = []
+        # Campos a excluir del resumen
+        campos_excluir = [
+            'compras_mostradas', 'compras_totales', 'categorias_analizadas', 
+            'clientes_mostrados', 'mensaje'
+        ]
+        
+        # Campos prioritarios a mostrar primero
+        campos_prioritarios = [
+            'total_general', 'total_general_formateado',
+            'cantidad_compras', 'promedio_compra', 'promedio_compra_formateado',
+            'max_compra', 'max_compra_formateado',
+            'min_compra', 'min_compra_formateado'
+        ]
+        
+        # Primero agregar campos prioritarios formateados
+        for key in campos_prioritarios:
+            if key in resumen and key not in campos_excluir:
+                value = resumen[key]
+                if isinstance(value, (dict, list)):
+                    continue
                 
-                # Primero agregar campos prioritarios formateados
-                for key in campos_prioritarios:
-                    if key in resumen and key not in campos_excluir:
-                        value = resumen[key]
-                        if isinstance(value, (dict, list)):
-                            continue
-                        
-                        # Si es formateado, usarlo directamente
-                        if key.endswith('_formateado'):
-                            label = key.replace('_formateado', '').replace('_', ' ').title().strip()
-                            ws[f'A{row}'] = label
-                            ws[f'A{row}'].font = Font(bold=True)
-                            ws[f'B{row}'] = str(value)
-                            row += 1
-                        elif isinstance(value, (int, float)):
-                            # Formatear si no hay versión formateada
-                            key_formateado = key + '_formateado'
-                            if key_formateado not in resumen:
-                                label = key.replace('_', ' ').title().strip()
-                                ws[f'A{row}'] = label
-                                ws[f'A{row}'].font = Font(bold=True)
-                                if 'total' in key.lower() or 'monto' in key.lower() or 'precio' in key.lower() or 'compra' in key.lower():
-                                    ws[f'B{row}'] = f"Bs. {value:,.2f}"
-                                else:
-                                    ws[f'B{row}'] = f"{value:,}"
-                                row += 1
-                
-                # Luego agregar otros campos relevantes
-                for key, value in resumen.items():
-                    if key in campos_excluir or key in campos_prioritarios:
-                        continue
-                    if isinstance(value, (dict, list)):
-                        continue
-                    
-                    # Si hay versión formateada, usar esa
+                # Si es formateado, usarlo directamente
+                if key.endswith('_formateado'):
+                    label = key.replace('_formateado', '').replace('_', ' ').title().strip()
+                    filas.append((label, str(value)))
+                elif isinstance(value, (int, float)):
+                    # Formatear si no hay versión formateada
                     key_formateado = key + '_formateado'
-                    if key_formateado in resumen:
-                        label = key.replace('_', ' ').title().strip()
-                        ws[f'A{row}'] = label
-                        ws[f'A{row}'].font = Font(bold=True)
-                        ws[f'B{row}'] = str(resumen[key_formateado])
-                        row += 1
-                    elif not key.endswith('_formateado') and not key.endswith('_display'):
-                        # Solo agregar si no es un campo formateado
+                    if key_formateado not in resumen:
                         label = key.replace('_', ' ').title().strip()
-                        ws[f'A{row}'] = label
-                        ws[f'A{row}'].font = Font(bold=True)
-                        if isinstance(value, (int, float)):
-                            if 'total' in key.lower() or 'monto' in key.lower() or 'precio' in key.lower() or 'compra' in key.lower():
-                                ws[f'B{row}'] = f"Bs. {value:,.2f}"
-                            else:
-                                ws[f'B{row}'] = f"{value:,}"
-                        else:
-                            ws[f'B{row}'] = str(value)
-                        row += 1
-                
-                row += 1
-            
-            # Mostrar datos principales
-            if 'datos' in datos and datos['datos']:
-                ws[f'A{row}'] = 'DETALLES'
-                ws[f'A{row}'].font = Font(bold=True, size=12, color="0066FF")
-                row += 1
-                
-                datos_lista = datos['datos']
-                if datos_lista:
-                    # Seleccionar columnas principales
-                    primera_fila = datos_lista[0]
-                    headers_principales = []
-                    for key in primera_fila.keys():
-                        valor = primera_fila[key]
-                        if not isinstance(valor, (dict, list)) or (isinstance(valor, str) and len(valor) < 100):
-                            headers_principales.append(key)
-                    
-                    if headers_principales:
-                        # Detectar si es reporte de productos
-                        es_reporte_productos = 'precio' in headers_principales and ('stock' in headers_principales or 'categoria' in headers_principales or 'marca' in headers_principales)
-                        
-                        # Si es reporte de productos, usar solo las columnas específicas
-                        if es_reporte_productos:
-                            columnas_productos = [
-                                'nombre',
-                                'precio',
-                                'categoria',
-                                'stock',
-                                'marca',
-                                'monto_total_vendido',
-                                'veces_vendido'
-                            ]
-                            columnas_principales = [col for col in columnas_productos if col in headers_principales]
-                        else:
-                            # Filtrar columnas para mostrar solo las principales
-                            columnas_principales = []
-                            excluir_columnas = [
-                                'id', 'id_venta', 'id_reporte',  # IDs no necesarios
-                                'fecha_iso', 'fecha_formateada',  # Usar solo 'fecha'
-                                'total_numero', 'monto_total',  # Usar versiones formateadas
-                                'cliente', 'productos',  # Objetos complejos
-                                'productos_count', 'total_productos_cantidad',  # Columnas eliminadas
-                                'notas', 'direccion_entrega',  # Solo en detalles
-                                'fecha_primera_compra', 'veces_comprado',  # Información extra
-                                'precio_unitario_promedio',  # Usar precio_unitario formateado
-                                'cantidad_vendida',  # Excluir cantidad_vendida, solo mostrar monto_total_vendido y veces_vendido
-                            ]
-                            
-                            # Verificar si el usuario es administrador
-                            es_admin = reporte.id_usuario and reporte.id_usuario.id_rol and reporte.id_usuario.id_rol.nombre.lower() == 'administrador'
-                            
-                            # Si no es admin, excluir columnas administrativas
-                            if not es_admin:
-                                excluir_columnas.extend(['estado', 'metodo_pago', 'metodo_pago_display', 'cliente_email', 'cliente_telefono', 'cliente_direccion'])
-                            
-                            # Prioridades para columnas principales
-                            # NOTA: Preferir siempre versiones _display o _formateado sobre originales
-                            if 'nombre' in headers_principales:
-                                prioridades = ['nombre', 'fecha', 'total', 'precio_total', 'precio_unitario', 'cantidad', 'categoria', 'cliente_nombre']
-                            else:
-                                prioridades = ['nombre', 'fecha', 'total', 'precio_total', 'precio_unitario', 'cantidad', 'categoria', 'cliente_nombre']
-                            
-                            # Si es admin, agregar columnas administrativas (sin método de pago - todas son Stripe)
-                            # Preferir estado_display sobre estado
-                            if es_admin:
-                                prioridades.extend(['estado_display', 'cliente_email', 'cliente_telefono'])
-                            
-                            # SIEMPRE incluir 'nombre' primero si existe
-                            if 'nombre' in headers_principales and 'nombre' not in excluir_columnas:
-                                columnas_principales.append('nombre')
-                            
-                            # Luego agregar otras prioridades (preferir versiones formateadas)
-                            # Primero agregar estado_display si existe, no estado
-                            if 'estado_display' in headers_principales and 'estado_display' not in excluir_columnas:
-                                if 'estado_display' not in columnas_principales:
-                                    columnas_principales.append('estado_display')
-                            
-                            for h in prioridades:
-                                if h != 'nombre' and h != 'estado':  # Excluir estado si ya tenemos estado_display
-                                    if h in headers_principales and h not in excluir_columnas and h not in columnas_principales:
-                                        # Si es estado y ya tenemos estado_display, saltar
-                                        if h == 'estado' and 'estado_display' in columnas_principales:
-                                            continue
-                                        columnas_principales.append(h)
-                            
-                            # Luego agregar otras columnas formateadas (evitando duplicados)
-                            for h in headers_principales:
-                                if h not in columnas_principales and h not in excluir_columnas:
-                                    # Priorizar versiones formateadas
-                                    if any(h.endswith(sufijo) for sufijo in ['_formateado', '_display', '_nombre']):
-                                        base = h.replace('_formateado', '').replace('_display', '').replace('_nombre', '')
-                                        # Verificar que no exista ya la base o la versión formateada
-                                        existe_base = any(c.replace('_formateado', '').replace('_display', '').replace('_nombre', '') == base for c in columnas_principales)
-                                        if not existe_base:
-                                            columnas_principales.append(h)
-                                    elif not any(h.startswith(ex) or h == ex for ex in excluir_columnas):
-                                        # Verificar que no exista una versión formateada de esta columna
-                                        tiene_formateado = any(c.replace('_formateado', '').replace('_display', '').replace('_nombre', '') == h for c in columnas_principales)
-                                        if not tiene_formateado:
-                                            columnas_principales.append(h)
-                            
-                            # Limpieza final: eliminar duplicados explícitos
-                            # Si hay estado_display, eliminar estado
-                            if 'estado_display' in columnas_principales and 'estado' in columnas_principales:
-                                columnas_principales.remove('estado')
-                            # Si hay total_formateado, eliminar total
-                            if 'total_formateado' in columnas_principales and 'total' in columnas_principales:
-                                columnas_principales.remove('total')
-                            # Si hay fecha, eliminar fecha_iso
-                            if 'fecha' in columnas_principales and 'fecha_iso' in columnas_principales:
-                                columnas_principales.remove('fecha_iso')
-                            
-                            # Si no hay suficientes columnas, agregar algunas básicas
-                            if len(columnas_principales) < 3:
-                                for h in ['fecha', 'total', 'nombre', 'cliente_nombre']:
-                                    if h in headers_principales and h not in columnas_principales:
-                                        columnas_principales.insert(0, h)
-                        
-                        # Encabezados
-                        header_row = row
-                        for col, header in enumerate(columnas_principales, 1):
-                            cell = ws.cell(row=header_row, column=col)
-                            cell.value = header.replace('_', ' ').replace('formateado', '').replace('display', '').replace('_iso', '').replace('_numero', '').title().strip()
-                            cell.font = Font(bold=True, color="FFFFFF")
-                            cell.fill = PatternFill(start_color="0066FF", end_color="0066FF", fill_type="solid")
-                            cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-                            cell.border = Border(
-                                left=Side(style='thin'),
-                                right=Side(style='thin'),
-                                top=Side(style='thin'),
-                                bottom=Side(style='thin')
-                            )
-                        
-                        # Filas de datos
-                        for item_idx, item in enumerate(datos_lista[:1000], 0):  # Limitar a 1000
-                            data_row = header_row + 1 + item_idx
-                            for col, header in enumerate(columnas_principales, 1):
-                                cell = ws.cell(row=data_row, column=col)
-                                valor = item.get(header, '')
-                                
-                                # Formatear valores
-                                if isinstance(valor, (int, float)):
-                                    if 'monto_total_vendido' in header.lower() or ('total' in header.lower() and 'vendido' in header.lower()) or ('monto' in header.lower() and 'vendido' in header.lower()):
-                                        cell.value = valor
-                                        cell.number_format = '$#,##0.00'  # Formato de moneda para monto total vendido
-                                    elif 'total' in header.lower() or 'monto' in header.lower() or 'precio' in header.lower() or 'compra' in header.lower():
-                                        cell.value = valor
-                                        cell.number_format = '$#,##0.00'
-                                    elif 'veces_vendido' in header.lower() or 'cantidad_vendida' in header.lower() or 'stock' in header.lower():
-                                        cell.value = valor
-                                        cell.number_format = '#,##0'  # Formato numérico sin decimales
-                                    else:
-                                        cell.value = valor
-                                        cell.number_format = '#,##0'
-                                elif isinstance(valor, bool):
-                                    cell.value = 'Sí' if valor else 'No'
-                                elif isinstance(valor, (dict, list)):
-                                    cell.value = f"{len(valor)} items" if isinstance(valor, list) else "Ver detalles"
-                                else:
-                                    # Para nombres, mostrar completo sin truncar
-                                    if 'nombre' in header.lower():
-                                        cell.value = str(valor)  # Nombre completo
-                                    else:
-                                        cell.value = str(valor)[:100]  # Limitar longitud para otras columnas
-                                
-                                # Determinar alineación según el tipo de columna
-                                if 'nombre' in header.lower():
-                                    cell.alignment = Alignment(horizontal='left', vertical='center', wrap_text=True)
-                                elif 'precio' in header.lower() or 'monto' in header.lower() or 'total' in header.lower() or 'stock' in header.lower() or 'veces_vendido' in header.lower() or 'cantidad_vendida' in header.lower():
-                                    cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-                                elif 'categoria' in header.lower() or 'marca' in header.lower():
-                                    cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-                                else:
-                                    cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-                                
-                                cell.border = Border(
-                                    left=Side(style='thin', color='CCCCCC'),
-                                    right=Side(style='thin', color='CCCCCC'),
-                                    top=Side(style='thin', color='CCCCCC'),
-                                    bottom=Side(style='thin', color='CCCCCC')
-                                )
-                                
-                                # Alternar colores de fila
-                                if item_idx % 2 == 0:
-                                    cell.fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-                                else:
-                                    cell.fill = PatternFill(start_color="F9FAFB", end_color="F9FAFB", fill_type="solid")
-        
-        # Ajustar ancho de columnas (evitar merged cells)
-        from openpyxl.utils import get_column_letter
-        
-        # Obtener el número máximo de columnas usadas
-        max_col = ws.max_column
-        
-        # Buscar la fila de encabezados (buscar desde arriba)
-        header_row_num = None
-        for row_idx in range(1, min(10, ws.max_row + 1)):  # Buscar en las primeras 10 filas
-            cell = ws.cell(row=row_idx, column=1)
-            if cell.value and ('DETALLES' in str(cell.value).upper() or 'RESUMEN' in str(cell.value).upper()):
-                header_row_num = row_idx + 1  # La siguiente fila es la de encabezados
-                break
+                        filas.append((label, self._formatear_numero_excel(key, value)))
+        
+        # Luego agregar otros campos relevantes
+        for key, value in resumen.items():
+            if key in campos_excluir or key in campos_prioritarios:
+                continue
+            if isinstance(value, (dict, list)):
+                continue
+            
+            # Si hay versión formateada, usar esa
+            key_formateado = key + '_formateado'
+            if key_formateado in resumen:
+                label = key.replace('_', ' ').title().strip()
+                filas.append((label, str(resumen[key_formateado])))
+            elif not key.endswith('_formateado') and not key.endswith('_display'):
+                # Solo agregar si no es un campo formateado
+                label = key.replace('_', ' ').title().strip()
+                if isinstance(value, (int, float)):
+                    filas.append((label, self._formatear_numero_excel(key, value)))
+                else:
+                    filas.append((label, str(value)))
         
+        return filas
+    
+    def _formatear_numero_excel(self, key, value):
+        if 'total' in key.lower() or 'monto' in key.lower() or 'precio' in key.lower() or 'compra' in key.lower():
+            return f"Bs. {value:,.2f}"
+        return f"{value:,}"
+    
+    def _columnas_principales(self, datos_lista, reporte: Reporte, minimo_columnas=3,
+                              columnas_basicas=('fecha', 'total', 'nombre', 'cliente_nombre')):
+        """Seleccionar las columnas principales de la tabla de detalles"""
+        if not datos_lista:
+            return []
+        
+        primera_fila = datos_lista[0]
+        headers_principales = []
+        for key in primera_fila.keys():
+            valor = primera_fila[key]
+            if not isinstance(valor, (dict, list)) or (isinstance(valor, str) and len(valor) < 100):
+                headers_principales.append(key)
+        
+        if not headers_principales:
+            return []
+        
+        # Detectar si es reporte de productos
+        es_reporte_productos = 'precio' in headers_principales and ('stock' in headers_principales or 'categoria' in headers_principales or 'marca' in headers_principales)
+        
+        # Si es reporte de productos, usar solo las columnas específicas
+        if es_reporte_productos:
+            columnas_productos = [
+                'nombre',
+                'precio',
+                'categoria',
+                'stock',
+                'marca',
+                'monto_total_vendido',
+                'veces_vendido'
+            ]
+            return [col for col in columnas_productos if col in headers_principales]
+        
+        # Filtrar columnas para mostrar solo las principales
+        columnas_principales = []
+        excluir_columnas = [
+            'id', 'id_venta', 'id_reporte',  # IDs no necesarios
+            'fecha_iso', 'fecha_formateada',  # Usar solo 'fecha'
+            'total_numero', 'monto_total',  # Usar versiones formateadas
+            'cliente', 'productos',  # Objetos complejos
+            'productos_count', 'total_productos_cantidad',  # Columnas eliminadas
+            'notas', 'direccion_entrega',  # Solo en detalles
+            'fecha_primera_compra', 'veces_comprado',  # Información extra
+            'precio_unitario_promedio',  # Usar precio_unitario formateado
+            'cantidad_vendida',  # Excluir cantidad_vendida, solo mostrar monto_total_vendido y veces_vendido
+        ]
+        
+        # Verificar si el usuario es administrador
+        es_admin = reporte.id_usuario and reporte.id_usuario.id_rol and reporte.id_usuario.id_rol.nombre.lower() == 'administrador'
+        
+        # Si no es admin, excluir columnas administrativas
+        if not es_admin:
+            excluir_columnas.extend(['estado', 'metodo_pago', 'metodo_pago_display', 'cliente_email', 'cliente_telefono', 'cliente_direccion'])
+        
+        # Prioridades para columnas principales
+        # NOTA: Preferir siempre versiones _display o _formateado sobre originales
+        if 'nombre' in headers_principales:
+            prioridades = ['nombre', 'fecha', 'total', 'precio_total', 'precio_unitario', 'cantidad', 'categoria', 'cliente_nombre']
+        else:
+            prioridades = ['nombre', 'fecha', 'total', 'precio_total', 'precio_unitario', 'cantidad', 'categoria', 'cliente_nombre']
+        
+        # Si es admin, agregar columnas administrativas (sin método de pago - todas son Stripe)
+        # Preferir estado_display sobre estado
+        if es_admin:
+            prioridades.extend(['estado_display', 'cliente_email', 'cliente_telefono'])
+        
+        # SIEMPRE incluir 'nombre' primero si existe
+        if 'nombre' in headers_principales and 'nombre' not in excluir_columnas:
+            columnas_principales.append('nombre')
+        
+        # Luego agregar otras prioridades (preferir versiones formateadas)
+        # Primero agregar estado_display si existe, no estado
+        if 'estado_display' in headers_principales and 'estado_display' not in excluir_columnas:
+            if 'estado_display' not in columnas_principales:
+                columnas_principales.append('estado_display')
+        
+        for h in prioridades:
+            if h != 'nombre' and h != 'estado':  # Excluir estado si ya tenemos estado_display
+                if h in headers_principales and h not in excluir_columnas and h not in columnas_principales:
+                    # Si es estado y ya tenemos estado_display, saltar
+                    if h == 'estado' and 'estado_display' in columnas_principales:
+                        continue
+                    columnas_principales.append(h)
+        
+        # Luego agregar otras columnas formateadas (evitando duplicados)
+        for h in headers_principales:
+            if h not in columnas_principales and h not in excluir_columnas:
+                # Priorizar versiones formateadas
+                if any(h.endswith(sufijo) for sufijo in ['_formateado', '_display', '_nombre']):
+                    base = h.replace('_formateado', '').replace('_display', '').replace('_nombre', '')
+                    # Verificar que no exista ya la base o la versión formateada
+                    existe_base = any(c.replace('_formateado', '').replace('_display', '').replace('_nombre', '') == base for c in columnas_principales)
+                    if not existe_base:
+                        columnas_principales.append(h)
+                elif not any(h.startswith(ex) or h == ex for ex in excluir_columnas):
+                    # Verificar que no exista una versión formateada de esta columna
+                    tiene_formateado = any(c.replace('_formateado', '').replace('_display', '').replace('_nombre', '') == h for c in columnas_principales)
+                    if not tiene_formateado:
+                        columnas_principales.append(h)
+        
+        # Limpieza final: eliminar duplicados explícitos
+        # Si hay estado_display, eliminar estado
+        if 'estado_display' in columnas_principales and 'estado' in columnas_principales:
+            columnas_principales.remove('estado')
+        # Si hay total_formateado, eliminar total
+        if 'total_formateado' in columnas_principales and 'total' in columnas_principales:
+            columnas_principales.remove('total')
+        # Si hay fecha, eliminar fecha_iso
+        if 'fecha' in columnas_principales and 'fecha_iso' in columnas_principales:
+            columnas_principales.remove('fecha_iso')
+        
+        # Si no hay suficientes columnas, agregar algunas básicas
+        if len(columnas_principales) < minimo_columnas:
+            for h in columnas_basicas:
+                if h in headers_principales and h not in columnas_principales:
+                    columnas_principales.insert(0, h)
+        
+        return columnas_principales
+    
+    def _ancho_columna_excel(self, header, max_length):
+        """Ancho de columna según el tipo de dato que contiene"""
         # Anchos específicos para columnas de productos
         anchos_columnas_productos = {
             'nombre': 30,
@@ -2059,82 +1801,52 @@ class DescargarReporteView(View):
             'veces_vendido': 14
         }
         
-        # Si no encontramos, buscar la fila con más celdas con texto (probablemente encabezados)
-        if not header_row_num:
-            for row_idx in range(1, min(20, ws.max_row + 1)):
-                row_cells = [ws.cell(row=row_idx, column=col) for col in range(1, min(max_col + 1, 10))]
-                if sum(1 for c in row_cells if c.value and isinstance(c.value, str) and len(str(c.value)) > 0) >= 3:
-                    header_row_num = row_idx
-                    break
-        
-        if not header_row_num:
-            header_row_num = 1
-        
-        for col_num in range(1, max_col + 1):
-            max_length = 0
-            column_letter = get_column_letter(col_num)
-            
-            # Obtener el header de esta columna para determinar ancho especial
-            header_cell = ws.cell(row=header_row_num, column=col_num)
-            header_text = str(header_cell.value or '').lower()
-            
-            # Verificar si la columna tiene celdas merged
-            try:
-                for row in ws.iter_rows(min_row=1, max_row=ws.max_row, min_col=col_num, max_col=col_num):
-                    for cell in row:
-                        try:
-                            # Saltar merged cells
-                            if hasattr(cell, 'value') and cell.value is not None:
-                                cell_value = str(cell.value)
-                                if len(cell_value) > max_length:
-                                    max_length = len(cell_value)
-                        except:
-                            pass
-            except:
-                pass
-            
-            # Ajustar ancho según el tipo de columna
-            # Primero verificar si es una columna de productos con ancho específico
-            header_clean = header_text.replace('_', ' ').replace('formateado', '').replace('display', '').strip()
-            if header_clean in anchos_columnas_productos:
-                adjusted_width = anchos_columnas_productos[header_clean]
-            elif 'nombre' in header_text:
-                adjusted_width = min(max(max_length + 2, 25), 50)  # Nombre más ancho
-            elif 'descripcion' in header_text or 'descripción' in header_text:
-                adjusted_width = min(max(max_length + 2, 40), 60)  # Descripción más ancha
-            elif 'monto_total_vendido' in header_text:
-                adjusted_width = min(max(max_length + 2, 18), 25)  # Monto total vendido
-            elif 'veces_vendido' in header_text:
-                adjusted_width = min(max(max_length + 2, 12), 15)  # Veces vendido
-            elif 'fecha' in header_text:
-                adjusted_width = min(max(max_length + 2, 15), 20)
-            elif 'total' in header_text or 'precio' in header_text or 'monto' in header_text:
-                adjusted_width = min(max(max_length + 2, 12), 18)
-            elif 'categoria' in header_text:
-                adjusted_width = min(max(max_length + 2, 15), 25)
-            elif 'marca' in header_text:
-                adjusted_width = min(max(max_length + 2, 12), 20)
-            elif 'stock' in header_text:
-                adjusted_width = min(max(max_length + 2, 8), 12)  # Stock más compacto
+        header_text = header.lower()
+        if header_text in anchos_columnas_productos:
+            return anchos_columnas_productos[header_text]
+        elif 'nombre' in header_text:
+            return min(max(max_length + 2, 25), 50)  # Nombre más ancho
+        elif 'descripcion' in header_text or 'descripción' in header_text:
+            return min(max(max_length + 2, 40), 60)  # Descripción más ancha
+        elif 'monto_total_vendido' in header_text:
+            return min(max(max_length + 2, 18), 25)  # Monto total vendido
+        elif 'veces_vendido' in header_text:
+            return min(max(max_length + 2, 12), 15)  # Veces vendido
+        elif 'fecha' in header_text:
+            return min(max(max_length + 2, 15), 20)
+        elif 'total' in header_text or 'precio' in header_text or 'monto' in header_text:
+            return min(max(max_length + 2, 12), 18)
+        elif 'categoria' in header_text:
+            return min(max(max_length + 2, 15), 25)
+        elif 'marca' in header_text:
+            return min(max(max_length + 2, 12), 20)
+        elif 'stock' in header_text:
+            return min(max(max_length + 2, 8), 12)  # Stock más compacto
+        return min(max(max_length + 2, 12), 30)
+    
+    def _celda_excel(self, excel, header, valor, estilo):
+        """Celda de la tabla de detalles con formato según el tipo de columna"""
+        header_lower = header.lower()
+        number_format = None
+        
+        # Formatear valores
+        if isinstance(valor, bool):
+            valor = 'Sí' if valor else 'No'
+        elif isinstance(valor, (int, float)):
+            if 'total' in header_lower or 'monto' in header_lower or 'precio' in header_lower or 'compra' in header_lower:
+                number_format = '$#,##0.00'  # Formato de moneda (incluye monto total vendido)
             else:
-                adjusted_width = min(max(max_length + 2, 12), 30)
-            
-            ws.column_dimensions[column_letter].width = adjusted_width
+                number_format = FORMATO_ENTERO  # Formato numérico sin decimales
+        elif isinstance(valor, (dict, list)):
+            valor = f"{len(valor)} items" if isinstance(valor, list) else "Ver detalles"
+        elif 'nombre' in header_lower:
+            valor = str(valor)  # Nombre completo, sin truncar
+        else:
+            valor = str(valor)[:100]  # Limitar longitud para otras columnas
         
-        try:
-            buffer = BytesIO()
-            wb.save(buffer)
-            buffer.seek(0)
-            
-            response = HttpResponse(
-                buffer,
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
-            response['Content-Disposition'] = f'attachment; filename="reporte_{reporte.id_reporte}.xlsx"'
-            return response
-        except Exception as e:
-            logger.error(f"Error al generar Excel: {str(e)}", exc_info=True)
-            raise
+        # Nombres alineados a la izquierda; el resto centrado (estilo de celda)
+        alignment = ALINEACION_IZQUIERDA if 'nombre' in header_lower else None
+        return excel.celda(valor, estilo, number_format=number_format, alignment=alignment)
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -2211,7 +1923,8 @@ class FiltrosInteligentesView(View):
 class OpcionesFiltrosView(View):
     """
     Vista auxiliar para obtener opciones de filtros para reportes
-    Retorna listas de clientes, categorías, productos, etc. para usar en filtros
+    Retorna categorías, estados y métodos de pago, y solo las primeras opciones
+    de clientes: el resto se busca con ventas_carrito.BusquedaFiltrosView
     """
     
     def get(self, request):
@@ -2226,7 +1939,7 @@ class OpcionesFiltrosView(View):
             
             user_id = request.session.get('user_id')
             try:
-                usuario = Usuario.objects.get(id=user_id)
+                usuario = Usuario.objects.select_related('id_rol').get(id=user_id)
                 is_admin = usuario.id_rol and usuario.id_rol.nombre.lower() == 'administrador'
             except Usuario.DoesNotExist:
                 return JsonResponse({
@@ -2236,32 +1949,16 @@ class OpcionesFiltrosView(View):
             
             response_data = {
                 'success': True,
-                'is_admin': is_admin
+                'is_admin': is_admin,
+                'busqueda_url': '/api/ventas/historial/filtros/buscar/'
             }
             
-            # Solo admin puede ver lista de clientes
+            # Solo admin puede ver clientes (sugerencias iniciales; el resto por búsqueda)
             if is_admin:
-                clientes = Cliente.objects.select_related('id').all().order_by('id__nombre')
-                clientes_list = [
-                    {
-                        'id': cliente.id.id,
-                        'nombre': f"{cliente.id.nombre} {cliente.id.apellido or ''}".strip(),
-                        'email': cliente.id.email
-                    }
-                    for cliente in clientes
-                ]
-                response_data['clientes'] = clientes_list
+                response_data['clientes'] = busqueda.buscar('clientes')
             
-            # Obtener lista de categorías para filtro
-            categorias = Categoria.objects.all().order_by('nombre')
-            categorias_list = [
-                {
-                    'id': categoria.id_categoria,
-                    'nombre': categoria.nombre
-                }
-                for categoria in categorias
-            ]
-            response_data['categorias'] = categorias_list
+            # Categorías para filtro (lista corta, cacheada)
+            response_data['categorias'] = busqueda.categorias()
             
             # Métodos de pago disponibles
             response_data['metodos_pago'] = [
@@ -0,0 +1,167 @@
+"""
+Búsqueda incremental (typeahead) de clientes, productos y categorías para las
+pantallas de filtros del historial de ventas y de los reportes.
+
+En lugar de enviar todas las opciones al abrir la pantalla, el frontend pide
+solo las que coinciden con lo escrito, con un límite de resultados. Cada
+palabra del texto debe aparecer en alguno de los campos de la entidad y las
+coincidencias al inicio del nombre van primero. En PostgreSQL esos campos
+tienen índices de trigramas (pg_trgm) sobre UPPER(campo::text), la expresión
+que genera icontains, así que la búsqueda no recorre la tabla completa.
+
+Las categorías son una lista corta de referencia: se cachean completas, se
+filtran en memoria y se invalidan al crear, editar o eliminar una categoría.
+Las sugerencias iniciales de clientes y productos (sin texto, las que se
+muestran al abrir las pantallas) también se cachean; las vistas que crean,
+editan o eliminan clientes o productos las invalidan, y los cambios hechos
+por otras vías (admin, comandos) se ven al vencer SUGERENCIAS_CACHE_TTL.
+"""
+from django.core.cache import cache
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from autenticacion_usuarios.models import Cliente
+from productos.models import Categoria, Producto
+
+ENTIDADES = ('clientes', 'productos', 'categorias')
+
+LIMITE_DEFECTO = 10
+LIMITE_MAXIMO = 50
+
+# Palabras del texto que se tienen en cuenta (cada una agrega un filtro)
+MAX_PALABRAS = 5
+
+CLAVE_CATEGORIAS = 'busqueda:categorias'
+CATEGORIAS_CACHE_TTL = 60 * 60
+
+# Sugerencias sin texto por entidad: se guardan LIMITE_MAXIMO y se recortan al pedir
+PREFIJO_SUGERENCIAS = 'busqueda:sugerencias:'
+SUGERENCIAS_CACHE_TTL = 5 * 60
+ENTIDADES_SUGERENCIAS = ('clientes', 'productos')
+
+
+def _palabras(texto):
+    return (texto or '').split()[:MAX_PALABRAS]
+
+
+def _filtro_palabras(palabras, campos):
+    """Cada palabra debe aparecer (sin distinguir mayúsculas) en alguno de los campos"""
+    filtro = Q()
+    for palabra in palabras:
+        en_algun_campo = Q()
+        for campo in campos:
+            en_algun_campo |= Q(**{f'{campo}__icontains': palabra})
+        filtro &= en_algun_campo
+    return filtro
+
+
+def _prioridad(palabras, campo):
+    """0 si el campo empieza con la primera palabra, 1 en otro caso"""
+    if not palabras:
+        return Value(1, output_field=IntegerField())
+    return Case(
+        When(**{f'{campo}__istartswith': palabras[0]}, then=Value(0)),
+        default=Value(1),
+        output_field=IntegerField()
+    )
+
+
+def _buscar_clientes(palabras, limite):
+    clientes = (
+        Cliente.objects
+        .filter(_filtro_palabras(palabras, ['id__nombre', 'id__apellido', 'id__email']))
+        .annotate(prioridad=_prioridad(palabras, 'id__nombre'))
+        .order_by('prioridad', 'id__nombre', 'id__apellido', 'id')
+        .values('id', 'id__nombre', 'id__apellido', 'id__email')[:limite]
+    )
+    return [
+        {
+            'id': cliente['id'],
+            'nombre': f"{cliente['id__nombre']} {cliente['id__apellido'] or ''}".strip(),
+            'email': cliente['id__email']
+        }
+        for cliente in clientes
+    ]
+
+
+def _buscar_productos(palabras, limite):
+    productos = (
+        Producto.objects
+        .filter(_filtro_palabras(palabras, ['nombre']))
+        .annotate(prioridad=_prioridad(palabras, 'nombre'))
+        .order_by('prioridad', 'nombre', 'id')
+        .values('id', 'nombre')[:limite]
+    )
+    return list(productos)
+
+
+def categorias():
+    """Lista completa de categorías [{'id', 'nombre'}], desde la caché"""
+    lista = cache.get(CLAVE_CATEGORIAS)
+    if lista is None:
+        lista = [
+            {'id': categoria['id_categoria'], 'nombre': categoria['nombre']}
+            for categoria in Categoria.objects.order_by('nombre').values('id_categoria', 'nombre')
+        ]
+        cache.set(CLAVE_CATEGORIAS, lista, CATEGORIAS_CACHE_TTL)
+    return lista
+
+
+def invalidar_categorias():
+    """Descarta la lista de categorías cacheada"""
+    cache.delete(CLAVE_CATEGORIAS)
+
+
+def _buscar_categorias(palabras, limite):
+    palabras = [palabra.lower() for palabra in palabras]
+    coincidencias = [
+        categoria for categoria in categorias()
+        if all(palabra in categoria['nombre'].lower() for palabra in palabras)
+    ]
+    if palabras:
+        # Estable: dentro de cada grupo se mantiene el orden alfabético
+        coincidencias.sort(key=lambda categoria: not categoria['nombre'].lower().startswith(palabras[0]))
+    return coincidencias[:limite]
+
+
+_BUSCADORES = {
+    'clientes': _buscar_clientes,
+    'productos': _buscar_productos,
+    'categorias': _buscar_categorias,
+}
+
+
+def _sugerencias(entidad, limite):
+    """Primeras opciones de `entidad` en orden alfabético, desde la caché"""
+    clave = f'{PREFIJO_SUGERENCIAS}{entidad}'
+    lista = cache.get(clave)
+    if lista is None:
+        lista = _BUSCADORES[entidad]([], LIMITE_MAXIMO)
+        cache.set(clave, lista, SUGERENCIAS_CACHE_TTL)
+    return lista[:limite]
+
+
+def invalidar_sugerencias(entidad):
+    """Descarta las sugerencias iniciales cacheadas de 'clientes' o 'productos'"""
+    cache.delete(f'{PREFIJO_SUGERENCIAS}{entidad}')
+
+
+def limite_valido(limite):
+    """Convierte el límite recibido en la consulta a un entero entre 1 y LIMITE_MAXIMO"""
+    try:
+        limite = int(limite)
+    except (TypeError, ValueError):
+        return LIMITE_DEFECTO
+    return max(1, min(limite, LIMITE_MAXIMO))
+
+
+def buscar(entidad, texto='', limite=LIMITE_DEFECTO):
+    """
+    Opciones de `entidad` que coinciden con `texto`, como máximo `limite`.
+    Sin texto retorna las primeras en orden alfabético.
+    """
+    if entidad not in _BUSCADORES:
+        raise ValueError(f"Entidad de búsqueda no soportada: {entidad}")
+    palabras = _palabras(texto)
+    if not palabras and entidad in ENTIDADES_SUGERENCIAS:
+        return _sugerencias(entidad, limite_valido(limite))
+    return _BUSCADORES[entidad](palabras, limite_valido(limite))
@@ -2,9 +2,13 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views import View
+from django.db import transaction
 import json
 
 from .models import Carrito, ItemCarrito, Venta, DetalleVenta
+from .outbox import registrar_evento, registrar_bitacora
+from . import historico
+from .reservas import verificar_disponibilidad
 
 
 # ==========================================================
@@ -89,109 +93,78 @@ class CheckoutView(View):
             # Calcular total
             total = sum(item.get_subtotal() for item in items_carrito)
             
-            # Crear venta
-            venta = Venta.objects.create(
-                cliente=cliente,
-                total=total,
-                estado='pendiente',
-                metodo_pago=metodo_pago,
-                direccion_entrega=direccion_entrega,
-                notas=notas
-            )
-            
-            # Notificar a administradores sobre nueva venta
-            try:
-                from autenticacion_usuarios.notificaciones_views import notificar_nueva_venta
-                notificar_nueva_venta(venta)
-            except Exception as e:
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.warning(f"Error notificando nueva venta: {str(e)}")
-            
             # Crear detalles de venta y actualizar stock
             from productos.models import Stock
             import logging
             logger = logging.getLogger(__name__)
             
             detalles_creados = []
-            productos_sin_stock = []
             
-            # Primero verificar todo el stock disponible
-            for item in items_carrito.select_related('producto'):
-                stock_obj = Stock.objects.filter(producto=item.producto).first()
-                stock_disponible = stock_obj.cantidad if stock_obj else 0
+            # La venta y sus efectos secundarios (outbox) se confirman juntos
+            with transaction.atomic():
+                # Verificar stock disponible (descontando reservas de pagos Stripe pendientes)
+                productos_sin_stock = verificar_disponibilidad(items_carrito.select_related('producto'))
                 
-                if stock_disponible < item.cantidad:
-                    productos_sin_stock.append({
-                        'producto': item.producto.nombre,
-                        'solicitado': item.cantidad,
-                        'disponible': stock_disponible
-                    })
-            
-            # Si hay productos sin stock, cancelar la venta
-            if productos_sin_stock:
-                venta.delete()
-                mensaje = 'Stock insuficiente para los siguientes productos: '
-                mensaje += ', '.join([f"{p['producto']} (solicitado: {p['solicitado']}, disponible: {p['disponible']})" 
-                                    for p in productos_sin_stock])
-                return JsonResponse({
-                    'success': False,
-                    'message': mensaje
-                }, status=400)
-            
-            # Si todo está bien, crear detalles y actualizar stock
-            for item in items_carrito.select_related('producto'):
-                # Crear detalle de venta
-                detalle = DetalleVenta.objects.create(
-                    venta=venta,
-                    producto=item.producto,
-                    cantidad=item.cantidad,
-                    precio_unitario=item.precio_unitario
+                # Si hay productos sin stock, rechazar la compra
+                if productos_sin_stock:
+                    mensaje = 'Stock insuficiente para los siguientes productos: '
+                    mensaje += ', '.join([f"{p['producto']} (solicitado: {p['solicitado']}, disponible: {p['disponible']})" 
+                                        for p in productos_sin_stock])
+                    return JsonResponse({
+                        'success': False,
+                        'message': mensaje
+                    }, status=400)
+                
+                venta = Venta.objects.create(
+                    cliente=cliente,
+                    total=total,
+                    estado='pendiente',
+                    metodo_pago=metodo_pago,
+                    direccion_entrega=direccion_entrega,
+                    notas=notas
                 )
-                detalles_creados.append(detalle)
                 
-                # Actualizar stock del producto
-                stock_obj = Stock.objects.filter(producto=item.producto).first()
-                if stock_obj:
-                    stock_obj.cantidad -= item.cantidad
-                    if stock_obj.cantidad < 0:
-                        stock_obj.cantidad = 0
-                    stock_obj.save()
-                else:
-                    logger.warning(f"Producto {item.producto.id} no tiene registro de stock")
-            
-            # Marcar venta como completada
-            venta.estado = 'completada'
-            venta.save()
-            
-            # CU12: Generar comprobante automáticamente
-            comprobante_data = None
-            try:
-                from .comprobantes_views import ComprobanteView
-                comprobante_view = ComprobanteView()
-                comprobante = comprobante_view._generar_comprobante(venta, 'factura')
-                comprobante_data = {
-                    'id': comprobante.id_comprobante,
-                    'numero': comprobante.nro,
-                    'pdf_url': f'/api/ventas/comprobantes/{venta.id_venta}/pdf/'
-                }
-            except Exception as e:
-                logger.warning(f"Error al generar comprobante automático: {str(e)}")
-                # No fallar la venta si el comprobante falla
-            
-            # Limpiar carrito
-            items_carrito.delete()
-            carrito.delete()
-            
-            # Registrar en bitácora
-            from autenticacion_usuarios.models import Bitacora
-            Bitacora.objects.create(
-                id_usuario=usuario,
-                accion='COMPRA_REALIZADA',
-                modulo='VENTAS',
-                descripcion=f'Cliente {usuario.nombre} realizó compra por ${total}',
-                ip=self.get_client_ip(request)
-            )
+                # Crear detalles y actualizar stock
+                for item in items_carrito.select_related('producto'):
+                    detalle = DetalleVenta.objects.create(
+                        venta=venta,
+                        producto=item.producto,
+                        cantidad=item.cantidad,
+                        precio_unitario=item.precio_unitario
+                    )
+                    detalles_creados.append(detalle)
+                    
+                    # Actualizar stock del producto
+                    stock_obj = Stock.objects.filter(producto=item.producto).first()
+                    if stock_obj:
+                        stock_obj.cantidad -= item.cantidad
+                        if stock_obj.cantidad < 0:
+                            stock_obj.cantidad = 0
+                        stock_obj.save()
+                    else:
+                        logger.warning(f"Producto {item.producto.id} no tiene registro de stock")
+                
+                # Marcar venta como completada
+                estado_anterior = venta.estado
+                venta.estado = 'completada'
+                venta.save()
+                historico.registrar_cambio_estado(venta, estado_anterior)
+                
+                # Limpiar carrito
+                items_carrito.delete()
+                carrito.delete()
+                
+                # Efectos secundarios: los procesa el comando despachar_outbox
+                registrar_evento('notificar_nueva_venta', venta_id=venta.id_venta)
+                # CU12: Generar comprobante automáticamente
+                registrar_evento('generar_comprobante', venta_id=venta.id_venta, tipo='factura')
+                registrar_bitacora(
+                    usuario_id=usuario.id,
+                    accion='COMPRA_REALIZADA',
+                    modulo='VENTAS',
+                    descripcion=f'Cliente {usuario.nombre} realizó compra por ${total}',
+                    ip=self.get_client_ip(request)
+                )
             
             # Respuesta exitosa
             response_data = {
@@ -208,8 +181,11 @@ class CheckoutView(View):
                 }
             }
             
-            if comprobante_data:
-                response_data['comprobante'] = comprobante_data
+            # El comprobante se genera en segundo plano; el PDF se genera a demanda si aún no existe
+            response_data['comprobante'] = {
+                'estado': 'pendiente',
+                'pdf_url': f'/api/ventas/comprobantes/{venta.id_venta}/pdf/'
+            }
             
             return JsonResponse(response_data, status=201)
             
@@ -0,0 +1,48 @@
+"""
+Coalescencia de llamadas concurrentes ("single-flight").
+
+Si varias peticiones del mismo proceso piden el mismo resultado a la vez, solo
+la primera ejecuta la función; las demás esperan y reciben su resultado (o su
+excepción). Evita golpear la pasarela de pagos N veces por el mismo dato.
+"""
+import threading
+
+
+class _Llamada:
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class SingleFlight:
+    """Comparte una única ejecución en curso por clave entre hilos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_curso = {}
+
+    def do(self, clave, funcion):
+        with self._lock:
+            llamada = self._en_curso.get(clave)
+            es_lider = llamada is None
+            if es_lider:
+                llamada = _Llamada()
+                self._en_curso[clave] = llamada
+
+        if not es_lider:
+            llamada.evento.wait()
+            if llamada.error is not None:
+                raise llamada.error
+            return llamada.resultado
+
+        try:
+            llamada.resultado = funcion()
+        except Exception as e:
+            llamada.error = e
+            raise
+        finally:
+            with self._lock:
+                self._en_curso.pop(clave, None)
+            llamada.evento.set()
+        return llamada.resultado
@@ -0,0 +1,262 @@
+"""
+Conciliación por lotes de pagos Stripe pendientes.
+
+Recorre los `PagoOnline` en estado 'pendiente' (paginación por id), consulta el
+estado de sus PaymentIntents en lote (API list por ventana de creación, con un
+pool acotado de hilos para los que no aparezcan) y aplica los cambios con
+actualizaciones en bloque.
+"""
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import EventoOutbox, PagoOnline, ReservaStock, Venta
+from . import historico, reservas
+
+logger = logging.getLogger(__name__)
+
+# Margen alrededor de la fecha del PagoOnline para la ventana de `PaymentIntent.list`
+MARGEN_VENTANA = timedelta(minutes=5)
+
+
+# ==========================================================
+# PASARELAS
+# ==========================================================
+
+class PasarelaStripe:
+    """Consulta estados de PaymentIntents contra la API de Stripe"""
+
+    def __init__(self, max_workers=8):
+        import stripe
+        self.stripe = stripe
+        self.max_workers = max_workers
+        self.llamadas = 0
+
+    def obtener_estados(self, payment_intent_ids, desde=None, hasta=None):
+        """Retorna {payment_intent_id: status} para los ids que se pudieron consultar"""
+        pendientes = set(payment_intent_ids)
+        estados = {}
+
+        # 1) Una sola paginación de la API list cubre todo el lote
+        if desde and hasta:
+            try:
+                self.llamadas += 1
+                pagina = self.stripe.PaymentIntent.list(
+                    created={'gte': int(desde.timestamp()), 'lte': int(hasta.timestamp())},
+                    limit=100
+                )
+                for payment_intent in pagina.auto_paging_iter():
+                    if payment_intent.id in pendientes:
+                        estados[payment_intent.id] = payment_intent.status
+                        pendientes.discard(payment_intent.id)
+                        if not pendientes:
+                            break
+            except self.stripe.error.StripeError as e:
+                logger.warning(f"Conciliación: falló PaymentIntent.list, se consultará uno a uno: {str(e)}")
+
+        # 2) Los que no aparecieron se consultan con un pool acotado
+        if pendientes:
+            self.llamadas += len(pendientes)
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                for payment_intent_id, status in pool.map(self._recuperar, pendientes):
+                    if status is not None:
+                        estados[payment_intent_id] = status
+
+        return estados
+
+    def _recuperar(self, payment_intent_id):
+        try:
+            return payment_intent_id, self.stripe.PaymentIntent.retrieve(payment_intent_id).status
+        except self.stripe.error.StripeError as e:
+            logger.warning(f"Conciliación: no se pudo recuperar {payment_intent_id}: {str(e)}")
+            return payment_intent_id, None
+
+
+class PasarelaStub:
+    """Pasarela local para pruebas: responde desde un diccionario {payment_intent_id: status}"""
+
+    def __init__(self, estados=None):
+        self.estados = dict(estados or {})
+        self.llamadas = 0
+
+    def obtener_estados(self, payment_intent_ids, desde=None, hasta=None):
+        self.llamadas += 1
+        return {pi: self.estados[pi] for pi in payment_intent_ids if pi in self.estados}
+
+
+# ==========================================================
+# APLICACIÓN DE CAMBIOS EN BLOQUE
+# ==========================================================
+
+def _aplicar_exitosos(pagos):
+    """
+    Completar en bloque las ventas de pagos que Stripe reporta como 'succeeded'.
+
+    Igual que VerifyPaymentIntentView, una venta cancelada (o cuya reserva ya se
+    liberó) no se completa: su pago pasa a 'reembolsado' y se encola la anulación
+    del PaymentIntent. Lo mismo si el stock ya no alcanza. Retorna
+    (ventas completadas, ventas rechazadas).
+    """
+    pago_ids = [p['id_pago'] for p in pagos]
+    venta_ids = [p['venta_id'] for p in pagos]
+
+    with transaction.atomic():
+        ventas = dict(
+            Venta.objects.select_for_update()
+            .filter(id_venta__in=venta_ids)
+            .order_by('id_venta')
+            .values_list('id_venta', 'estado')
+        )
+        # Ya completadas (p. ej. por verify): solo falta marcar el pago
+        completadas = [venta_id for venta_id, estado in ventas.items() if estado == 'completada']
+        sin_reserva = set(
+            ReservaStock.objects.filter(venta_id__in=ventas.keys())
+            .exclude(estado='activa').values_list('venta_id', flat=True)
+        )
+        rechazadas = [
+            venta_id for venta_id, estado in ventas.items()
+            if estado == 'cancelada' or (estado != 'completada' and venta_id in sin_reserva)
+        ]
+        por_completar = [
+            venta_id for venta_id in ventas if venta_id not in rechazadas and venta_id not in completadas
+        ]
+
+        # Descontar stock de todo el lote a la vez; si algún producto no alcanza,
+        # se reintenta venta por venta y se rechazan las que no caben
+        try:
+            with transaction.atomic():
+                reservas.descontar_stock(por_completar)
+        except reservas.StockInsuficiente:
+            for venta_id in list(por_completar):
+                try:
+                    with transaction.atomic():
+                        reservas.descontar_stock([venta_id])
+                except reservas.StockInsuficiente:
+                    por_completar.remove(venta_id)
+                    rechazadas.append(venta_id)
+
+        PagoOnline.objects.filter(
+            id_pago__in=pago_ids, estado='pendiente', venta_id__in=completadas + por_completar
+        ).update(estado='exitoso')
+
+        if rechazadas:
+            logger.warning(f"Conciliación: pagos cobrados de ventas que no se pueden completar, se reembolsan: {rechazadas}")
+            reservas.anular_pagos(rechazadas, estado='reembolsado')
+            ReservaStock.objects.filter(venta_id__in=rechazadas, estado='activa').update(estado='liberada')
+            Venta.objects.filter(id_venta__in=rechazadas, estado='pendiente').update(
+                estado='cancelada', fecha_actualizacion=timezone.now()
+            )
+
+        if por_completar:
+            Venta.objects.filter(id_venta__in=por_completar).update(
+                estado='completada', metodo_pago='stripe', fecha_actualizacion=timezone.now()
+            )
+            historico.aplicar_ventas(por_completar)
+            ReservaStock.objects.filter(venta_id__in=por_completar, estado='activa').update(estado='confirmada')
+
+            # El carrito no se toca: el cliente que no volvió a verify pudo haber
+            # armado uno nuevo desde entonces
+
+            # CU12: comprobantes vía outbox
+            ahora = timezone.now()
+            EventoOutbox.objects.bulk_create([
+                EventoOutbox(
+                    tipo='generar_comprobante',
+                    payload={'venta_id': venta_id, 'tipo': 'factura'},
+                    fecha_disponible=ahora
+                )
+                for venta_id in por_completar
+            ])
+
+    return len(por_completar), len(rechazadas)
+
+
+def _aplicar_cancelados(pagos):
+    """Marcar como fallidos los pagos cuyo PaymentIntent fue cancelado y liberar su stock"""
+    pago_ids = [p['id_pago'] for p in pagos]
+    venta_ids = [p['venta_id'] for p in pagos]
+
+    with transaction.atomic():
+        PagoOnline.objects.filter(id_pago__in=pago_ids, estado='pendiente').update(estado='fallido')
+        ReservaStock.objects.filter(venta_id__in=venta_ids, estado='activa').update(estado='liberada')
+        return Venta.objects.filter(id_venta__in=venta_ids, estado='pendiente').update(
+            estado='cancelada', fecha_actualizacion=timezone.now()
+        )
+
+
+# ==========================================================
+# PROCESO PRINCIPAL
+# ==========================================================
+
+def conciliar_pagos_pendientes(pasarela, tamano_lote=100, antiguedad_minima=timedelta(minutes=10), dry_run=False):
+    """
+    Concilia los pagos pendientes contra la pasarela y retorna un resumen.
+
+    `antiguedad_minima` evita tocar pagos recién creados que el navegador
+    todavía puede estar verificando.
+    """
+    inicio = time.monotonic()
+    limite = timezone.now() - antiguedad_minima
+    resumen = {
+        'revisados': 0,
+        'sin_respuesta': 0,
+        'estados': defaultdict(int),
+        'ventas_completadas': 0,
+        'ventas_canceladas': 0,
+        'ventas_rechazadas': 0,
+    }
+
+    ultimo_id = 0
+    while True:
+        lote = list(
+            PagoOnline.objects.filter(
+                estado='pendiente',
+                stripe_payment_intent_id__isnull=False,
+                fecha__lte=limite,
+                id_pago__gt=ultimo_id
+            ).order_by('id_pago').values('id_pago', 'venta_id', 'stripe_payment_intent_id', 'fecha')[:tamano_lote]
+        )
+        if not lote:
+            break
+        ultimo_id = lote[-1]['id_pago']
+        resumen['revisados'] += len(lote)
+
+        fechas = [p['fecha'] for p in lote]
+        estados = pasarela.obtener_estados(
+            [p['stripe_payment_intent_id'] for p in lote],
+            desde=min(fechas) - MARGEN_VENTANA,
+            hasta=max(fechas) + MARGEN_VENTANA
+        )
+
+        exitosos, cancelados = [], []
+        for pago in lote:
+            status = estados.get(pago['stripe_payment_intent_id'])
+            if status is None:
+                resumen['sin_respuesta'] += 1
+                continue
+            resumen['estados'][status] += 1
+            if status == 'succeeded':
+                exitosos.append(pago)
+            elif status == 'canceled':
+                cancelados.append(pago)
+
+        if not dry_run:
+            if exitosos:
+                completadas, rechazadas = _aplicar_exitosos(exitosos)
+                resumen['ventas_completadas'] += completadas
+                resumen['ventas_rechazadas'] += rechazadas
+            if cancelados:
+                resumen['ventas_canceladas'] += _aplicar_cancelados(cancelados)
+
+        if len(lote) < tamano_lote:
+            break
+
+    resumen['estados'] = dict(resumen['estados'])
+    resumen['llamadas_api'] = pasarela.llamadas
+    resumen['segundos'] = round(time.monotonic() - inicio, 2)
+    return resumen
@@ -0,0 +1,211 @@
+"""
+Estadísticas del dashboard del administrador (DashboardStatsView y su exportación).
+
+Los meses se cuentan en la zona horaria local (America/La_Paz), igual que los
+días de VentaHistorico: la serie de los últimos 12 meses sale de un solo
+GROUP BY por TruncMonth, y de ella también se toman los totales del mes actual
+y del anterior.
+
+El resultado se cachea por rol durante unos segundos
+(DASHBOARD_STATS_CACHE_TTL) bajo una versión. Con caché compartida, completar o
+revertir una venta cambia la versión al confirmar la transacción (ver
+historico.aplicar_ventas). Sin ella (LocMem, una por proceso) ese cambio no
+llegaría a los demás workers, así que la versión es la última
+`Venta.fecha_actualizacion`, una consulta sobre un índice.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from autenticacion_usuarios import archivo_bitacora
+from productos.models import Producto
+from .models import DetalleVenta, Venta
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIJO_DASHBOARD = 'dashboard:stats:'
+CLAVE_VERSION_DASHBOARD = f'{CACHE_PREFIJO_DASHBOARD}version'
+DASHBOARD_CACHE_TTL = getattr(settings, 'DASHBOARD_STATS_CACHE_TTL', 60)
+CACHE_COMPARTIDA = getattr(settings, 'CACHE_COMPARTIDA', False)
+# La versión vive más que cualquier entrada cacheada, pero no para siempre
+VERSION_TTL = 24 * 60 * 60
+
+MESES_SERIE = 12
+
+
+def _mes_anterior(inicio_mes, meses=1):
+    """Inicio del mes `meses` antes de `inicio_mes` (fecha local con tz)"""
+    total = inicio_mes.year * 12 + inicio_mes.month - 1 - meses
+    return inicio_mes.replace(year=total // 12, month=total % 12 + 1)
+
+
+def _cambio_porcentual(actual, anterior):
+    if anterior > 0:
+        return ((actual - anterior) / anterior) * 100
+    return 0
+
+
+def _version():
+    if CACHE_COMPARTIDA:
+        return cache.get(CLAVE_VERSION_DASHBOARD, 0)
+    ultima = Venta.objects.aggregate(ultima=Max('fecha_actualizacion'))['ultima']
+    return int(ultima.timestamp() * 1_000_000) if ultima else 0
+
+
+def _clave_cache(rol_nombre):
+    # La versión cambia en cada invalidación: las claves anteriores quedan huérfanas
+    # y expiran solas, sin necesidad de conocer todos los roles
+    return f'{CACHE_PREFIJO_DASHBOARD}{rol_nombre}:{_version()}'
+
+
+def invalidar_cache():
+    """Descarta las estadísticas cacheadas de todos los roles"""
+    cache.set(CLAVE_VERSION_DASHBOARD, time.time_ns(), VERSION_TTL)
+
+
+def obtener_dashboard(rol_nombre):
+    """Estadísticas del dashboard desde la caché o recalculadas"""
+    clave = _clave_cache(rol_nombre)
+    datos = cache.get(clave)
+    if datos is None:
+        datos = calcular_dashboard()
+        cache.set(clave, datos, DASHBOARD_CACHE_TTL)
+    return datos
+
+
+def _ventas_mensuales(inicio_serie):
+    """{(año, mes): (total, cantidad)} de ventas completadas desde `inicio_serie`, en hora local"""
+    por_mes = (
+        Venta.objects.filter(fecha_venta__gte=inicio_serie, estado='completada')
+        .annotate(mes=TruncMonth('fecha_venta', tzinfo=timezone.get_current_timezone()))
+        .values('mes')
+        .annotate(total=Sum('total'), cantidad=Count('pk'))
+        .order_by()
+    )
+    return {
+        (fila['mes'].year, fila['mes'].month): (float(fila['total'] or 0), fila['cantidad'])
+        for fila in por_mes
+    }
+
+
+def calcular_dashboard():
+    """Calcula el contenido completo de DashboardStatsView"""
+    # Fechas para comparación (mes local)
+    ahora = timezone.localtime()
+    inicio_mes_actual = ahora.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    inicio_mes_anterior = _mes_anterior(inicio_mes_actual)
+    meses = [_mes_anterior(inicio_mes_actual, i) for i in range(MESES_SERIE - 1, -1, -1)]
+
+    # Ventas de los últimos 12 meses en una sola consulta
+    por_mes = _ventas_mensuales(meses[0])
+    total_ventas_mes, cantidad_ventas_mes = por_mes.get((inicio_mes_actual.year, inicio_mes_actual.month), (0.0, 0))
+    total_ventas_mes_anterior, cantidad_ventas_mes_anterior = por_mes.get(
+        (inicio_mes_anterior.year, inicio_mes_anterior.month), (0.0, 0)
+    )
+
+    # Calcular cambios porcentuales
+    cambio_ventas = _cambio_porcentual(total_ventas_mes, total_ventas_mes_anterior)
+    cambio_pedidos = _cambio_porcentual(cantidad_ventas_mes, cantidad_ventas_mes_anterior)
+
+    # Nuevos clientes de este mes y del anterior - usar bitácora para determinar fecha de registro
+    # (incluye el mes anterior aunque ya esté archivado)
+    clientes = archivo_bitacora.contar_por_mes('REGISTRO_CLIENTE', desde=inicio_mes_anterior)
+    clientes_mes_actual = clientes.get(inicio_mes_actual.date(), 0)
+    cambio_clientes = _cambio_porcentual(clientes_mes_actual, clientes.get(inicio_mes_anterior.date(), 0))
+
+    # Productos disponibles (todos los productos en el sistema)
+    productos_activos = Producto.objects.count()
+    # Para el cambio porcentual no hay historial de productos
+    cambio_productos = 0.0
+
+    # Ventas recientes (últimas 5)
+    ventas_recientes = Venta.objects.select_related('cliente', 'cliente__id').order_by('-fecha_venta')[:5]
+    ventas_recientes_data = []
+    for venta in ventas_recientes:
+        try:
+            cliente_nombre = 'Cliente desconocido'
+            if venta.cliente and venta.cliente.id:
+                nombre = venta.cliente.id.nombre or ''
+                apellido = venta.cliente.id.apellido or ''
+                cliente_nombre = f"{nombre} {apellido}".strip() or 'Cliente sin nombre'
+
+            ventas_recientes_data.append({
+                'id': f'V-{venta.id_venta}',
+                'client': cliente_nombre,
+                'amount': float(venta.total or 0),
+                'status': venta.estado or 'pendiente',
+                'date': venta.fecha_venta.strftime('%d/%m/%Y') if venta.fecha_venta else 'Fecha desconocida'
+            })
+        except Exception as e:
+            logger.warning(f"Error procesando venta {venta.id_venta}: {str(e)}")
+            continue
+
+    # Productos más vendidos (top 4)
+    productos_top = DetalleVenta.objects.filter(
+        producto__isnull=False
+    ).values(
+        'producto__nombre', 'producto__precio'
+    ).annotate(
+        total_vendido=Sum('cantidad'),
+        monto_total=Sum('subtotal')
+    ).order_by('-total_vendido')[:4]
+
+    top_products_data = []
+    for prod in productos_top:
+        if prod.get('producto__nombre'):
+            top_products_data.append({
+                'name': prod['producto__nombre'],
+                'sales': prod.get('total_vendido', 0),
+                'revenue': float(prod.get('monto_total') or 0)
+            })
+
+    # Ventas mensuales para gráfico (últimos 12 meses, incluidos los meses sin ventas)
+    ventas_mensuales = [
+        {'mes': mes.strftime('%b'), 'total': por_mes.get((mes.year, mes.month), (0.0, 0))[0]}
+        for mes in meses
+    ]
+
+    # Calcular altura relativa para el gráfico (0-100%)
+    max_ventas = max([v['total'] for v in ventas_mensuales]) if ventas_mensuales else 1
+    ventas_mensuales_alturas = [
+        int((v['total'] / max_ventas) * 100) if max_ventas > 0 else 0
+        for v in ventas_mensuales
+    ]
+
+    return {
+        'stats': {
+            'ventas_mes': {
+                'value': total_ventas_mes,
+                'change': cambio_ventas,
+                'trend': 'up' if cambio_ventas >= 0 else 'down'
+            },
+            'total_pedidos': {
+                'value': cantidad_ventas_mes,
+                'change': cambio_pedidos,
+                'trend': 'up' if cambio_pedidos >= 0 else 'down'
+            },
+            'nuevos_clientes': {
+                'value': clientes_mes_actual,
+                'change': cambio_clientes,
+                'trend': 'up' if cambio_clientes >= 0 else 'down'
+            },
+            'productos_activos': {
+                'value': productos_activos,
+                'change': cambio_productos,
+                'trend': 'down' if cambio_productos < 0 else 'up'
+            }
+        },
+        'ventas_recientes': ventas_recientes_data,
+        'top_products': top_products_data,
+        'ventas_mensuales': {
+            'labels': [v['mes'] for v in ventas_mensuales],
+            'heights': ventas_mensuales_alturas,
+            'values': [v['total'] for v in ventas_mensuales]
+        },
+        'generado': timezone.now().isoformat()
+    }
@@ -1,24 +1,116 @@
 """
 CU13: Historial de Ventas
 """
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views import View
-from django.db.models import Q, Sum, Count, Avg, Max, Min
-from productos.models import Producto, Categoria
+from django.db.models import Q, Sum, Count, Avg, Max, Min, Exists, OuterRef, Prefetch
+from productos.models import Categoria
 from django.core.paginator import Paginator
-from django.utils import timezone
 from datetime import datetime, timedelta
+import csv
 import json
 import logging
 
-from .models import Venta, DetalleVenta, VentaHistorico
-from autenticacion_usuarios.models import Usuario, Cliente, Bitacora
+from .models import Venta, DetalleVenta
+from . import busqueda, estadisticas, historico
+from autenticacion_usuarios.models import Usuario, Cliente
 
 logger = logging.getLogger(__name__)
 
 
+def _filtrar_ventas(request):
+    """
+    Ventas visibles para el usuario de la sesión con los filtros de la consulta
+    (fechas, estado, método de pago, categoría, producto y cliente).
+    Retorna (usuario, ventas, None) o (None, None, respuesta de error).
+    """
+    # Obtener parámetros de filtro
+    fecha_desde = request.GET.get('fecha_desde')
+    fecha_hasta = request.GET.get('fecha_hasta')
+    estado = request.GET.get('estado')
+    metodo_pago = request.GET.get('metodo_pago')
+    categoria_id = request.GET.get('categoria_id')
+    producto_id = request.GET.get('producto_id')
+    producto_nombre = request.GET.get('producto_nombre')  # Búsqueda por nombre
+    cliente_id = request.GET.get('cliente_id')
+    
+    # Obtener usuario y cliente
+    user_id = request.session.get('user_id')
+    try:
+        usuario = Usuario.objects.get(id=user_id)
+        
+        # Si es cliente, solo puede ver sus propias ventas
+        if usuario.id_rol.nombre.lower() == 'cliente':
+            try:
+                cliente = Cliente.objects.get(id=usuario)
+                ventas_query = Venta.objects.filter(cliente=cliente)
+            except Cliente.DoesNotExist:
+                return None, None, JsonResponse({
+                    'success': False,
+                    'message': 'Cliente no encontrado'
+                }, status=404)
+        else:
+            # Admin puede ver todas las ventas o filtrar por cliente
+            ventas_query = Venta.objects.all()
+            if cliente_id:
+                try:
+                    cliente = Cliente.objects.get(id=cliente_id)
+                    ventas_query = ventas_query.filter(cliente=cliente)
+                except Cliente.DoesNotExist:
+                    pass
+    except Usuario.DoesNotExist:
+        return None, None, JsonResponse({
+            'success': False,
+            'message': 'Usuario no encontrado'
+        }, status=404)
+    
+    # Aplicar filtros
+    if fecha_desde:
+        try:
+            fecha_desde_obj = datetime.strptime(fecha_desde, '%Y-%m-%d')
+            ventas_query = ventas_query.filter(fecha_venta__gte=fecha_desde_obj)
+        except ValueError:
+            pass
+    
+    if fecha_hasta:
+        try:
+            fecha_hasta_obj = datetime.strptime(fecha_hasta, '%Y-%m-%d')
+            # Agregar un día para incluir todo el día
+            fecha_hasta_obj += timedelta(days=1)
+            ventas_query = ventas_query.filter(fecha_venta__lt=fecha_hasta_obj)
+        except ValueError:
+            pass
+    
+    if estado:
+        ventas_query = ventas_query.filter(estado=estado)
+    
+    if metodo_pago:
+        ventas_query = ventas_query.filter(metodo_pago=metodo_pago)
+    
+    # Filtros sobre los productos vendidos: EXISTS sobre detalle_venta en lugar de
+    # JOIN + DISTINCT (no duplica ventas ni obliga a deduplicar en cada consulta)
+    if categoria_id:
+        ventas_query = ventas_query.filter(Exists(
+            DetalleVenta.objects.filter(venta=OuterRef('pk'), producto__categoria_id=categoria_id)
+        ))
+    
+    # Filtrar por producto (ID)
+    if producto_id:
+        ventas_query = ventas_query.filter(Exists(
+            DetalleVenta.objects.filter(venta=OuterRef('pk'), producto_id=producto_id)
+        ))
+    
+    # Filtrar por nombre de producto (búsqueda parcial, case-insensitive)
+    if producto_nombre:
+        ventas_query = ventas_query.filter(Exists(
+            DetalleVenta.objects.filter(venta=OuterRef('pk'), producto__nombre__icontains=producto_nombre)
+        ))
+    
+    return usuario, ventas_query, None
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class HistorialVentasView(View):
     """
@@ -36,98 +128,37 @@ class HistorialVentasView(View):
                     'message': 'Debe iniciar sesión para ver historial'
                 }, status=401)
             
-            # Obtener parámetros de filtro
-            fecha_desde = request.GET.get('fecha_desde')
-            fecha_hasta = request.GET.get('fecha_hasta')
-            estado = request.GET.get('estado')
-            metodo_pago = request.GET.get('metodo_pago')
-            categoria_id = request.GET.get('categoria_id')
-            producto_id = request.GET.get('producto_id')
-            producto_nombre = request.GET.get('producto_nombre')  # Búsqueda por nombre
-            cliente_id = request.GET.get('cliente_id')
+            # Obtener parámetros de paginación
             page = int(request.GET.get('page', 1))
             page_size = int(request.GET.get('page_size', 20))
             
-            # Obtener usuario y cliente
-            user_id = request.session.get('user_id')
-            try:
-                usuario = Usuario.objects.get(id=user_id)
-                
-                # Si es cliente, solo puede ver sus propias ventas
-                if usuario.id_rol.nombre.lower() == 'cliente':
-                    try:
-                        cliente = Cliente.objects.get(id=usuario)
-                        ventas_query = Venta.objects.filter(cliente=cliente)
-                    except Cliente.DoesNotExist:
-                        return JsonResponse({
-                            'success': False,
-                            'message': 'Cliente no encontrado'
-                        }, status=404)
-                else:
-                    # Admin puede ver todas las ventas o filtrar por cliente
-                    ventas_query = Venta.objects.all()
-                    if cliente_id:
-                        try:
-                            cliente = Cliente.objects.get(id=cliente_id)
-                            ventas_query = ventas_query.filter(cliente=cliente)
-                        except Cliente.DoesNotExist:
-                            pass
-            except Usuario.DoesNotExist:
-                return JsonResponse({
-                    'success': False,
-                    'message': 'Usuario no encontrado'
-                }, status=404)
-            
-            # Aplicar filtros
-            if fecha_desde:
-                try:
-                    fecha_desde_obj = datetime.strptime(fecha_desde, '%Y-%m-%d')
-                    ventas_query = ventas_query.filter(fecha_venta__gte=fecha_desde_obj)
-                except ValueError:
-                    pass
-            
-            if fecha_hasta:
-                try:
-                    fecha_hasta_obj = datetime.strptime(fecha_hasta, '%Y-%m-%d')
-                    # Agregar un día para incluir todo el día
-                    fecha_hasta_obj += timedelta(days=1)
-                    ventas_query = ventas_query.filter(fecha_venta__lt=fecha_hasta_obj)
-                except ValueError:
-                    pass
-            
-            if estado:
-                ventas_query = ventas_query.filter(estado=estado)
-            
-            if metodo_pago:
-                ventas_query = ventas_query.filter(metodo_pago=metodo_pago)
-            
-            # Filtrar por categoría (requiere join con detalles)
-            if categoria_id:
-                ventas_query = ventas_query.filter(
-                    detalles__producto__categoria_id=categoria_id
-                ).distinct()
-            
-            # Filtrar por producto (ID)
-            if producto_id:
-                ventas_query = ventas_query.filter(
-                    detalles__producto_id=producto_id
-                ).distinct()
-            
-            # Filtrar por nombre de producto (búsqueda parcial, case-insensitive)
-            if producto_nombre:
-                ventas_query = ventas_query.filter(
-                    detalles__producto__nombre__icontains=producto_nombre
-                ).distinct()
+            usuario, ventas_query, error = _filtrar_ventas(request)
+            if error:
+                return error
+            
+            # Estadísticas en una sola consulta con agregados condicionales;
+            # el total también alimenta al paginador (evita su COUNT aparte)
+            resumen = ventas_query.aggregate(
+                total_ventas=Count('pk'),
+                total_monto=Sum('total'),
+                ventas_completadas=Count('pk', filter=Q(estado='completada')),
+                ventas_pendientes=Count('pk', filter=Q(estado='pendiente')),
+                ventas_canceladas=Count('pk', filter=Q(estado='cancelada')),
+            )
+            resumen['total_monto'] = float(resumen['total_monto'] or 0)
+            total_ventas = resumen['total_ventas']
             
             # Ordenar por fecha descendente
-            ventas_query = ventas_query.select_related('cliente', 'cliente__id').prefetch_related(
+            ventas_query = ventas_query.select_related(
+                'cliente', 'cliente__id', 'comprobante', 'pago_online'
+            ).prefetch_related(
                 'detalles', 'detalles__producto'
             ).order_by('-fecha_venta')
             
             # Paginación
             paginator = Paginator(ventas_query, page_size)
+            paginator.count = total_ventas  # Ya calculado en las estadísticas
             total_pages = paginator.num_pages
-            total_ventas = paginator.count
             
             if page > total_pages:
                 page = total_pages
@@ -173,15 +204,6 @@ class HistorialVentasView(View):
                     } if hasattr(venta, 'pago_online') else None
                 })
             
-            # Calcular estadísticas
-            estadisticas = {
-                'total_ventas': total_ventas,
-                'total_monto': float(ventas_query.aggregate(Sum('total'))['total__sum'] or 0),
-                'ventas_completadas': ventas_query.filter(estado='completada').count(),
-                'ventas_pendientes': ventas_query.filter(estado='pendiente').count(),
-                'ventas_canceladas': ventas_query.filter(estado='cancelada').count(),
-            }
-            
             # Obtener información del usuario para el frontend
             user_role = usuario.id_rol.nombre.lower() if usuario.id_rol else 'cliente'
             
@@ -196,7 +218,7 @@ class HistorialVentasView(View):
                     'has_next': ventas_page.has_next(),
                     'has_previous': ventas_page.has_previous()
                 },
-                'estadisticas': estadisticas,
+                'estadisticas': resumen,
                 'user_role': user_role  # Información del rol para el frontend
             }, status=200)
             
@@ -208,11 +230,143 @@ class HistorialVentasView(View):
             }, status=500)
 
 
+class _Eco:
+    """Destino para csv.writer que devuelve la línea escrita en lugar de guardarla"""
+    
+    def write(self, linea):
+        return linea
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class HistorialExportarView(View):
+    """
+    CU13: Exportar Historial de Ventas
+    Descarga las ventas con los mismos filtros que HistorialVentasView, en CSV
+    (una fila por producto vendido) o NDJSON (un objeto JSON por venta).
+    GET /api/ventas/historial/exportar/?formato=csv|ndjson&fecha_desde=...&fecha_hasta=...
+    
+    Se genera en streaming sobre un cursor del servidor: las ventas se leen de a
+    CHUNK_VENTAS y sus detalles con una consulta por bloque, así la memoria no
+    crece con la cantidad de filas exportadas.
+    """
+    
+    CHUNK_VENTAS = 500
+    
+    COLUMNAS_CSV = [
+        'id_venta', 'fecha', 'estado', 'metodo_pago', 'total',
+        'cliente_id', 'cliente_nombre', 'cliente_email',
+        'producto_id', 'producto_nombre', 'cantidad', 'precio_unitario', 'subtotal'
+    ]
+    
+    def get(self, request):
+        """Exportar historial de ventas"""
+        try:
+            # Verificar autenticación
+            if not request.session.get('is_authenticated'):
+                return JsonResponse({
+                    'success': False,
+                    'message': 'Debe iniciar sesión para exportar historial'
+                }, status=401)
+            
+            formato = request.GET.get('formato', 'csv').lower()
+            if formato not in ('csv', 'ndjson'):
+                return JsonResponse({
+                    'success': False,
+                    'message': 'Formato no soportado. Use csv o ndjson'
+                }, status=400)
+            
+            _, ventas_query, error = _filtrar_ventas(request)
+            if error:
+                return error
+            
+            ventas_query = ventas_query.select_related('cliente', 'cliente__id').prefetch_related(
+                Prefetch('detalles', queryset=DetalleVenta.objects.select_related('producto').order_by('id_detalle'))
+            ).order_by('-fecha_venta', '-id_venta')
+            
+            # Con chunk_size, iterator() resuelve el prefetch de detalles bloque por bloque
+            ventas = ventas_query.iterator(chunk_size=self.CHUNK_VENTAS)
+            if formato == 'csv':
+                response = StreamingHttpResponse(self._generar_csv(ventas), content_type='text/csv; charset=utf-8')
+            else:
+                response = StreamingHttpResponse(self._generar_ndjson(ventas), content_type='application/x-ndjson')
+            
+            fecha_desde = request.GET.get('fecha_desde')
+            fecha_hasta = request.GET.get('fecha_hasta')
+            nombre = f"historial_ventas_{fecha_desde or 'inicio'}_{fecha_hasta or 'hoy'}.{formato}"
+            response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+            return response
+            
+        except Exception as e:
+            logger.error(f"Error en HistorialExportarView.get: {str(e)}", exc_info=True)
+            return JsonResponse({
+                'success': False,
+                'message': f'Error interno: {str(e)}'
+            }, status=500)
+    
+    @staticmethod
+    def _datos_cliente(venta):
+        usuario = venta.cliente.id
+        return {
+            'id': usuario.id,
+            'nombre': f"{usuario.nombre} {usuario.apellido or ''}".strip(),
+            'email': usuario.email
+        }
+    
+    @staticmethod
+    def _datos_detalle(detalle):
+        return {
+            'id': detalle.producto.id if detalle.producto else detalle.producto_id,
+            'nombre': detalle.producto.nombre if detalle.producto else f"Producto #{detalle.producto_id}",
+            'cantidad': detalle.cantidad,
+            'precio_unitario': float(detalle.precio_unitario),
+            'subtotal': float(detalle.subtotal)
+        }
+    
+    def _generar_csv(self, ventas):
+        """Una fila por producto vendido; una venta sin detalles ocupa una fila sin producto"""
+        writer = csv.writer(_Eco())
+        # BOM para que Excel abra el archivo como UTF-8
+        yield '\ufeff' + writer.writerow(self.COLUMNAS_CSV)
+        
+        for venta in ventas:
+            cliente = self._datos_cliente(venta)
+            fila_venta = [
+                venta.id_venta, venta.fecha_venta.isoformat(), venta.estado, venta.metodo_pago,
+                float(venta.total), cliente['id'], cliente['nombre'], cliente['email']
+            ]
+            detalles = [self._datos_detalle(detalle) for detalle in venta.detalles.all()]
+            if not detalles:
+                yield writer.writerow(fila_venta + [None] * 5)
+                continue
+            yield ''.join(
+                writer.writerow(fila_venta + [
+                    detalle['id'], detalle['nombre'], detalle['cantidad'],
+                    detalle['precio_unitario'], detalle['subtotal']
+                ])
+                for detalle in detalles
+            )
+    
+    def _generar_ndjson(self, ventas):
+        """Un objeto JSON por venta y por línea, con sus productos"""
+        for venta in ventas:
+            yield json.dumps({
+                'id': venta.id_venta,
+                'cliente': self._datos_cliente(venta),
+                'fecha': venta.fecha_venta.isoformat(),
+                'total': float(venta.total),
+                'estado': venta.estado,
+                'metodo_pago': venta.metodo_pago,
+                'direccion_entrega': venta.direccion_entrega,
+                'productos': [self._datos_detalle(detalle) for detalle in venta.detalles.all()]
+            }, ensure_ascii=False) + '\n'
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class HistorialFiltrosView(View):
     """
     Vista auxiliar para obtener opciones de filtros
-    Retorna listas de clientes y productos para usar en filtros
+    Retorna categorías, estados y métodos de pago, y solo las primeras opciones
+    de clientes y productos: el resto se busca con BusquedaFiltrosView
     """
     
     def get(self, request):
@@ -227,7 +381,7 @@ class HistorialFiltrosView(View):
             
             user_id = request.session.get('user_id')
             try:
-                usuario = Usuario.objects.get(id=user_id)
+                usuario = Usuario.objects.select_related('id_rol').get(id=user_id)
                 is_admin = usuario.id_rol.nombre.lower() == 'administrador'
             except Usuario.DoesNotExist:
                 return JsonResponse({
@@ -237,45 +391,19 @@ class HistorialFiltrosView(View):
             
             response_data = {
                 'success': True,
-                'is_admin': is_admin
+                'is_admin': is_admin,
+                'busqueda_url': '/api/ventas/historial/filtros/buscar/'
             }
             
-            # Solo admin puede ver lista de clientes
+            # Solo admin puede ver clientes (sugerencias iniciales; el resto por búsqueda)
             if is_admin:
-                clientes = Cliente.objects.select_related('id').all().order_by('id__nombre')
-                clientes_list = [
-                    {
-                        'id': cliente.id.id,
-                        'nombre': f"{cliente.id.nombre} {cliente.id.apellido or ''}".strip(),
-                        'email': cliente.id.email
-                    }
-                    for cliente in clientes
-                ]
-                response_data['clientes'] = clientes_list
-            
-            # Obtener lista de productos para filtro
-            from productos.models import Producto
-            productos = Producto.objects.all().order_by('nombre')[:100]  # Limitar a 100
-            productos_list = [
-                {
-                    'id': producto.id,
-                    'nombre': producto.nombre
-                }
-                for producto in productos
-            ]
-            response_data['productos'] = productos_list
-            
-            # Obtener categorías para filtro
-            from productos.models import Categoria
-            categorias = Categoria.objects.all().order_by('nombre')
-            categorias_list = [
-                {
-                    'id': categoria.id_categoria,
-                    'nombre': categoria.nombre
-                }
-                for categoria in categorias
-            ]
-            response_data['categorias'] = categorias_list
+                response_data['clientes'] = busqueda.buscar('clientes')
+            
+            # Productos: sugerencias iniciales; el resto por búsqueda
+            response_data['productos'] = busqueda.buscar('productos')
+            
+            # Categorías para filtro (lista corta, cacheada)
+            response_data['categorias'] = busqueda.categorias()
             
             # Métodos de pago disponibles - Solo Stripe
             response_data['metodos_pago'] = [
@@ -299,11 +427,70 @@ class HistorialFiltrosView(View):
             }, status=500)
 
 
+@method_decorator(csrf_exempt, name='dispatch')
+class BusquedaFiltrosView(View):
+    """
+    Búsqueda incremental (typeahead) para los filtros del historial y de los reportes
+    GET /api/ventas/historial/filtros/buscar/?entidad=clientes|productos|categorias&q=texto&limite=10
+    """
+    
+    def get(self, request):
+        """Buscar opciones de filtro que coinciden con el texto"""
+        try:
+            # Verificar autenticación
+            if not request.session.get('is_authenticated'):
+                return JsonResponse({
+                    'success': False,
+                    'message': 'Debe iniciar sesión'
+                }, status=401)
+            
+            entidad = request.GET.get('entidad')
+            if entidad not in busqueda.ENTIDADES:
+                return JsonResponse({
+                    'success': False,
+                    'message': f"entidad debe ser una de: {', '.join(busqueda.ENTIDADES)}"
+                }, status=400)
+            
+            # Solo admin puede buscar clientes
+            if entidad == 'clientes':
+                try:
+                    usuario = Usuario.objects.select_related('id_rol').get(id=request.session.get('user_id'))
+                except Usuario.DoesNotExist:
+                    return JsonResponse({
+                        'success': False,
+                        'message': 'Usuario no encontrado'
+                    }, status=404)
+                if usuario.id_rol.nombre.lower() != 'administrador':
+                    return JsonResponse({
+                        'success': False,
+                        'message': 'Solo administradores pueden buscar clientes'
+                    }, status=403)
+            
+            resultados = busqueda.buscar(
+                entidad,
+                request.GET.get('q', ''),
+                request.GET.get('limite', busqueda.LIMITE_DEFECTO)
+            )
+            
+            return JsonResponse({
+                'success': True,
+                'entidad': entidad,
+                'resultados': resultados
+            }, status=200)
+            
+        except Exception as e:
+            logger.error(f"Error en BusquedaFiltrosView.get: {str(e)}", exc_info=True)
+            return JsonResponse({
+                'success': False,
+                'message': f'Error interno: {str(e)}'
+            }, status=500)
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class HistorialAgregadoView(View):
     """
     CU13: Historial Agregado de Ventas
-    Retorna datos históricos agregados por fecha y categoría
+    Retorna datos históricos agregados por día, semana o mes y categoría
     """
     
     def get(self, request):
@@ -331,45 +518,38 @@ class HistorialAgregadoView(View):
             categoria_id = request.GET.get('categoria_id')
             agrupar_por = request.GET.get('agrupar_por', 'dia')  # dia, semana, mes
             
-            # Obtener historial
-            historial_query = VentaHistorico.objects.all()
+            if agrupar_por not in ('dia',) + historico.PERIODOS:
+                return JsonResponse({
+                    'success': False,
+                    'message': "agrupar_por debe ser 'dia', 'semana' o 'mes'"
+                }, status=400)
             
+            fecha_desde_obj = None
             if fecha_desde:
                 try:
                     fecha_desde_obj = datetime.strptime(fecha_desde, '%Y-%m-%d').date()
-                    historial_query = historial_query.filter(fecha__gte=fecha_desde_obj)
                 except ValueError:
                     pass
             
+            fecha_hasta_obj = None
             if fecha_hasta:
                 try:
                     fecha_hasta_obj = datetime.strptime(fecha_hasta, '%Y-%m-%d').date()
-                    historial_query = historial_query.filter(fecha__lte=fecha_hasta_obj)
                 except ValueError:
                     pass
             
-            if categoria_id:
-                historial_query = historial_query.filter(categoria_id=categoria_id)
-            
-            historial_query = historial_query.select_related('categoria').order_by('-fecha')
-            
-            # Serializar
-            historial_data = []
-            for hist in historial_query:
-                historial_data.append({
-                    'id': hist.id_his,
-                    'fecha': hist.fecha.isoformat(),
-                    'categoria': {
-                        'id': hist.categoria.id_categoria if hist.categoria else None,
-                        'nombre': hist.categoria.nombre if hist.categoria else 'General'
-                    },
-                    'cantidad_total': hist.cantidad_total,
-                    'monto_total': float(hist.monto_total),
-                    'ventas_count': hist.ventas_count
-                })
+            # Semanas y meses completos salen del nivel precalculado; los extremos
+            # del rango que cortan un período se agrupan desde el historial diario
+            historial_data = historico.consultar(
+                agrupar_por,
+                desde=fecha_desde_obj,
+                hasta=fecha_hasta_obj,
+                categoria_id=categoria_id
+            )
             
             return JsonResponse({
                 'success': True,
+                'agrupar_por': agrupar_por,
                 'historial': historial_data,
                 'total_registros': len(historial_data)
             }, status=200)
@@ -408,55 +588,28 @@ class SincronizarHistorialView(View):
                     'message': 'Solo administradores pueden sincronizar historial'
                 }, status=403)
             
-            # Obtener ventas completadas
-            ventas = Venta.objects.filter(estado='completada').select_related(
-                'cliente'
-            ).prefetch_related('detalles', 'detalles__producto', 'detalles__producto__categoria')
-            
-            registros_creados = 0
-            
-            # Agrupar por fecha y categoría
-            from collections import defaultdict
-            agrupacion = defaultdict(lambda: {
-                'cantidad_total': 0,
-                'monto_total': 0,
-                'ventas_count': 0
-            })
-            
-            for venta in ventas:
-                fecha = venta.fecha_venta.date()
-                
-                for detalle in venta.detalles.all():
-                    categoria_id = None
-                    if detalle.producto and detalle.producto.categoria:
-                        categoria_id = detalle.producto.categoria.id_categoria
-                    
-                    key = (fecha, categoria_id)
-                    agrupacion[key]['cantidad_total'] += detalle.cantidad
-                    agrupacion[key]['monto_total'] += float(detalle.subtotal)
-                
-                # Contar ventas por fecha (sin categoría)
-                key_general = (fecha, None)
-                agrupacion[key_general]['ventas_count'] += 1
-            
-            # Crear o actualizar registros
-            for (fecha, categoria_id), datos in agrupacion.items():
-                historial, created = VentaHistorico.objects.update_or_create(
-                    fecha=fecha,
-                    categoria_id=categoria_id,
-                    defaults={
-                        'cantidad_total': datos['cantidad_total'],
-                        'monto_total': datos['monto_total'],
-                        'ventas_count': datos['ventas_count']
-                    }
-                )
-                if created:
-                    registros_creados += 1
+            # Incremental por defecto; {"modo": "completo"} reconstruye todo el historial
+            try:
+                data = json.loads(request.body) if request.body else {}
+            except json.JSONDecodeError:
+                data = {}
+            modo = data.get('modo', 'incremental')
+            
+            if modo == 'completo':
+                resumen = historico.reconstruir()
+            elif modo == 'incremental':
+                resumen = historico.sincronizar_incremental()
+            else:
+                return JsonResponse({
+                    'success': False,
+                    'message': 'Modo no soportado. Use incremental o completo'
+                }, status=400)
             
             return JsonResponse({
                 'success': True,
-                'message': f'Historial sincronizado. {registros_creados} registros creados/actualizados.',
-                'registros_procesados': len(agrupacion)
+                'message': f"Historial sincronizado. {resumen['registros_procesados']} registros creados/actualizados.",
+                'modo': modo,
+                **resumen
             }, status=200)
             
         except Exception as e:
@@ -513,164 +666,10 @@ class DashboardStatsView(View):
                     'message': 'Solo administradores pueden ver estadísticas del dashboard'
                 }, status=403)
             
-            # Fechas para comparación
-            ahora = timezone.now()
-            inicio_mes_actual = ahora.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            
-            # Calcular inicio del mes anterior
-            if inicio_mes_actual.month == 1:
-                inicio_mes_anterior = inicio_mes_actual.replace(year=inicio_mes_actual.year - 1, month=12, day=1)
-            else:
-                inicio_mes_anterior = inicio_mes_actual.replace(month=inicio_mes_actual.month - 1, day=1)
-            
-            fin_mes_anterior = inicio_mes_actual - timedelta(seconds=1)
-            
-            # Ventas del mes actual
-            ventas_mes_actual = Venta.objects.filter(fecha_venta__gte=inicio_mes_actual, estado='completada')
-            total_ventas_mes = float(ventas_mes_actual.aggregate(Sum('total'))['total__sum'] or 0)
-            cantidad_ventas_mes = ventas_mes_actual.count()
-            
-            # Ventas del mes anterior
-            ventas_mes_anterior = Venta.objects.filter(
-                fecha_venta__gte=inicio_mes_anterior,
-                fecha_venta__lte=fin_mes_anterior,
-                estado='completada'
-            )
-            total_ventas_mes_anterior = float(ventas_mes_anterior.aggregate(Sum('total'))['total__sum'] or 0)
-            cantidad_ventas_mes_anterior = ventas_mes_anterior.count()
-            
-            # Calcular cambios porcentuales
-            cambio_ventas = 0
-            if total_ventas_mes_anterior > 0:
-                cambio_ventas = ((total_ventas_mes - total_ventas_mes_anterior) / total_ventas_mes_anterior) * 100
-            
-            cambio_pedidos = 0
-            if cantidad_ventas_mes_anterior > 0:
-                cambio_pedidos = ((cantidad_ventas_mes - cantidad_ventas_mes_anterior) / cantidad_ventas_mes_anterior) * 100
-            
-            # Nuevos clientes este mes - usar bitácora para determinar fecha de registro
-            clientes_mes_actual = Bitacora.objects.filter(
-                accion='REGISTRO_CLIENTE',
-                fecha__gte=inicio_mes_actual
-            ).count()
-            
-            # Nuevos clientes mes anterior
-            clientes_mes_anterior = Bitacora.objects.filter(
-                accion='REGISTRO_CLIENTE',
-                fecha__gte=inicio_mes_anterior,
-                fecha__lte=fin_mes_anterior
-            ).count()
-            
-            cambio_clientes = 0
-            if clientes_mes_anterior > 0:
-                cambio_clientes = ((clientes_mes_actual - clientes_mes_anterior) / clientes_mes_anterior) * 100
-            
-            # Productos disponibles (todos los productos en el sistema)
-            productos_activos = Producto.objects.count()
-            # Para el cambio porcentual, usamos el mismo valor ya que no hay historial
-            productos_activos_anterior = productos_activos
-            cambio_productos = 0.0
-            
-            # Ventas recientes (últimas 5)
-            ventas_recientes = Venta.objects.select_related('cliente', 'cliente__id').order_by('-fecha_venta')[:5]
-            ventas_recientes_data = []
-            for venta in ventas_recientes:
-                try:
-                    cliente_nombre = 'Cliente desconocido'
-                    if venta.cliente and venta.cliente.id:
-                        nombre = venta.cliente.id.nombre or ''
-                        apellido = venta.cliente.id.apellido or ''
-                        cliente_nombre = f"{nombre} {apellido}".strip() or 'Cliente sin nombre'
-                    
-                    ventas_recientes_data.append({
-                        'id': f'V-{venta.id_venta}',
-                        'client': cliente_nombre,
-                        'amount': float(venta.total or 0),
-                        'status': venta.estado or 'pendiente',
-                        'date': venta.fecha_venta.strftime('%d/%m/%Y') if venta.fecha_venta else 'Fecha desconocida'
-                    })
-                except Exception as e:
-                    logger.warning(f"Error procesando venta {venta.id_venta}: {str(e)}")
-                    continue
-            
-            # Productos más vendidos (top 4)
-            productos_top = DetalleVenta.objects.filter(
-                producto__isnull=False
-            ).values(
-                'producto__nombre', 'producto__precio'
-            ).annotate(
-                total_vendido=Sum('cantidad'),
-                monto_total=Sum('subtotal')
-            ).order_by('-total_vendido')[:4]
-            
-            top_products_data = []
-            for prod in productos_top:
-                if prod.get('producto__nombre'):
-                    top_products_data.append({
-                        'name': prod['producto__nombre'],
-                        'sales': prod.get('total_vendido', 0),
-                        'revenue': float(prod.get('monto_total') or 0)
-                    })
-            
-            # Ventas mensuales para gráfico (últimos 12 meses)
-            ventas_mensuales = []
-            for i in range(11, -1, -1):
-                mes_inicio = (ahora - timedelta(days=30*i)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                if i == 0:
-                    mes_fin = ahora
-                else:
-                    siguiente_mes = mes_inicio + timedelta(days=32)
-                    mes_fin = siguiente_mes.replace(day=1) - timedelta(seconds=1)
-                
-                ventas_mes = Venta.objects.filter(
-                    fecha_venta__gte=mes_inicio,
-                    fecha_venta__lte=mes_fin,
-                    estado='completada'
-                )
-                total_mes = float(ventas_mes.aggregate(Sum('total'))['total__sum'] or 0)
-                ventas_mensuales.append({
-                    'mes': mes_inicio.strftime('%b'),
-                    'total': total_mes
-                })
-            
-            # Calcular altura relativa para el gráfico (0-100%)
-            max_ventas = max([v['total'] for v in ventas_mensuales]) if ventas_mensuales else 1
-            ventas_mensuales_alturas = [
-                int((v['total'] / max_ventas) * 100) if max_ventas > 0 else 0
-                for v in ventas_mensuales
-            ]
-            
+            # Estadísticas cacheadas por rol unos segundos (se invalidan al completar ventas)
             return JsonResponse({
                 'success': True,
-                'stats': {
-                    'ventas_mes': {
-                        'value': total_ventas_mes,
-                        'change': cambio_ventas,
-                        'trend': 'up' if cambio_ventas >= 0 else 'down'
-                    },
-                    'total_pedidos': {
-                        'value': cantidad_ventas_mes,
-                        'change': cambio_pedidos,
-                        'trend': 'up' if cambio_pedidos >= 0 else 'down'
-                    },
-                    'nuevos_clientes': {
-                        'value': clientes_mes_actual,
-                        'change': cambio_clientes,
-                        'trend': 'up' if cambio_clientes >= 0 else 'down'
-                    },
-                    'productos_activos': {
-                        'value': productos_activos,
-                        'change': cambio_productos,
-                        'trend': 'down' if cambio_productos < 0 else 'up'
-                    }
-                },
-                'ventas_recientes': ventas_recientes_data,
-                'top_products': top_products_data,
-                'ventas_mensuales': {
-                    'labels': [v['mes'] for v in ventas_mensuales],
-                    'heights': ventas_mensuales_alturas,
-                    'values': [v['total'] for v in ventas_mensuales]
-                }
+                **estadisticas.obtener_dashboard(rol_nombre)
             }, status=200)
             
         except Exception as e:
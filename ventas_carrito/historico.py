@@ -0,0 +1,643 @@
+"""
+Sincronización del historial agregado de ventas desde las ventas (CU13).
+
+Niveles: diario (VentaHistorico) y, derivados de él, semanal y mensual
+(VentaHistoricoPeriodo). Cada fila es un (período, categoría); la fila sin
+categoría de cada período es la general y lleva el conteo de ventas.
+
+- En tiempo real: cada venta que pasa a 'completada' (o deja de estarlo) suma
+  o resta sus montos a las filas de su día, semana y mes con
+  UPDATE ... SET x = x + F, en la misma transacción que el cambio de estado.
+- Incremental: una marca de agua guarda la última `Venta.fecha_actualizacion`
+  procesada y solo se recalculan los días con ventas modificadas desde entonces
+  (una venta pendiente que se completa días después sigue contando).
+- Reconstrucción completa: recorre todos los días en bloques, sin cargar el
+  historial en memoria.
+
+Cada bloque de días se agrega en la base de datos (GROUP BY día y categoría) y
+se escribe con upserts en bloque; las semanas y meses que contienen esos días
+se recalculan desde el nivel diario. Las filas que ya no tienen ventas quedan
+en cero en lugar de eliminarse. Los días se cuentan en la zona horaria local
+(TIME_ZONE, America/La_Paz), igual que los meses del dashboard (estadisticas.py)
+y de la bitácora archivada. Un verificador periódico recalcula una muestra de
+días y repara desvíos.
+
+Concurrencia: todas las escrituras recorren las filas en el mismo orden
+(`_orden_filas`) y la creación de filas generales, que la restricción única no
+protege porque categoria es NULL, se serializa con un bloqueo sobre la marca.
+"""
+import heapq
+import itertools
+import logging
+import random
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from . import estadisticas, resumen_clientes
+from .models import DetalleVenta, MarcaSincronizacion, Venta, VentaHistorico, VentaHistoricoPeriodo
+
+logger = logging.getLogger(__name__)
+
+PROCESO = 'venta_historico'
+
+# Días recalculados por transacción
+DIAS_POR_BLOQUE = 31
+
+# Se relee este margen antes de la marca: una transacción que fijó
+# fecha_actualizacion antes de la marca pero confirmó después no se pierde
+MARGEN_RELECTURA = timedelta(minutes=5)
+
+CAMPOS_AGREGADOS = ['cantidad_total', 'monto_total', 'ventas_count']
+
+# Niveles derivados del diario, del más fino al más grueso
+PERIODOS = ('semana', 'mes')
+TRUNC_PERIODO = {'semana': TruncWeek, 'mes': TruncMonth}
+_ORDEN_PERIODO = {'dia': 0, 'semana': 1, 'mes': 2}
+
+
+# ==========================================================
+# PERÍODOS Y FILAS
+# ==========================================================
+
+def inicio_periodo(periodo, fecha):
+    """Primer día de la semana (lunes) o del mes que contiene `fecha`"""
+    if periodo == 'semana':
+        return fecha - timedelta(days=fecha.weekday())
+    if periodo == 'mes':
+        return fecha.replace(day=1)
+    return fecha
+
+
+def siguiente_periodo(periodo, inicio):
+    """Inicio del período siguiente al que empieza en `inicio`"""
+    if periodo == 'semana':
+        return inicio + timedelta(days=7)
+    if periodo == 'mes':
+        return (inicio.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return inicio + timedelta(days=1)
+
+
+def _filas(periodo, fecha, categoria_id):
+    if periodo == 'dia':
+        return VentaHistorico.objects.filter(fecha=fecha, categoria_id=categoria_id)
+    return VentaHistoricoPeriodo.objects.filter(periodo=periodo, fecha_inicio=fecha, categoria_id=categoria_id)
+
+
+def _nueva_fila(periodo, fecha, categoria_id, **valores):
+    if periodo == 'dia':
+        return VentaHistorico(fecha=fecha, categoria_id=categoria_id, **valores)
+    return VentaHistoricoPeriodo(periodo=periodo, fecha_inicio=fecha, categoria_id=categoria_id, **valores)
+
+
+def _orden_filas(item):
+    """
+    Orden de escritura común a la sincronización y a la actualización en tiempo
+    real (por nivel; dentro de cada nivel las filas generales al final) para que
+    dos transacciones no se esperen en cruz.
+    """
+    (periodo, fecha, categoria_id), _ = item
+    return _ORDEN_PERIODO[periodo], categoria_id is None, fecha, categoria_id or 0
+
+
+def _bloquear_filas_generales():
+    """
+    Serializa la creación de filas generales (categoria NULL), que la
+    restricción única no protege, con un bloqueo sobre la marca del proceso
+    """
+    MarcaSincronizacion.objects.get_or_create(proceso=PROCESO)
+    MarcaSincronizacion.objects.select_for_update().filter(proceso=PROCESO).exists()
+
+
+# ==========================================================
+# RECÁLCULO DESDE LAS VENTAS
+# ==========================================================
+
+def _dia(campo):
+    return TruncDate(campo, tzinfo=timezone.get_current_timezone())
+
+
+def _rango_local(dias):
+    inicio = timezone.make_aware(datetime.combine(min(dias), time.min))
+    fin = timezone.make_aware(datetime.combine(max(dias) + timedelta(days=1), time.min))
+    return inicio, fin
+
+
+def _agregar_dias(dias):
+    """Agregados por (fecha, categoria_id) de las ventas completadas de `dias`"""
+    inicio, fin = _rango_local(dias)
+    agregados = {}
+
+    por_categoria = (
+        DetalleVenta.objects
+        .filter(venta__estado='completada', venta__fecha_venta__gte=inicio, venta__fecha_venta__lt=fin)
+        .annotate(dia=_dia('venta__fecha_venta'))
+        .filter(dia__in=dias)
+        .values('dia', 'producto__categoria_id')
+        .annotate(cantidad_total=Sum('cantidad'), monto_total=Sum('subtotal'))
+        .order_by()
+    )
+    for fila in por_categoria:
+        agregados[(fila['dia'], fila['producto__categoria_id'])] = {
+            'cantidad_total': fila['cantidad_total'] or 0,
+            'monto_total': fila['monto_total'] or 0,
+            'ventas_count': 0,
+        }
+
+    # El conteo de ventas va en la fila general (sin categoría) de cada día
+    ventas_por_dia = (
+        Venta.objects
+        .filter(estado='completada', fecha_venta__gte=inicio, fecha_venta__lt=fin)
+        .annotate(dia=_dia('fecha_venta'))
+        .filter(dia__in=dias)
+        .values('dia')
+        .annotate(ventas_count=Count('pk'))
+        .order_by()
+    )
+    for fila in ventas_por_dia:
+        datos = agregados.setdefault(
+            (fila['dia'], None), {'cantidad_total': 0, 'monto_total': 0, 'ventas_count': 0}
+        )
+        datos['ventas_count'] = fila['ventas_count']
+
+    return agregados
+
+
+def _agregar_periodos(periodo, inicios):
+    """Agregados por (inicio, categoria_id) de los períodos `inicios`, sumados desde el nivel diario"""
+    inicios = sorted(inicios)
+    por_periodo = (
+        VentaHistorico.objects
+        .filter(fecha__gte=inicios[0], fecha__lt=siguiente_periodo(periodo, inicios[-1]))
+        .annotate(inicio=TRUNC_PERIODO[periodo]('fecha'))
+        .filter(inicio__in=inicios)
+        .values('inicio', 'categoria_id')
+        .annotate(
+            cantidad_total=Sum('cantidad_total'),
+            monto_total=Sum('monto_total'),
+            ventas_count=Sum('ventas_count')
+        )
+        .order_by()
+    )
+    agregados = {}
+    for fila in por_periodo:
+        datos = {campo: fila[campo] or 0 for campo in CAMPOS_AGREGADOS}
+        # Las filas diarias en cero no generan filas del período
+        if any(datos.values()):
+            agregados[(fila['inicio'], fila['categoria_id'])] = datos
+    return agregados
+
+
+def _existentes(periodo, fechas):
+    """{(fecha, categoria_id): pk} de las filas guardadas del nivel para `fechas`"""
+    if periodo == 'dia':
+        filas = VentaHistorico.objects.filter(fecha__in=fechas).values_list('id_his', 'fecha', 'categoria_id')
+    else:
+        filas = VentaHistoricoPeriodo.objects.filter(periodo=periodo, fecha_inicio__in=fechas).values_list(
+            'id_his_periodo', 'fecha_inicio', 'categoria_id'
+        )
+    return {(fecha, categoria_id): pk for pk, fecha, categoria_id in filas}
+
+
+def _escribir_nivel(periodo, agregados, existentes):
+    """
+    Upsert en bloque de los agregados de un nivel. Las filas existentes que ya
+    no tienen ventas quedan en cero: borrarlas tomaría sus bloqueos fuera del
+    orden de `_orden_filas`. Retorna la cantidad de filas vaciadas.
+    """
+    vacias = {clave: dict.fromkeys(CAMPOS_AGREGADOS, 0) for clave in existentes.keys() - agregados.keys()}
+    filas = sorted(
+        (((periodo, fecha, categoria_id), datos) for (fecha, categoria_id), datos in {**agregados, **vacias}.items()),
+        key=_orden_filas
+    )
+
+    por_categoria = []
+    generales = []
+    for (_, fecha, categoria_id), datos in filas:
+        fila = _nueva_fila(periodo, fecha, categoria_id, **datos)
+        if categoria_id is None:
+            # (fecha, NULL) no dispara ON CONFLICT: se actualiza por su clave primaria
+            fila.pk = existentes.get((fecha, None))
+            generales.append(fila)
+        else:
+            por_categoria.append(fila)
+
+    modelo = VentaHistorico if periodo == 'dia' else VentaHistoricoPeriodo
+    if por_categoria:
+        modelo.objects.bulk_create(
+            por_categoria,
+            update_conflicts=True,
+            unique_fields=['fecha', 'categoria'] if periodo == 'dia' else ['periodo', 'fecha_inicio', 'categoria'],
+            update_fields=CAMPOS_AGREGADOS
+        )
+    if generales:
+        modelo.objects.bulk_create(
+            generales,
+            update_conflicts=True,
+            unique_fields=[modelo._meta.pk.name],
+            update_fields=CAMPOS_AGREGADOS
+        )
+    return len(vacias)
+
+
+def _recalcular_periodos(periodo, inicios):
+    """Reescribe los períodos `inicios` desde el nivel diario. Requiere el bloqueo de la marca."""
+    inicios = sorted(set(inicios))
+    return _escribir_nivel(periodo, _agregar_periodos(periodo, inicios), _existentes(periodo, inicios))
+
+
+def recalcular_dias(dias):
+    """
+    Recalcula y escribe el historial de `dias` (lista de fechas locales) y de las
+    semanas y meses que los contienen. Retorna (filas diarias escritas, filas
+    diarias vaciadas).
+    """
+    dias = sorted(set(dias))
+    if not dias:
+        return 0, 0
+
+    with transaction.atomic():
+        # El bloqueo se toma antes que cualquier fila, igual que en aplicar_ventas
+        _bloquear_filas_generales()
+        agregados = _agregar_dias(dias)
+        vaciadas = _escribir_nivel('dia', agregados, _existentes('dia', dias))
+        for periodo in PERIODOS:
+            _recalcular_periodos(periodo, {inicio_periodo(periodo, dia) for dia in dias})
+
+    return len(agregados), vaciadas
+
+
+def _dias_a_recorrer():
+    """Días con ventas completadas o con historial, en orden y sin repetir (streaming)"""
+    dias_ventas = (
+        Venta.objects.filter(estado='completada')
+        .annotate(dia=_dia('fecha_venta'))
+        .values_list('dia', flat=True)
+        .distinct()
+        .order_by('dia')
+        .iterator()
+    )
+    dias_historial = (
+        VentaHistorico.objects.values_list('fecha', flat=True).distinct().order_by('fecha').iterator()
+    )
+    for dia, _ in itertools.groupby(heapq.merge(dias_ventas, dias_historial)):
+        yield dia
+
+
+def _procesar_por_bloques(dias, dias_por_bloque):
+    resumen = {'dias_recalculados': 0, 'registros_procesados': 0, 'registros_vaciados': 0}
+    dias = iter(dias)
+    while True:
+        bloque = list(itertools.islice(dias, dias_por_bloque))
+        if not bloque:
+            break
+        escritos, vaciados = recalcular_dias(bloque)
+        resumen['dias_recalculados'] += len(bloque)
+        resumen['registros_procesados'] += escritos
+        resumen['registros_vaciados'] += vaciados
+    return resumen
+
+
+def _guardar_marca(ultima_fecha):
+    if ultima_fecha is None:
+        return
+    MarcaSincronizacion.objects.update_or_create(proceso=PROCESO, defaults={'ultima_fecha': ultima_fecha})
+
+
+def reconstruir(dias_por_bloque=DIAS_POR_BLOQUE):
+    """Recalcula todo el historial, un bloque de días por transacción"""
+    # La marca se toma antes de recorrer: lo que cambie durante la reconstrucción
+    # se vuelve a procesar en la siguiente sincronización incremental
+    hasta = Venta.objects.aggregate(ultima=Max('fecha_actualizacion'))['ultima']
+    resumen = _procesar_por_bloques(_dias_a_recorrer(), dias_por_bloque)
+    _guardar_marca(hasta)
+    logger.info(f"VentaHistorico reconstruido: {resumen}")
+    return resumen
+
+
+def sincronizar_incremental(dias_por_bloque=DIAS_POR_BLOQUE):
+    """
+    Recalcula solo los días con ventas modificadas desde la última marca.
+    Sin marca previa equivale a una reconstrucción completa.
+    """
+    marca = MarcaSincronizacion.objects.filter(proceso=PROCESO).first()
+    if marca is None or marca.ultima_fecha is None:
+        return reconstruir(dias_por_bloque)
+
+    cambios = Venta.objects.filter(fecha_actualizacion__gt=marca.ultima_fecha - MARGEN_RELECTURA)
+    hasta = cambios.aggregate(ultima=Max('fecha_actualizacion'))['ultima']
+    if hasta is None:
+        return {'dias_recalculados': 0, 'registros_procesados': 0, 'registros_vaciados': 0}
+
+    dias = (
+        cambios.filter(fecha_actualizacion__lte=hasta)
+        .annotate(dia=_dia('fecha_venta'))
+        .values_list('dia', flat=True)
+        .distinct()
+        .order_by('dia')
+    )
+    resumen = _procesar_por_bloques(dias.iterator(), dias_por_bloque)
+    _guardar_marca(max(hasta, marca.ultima_fecha))
+    return resumen
+
+
+# ==========================================================
+# ACTUALIZACIÓN EN TIEMPO REAL
+# ==========================================================
+
+def _sumar_fila(periodo, fecha, categoria_id, cantidad_total, monto_total, ventas_count):
+    """UPDATE aditivo de una fila del historial; la crea si todavía no existe"""
+    filas = _filas(periodo, fecha, categoria_id)
+    deltas = {
+        'cantidad_total': F('cantidad_total') + cantidad_total,
+        'monto_total': F('monto_total') + monto_total,
+        'ventas_count': F('ventas_count') + ventas_count,
+    }
+    if filas.update(**deltas):
+        return
+
+    nueva = _nueva_fila(
+        periodo, fecha, categoria_id,
+        cantidad_total=cantidad_total,
+        monto_total=monto_total,
+        ventas_count=ventas_count
+    )
+    if categoria_id is None:
+        _bloquear_filas_generales()
+        if not filas.update(**deltas):
+            nueva.save()
+        return
+
+    try:
+        with transaction.atomic():
+            nueva.save()
+    except IntegrityError:
+        # Otra transacción creó la fila primero
+        filas.update(**deltas)
+
+
+def aplicar_ventas(venta_ids, signo=1):
+    """
+    Suma (signo=1) o resta (signo=-1) las ventas indicadas en el historial
+    diario, semanal y mensual. Debe llamarse dentro de la transacción que
+    cambia su estado.
+    """
+    venta_ids = list(venta_ids)
+    if not venta_ids:
+        return
+
+    por_categoria = (
+        DetalleVenta.objects.filter(venta_id__in=venta_ids)
+        .annotate(dia=_dia('venta__fecha_venta'))
+        .values('dia', 'producto__categoria_id')
+        .annotate(cantidad_total=Sum('cantidad'), monto_total=Sum('subtotal'))
+        .order_by()
+    )
+    ventas_por_dia = dict(
+        Venta.objects.filter(id_venta__in=venta_ids)
+        .annotate(dia=_dia('fecha_venta'))
+        .values('dia')
+        .annotate(ventas_count=Count('pk'))
+        .order_by()
+        .values_list('dia', 'ventas_count')
+    )
+
+    diarios = {}
+    for fila in por_categoria:
+        diarios[(fila['dia'], fila['producto__categoria_id'])] = [fila['cantidad_total'] or 0, fila['monto_total'] or 0, 0]
+    for dia, ventas_count in ventas_por_dia.items():
+        diarios.setdefault((dia, None), [0, 0, 0])[2] = ventas_count
+
+    # Cada delta diario se suma también a su semana y a su mes
+    deltas = {}
+    for (dia, categoria_id), valores in diarios.items():
+        for periodo in ('dia',) + PERIODOS:
+            acumulado = deltas.setdefault((periodo, inicio_periodo(periodo, dia), categoria_id), [0, 0, 0])
+            for i, valor in enumerate(valores):
+                acumulado[i] += valor
+
+    # Si hay que crear filas generales, el bloqueo se toma antes de tocar
+    # cualquier fila, en el mismo orden que recalcular_dias
+    if any(
+        not _filas(periodo, fecha, categoria_id).exists()
+        for periodo, fecha, categoria_id in deltas if categoria_id is None
+    ):
+        _bloquear_filas_generales()
+
+    for (periodo, fecha, categoria_id), (cantidad_total, monto_total, ventas_count) in sorted(
+        deltas.items(), key=_orden_filas
+    ):
+        _sumar_fila(periodo, fecha, categoria_id, signo * cantidad_total, signo * monto_total, signo * ventas_count)
+
+    # Totales por cliente (detalle, reporte de clientes, clientes activos)
+    resumen_clientes.actualizar_por_ventas(venta_ids)
+
+    # Las estadísticas del dashboard dejan de ser válidas cuando la venta se confirma
+    transaction.on_commit(estadisticas.invalidar_cache)
+
+
+def registrar_cambio_estado(venta, estado_anterior):
+    """Actualiza el historial si la venta entró o salió del estado 'completada'"""
+    if estado_anterior != 'completada' and venta.estado == 'completada':
+        aplicar_ventas([venta.id_venta], signo=1)
+    elif estado_anterior == 'completada' and venta.estado != 'completada':
+        aplicar_ventas([venta.id_venta], signo=-1)
+
+
+# ==========================================================
+# CONSULTA POR NIVELES
+# ==========================================================
+
+def _fila_consulta(fecha, categoria_id, categoria_nombre, datos, **extra):
+    return {
+        **extra,
+        'fecha': fecha.isoformat(),
+        'categoria': {
+            'id': categoria_id,
+            'nombre': categoria_nombre if categoria_id else 'General'
+        },
+        'cantidad_total': datos['cantidad_total'],
+        'monto_total': float(datos['monto_total']),
+        'ventas_count': datos['ventas_count']
+    }
+
+
+def _rangos_parciales(periodo, desde, hasta):
+    """
+    Divide [desde, hasta] en los períodos completos (primero, fin), que se leen
+    del nivel del período, y los extremos parciales, que se agrupan desde el
+    nivel diario. Los límites None quedan abiertos; completos es None si el
+    rango no contiene ningún período entero.
+    """
+    primero = None
+    if desde is not None:
+        primero = inicio_periodo(periodo, desde)
+        if primero != desde:
+            primero = siguiente_periodo(periodo, primero)
+    fin = inicio_periodo(periodo, hasta + timedelta(days=1)) if hasta is not None else None
+
+    if primero is not None and fin is not None and primero >= fin:
+        return None, [(desde, hasta)]
+
+    parciales = []
+    if primero is not None and desde < primero:
+        parciales.append((desde, primero - timedelta(days=1)))
+    if fin is not None and fin <= hasta:
+        parciales.append((fin, hasta))
+    return (primero, fin), parciales
+
+
+def consultar(periodo, desde=None, hasta=None, categoria_id=None):
+    """
+    Historial agregado por 'dia', 'semana' o 'mes' entre `desde` y `hasta`
+    (inclusive), de la fecha más reciente a la más antigua. Los períodos
+    completos salen del nivel precalculado; los extremos que cortan un período
+    se agrupan desde el nivel diario y se marcan como parciales.
+    """
+    if periodo == 'dia':
+        filas = VentaHistorico.objects.select_related('categoria').exclude(
+            cantidad_total=0, monto_total=0, ventas_count=0
+        )
+        if desde is not None:
+            filas = filas.filter(fecha__gte=desde)
+        if hasta is not None:
+            filas = filas.filter(fecha__lte=hasta)
+        if categoria_id:
+            filas = filas.filter(categoria_id=categoria_id)
+        return [
+            _fila_consulta(
+                fila.fecha, fila.categoria_id, fila.categoria.nombre if fila.categoria else None,
+                {campo: getattr(fila, campo) for campo in CAMPOS_AGREGADOS},
+                id=fila.id_his, periodo='dia', parcial=False
+            )
+            for fila in filas.order_by('-fecha')
+        ]
+
+    completos, parciales = _rangos_parciales(periodo, desde, hasta)
+    resultado = []
+
+    if completos is not None:
+        primero, fin = completos
+        filas = VentaHistoricoPeriodo.objects.select_related('categoria').filter(periodo=periodo).exclude(
+            cantidad_total=0, monto_total=0, ventas_count=0
+        )
+        if primero is not None:
+            filas = filas.filter(fecha_inicio__gte=primero)
+        if fin is not None:
+            filas = filas.filter(fecha_inicio__lt=fin)
+        if categoria_id:
+            filas = filas.filter(categoria_id=categoria_id)
+        resultado.extend(
+            _fila_consulta(
+                fila.fecha_inicio, fila.categoria_id, fila.categoria.nombre if fila.categoria else None,
+                {campo: getattr(fila, campo) for campo in CAMPOS_AGREGADOS},
+                id=fila.id_his_periodo, periodo=periodo, parcial=False
+            )
+            for fila in filas
+        )
+
+    if parciales:
+        en_rango = Q()
+        for inicio, ultimo in parciales:
+            en_rango |= Q(fecha__gte=inicio, fecha__lte=ultimo)
+        bordes = VentaHistorico.objects.filter(en_rango)
+        if categoria_id:
+            bordes = bordes.filter(categoria_id=categoria_id)
+        bordes = (
+            bordes.annotate(inicio=TRUNC_PERIODO[periodo]('fecha'))
+            .values('inicio', 'categoria_id', 'categoria__nombre')
+            .annotate(
+                cantidad_total=Sum('cantidad_total'),
+                monto_total=Sum('monto_total'),
+                ventas_count=Sum('ventas_count')
+            )
+            .order_by()
+        )
+        for fila in bordes:
+            datos = {campo: fila[campo] or 0 for campo in CAMPOS_AGREGADOS}
+            if any(datos.values()):
+                resultado.append(_fila_consulta(
+                    fila['inicio'], fila['categoria_id'], fila['categoria__nombre'], datos,
+                    id=None, periodo=periodo, parcial=True
+                ))
+
+    resultado.sort(key=lambda fila: fila['fecha'], reverse=True)
+    return resultado
+
+
+# ==========================================================
+# VERIFICACIÓN DE DESVÍOS
+# ==========================================================
+
+def _valores_guardados(periodo, fechas):
+    """{(fecha, categoria_id): valores} de las filas del nivel, sin las que están en cero"""
+    if periodo == 'dia':
+        filas = VentaHistorico.objects.filter(fecha__in=fechas).values_list(
+            'fecha', 'categoria_id', *CAMPOS_AGREGADOS
+        )
+    else:
+        filas = VentaHistoricoPeriodo.objects.filter(periodo=periodo, fecha_inicio__in=fechas).values_list(
+            'fecha_inicio', 'categoria_id', *CAMPOS_AGREGADOS
+        )
+    return {
+        (fecha, categoria_id): dict(zip(CAMPOS_AGREGADOS, valores))
+        for fecha, categoria_id, *valores in filas
+        if any(valores)
+    }
+
+
+def _fechas_con_desvio(calculados, guardados):
+    return sorted({
+        fecha for fecha, categoria_id in calculados.keys() | guardados.keys()
+        if calculados.get((fecha, categoria_id)) != guardados.get((fecha, categoria_id))
+    })
+
+
+def _muestra_dias(recientes, aleatorios):
+    """Los últimos `recientes` días más `aleatorios` días al azar del rango con historial"""
+    hoy = timezone.localdate()
+    dias = {hoy - timedelta(days=i) for i in range(recientes)}
+
+    primero = VentaHistorico.objects.aggregate(primero=Min('fecha'))['primero']
+    if primero and aleatorios:
+        rango = (hoy - primero).days + 1
+        dias.update(primero + timedelta(days=i) for i in random.sample(range(rango), min(aleatorios, rango)))
+    return sorted(dias)
+
+
+def verificar(recientes=7, aleatorios=30):
+    """
+    Recalcula una muestra de días desde las ventas y sus semanas y meses desde
+    el nivel diario, los compara con lo guardado y repara lo que no coincide.
+    Retorna un resumen.
+    """
+    dias = _muestra_dias(recientes, aleatorios)
+    resumen = {'dias_verificados': len(dias), 'dias_reparados': 0, 'periodos_reparados': 0}
+
+    for inicio in range(0, len(dias), DIAS_POR_BLOQUE):
+        bloque = dias[inicio:inicio + DIAS_POR_BLOQUE]
+        con_desvio = _fechas_con_desvio(_agregar_dias(bloque), _valores_guardados('dia', bloque))
+        if con_desvio:
+            logger.warning(f"VentaHistorico con desvíos en {len(con_desvio)} días: {con_desvio[:10]}")
+            recalcular_dias(con_desvio)
+            resumen['dias_reparados'] += len(con_desvio)
+
+    # Semanas y meses de la muestra contra la suma de sus días
+    for periodo in PERIODOS:
+        inicios = sorted({inicio_periodo(periodo, dia) for dia in dias})
+        if not inicios:
+            continue
+        con_desvio = _fechas_con_desvio(_agregar_periodos(periodo, inicios), _valores_guardados(periodo, inicios))
+        if con_desvio:
+            logger.warning(
+                f"VentaHistoricoPeriodo ({periodo}) con desvíos en {len(con_desvio)} períodos: {con_desvio[:10]}"
+            )
+            with transaction.atomic():
+                _bloquear_filas_generales()
+                _recalcular_periodos(periodo, con_desvio)
+            resumen['periodos_reparados'] += len(con_desvio)
+
+    return resumen
@@ -0,0 +1,67 @@
+"""
+Comando para conciliar pagos Stripe pendientes cuyo navegador nunca llamó a verify
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from ventas_carrito.conciliacion import PasarelaStripe, conciliar_pagos_pendientes
+
+
+class Command(BaseCommand):
+    help = 'Consulta en lote el estado de los PaymentIntents de pagos pendientes y aplica los cambios en bloque'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Pagos pendientes por lote (default: 100)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Máximo de consultas simultáneas a Stripe (default: 8)'
+        )
+        parser.add_argument(
+            '--minutos',
+            type=int,
+            default=10,
+            help='Solo conciliar pagos con al menos esta antigüedad en minutos (default: 10)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Consultar estados sin aplicar cambios',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            pasarela = PasarelaStripe(max_workers=options['workers'])
+        except ImportError:
+            self.stdout.write(self.style.ERROR('❌ Stripe no está instalado'))
+            return
+        pasarela.stripe.api_key = getattr(settings, 'STRIPE_SECRET_KEY', '')
+
+        resumen = conciliar_pagos_pendientes(
+            pasarela,
+            tamano_lote=options['batch_size'],
+            antiguedad_minima=timedelta(minutes=options['minutos']),
+            dry_run=options['dry_run']
+        )
+
+        prefijo = '[DRY RUN] ' if options['dry_run'] else ''
+        self.stdout.write(f"{prefijo}Pagos revisados: {resumen['revisados']}")
+        for status, cantidad in sorted(resumen['estados'].items()):
+            self.stdout.write(f'  - {status}: {cantidad}')
+        if resumen['sin_respuesta']:
+            self.stdout.write(self.style.WARNING(f"  - sin respuesta de Stripe: {resumen['sin_respuesta']}"))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefijo}✓ {resumen['ventas_completadas']} ventas completadas, "
+                f"{resumen['ventas_canceladas']} canceladas, "
+                f"{resumen['ventas_rechazadas']} rechazadas con reembolso "
+                f"({resumen['llamadas_api']} llamadas a la API en {resumen['segundos']}s)"
+            )
+        )
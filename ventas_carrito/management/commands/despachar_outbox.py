@@ -0,0 +1,64 @@
+"""
+Comando para procesar los efectos secundarios post-venta encolados en el outbox
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from ventas_carrito.outbox import despachar_lote
+
+
+class Command(BaseCommand):
+    help = 'Procesa por lotes los eventos pendientes del outbox (notificaciones, comprobantes, bitácora)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Cantidad de eventos por lote (default: 100)'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Seguir procesando indefinidamente (modo worker)'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2.0,
+            help='Segundos de espera entre lotes vacíos en modo --loop (default: 2)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        loop = options['loop']
+        intervalo = options['intervalo']
+
+        totales = {'procesados': 0, 'reintentos': 0, 'fallidos': 0}
+
+        try:
+            while True:
+                resumen = despachar_lote(batch_size)
+                for clave in totales:
+                    totales[clave] += resumen[clave]
+
+                if resumen['total']:
+                    self.stdout.write(
+                        f"Lote: {resumen['procesados']} procesados, "
+                        f"{resumen['reintentos']} reintentos, {resumen['fallidos']} fallidos"
+                    )
+
+                # Lote incompleto: no queda trabajo disponible por ahora
+                if resumen['total'] < batch_size:
+                    if not loop:
+                        break
+                    time.sleep(intervalo)
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✓ Outbox: {totales['procesados']} procesados, "
+                f"{totales['reintentos']} reintentos, {totales['fallidos']} fallidos"
+            )
+        )
@@ -0,0 +1,211 @@
+"""
+Comando para (re)generar en paralelo los PDFs de comprobantes, p. ej. tras un
+cambio de plantilla. Los PDFs vigentes (misma huella de contenido) se omiten.
+
+Con --checkpoint el avance se guarda en un JSON: el último id de venta de los
+lotes contiguos terminados y los ids que fallaron, que se reintentan al reanudar.
+"""
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+from ventas_carrito.models import Venta
+
+logger = logging.getLogger(__name__)
+
+
+def _inicializar_worker():
+    # Cada proceso hijo abre su propia conexión (no compartir la del padre)
+    connections.close_all()
+
+
+def _procesar_lote(venta_ids, forzar=False, crear_faltantes=False):
+    """
+    Renderiza los PDFs de un lote de ventas dentro de un proceso del pool.
+    Retorna (último id del lote, totales, ids de las ventas que fallaron).
+    """
+    from ventas_carrito.comprobantes_views import ComprobanteView
+
+    resultado = {'renderizados': 0, 'vigentes': 0, 'sin_comprobante': 0, 'errores': 0, 'paginas': 0}
+    fallidos = []
+    comprobante_view = ComprobanteView()
+    ventas = (
+        Venta.objects.filter(id_venta__in=venta_ids)
+        .select_related('cliente', 'cliente__id', 'comprobante')
+        .prefetch_related('detalles', 'detalles__producto')
+        .order_by('id_venta')
+    )
+
+    for venta in ventas:
+        try:
+            comprobante_view.paginas_generadas = 0
+            if not hasattr(venta, 'comprobante'):
+                if not crear_faltantes:
+                    resultado['sin_comprobante'] += 1
+                    continue
+                comprobante_view._generar_comprobante(venta, 'factura')
+            elif forzar:
+                pdf_path = comprobante_view._generar_pdf(venta.comprobante, venta)
+                comprobante_view._reemplazar_pdf(venta.comprobante, pdf_path)
+            else:
+                comprobante_view._obtener_pdf(venta.comprobante, venta)
+
+            if comprobante_view.paginas_generadas:
+                resultado['renderizados'] += 1
+                resultado['paginas'] += comprobante_view.paginas_generadas
+            else:
+                resultado['vigentes'] += 1
+        except Exception as e:
+            resultado['errores'] += 1
+            fallidos.append(venta.id_venta)
+            logger.error(f"Error generando PDF de la venta #{venta.id_venta}: {str(e)}")
+
+    connections.close_all()
+    return venta_ids[-1], resultado, fallidos
+
+
+class Command(BaseCommand):
+    help = 'Genera en paralelo los PDFs de comprobantes por rango de fechas o de ids, omitiendo los vigentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=str, help='Fecha inicial de venta (YYYY-MM-DD)')
+        parser.add_argument('--hasta', type=str, help='Fecha final de venta (YYYY-MM-DD)')
+        parser.add_argument('--id-desde', type=int, help='ID de venta inicial')
+        parser.add_argument('--id-hasta', type=int, help='ID de venta final')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 2,
+            help='Procesos en paralelo (default: número de CPUs)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=50,
+            help='Ventas por lote enviado a cada proceso (default: 50)'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            type=str,
+            help='Archivo JSON para guardar el avance y reanudar desde él'
+        )
+        parser.add_argument(
+            '--forzar',
+            action='store_true',
+            help='Volver a renderizar aunque el PDF esté vigente'
+        )
+        parser.add_argument(
+            '--crear-faltantes',
+            action='store_true',
+            help='Crear el comprobante de ventas completadas que aún no lo tienen'
+        )
+
+    def _leer_checkpoint(self, ruta):
+        """Retorna (último id completado, ids que fallaron y deben reintentarse)"""
+        if ruta and os.path.exists(ruta):
+            with open(ruta) as f:
+                datos = json.load(f)
+            return datos.get('ultimo_id', 0), set(datos.get('fallidos', []))
+        return 0, set()
+
+    def _guardar_checkpoint(self, ruta, ultimo_id, fallidos):
+        if not ruta:
+            return
+        tmp = f'{ruta}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'ultimo_id': ultimo_id, 'fallidos': sorted(fallidos), 'fecha': datetime.now().isoformat()}, f)
+        os.replace(tmp, ruta)
+
+    def handle(self, *args, **options):
+        ventas = Venta.objects.filter(estado='completada')
+        try:
+            if options['desde']:
+                ventas = ventas.filter(fecha_venta__date__gte=datetime.strptime(options['desde'], '%Y-%m-%d').date())
+            if options['hasta']:
+                ventas = ventas.filter(fecha_venta__date__lte=datetime.strptime(options['hasta'], '%Y-%m-%d').date())
+        except ValueError:
+            raise CommandError('Formato de fecha inválido. Use YYYY-MM-DD')
+        if options['id_desde']:
+            ventas = ventas.filter(id_venta__gte=options['id_desde'])
+        if options['id_hasta']:
+            ventas = ventas.filter(id_venta__lte=options['id_hasta'])
+        if not options['crear_faltantes']:
+            ventas = ventas.filter(comprobante__isnull=False)
+
+        checkpoint = options['checkpoint']
+        reanudar_desde, fallidos_previos = self._leer_checkpoint(checkpoint)
+        if reanudar_desde:
+            ventas = ventas.filter(Q(id_venta__gt=reanudar_desde) | Q(id_venta__in=fallidos_previos))
+            self.stdout.write(
+                f'Reanudando después de la venta #{reanudar_desde} '
+                f'(reintentando {len(fallidos_previos)} ventas con errores)'
+            )
+
+        venta_ids = list(ventas.order_by('id_venta').values_list('id_venta', flat=True))
+        if not venta_ids:
+            self.stdout.write(self.style.SUCCESS('✓ No hay comprobantes por generar'))
+            return
+
+        chunk_size = options['chunk_size']
+        lotes = [venta_ids[i:i + chunk_size] for i in range(0, len(venta_ids), chunk_size)]
+        self.stdout.write(f'Procesando {len(venta_ids)} ventas en {len(lotes)} lotes con {options["workers"]} procesos...')
+
+        totales = {'renderizados': 0, 'vigentes': 0, 'sin_comprobante': 0, 'errores': 0, 'paginas': 0}
+        # Los lotes terminan en desorden: el checkpoint avanza solo hasta el último lote contiguo completado.
+        # Las ventas con error quedan en el checkpoint para reintentarlas aunque su lote ya se haya pasado
+        fin_de_lote = [lote[-1] for lote in lotes]
+        ids_por_lote = {lote[-1]: lote for lote in lotes}
+        completados = set()
+        indice_contiguo = 0
+        # Fallidos de la corrida anterior cuyo lote aún no terminó, más los de esta corrida
+        fallidos = set(fallidos_previos)
+
+        # No heredar la conexión del proceso padre en los hijos
+        connections.close_all()
+        inicio = time.monotonic()
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_inicializar_worker) as pool:
+            futuros = [
+                pool.submit(_procesar_lote, lote, options['forzar'], options['crear_faltantes'])
+                for lote in lotes
+            ]
+            for futuro in as_completed(futuros):
+                ultimo_id, resultado, fallidos_lote = futuro.result()
+                for clave in totales:
+                    totales[clave] += resultado[clave]
+
+                completados.add(ultimo_id)
+                fallidos.difference_update(ids_por_lote[ultimo_id])
+                fallidos.update(fallidos_lote)
+                while indice_contiguo < len(fin_de_lote) and fin_de_lote[indice_contiguo] in completados:
+                    indice_contiguo += 1
+                if indice_contiguo:
+                    self._guardar_checkpoint(checkpoint, max(fin_de_lote[indice_contiguo - 1], reanudar_desde), fallidos)
+
+                transcurrido = time.monotonic() - inicio
+                self.stdout.write(
+                    f"  {len(completados)}/{len(lotes)} lotes - "
+                    f"{totales['paginas'] / transcurrido if transcurrido else 0:.1f} páginas/s"
+                )
+
+        transcurrido = time.monotonic() - inicio
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✓ {totales['renderizados']} PDFs renderizados ({totales['paginas']} páginas), "
+                f"{totales['vigentes']} vigentes omitidos, {totales['errores']} errores "
+                f"en {transcurrido:.1f}s ({totales['paginas'] / transcurrido if transcurrido else 0:.1f} páginas/s)"
+            )
+        )
+        if fallidos and checkpoint:
+            self.stdout.write(
+                self.style.WARNING(f"  {len(fallidos)} ventas con errores quedan en {checkpoint} para reintentarse")
+            )
+        if totales['sin_comprobante']:
+            self.stdout.write(
+                self.style.WARNING(f"  {totales['sin_comprobante']} ventas sin comprobante (use --crear-faltantes)")
+            )
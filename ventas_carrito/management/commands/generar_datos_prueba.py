@@ -448,7 +448,7 @@ class Command(BaseCommand):
                 notas=f'Venta generada automáticamente - {fecha_venta.strftime("%d/%m/%Y %H:%M")}'
             )
             # Actualizar fecha a la fecha histórica específica
-            Venta.objects.filter(id_venta=venta.id_venta).update(fecha_venta=fecha_venta)
+            Venta.objects.filter(id_venta=venta.id_venta).update(fecha_venta=fecha_venta, fecha_actualizacion=timezone.now())
             # Refrescar el objeto para tener la fecha actualizada
             venta.refresh_from_db()
             
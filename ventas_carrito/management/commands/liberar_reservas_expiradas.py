@@ -0,0 +1,39 @@
+"""
+Comando para liberar reservas de stock vencidas y cancelar ventas Stripe abandonadas
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from ventas_carrito.reservas import liberar_expiradas
+
+
+class Command(BaseCommand):
+    help = 'Libera reservas de stock expiradas y cancela en bloque las ventas pendientes abandonadas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Cantidad de reservas liberadas por transacción (default: 500)'
+        )
+        parser.add_argument(
+            '--horas-sin-reserva',
+            type=int,
+            default=24,
+            help='Cancelar ventas pendientes sin reservas más antiguas que estas horas (0 = no cancelar)'
+        )
+
+    def handle(self, *args, **options):
+        horas = options['horas_sin_reserva']
+        resumen = liberar_expiradas(
+            tamano_lote=options['batch_size'],
+            antiguedad_sin_reserva=timedelta(hours=horas) if horas > 0 else None
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✓ {resumen['reservas_liberadas']} reservas liberadas, "
+                f"{resumen['ventas_canceladas']} ventas pendientes canceladas"
+            )
+        )
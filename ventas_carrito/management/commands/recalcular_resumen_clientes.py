@@ -0,0 +1,37 @@
+"""
+Comando para recalcular el resumen de compras por cliente (ClienteResumen) y
+sus segmentos RFM. Pensado para ejecutarse cada noche (cron); la primera
+ejecución carga el resumen de los clientes existentes.
+"""
+from django.core.management.base import BaseCommand
+from ventas_carrito import resumen_clientes
+
+
+class Command(BaseCommand):
+    help = 'Recalcula ClienteResumen desde las ventas y reasigna los segmentos RFM'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--solo-segmentos',
+            action='store_true',
+            help='Recalcular solo los puntajes RFM y segmentos, sin releer las ventas'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=resumen_clientes.CLIENTES_POR_LOTE,
+            help=f'Clientes por transacción (default: {resumen_clientes.CLIENTES_POR_LOTE})'
+        )
+
+    def handle(self, *args, **options):
+        if options['solo_segmentos']:
+            resumen = {'clientes': 0, 'segmentos': resumen_clientes.recalcular_segmentos(options['lote'])}
+        else:
+            resumen = resumen_clientes.reconstruir(options['lote'])
+
+        segmentos = ', '.join(f"{segmento}: {cantidad}" for segmento, cantidad in sorted(resumen['segmentos'].items()))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✓ {resumen['clientes']} clientes recalculados. Segmentos: {segmentos or 'ninguno'}"
+            )
+        )
@@ -0,0 +1,37 @@
+"""
+Comando para sincronizar el historial agregado de ventas (VentaHistorico).
+Pensado para ejecutarse periódicamente (cron); por defecto es incremental.
+"""
+from django.core.management.base import BaseCommand
+from ventas_carrito import historico
+
+
+class Command(BaseCommand):
+    help = 'Sincroniza VentaHistorico de forma incremental o lo reconstruye por bloques de días'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--completo',
+            action='store_true',
+            help='Reconstruir todo el historial en lugar de solo los días modificados'
+        )
+        parser.add_argument(
+            '--dias-por-bloque',
+            type=int,
+            default=historico.DIAS_POR_BLOQUE,
+            help=f'Días recalculados por transacción (default: {historico.DIAS_POR_BLOQUE})'
+        )
+
+    def handle(self, *args, **options):
+        if options['completo']:
+            resumen = historico.reconstruir(options['dias_por_bloque'])
+        else:
+            resumen = historico.sincronizar_incremental(options['dias_por_bloque'])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✓ {resumen['dias_recalculados']} días recalculados, "
+                f"{resumen['registros_procesados']} registros creados/actualizados, "
+                f"{resumen['registros_vaciados']} vaciados"
+            )
+        )
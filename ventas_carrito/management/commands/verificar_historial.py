@@ -0,0 +1,35 @@
+"""
+Comando para verificar el historial agregado de ventas (VentaHistorico) que se
+mantiene en tiempo real: recalcula una muestra de días y repara los desvíos.
+Pensado para ejecutarse periódicamente (cron).
+"""
+from django.core.management.base import BaseCommand
+from ventas_carrito import historico
+
+
+class Command(BaseCommand):
+    help = 'Recalcula una muestra de días de VentaHistorico y repara los que no coinciden con las ventas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recientes',
+            type=int,
+            default=7,
+            help='Últimos días que siempre se verifican (default: 7)'
+        )
+        parser.add_argument(
+            '--aleatorios',
+            type=int,
+            default=30,
+            help='Días adicionales elegidos al azar de todo el historial (default: 30)'
+        )
+
+    def handle(self, *args, **options):
+        resumen = historico.verificar(recientes=options['recientes'], aleatorios=options['aleatorios'])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✓ {resumen['dias_verificados']} días verificados, {resumen['dias_reparados']} reparados, "
+                f"{resumen['periodos_reparados']} semanas/meses reparados"
+            )
+        )
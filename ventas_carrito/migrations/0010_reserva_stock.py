@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0005_cupondescuento_oferta'),
+        ('ventas_carrito', '0009_evento_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaStock',
+            fields=[
+                ('id_reserva', models.BigAutoField(primary_key=True, serialize=False)),
+                ('cantidad', models.PositiveIntegerField()),
+                ('estado', models.CharField(choices=[('activa', 'Activa'), ('confirmada', 'Confirmada'), ('liberada', 'Liberada')], default='activa', max_length=20)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_expiracion', models.DateTimeField()),
+                ('producto', models.ForeignKey(db_column='id_producto', on_delete=django.db.models.deletion.CASCADE, to='productos.producto')),
+                ('venta', models.ForeignKey(db_column='venta_id', on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='ventas_carrito.venta')),
+            ],
+            options={
+                'verbose_name': 'Reserva de Stock',
+                'verbose_name_plural': 'Reservas de Stock',
+                'db_table': 'reserva_stock',
+                'indexes': [models.Index(fields=['estado', 'fecha_expiracion'], name='reserva_estado_exp_idx'), models.Index(fields=['producto', 'estado'], name='reserva_producto_estado_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas_carrito', '0010_reserva_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaComprobante',
+            fields=[
+                ('id_secuencia', models.AutoField(primary_key=True, serialize=False)),
+                ('tipo', models.CharField(max_length=20)),
+                ('anio', models.PositiveIntegerField(default=0)),
+                ('ultimo_numero', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Secuencia de Comprobante',
+                'verbose_name_plural': 'Secuencias de Comprobante',
+                'db_table': 'secuencia_comprobante',
+                'unique_together': {('tipo', 'anio')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas_carrito', '0011_secuencia_comprobante'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaSincronizacion',
+            fields=[
+                ('id_marca', models.AutoField(primary_key=True, serialize=False)),
+                ('proceso', models.CharField(max_length=50, unique=True)),
+                ('ultima_fecha', models.DateTimeField(blank=True, null=True)),
+                ('fecha_ejecucion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Marca de Sincronización',
+                'verbose_name_plural': 'Marcas de Sincronización',
+                'db_table': 'marca_sincronizacion',
+            },
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
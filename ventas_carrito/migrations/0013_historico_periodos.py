@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def reiniciar_marca_historico(apps, schema_editor):
+    """La siguiente sincronización reconstruye todo y completa semanas y meses"""
+    MarcaSincronizacion = apps.get_model('ventas_carrito', 'MarcaSincronizacion')
+    MarcaSincronizacion.objects.filter(proceso='venta_historico').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0005_cupondescuento_oferta'),
+        ('ventas_carrito', '0012_historico_incremental'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaHistoricoPeriodo',
+            fields=[
+                ('id_his_periodo', models.AutoField(primary_key=True, serialize=False)),
+                ('periodo', models.CharField(choices=[('semana', 'Semana'), ('mes', 'Mes')], max_length=10)),
+                ('fecha_inicio', models.DateField()),
+                ('cantidad_total', models.IntegerField(default=0)),
+                ('monto_total', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('ventas_count', models.IntegerField(default=0)),
+                ('categoria', models.ForeignKey(blank=True, db_column='id_categoria', null=True, on_delete=django.db.models.deletion.SET_NULL, to='productos.categoria')),
+            ],
+            options={
+                'verbose_name': 'Historial de Venta por Período',
+                'verbose_name_plural': 'Historial de Ventas por Período',
+                'db_table': 'venta_historico_periodo',
+                'ordering': ['-fecha_inicio'],
+                'unique_together': {('periodo', 'fecha_inicio', 'categoria')},
+            },
+        ),
+        migrations.RunPython(reiniciar_marca_historico, migrations.RunPython.noop),
+    ]
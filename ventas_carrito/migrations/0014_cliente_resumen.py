@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autenticacion_usuarios', '0002_indices_busqueda'),
+        ('ventas_carrito', '0013_historico_periodos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClienteResumen',
+            fields=[
+                ('cliente', models.OneToOneField(db_column='id_cliente', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resumen', serialize=False, to='autenticacion_usuarios.cliente')),
+                ('total_compras', models.IntegerField(default=0)),
+                ('monto_total', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('monto_maximo', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('monto_minimo', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('primera_compra', models.DateTimeField(blank=True, null=True)),
+                ('ultima_compra', models.DateTimeField(blank=True, null=True)),
+                ('ultima_compra_monto', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('mes', models.DateField(blank=True, null=True)),
+                ('compras_mes', models.IntegerField(default=0)),
+                ('monto_mes', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('recencia', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('frecuencia', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('valor', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('segmento', models.CharField(choices=[('sin_compras', 'Sin compras'), ('campeon', 'Campeón'), ('leal', 'Leal'), ('potencial', 'Potencial'), ('nuevo', 'Nuevo'), ('en_riesgo', 'En riesgo'), ('hibernando', 'Hibernando'), ('perdido', 'Perdido')], default='sin_compras', max_length=20)),
+                ('fecha_segmento', models.DateTimeField(blank=True, null=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Resumen de Cliente',
+                'verbose_name_plural': 'Resúmenes de Clientes',
+                'db_table': 'cliente_resumen',
+                'indexes': [models.Index(fields=['mes', 'monto_mes'], name='cliente_resumen_mes_idx'), models.Index(fields=['segmento'], name='cliente_resumen_segmento_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:10
+
+from django.db import migrations
+
+
+def vaciar_historico(apps, schema_editor):
+    """
+    Los días pasan de UTC a hora local: se vacía el historial y se borra la
+    marca para que la siguiente sincronización lo reconstruya completo
+    """
+    apps.get_model('ventas_carrito', 'VentaHistorico').objects.all().delete()
+    apps.get_model('ventas_carrito', 'VentaHistoricoPeriodo').objects.all().delete()
+    apps.get_model('ventas_carrito', 'MarcaSincronizacion').objects.filter(proceso='venta_historico').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas_carrito', '0014_cliente_resumen'),
+    ]
+
+    operations = [
+        migrations.RunPython(vaciar_historico, vaciar_historico),
+    ]
@@ -58,6 +58,8 @@ class Venta(models.Model):
     metodo_pago = models.CharField(max_length=50, default='stripe')  # SOLO stripe
     direccion_entrega = models.CharField(max_length=255, blank=True, null=True)
     notas = models.TextField(blank=True, null=True)
+    # Último cambio de la venta; los .update() en bloque deben fijarlo explícitamente
+    fecha_actualizacion = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         db_table = 'venta'
@@ -115,7 +117,7 @@ class PagoOnline(models.Model):
     id_pago = models.AutoField(primary_key=True)
     venta = models.OneToOneField(Venta, on_delete=models.CASCADE, db_column='venta_id', related_name='pago_online')
     monto = models.DecimalField(max_digits=10, decimal_places=2)
-    estado = models.CharField(max_length=20, default='pendiente')  # pendiente, exitoso, fallido, rechazado
+    estado = models.CharField(max_length=20, default='pendiente')  # pendiente, exitoso, fallido, rechazado, reembolsado
     referencia = models.CharField(max_length=100, unique=True, blank=True, null=True)  # Número de referencia de transacción
     fecha = models.DateTimeField(auto_now_add=True)
     metodo_pago = models.ForeignKey(MetodoPago, on_delete=models.SET_NULL, null=True, blank=True, db_column='id_mp')
@@ -187,4 +189,176 @@ class VentaHistorico(models.Model):
     
     def __str__(self):
         cat = self.categoria.nombre if self.categoria else "General"
-        return f"Historial {self.fecha} - {cat} - {self.ventas_count} ventas - ${self.monto_total}"
\ No newline at end of file
+        return f"Historial {self.fecha} - {cat} - {self.ventas_count} ventas - ${self.monto_total}"
+
+
+class VentaHistoricoPeriodo(models.Model):
+    """Historial agregado por semana o mes, mantenido desde VentaHistorico (CU13)"""
+    PERIODOS = [
+        ('semana', 'Semana'),
+        ('mes', 'Mes'),
+    ]
+    
+    id_his_periodo = models.AutoField(primary_key=True)
+    periodo = models.CharField(max_length=10, choices=PERIODOS)
+    fecha_inicio = models.DateField()  # Lunes de la semana o primer día del mes
+    categoria = models.ForeignKey('productos.Categoria', on_delete=models.SET_NULL, null=True, blank=True, db_column='id_categoria')
+    cantidad_total = models.IntegerField(default=0)
+    monto_total = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    ventas_count = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'venta_historico_periodo'
+        verbose_name = 'Historial de Venta por Período'
+        verbose_name_plural = 'Historial de Ventas por Período'
+        ordering = ['-fecha_inicio']
+        unique_together = ('periodo', 'fecha_inicio', 'categoria')  # Un registro por período y categoría
+    
+    def __str__(self):
+        cat = self.categoria.nombre if self.categoria else "General"
+        return f"Historial {self.periodo} {self.fecha_inicio} - {cat} - {self.ventas_count} ventas - ${self.monto_total}"
+
+
+class ClienteResumen(models.Model):
+    """
+    Totales de las compras completadas de cada cliente, actualizados al completar
+    o cancelar una venta; el segmento RFM se recalcula cada noche en bloque
+    """
+    SEGMENTOS = [
+        ('sin_compras', 'Sin compras'),
+        ('campeon', 'Campeón'),
+        ('leal', 'Leal'),
+        ('potencial', 'Potencial'),
+        ('nuevo', 'Nuevo'),
+        ('en_riesgo', 'En riesgo'),
+        ('hibernando', 'Hibernando'),
+        ('perdido', 'Perdido'),
+    ]
+    
+    cliente = models.OneToOneField(Cliente, on_delete=models.CASCADE, primary_key=True, db_column='id_cliente', related_name='resumen')
+    total_compras = models.IntegerField(default=0)
+    monto_total = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    monto_maximo = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    monto_minimo = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    primera_compra = models.DateTimeField(null=True, blank=True)
+    ultima_compra = models.DateTimeField(null=True, blank=True)
+    ultima_compra_monto = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # Compras del mes `mes` (primer día, hora local); de otro mes equivalen a cero
+    mes = models.DateField(null=True, blank=True)
+    compras_mes = models.IntegerField(default=0)
+    monto_mes = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    # Puntajes RFM 1-5 (recencia, frecuencia, monto) del último recálculo nocturno
+    recencia = models.PositiveSmallIntegerField(null=True, blank=True)
+    frecuencia = models.PositiveSmallIntegerField(null=True, blank=True)
+    valor = models.PositiveSmallIntegerField(null=True, blank=True)
+    segmento = models.CharField(max_length=20, choices=SEGMENTOS, default='sin_compras')
+    fecha_segmento = models.DateTimeField(null=True, blank=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'cliente_resumen'
+        verbose_name = 'Resumen de Cliente'
+        verbose_name_plural = 'Resúmenes de Clientes'
+        indexes = [
+            models.Index(fields=['mes', 'monto_mes'], name='cliente_resumen_mes_idx'),
+            models.Index(fields=['segmento'], name='cliente_resumen_segmento_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Resumen cliente #{self.cliente_id} - {self.total_compras} compras - ${self.monto_total} - {self.segmento}"
+
+# ==========================================================
+# OUTBOX TRANSACCIONAL (efectos secundarios post-venta)
+# ==========================================================
+
+class EventoOutbox(models.Model):
+    """Efecto secundario pendiente, escrito en la misma transacción que la venta"""
+    ESTADOS_EVENTO = [
+        ('pendiente', 'Pendiente'),
+        ('procesado', 'Procesado'),
+        ('fallido', 'Fallido'),
+    ]
+    
+    id_evento = models.BigAutoField(primary_key=True)
+    tipo = models.CharField(max_length=50)  # notificar_nueva_venta, generar_comprobante, registrar_bitacora
+    payload = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADOS_EVENTO, default='pendiente')
+    intentos = models.PositiveIntegerField(default=0)
+    ultimo_error = models.TextField(blank=True, null=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_disponible = models.DateTimeField(db_index=True)  # No procesar antes de esta fecha (reintentos)
+    fecha_procesado = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        db_table = 'evento_outbox'
+        verbose_name = 'Evento Outbox'
+        verbose_name_plural = 'Eventos Outbox'
+        ordering = ['id_evento']
+        indexes = [
+            models.Index(fields=['estado', 'fecha_disponible'], name='outbox_estado_disp_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Evento #{self.id_evento} - {self.tipo} - {self.estado}"
+
+
+class ReservaStock(models.Model):
+    """Reserva temporal de stock para una venta pendiente de pago (Stripe)"""
+    ESTADOS_RESERVA = [
+        ('activa', 'Activa'),
+        ('confirmada', 'Confirmada'),
+        ('liberada', 'Liberada'),
+    ]
+    
+    id_reserva = models.BigAutoField(primary_key=True)
+    venta = models.ForeignKey(Venta, on_delete=models.CASCADE, related_name='reservas', db_column='venta_id')
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, db_column='id_producto')
+    cantidad = models.PositiveIntegerField()
+    estado = models.CharField(max_length=20, choices=ESTADOS_RESERVA, default='activa')
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_expiracion = models.DateTimeField()
+    
+    class Meta:
+        db_table = 'reserva_stock'
+        verbose_name = 'Reserva de Stock'
+        verbose_name_plural = 'Reservas de Stock'
+        indexes = [
+            models.Index(fields=['estado', 'fecha_expiracion'], name='reserva_estado_exp_idx'),
+            models.Index(fields=['producto', 'estado'], name='reserva_producto_estado_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Reserva #{self.id_reserva} - Venta #{self.venta_id} - {self.cantidad}u - {self.estado}"
+
+
+class SecuenciaComprobante(models.Model):
+    """Contador de numeración de comprobantes por tipo (y por año si está configurado)"""
+    id_secuencia = models.AutoField(primary_key=True)
+    tipo = models.CharField(max_length=20)
+    anio = models.PositiveIntegerField(default=0)  # 0 = numeración continua, sin reinicio anual
+    ultimo_numero = models.PositiveBigIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'secuencia_comprobante'
+        verbose_name = 'Secuencia de Comprobante'
+        verbose_name_plural = 'Secuencias de Comprobante'
+        unique_together = ('tipo', 'anio')
+    
+    def __str__(self):
+        return f"{self.tipo} ({self.anio or 'continua'}) - {self.ultimo_numero}"
+
+
+class MarcaSincronizacion(models.Model):
+    """Marca de agua de un proceso incremental (p. ej. la sincronización de VentaHistorico)"""
+    id_marca = models.AutoField(primary_key=True)
+    proceso = models.CharField(max_length=50, unique=True)
+    ultima_fecha = models.DateTimeField(null=True, blank=True)  # Último cambio ya procesado
+    fecha_ejecucion = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'marca_sincronizacion'
+        verbose_name = 'Marca de Sincronización'
+        verbose_name_plural = 'Marcas de Sincronización'
+    
+    def __str__(self):
+        return f"{self.proceso} - {self.ultima_fecha}"
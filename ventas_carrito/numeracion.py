@@ -0,0 +1,107 @@
+"""
+Asignación de números de comprobante basada en una tabla de contadores.
+
+Reemplaza el antiguo `COUNT(*) + 1` (lento y con colisiones bajo concurrencia).
+
+- Modo sin huecos (COMPROBANTE_NUMERACION_BLOQUE = 1): el contador se bloquea con
+  SELECT ... FOR UPDATE dentro de la transacción del llamador; si esta se revierte,
+  el número también. Solo es sin huecos si el llamador crea el Comprobante en esa
+  misma transacción (como ComprobanteView._generar_comprobante).
+- Modo por bloques (COMPROBANTE_NUMERACION_BLOQUE > 1): cada proceso reserva N
+  números de una vez en una conexión propia (autocommit) y los reparte en memoria.
+  Una reversión o un reinicio del worker deja huecos, pero nunca repite números.
+"""
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from .models import Comprobante, SecuenciaComprobante
+
+
+def _anio_actual():
+    if getattr(settings, 'COMPROBANTE_NUMERACION_POR_ANIO', False):
+        return timezone.localdate().year
+    return 0
+
+
+def _valor_inicial(tipo, anio):
+    """
+    Continuar después de los números emitidos con el esquema anterior (COUNT + 1):
+    todos los del tipo para la numeración continua, solo los del año si es anual
+    """
+    comprobantes = Comprobante.objects.filter(tipo=tipo)
+    if anio:
+        comprobantes = comprobantes.filter(fecha_emision__year=anio)
+    return comprobantes.count()
+
+
+def _reservar_en_transaccion(tipo, anio):
+    """Siguiente número con bloqueo de fila en la transacción actual (sin huecos)"""
+    with transaction.atomic():
+        secuencia = SecuenciaComprobante.objects.select_for_update().filter(tipo=tipo, anio=anio).first()
+        if secuencia is None:
+            SecuenciaComprobante.objects.bulk_create(
+                [SecuenciaComprobante(tipo=tipo, anio=anio, ultimo_numero=_valor_inicial(tipo, anio))],
+                ignore_conflicts=True
+            )
+            secuencia = SecuenciaComprobante.objects.select_for_update().get(tipo=tipo, anio=anio)
+        secuencia.ultimo_numero += 1
+        secuencia.save(update_fields=['ultimo_numero'])
+        return secuencia.ultimo_numero
+
+
+def _reservar_bloque(tipo, anio, cantidad):
+    """
+    Reserva `cantidad` números en una conexión independiente que confirma de
+    inmediato, para que el bloque no dependa de la transacción del llamador.
+    Retorna el primer número del bloque.
+    """
+    tabla = SecuenciaComprobante._meta.db_table
+    conexion = connections.create_connection(DEFAULT_DB_ALIAS)
+    try:
+        with conexion.cursor() as cursor:
+            cursor.execute(f"SELECT 1 FROM {tabla} WHERE tipo = %s AND anio = %s", [tipo, anio])
+            if cursor.fetchone() is None:
+                cursor.execute(
+                    f"INSERT INTO {tabla} (tipo, anio, ultimo_numero) VALUES (%s, %s, %s) "
+                    f"ON CONFLICT (tipo, anio) DO NOTHING",
+                    [tipo, anio, _valor_inicial(tipo, anio)]
+                )
+            cursor.execute(
+                f"UPDATE {tabla} SET ultimo_numero = ultimo_numero + %s "
+                f"WHERE tipo = %s AND anio = %s RETURNING ultimo_numero",
+                [cantidad, tipo, anio]
+            )
+            ultimo = cursor.fetchone()[0]
+    finally:
+        conexion.close()
+    return ultimo - cantidad + 1
+
+
+class AsignadorNumeros:
+    """Reparte números de comprobante; mantiene un bloque en memoria por (tipo, año)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloques = {}  # (tipo, anio) -> [siguiente, ultimo]
+
+    def siguiente(self, tipo):
+        anio = _anio_actual()
+        tamano_bloque = getattr(settings, 'COMPROBANTE_NUMERACION_BLOQUE', 1)
+        if tamano_bloque <= 1:
+            return _reservar_en_transaccion(tipo, anio)
+
+        with self._lock:
+            bloque = self._bloques.get((tipo, anio))
+            if bloque is None or bloque[0] > bloque[1]:
+                inicio = _reservar_bloque(tipo, anio, tamano_bloque)
+                bloque = [inicio, inicio + tamano_bloque - 1]
+                self._bloques[(tipo, anio)] = bloque
+            numero = bloque[0]
+            bloque[0] += 1
+        return numero
+
+
+asignador = AsignadorNumeros()
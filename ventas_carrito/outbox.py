@@ -0,0 +1,189 @@
+"""
+Outbox transaccional para efectos secundarios post-venta.
+
+Las vistas de venta solo escriben filas en `evento_outbox` dentro de la misma
+transacción que la venta; el comando `despachar_outbox` las procesa por lotes
+(notificaciones, comprobante PDF, bitácora) con reintentos y backoff.
+
+En producción el despachador corre como worker (servicio smart_outbox en
+render.yaml, o la línea `worker` del Procfile).
+"""
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import EventoOutbox
+
+logger = logging.getLogger(__name__)
+
+MAX_INTENTOS = 5
+BACKOFF_BASE_SEGUNDOS = 30
+# Plazo de un evento reclamado antes de que otro despachador pueda retomarlo
+RECLAMO_SEGUNDOS = 10 * 60
+
+
+def registrar_evento(tipo_evento, /, **payload):
+    """Encolar un efecto secundario. Debe llamarse dentro de la transacción de la venta."""
+    # Posicional: el payload puede traer su propia clave 'tipo' (p. ej. tipo de comprobante)
+    return EventoOutbox.objects.create(
+        tipo=tipo_evento,
+        payload=payload,
+        fecha_disponible=timezone.now()
+    )
+
+
+def registrar_bitacora(usuario_id, accion, modulo, descripcion, ip=None):
+    """Atajo para encolar una entrada de bitácora"""
+    return registrar_evento(
+        'registrar_bitacora',
+        usuario_id=usuario_id,
+        accion=accion,
+        modulo=modulo,
+        descripcion=descripcion,
+        ip=ip
+    )
+
+
+# ==========================================================
+# MANEJADORES POR TIPO DE EVENTO
+# ==========================================================
+
+def _manejar_notificar_nueva_venta(payload):
+    from autenticacion_usuarios.notificaciones_views import notificar_nueva_venta
+    from .models import Venta
+
+    venta = Venta.objects.select_related('cliente', 'cliente__id').filter(id_venta=payload['venta_id']).first()
+    if venta is None:
+        # La venta se revirtió (p. ej. error de Stripe): nada que notificar
+        return
+    notificar_nueva_venta(venta)
+
+
+def _manejar_generar_comprobante(payload):
+    from .comprobantes_views import ComprobanteView
+    from .models import Venta
+
+    venta = Venta.objects.select_related('cliente', 'cliente__id').prefetch_related(
+        'detalles', 'detalles__producto'
+    ).filter(id_venta=payload['venta_id']).first()
+    if venta is None:
+        return
+    comprobante_view = ComprobanteView()
+    if hasattr(venta, 'comprobante'):
+        # Ya existe: el PDF solo se re-renderiza si cambió su contenido
+        comprobante_view._obtener_pdf(venta.comprobante, venta)
+    else:
+        comprobante_view._generar_comprobante(venta, payload.get('tipo', 'factura'))
+
+
+def _manejar_registrar_bitacora(payload):
+    from autenticacion_usuarios.models import Bitacora
+
+    Bitacora.objects.create(
+        id_usuario_id=payload['usuario_id'],
+        accion=payload['accion'],
+        modulo=payload['modulo'],
+        descripcion=payload.get('descripcion'),
+        ip=payload.get('ip')
+    )
+
+
+def _manejar_anular_payment_intent(payload):
+    """
+    Anula el PaymentIntent de una venta cancelada: lo cancela si aún no se cobró
+    y lo reembolsa si el cliente llegó a pagarlo.
+    """
+    import stripe
+    from django.conf import settings
+    from .models import PagoOnline
+
+    stripe.api_key = getattr(settings, 'STRIPE_SECRET_KEY', '')
+    payment_intent_id = payload['payment_intent_id']
+    payment_intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+
+    if payment_intent.status == 'succeeded':
+        # La clave de idempotencia evita un segundo reembolso si el evento se repite
+        stripe.Refund.create(payment_intent=payment_intent_id, idempotency_key=f'reembolso-{payment_intent_id}')
+        PagoOnline.objects.filter(stripe_payment_intent_id=payment_intent_id).update(estado='reembolsado')
+        logger.warning(f"PaymentIntent {payment_intent_id} cobrado para una venta cancelada: reembolsado")
+    elif payment_intent.status != 'canceled':
+        # Si se cobra justo ahora, cancel falla y el reintento lo reembolsa
+        stripe.PaymentIntent.cancel(payment_intent_id)
+
+
+MANEJADORES = {
+    'notificar_nueva_venta': _manejar_notificar_nueva_venta,
+    'generar_comprobante': _manejar_generar_comprobante,
+    'registrar_bitacora': _manejar_registrar_bitacora,
+    'anular_payment_intent': _manejar_anular_payment_intent,
+}
+
+
+# ==========================================================
+# DESPACHADOR
+# ==========================================================
+
+def _reclamar(tamano_lote):
+    """
+    Toma un lote de eventos pendientes en una transacción corta: los bloquea
+    con SKIP LOCKED, suma el intento y corre su fecha_disponible RECLAMO_SEGUNDOS.
+    Ningún otro despachador los vuelve a tomar hasta que venza ese plazo, que
+    solo llega a vencer si este proceso muere antes de registrar el resultado.
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        eventos = list(
+            EventoOutbox.objects.select_for_update(skip_locked=True)
+            .filter(estado='pendiente', fecha_disponible__lte=ahora)
+            .order_by('id_evento')[:tamano_lote]
+        )
+        for evento in eventos:
+            evento.intentos += 1
+            evento.fecha_disponible = ahora + timedelta(seconds=RECLAMO_SEGUNDOS)
+        if eventos:
+            EventoOutbox.objects.bulk_update(eventos, ['intentos', 'fecha_disponible'])
+    return eventos
+
+
+def despachar_lote(tamano_lote=100):
+    """
+    Procesa un lote de eventos pendientes y devuelve un resumen.
+
+    Los eventos se reclaman en una transacción corta (ver _reclamar) y cada
+    manejador corre después, fuera de ella y en su propia transacción: generar
+    un PDF o notificar no mantiene bloqueadas las filas del resto del lote.
+    """
+    resumen = {'procesados': 0, 'reintentos': 0, 'fallidos': 0}
+    eventos = _reclamar(tamano_lote)
+
+    for evento in eventos:
+        manejador = MANEJADORES.get(evento.tipo)
+        try:
+            if manejador is None:
+                raise ValueError(f"Tipo de evento desconocido: {evento.tipo}")
+            with transaction.atomic():
+                manejador(evento.payload)
+            evento.estado = 'procesado'
+            evento.fecha_procesado = timezone.now()
+            evento.ultimo_error = None
+            resumen['procesados'] += 1
+        except Exception as e:
+            evento.ultimo_error = str(e)
+            if evento.intentos >= MAX_INTENTOS:
+                evento.estado = 'fallido'
+                resumen['fallidos'] += 1
+                logger.error(f"Evento outbox #{evento.id_evento} ({evento.tipo}) descartado: {str(e)}")
+            else:
+                # Backoff exponencial: 30s, 60s, 120s, ...
+                espera = BACKOFF_BASE_SEGUNDOS * (2 ** (evento.intentos - 1))
+                evento.fecha_disponible = timezone.now() + timedelta(seconds=espera)
+                resumen['reintentos'] += 1
+                logger.warning(f"Evento outbox #{evento.id_evento} ({evento.tipo}) falló, reintento en {espera}s: {str(e)}")
+        # El resultado se guarda por evento: si el proceso muere a mitad de lote,
+        # solo se repiten los eventos que no alcanzaron a registrarse
+        evento.save(update_fields=['estado', 'ultimo_error', 'fecha_disponible', 'fecha_procesado'])
+
+    resumen['total'] = len(eventos)
+    return resumen
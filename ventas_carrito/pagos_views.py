@@ -6,6 +6,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.utils import timezone
+from django.db import transaction
 import json
 import hashlib
 import secrets
@@ -13,7 +14,9 @@ import logging
 from datetime import datetime
 
 from .models import Venta, PagoOnline, MetodoPago
-from autenticacion_usuarios.models import Usuario, Cliente, Bitacora
+from . import historico
+from autenticacion_usuarios.models import Usuario, Cliente
+from autenticacion_usuarios import bitacora
 
 logger = logging.getLogger(__name__)
 
@@ -153,13 +156,16 @@ class PagoOnlineView(View):
             
             # Si el pago fue exitoso, actualizar estado de la venta
             if resultado_pago['estado'] == 'exitoso':
-                venta.estado = 'completada'
-                venta.metodo_pago = 'stripe'  # SOLO Stripe permitido
-                venta.save()
+                with transaction.atomic():
+                    estado_anterior = venta.estado
+                    venta.estado = 'completada'
+                    venta.metodo_pago = 'stripe'  # SOLO Stripe permitido
+                    venta.save()
+                    historico.registrar_cambio_estado(venta, estado_anterior)
             
             # Registrar en bitácora
-            Bitacora.objects.create(
-                id_usuario=usuario,
+            bitacora.registrar(
+                usuario.id,
                 accion='PAGO_ONLINE',
                 modulo='VENTAS',
                 descripcion=f'Pago en línea procesado para venta #{venta_id}. Estado: {resultado_pago["estado"]}',
@@ -0,0 +1,237 @@
+"""
+Resumen de compras por cliente (ClienteResumen).
+
+Cada fila guarda los totales de las ventas completadas de un cliente: cantidad,
+monto, máximo y mínimo, primera y última compra y las compras del mes en curso.
+Los consumidores (detalle de cliente, reporte de clientes, clientes activos del
+dashboard) leen una fila por cliente en lugar de recorrer sus ventas.
+
+- En tiempo real: cuando una venta entra o sale de 'completada'
+  (historico.aplicar_ventas) se recalcula la fila de su cliente con una sola
+  consulta agregada sobre sus ventas, con la fila bloqueada para que dos
+  cambios simultáneos del mismo cliente no se pisen.
+- Cada noche (comando recalcular_resumen_clientes): se recalculan todas las
+  filas por lotes y los puntajes RFM con PERCENT_RANK en la base de datos, y a
+  partir de ellos el segmento de cada cliente.
+"""
+import itertools
+import logging
+import math
+from datetime import datetime, time
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Q, Subquery, Sum, Window
+from django.db.models.functions import PercentRank
+from django.utils import timezone
+
+from autenticacion_usuarios.models import Cliente
+from .models import ClienteResumen, Venta
+
+logger = logging.getLogger(__name__)
+
+CLIENTES_POR_LOTE = 1000
+
+CAMPOS_RESUMEN = [
+    'total_compras', 'monto_total', 'monto_maximo', 'monto_minimo',
+    'primera_compra', 'ultima_compra', 'ultima_compra_monto',
+    'mes', 'compras_mes', 'monto_mes',
+]
+
+CAMPOS_SEGMENTO = ['recencia', 'frecuencia', 'valor', 'segmento', 'fecha_segmento']
+
+# Puntaje de una dimensión en la que todos los clientes empatan (o hay uno solo)
+PUNTAJE_NEUTRO = 3
+
+# Valores de un cliente sin ventas completadas
+_SIN_COMPRAS = {
+    'total_compras': 0, 'monto_total': 0, 'monto_maximo': None, 'monto_minimo': None,
+    'primera_compra': None, 'ultima_compra': None, 'ultima_compra_monto': None,
+    'mes': None, 'compras_mes': 0, 'monto_mes': 0,
+}
+
+
+def inicio_mes_actual():
+    """Primer día del mes en curso (hora local)"""
+    return timezone.localdate().replace(day=1)
+
+
+def compras_del_mes(resumen):
+    """(compras, monto) del mes en curso; el bucket de un mes anterior cuenta como vacío"""
+    if resumen is None or resumen.mes != inicio_mes_actual():
+        return 0, 0
+    return resumen.compras_mes, resumen.monto_mes
+
+
+def agregar_ventas(cliente_ids, desde=None, hasta=None):
+    """
+    {cliente_id: valores} de las ventas completadas de esos clientes, en una
+    consulta. `desde`/`hasta` limitan las ventas (p. ej. reportes por fechas).
+    """
+    mes = inicio_mes_actual()
+    desde_mes = timezone.make_aware(datetime.combine(mes, time.min))
+    ventas = Venta.objects.filter(estado='completada')
+    if desde is not None:
+        ventas = ventas.filter(fecha_venta__gte=desde)
+    if hasta is not None:
+        ventas = ventas.filter(fecha_venta__lte=hasta)
+    ultima = (
+        ventas.filter(cliente_id=OuterRef('cliente_id'))
+        .order_by('-fecha_venta', '-id_venta')
+        .values('total')[:1]
+    )
+    filas = (
+        ventas.filter(cliente_id__in=cliente_ids)
+        .values('cliente_id')
+        .annotate(
+            total_compras=Count('pk'),
+            monto_total=Sum('total'),
+            monto_maximo=Max('total'),
+            monto_minimo=Min('total'),
+            primera_compra=Min('fecha_venta'),
+            ultima_compra=Max('fecha_venta'),
+            compras_mes=Count('pk', filter=Q(fecha_venta__gte=desde_mes)),
+            monto_mes=Sum('total', filter=Q(fecha_venta__gte=desde_mes)),
+            ultima_compra_monto=Subquery(ultima),
+        )
+        .order_by()
+    )
+    return {
+        fila.pop('cliente_id'): {**fila, 'mes': mes, 'monto_mes': fila['monto_mes'] or 0}
+        for fila in filas
+    }
+
+
+def actualizar_clientes(cliente_ids):
+    """Recalcula el resumen de los clientes indicados desde sus ventas"""
+    cliente_ids = sorted(set(cliente_ids))
+    if not cliente_ids:
+        return
+
+    with transaction.atomic():
+        ClienteResumen.objects.bulk_create(
+            [ClienteResumen(cliente_id=cliente_id) for cliente_id in cliente_ids],
+            ignore_conflicts=True
+        )
+        # Con las filas bloqueadas, el agregado ve las ventas ya confirmadas por
+        # cualquier otra transacción que haya actualizado al mismo cliente
+        list(
+            ClienteResumen.objects.select_for_update()
+            .filter(cliente_id__in=cliente_ids)
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        agregados = agregar_ventas(cliente_ids)
+        ClienteResumen.objects.bulk_create(
+            [
+                ClienteResumen(cliente_id=cliente_id, **agregados.get(cliente_id, _SIN_COMPRAS))
+                for cliente_id in cliente_ids
+            ],
+            update_conflicts=True,
+            unique_fields=['cliente'],
+            update_fields=CAMPOS_RESUMEN + ['fecha_actualizacion']
+        )
+
+
+def actualizar_por_ventas(venta_ids):
+    """Recalcula el resumen de los clientes de esas ventas"""
+    actualizar_clientes(Venta.objects.filter(id_venta__in=list(venta_ids)).values_list('cliente_id', flat=True).distinct())
+
+
+# ==========================================================
+# RECÁLCULO NOCTURNO Y SEGMENTOS RFM
+# ==========================================================
+
+def _segmento(recencia, frecuencia, valor):
+    """Segmento a partir de los puntajes RFM (1 = peor quintil, 5 = mejor)"""
+    if recencia >= 4 and frecuencia >= 4 and valor >= 4:
+        return 'campeon'
+    if recencia >= 3 and frecuencia >= 4:
+        return 'leal'
+    if recencia >= 4 and frecuencia <= 1:
+        return 'nuevo'
+    if recencia >= 3:
+        return 'potencial'
+    if frecuencia >= 3 or valor >= 4:
+        return 'en_riesgo'
+    if recencia == 2:
+        return 'hibernando'
+    return 'perdido'
+
+
+def _quintil(percentil):
+    """Puntaje 1-5 a partir del PERCENT_RANK (0 = el menor valor, 1 = el mayor)"""
+    # Redondeo: 0.6 * 5 da 3.0000000000000004 en coma flotante
+    return min(math.floor(round(percentil * 5, 9)) + 1, 5)
+
+
+def recalcular_segmentos(lote=CLIENTES_POR_LOTE):
+    """
+    Puntajes RFM por quintiles de PERCENT_RANK sobre los clientes con compras y
+    segmento de cada cliente. Retorna {segmento: cantidad}.
+
+    PERCENT_RANK da el mismo valor a los empates, así que dos clientes con la
+    misma última compra, cantidad o monto reciben el mismo puntaje (con NTILE el
+    desempate por id los repartía entre quintiles distintos). Si en una
+    dimensión todos empatan, PERCENT_RANK da 0 a todos: esa dimensión recibe
+    PUNTAJE_NEUTRO en lugar de 1 (una tienda con un solo comprador, o en la que
+    todos compraron una vez, no los marca como perdidos).
+    """
+    ahora = timezone.now()
+    ClienteResumen.objects.filter(total_compras=0).update(
+        recencia=None, frecuencia=None, valor=None, segmento='sin_compras', fecha_segmento=ahora
+    )
+
+    con_compras = ClienteResumen.objects.filter(total_compras__gt=0)
+    rangos = con_compras.aggregate(
+        r_min=Min('ultima_compra'), r_max=Max('ultima_compra'),
+        f_min=Min('total_compras'), f_max=Max('total_compras'),
+        m_min=Min('monto_total'), m_max=Max('monto_total'),
+    )
+    empatados = [rangos[f'{d}_min'] == rangos[f'{d}_max'] for d in ('r', 'f', 'm')]
+
+    puntajes = (
+        con_compras
+        .annotate(
+            r=Window(PercentRank(), order_by=F('ultima_compra').asc()),
+            f=Window(PercentRank(), order_by=F('total_compras').asc()),
+            m=Window(PercentRank(), order_by=F('monto_total').asc()),
+        )
+        .values_list('pk', 'r', 'f', 'm')
+        .order_by()
+        .iterator(chunk_size=lote)
+    )
+    conteo = {}
+    while True:
+        bloque = list(itertools.islice(puntajes, lote))
+        if not bloque:
+            break
+        filas = []
+        for cliente_id, r, f, m in bloque:
+            recencia, frecuencia, valor = (
+                PUNTAJE_NEUTRO if empatado else _quintil(percentil)
+                for empatado, percentil in zip(empatados, (r, f, m))
+            )
+            segmento = _segmento(recencia, frecuencia, valor)
+            conteo[segmento] = conteo.get(segmento, 0) + 1
+            filas.append(ClienteResumen(
+                cliente_id=cliente_id, recencia=recencia, frecuencia=frecuencia, valor=valor,
+                segmento=segmento, fecha_segmento=ahora
+            ))
+        ClienteResumen.objects.bulk_update(filas, CAMPOS_SEGMENTO)
+    return conteo
+
+
+def reconstruir(lote=CLIENTES_POR_LOTE):
+    """Recalcula el resumen de todos los clientes por lotes y luego sus segmentos"""
+    cliente_ids = Cliente.objects.values_list('id', flat=True).order_by('id').iterator(chunk_size=lote)
+    clientes = 0
+    while True:
+        bloque = list(itertools.islice(cliente_ids, lote))
+        if not bloque:
+            break
+        actualizar_clientes(bloque)
+        clientes += len(bloque)
+
+    segmentos = recalcular_segmentos(lote)
+    logger.info(f"ClienteResumen recalculado: {clientes} clientes, segmentos {segmentos}")
+    return {'clientes': clientes, 'segmentos': segmentos}
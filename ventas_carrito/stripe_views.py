@@ -8,6 +8,7 @@ from django.utils.decorators import method_decorator
 from django.views import View
 from django.conf import settings
 from django.db import transaction
+from django.core.cache import cache
 from django.utils import timezone
 import json
 import logging
@@ -22,12 +23,25 @@ except ImportError:
     STRIPE_AVAILABLE = False
 
 from .models import Venta, PagoOnline, MetodoPago, Carrito, ItemCarrito, DetalleVenta, Comprobante
-from autenticacion_usuarios.models import Usuario, Cliente, Bitacora
-from productos.models import Stock
-from .comprobantes_views import ComprobanteView
+from autenticacion_usuarios.models import Usuario, Cliente
+from .outbox import registrar_evento, registrar_bitacora
+from . import historico
+from .reservas import (
+    verificar_disponibilidad, reservar_stock, confirmar_reservas, liberar_reservas,
+    reserva_vigente, descontar_stock, cancelar_ventas, StockInsuficiente
+)
+from .coalescencia import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# Caché de verificaciones: estados no terminales se cachean unos segundos,
+# los terminales (ya no cambian en Stripe) durante un plazo más largo pero acotado
+CACHE_PREFIJO_VERIFICACION = 'stripe:verify:'
+VERIFICACION_CACHE_TTL = getattr(settings, 'STRIPE_VERIFICACION_CACHE_TTL', 3)
+VERIFICACION_TERMINAL_TTL = getattr(settings, 'STRIPE_VERIFICACION_TERMINAL_TTL', 60 * 60)
+ESTADOS_TERMINALES_PI = ('succeeded', 'canceled')
+_verificaciones_en_curso = SingleFlight()
+
 # Configurar Stripe con la clave secreta desde variables de entorno
 if STRIPE_AVAILABLE:
     stripe.api_key = getattr(settings, 'STRIPE_SECRET_KEY', '')
@@ -146,30 +160,19 @@ class CreatePaymentIntentView(View):
                     'message': 'El total debe ser mayor a 0'
                 }, status=400)
             
-            # Verificar stock antes de crear la venta
-            productos_sin_stock = []
-            for item in items_carrito.select_related('producto'):
-                stock_obj = Stock.objects.filter(producto=item.producto).first()
-                stock_disponible = stock_obj.cantidad if stock_obj else 0
-                
-                if stock_disponible < item.cantidad:
-                    productos_sin_stock.append({
-                        'producto': item.producto.nombre,
-                        'solicitado': item.cantidad,
-                        'disponible': stock_disponible
-                    })
-            
-            if productos_sin_stock:
-                mensaje = 'Stock insuficiente para los siguientes productos: '
-                mensaje += ', '.join([f"{p['producto']} (solicitado: {p['solicitado']}, disponible: {p['disponible']})" 
-                                    for p in productos_sin_stock])
-                return JsonResponse({
-                    'success': False,
-                    'message': mensaje
-                }, status=400)
-            
-            # Crear venta y detalles en una transacción
+            # Verificar stock (descontando reservas vigentes), crear venta y reservar en una transacción
             with transaction.atomic():
+                productos_sin_stock = verificar_disponibilidad(items_carrito.select_related('producto'))
+                
+                if productos_sin_stock:
+                    mensaje = 'Stock insuficiente para los siguientes productos: '
+                    mensaje += ', '.join([f"{p['producto']} (solicitado: {p['solicitado']}, disponible: {p['disponible']})" 
+                                        for p in productos_sin_stock])
+                    return JsonResponse({
+                        'success': False,
+                        'message': mensaje
+                    }, status=400)
+                
                 venta = Venta.objects.create(
                     cliente=cliente,
                     total=total,
@@ -180,20 +183,20 @@ class CreatePaymentIntentView(View):
                 )
                 
                 # Crear detalles de venta
+                detalles = []
                 for item in items_carrito.select_related('producto'):
-                    DetalleVenta.objects.create(
+                    detalles.append(DetalleVenta.objects.create(
                         venta=venta,
                         producto=item.producto,
                         cantidad=item.cantidad,
                         precio_unitario=item.precio_unitario
-                    )
-            
-            # Notificar a administradores sobre nueva venta
-            try:
-                from autenticacion_usuarios.notificaciones_views import notificar_nueva_venta
-                notificar_nueva_venta(venta)
-            except Exception as e:
-                logger.warning(f"Error notificando nueva venta: {str(e)}")
+                    ))
+                
+                # Retener el stock hasta que se verifique el pago o expire la reserva
+                reservar_stock(venta, detalles)
+                
+                # Notificar a administradores sobre nueva venta (vía outbox)
+                registrar_evento('notificar_nueva_venta', venta_id=venta.id_venta)
             
             # Obtener o crear método de pago Stripe
             metodo_pago, _ = MetodoPago.objects.get_or_create(nombre='Stripe')
@@ -233,17 +236,14 @@ class CreatePaymentIntentView(View):
                 referencia=f"STRIPE-{timezone.now().strftime('%Y%m%d')}-{payment_intent.id[:8]}"
             )
             
-            # Registrar en bitácora
-            try:
-                Bitacora.objects.create(
-                    id_usuario=usuario,
-                    accion='STRIPE_PAYMENT_INTENT_CREATED',
-                    modulo='VENTAS',
-                    descripcion=f'Payment Intent creado para venta #{venta.id_venta}',
-                    ip=_get_client_ip(request)
-                )
-            except Exception as e:
-                logger.warning(f"Error al registrar en bitácora: {str(e)}")
+            # Registrar en bitácora (vía outbox)
+            registrar_bitacora(
+                usuario_id=usuario.id,
+                accion='STRIPE_PAYMENT_INTENT_CREATED',
+                modulo='VENTAS',
+                descripcion=f'Payment Intent creado para venta #{venta.id_venta}',
+                ip=_get_client_ip(request)
+            )
             
             logger.info(f"✅ Payment Intent {payment_intent.id} creado para Venta #{venta.id_venta}")
             
@@ -301,156 +301,216 @@ class VerifyPaymentIntentView(View):
                     'message': 'payment_intent_id es requerido'
                 }, status=400)
             
-            # Recuperar Payment Intent de Stripe
-            try:
-                payment_intent = stripe.PaymentIntent.retrieve(payment_intent_id)
-            except stripe.error.StripeError as e:
-                logger.error(f"Error de Stripe al recuperar Payment Intent: {str(e)}")
-                return JsonResponse({
-                    'success': False,
-                    'message': f'Error al verificar pago: {str(e)}'
-                }, status=400)
-            
-            status_pi = payment_intent.status
-            logger.info(f"🔍 Verificando Payment Intent: {payment_intent_id}, Estado: {status_pi}")
-            
-            # Buscar el pago por Payment Intent ID
-            try:
-                pago_online = PagoOnline.objects.get(stripe_payment_intent_id=payment_intent_id)
-            except PagoOnline.DoesNotExist:
-                logger.error(f"❌ No se encontró el PagoOnline con Payment Intent: {payment_intent_id}")
-                return JsonResponse({
-                    'success': False,
-                    'message': 'Pago no encontrado en la base de datos',
-                    'payment_intent_id': payment_intent_id
-                }, status=404)
-            
-            venta = pago_online.venta
+            # Las consultas concurrentes del mismo PaymentIntent comparten una sola verificación
+            respuesta, status_code = _verificaciones_en_curso.do(
+                payment_intent_id,
+                lambda: self._verificar_con_cache(request, payment_intent_id)
+            )
+            return JsonResponse(respuesta, status=status_code)
             
-            # Si el pago fue exitoso en Stripe, actualizar el registro
-            if status_pi == 'succeeded':
-                comprobante_data = None
-                
-                with transaction.atomic():
-                    pago_online.estado = 'exitoso'
-                    pago_online.save(update_fields=['estado'])
-                    
-                    # Actualizar estado de la venta
-                    venta.estado = 'completada'
-                    venta.metodo_pago = 'stripe'
-                    venta.save(update_fields=['estado', 'metodo_pago'])
-                    
-                    # Actualizar stock
-                    for detalle in venta.detalles.all():
-                        stock_obj = Stock.objects.filter(producto=detalle.producto).first()
-                        if stock_obj:
-                            stock_obj.cantidad -= detalle.cantidad
-                            if stock_obj.cantidad < 0:
-                                stock_obj.cantidad = 0
-                            stock_obj.save()
-                    
-                    # Limpiar carrito
-                    try:
-                        carrito = Carrito.objects.get(cliente=venta.cliente, activo=True)
-                        carrito.items.all().delete()
-                        carrito.delete()
-                    except Carrito.DoesNotExist:
-                        pass
+        except json.JSONDecodeError:
+            return JsonResponse({
+                'success': False,
+                'message': 'Formato de datos inválido'
+            }, status=400)
+        except Exception as e:
+            logger.error(f"Error en VerifyPaymentIntentView: {str(e)}", exc_info=True)
+            return JsonResponse({
+                'success': False,
+                'message': f'Error interno: {str(e)}'
+            }, status=500)
+    
+    def _verificar_con_cache(self, request, payment_intent_id):
+        """Responder desde caché si hay un resultado reciente (o terminal) para el PaymentIntent"""
+        cache_key = f'{CACHE_PREFIJO_VERIFICACION}{payment_intent_id}'
+        cacheado = cache.get(cache_key)
+        if cacheado is not None:
+            return cacheado
+        
+        respuesta, status_code = self._verificar(request, payment_intent_id)
+        if status_code == 200:
+            # Estados terminales no cambian más en Stripe, pero la venta sí puede
+            # cambiar (reembolso, anulación): se cachean con un plazo acotado
+            terminal = respuesta.get('status') in ESTADOS_TERMINALES_PI
+            timeout = VERIFICACION_TERMINAL_TTL if terminal else VERIFICACION_CACHE_TTL
+            cache.set(cache_key, (respuesta, status_code), timeout)
+        return respuesta, status_code
+    
+    def _verificar(self, request, payment_intent_id):
+        """Consultar Stripe y actualizar PagoOnline/Venta. Retorna (respuesta, status_code)"""
+        # Recuperar Payment Intent de Stripe
+        try:
+            payment_intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+        except stripe.error.StripeError as e:
+            logger.error(f"Error de Stripe al recuperar Payment Intent: {str(e)}")
+            return {
+                'success': False,
+                'message': f'Error al verificar pago: {str(e)}'
+            }, 400
+        
+        status_pi = payment_intent.status
+        logger.info(f"🔍 Verificando Payment Intent: {payment_intent_id}, Estado: {status_pi}")
+        
+        # Buscar el pago por Payment Intent ID
+        try:
+            pago_online = PagoOnline.objects.get(stripe_payment_intent_id=payment_intent_id)
+        except PagoOnline.DoesNotExist:
+            logger.error(f"❌ No se encontró el PagoOnline con Payment Intent: {payment_intent_id}")
+            return {
+                'success': False,
+                'message': 'Pago no encontrado en la base de datos',
+                'payment_intent_id': payment_intent_id
+            }, 404
+        
+        venta = pago_online.venta
+        
+        # Si el pago fue exitoso en Stripe, actualizar el registro
+        if status_pi == 'succeeded':
+            rechazo = None
+            with transaction.atomic():
+                # Bloquear el pago: una verificación repetida no vuelve a descontar stock
+                pago_online = PagoOnline.objects.select_for_update().get(id_pago=pago_online.id_pago)
+                # Bloquear la venta: el barrido de reservas no la cancela a mitad de la verificación
+                venta = Venta.objects.select_for_update().get(id_venta=pago_online.venta_id)
                 
-                # CU12: Generar comprobante automáticamente después de pago exitoso
-                try:
-                    comprobante_view = ComprobanteView()
-                    # Verificar si ya existe comprobante
-                    if hasattr(venta, 'comprobante'):
-                        comprobante = venta.comprobante
-                        # Regenerar PDF si ya existe
-                        try:
-                            pdf_path = comprobante_view._generar_pdf(comprobante, venta)
-                            comprobante.pdf_ruta = pdf_path
-                            comprobante.save()
-                        except Exception as e:
-                            logger.warning(f"Error al regenerar PDF del comprobante: {str(e)}")
+                if pago_online.estado == 'reembolsado':
+                    rechazo = 'La venta fue cancelada; el pago será reembolsado'
+                elif pago_online.estado != 'exitoso':
+                    if not reserva_vigente(venta):
+                        rechazo = 'La reserva de stock expiró y la venta fue cancelada; el pago será reembolsado'
                     else:
-                        # Crear nuevo comprobante
-                        comprobante = comprobante_view._generar_comprobante(venta, 'factura')
+                        try:
+                            descontar_stock([venta.id_venta])
+                        except StockInsuficiente as e:
+                            rechazo = f'Sin stock suficiente para {", ".join(e.productos)}; el pago será reembolsado'
                     
-                    comprobante_data = {
-                        'id': comprobante.id_comprobante,
-                        'numero': comprobante.nro,
-                        'tipo': comprobante.tipo,
-                        'fecha': comprobante.fecha_emision.isoformat(),
-                        'pdf_url': f'/api/ventas/comprobantes/{venta.id_venta}/pdf/'
-                    }
-                    logger.info(f"✅ Comprobante #{comprobante.nro} generado automáticamente para venta #{venta.id_venta}")
-                except Exception as e:
-                    logger.error(f"Error al generar comprobante automático: {str(e)}", exc_info=True)
-                    # No fallar la venta si el comprobante falla, pero registrar el error
-                
-                # Registrar en bitácora
-                try:
-                    user_id = request.session.get('user_id')
-                    if user_id:
-                        usuario = Usuario.objects.get(id=user_id)
-                        Bitacora.objects.create(
-                            id_usuario=usuario,
-                            accion='STRIPE_PAYMENT_SUCCEEDED',
-                            modulo='VENTAS',
-                            descripcion=f'Pago Stripe exitoso para venta #{venta.id_venta}',
-                            ip=_get_client_ip(request)
-                        )
-                except Exception as e:
-                    logger.warning(f"Error al registrar en bitácora: {str(e)}")
-                
-                logger.info(f"✅ PagoOnline #{pago_online.id_pago} y Venta #{venta.id_venta} confirmados exitosamente")
-                
-                response_data = {
-                    'success': True,
-                    'status': status_pi,
-                    'pago_online_id': pago_online.id_pago,
-                    'venta_id': venta.id_venta,
-                    'message': 'Pago confirmado exitosamente'
-                }
-                
-                # Agregar información del comprobante si se generó exitosamente
-                if comprobante_data:
-                    response_data['comprobante'] = comprobante_data
-                
-                return JsonResponse(response_data, status=200)
+                    if rechazo:
+                        # Cobrado pero sin stock que entregar: se reembolsa vía outbox
+                        pago_online.estado = 'reembolsado'
+                        pago_online.save(update_fields=['estado'])
+                        liberar_reservas(venta)
+                        if venta.estado == 'pendiente':
+                            venta.estado = 'cancelada'
+                            venta.save(update_fields=['estado', 'fecha_actualizacion'])
+                        registrar_evento('anular_payment_intent', payment_intent_id=payment_intent_id)
+                        logger.warning(f"⚠️ Venta #{venta.id_venta} no completada con PaymentIntent {payment_intent_id}: {rechazo}")
+                    else:
+                        pago_online.estado = 'exitoso'
+                        pago_online.save(update_fields=['estado'])
+                        
+                        # Actualizar estado de la venta y el historial diario
+                        estado_anterior = venta.estado
+                        venta.estado = 'completada'
+                        venta.metodo_pago = 'stripe'
+                        venta.save(update_fields=['estado', 'metodo_pago', 'fecha_actualizacion'])
+                        historico.registrar_cambio_estado(venta, estado_anterior)
+                        
+                        # El stock ya se descontó: la reserva queda confirmada
+                        confirmar_reservas(venta)
+                        
+                        # Limpiar carrito
+                        try:
+                            carrito = Carrito.objects.get(cliente=venta.cliente, activo=True)
+                            carrito.items.all().delete()
+                            carrito.delete()
+                        except Carrito.DoesNotExist:
+                            pass
+                        
+                        # CU12: Generar (o regenerar) comprobante en segundo plano vía outbox
+                        registrar_evento('generar_comprobante', venta_id=venta.id_venta, tipo='factura')
+                        
+                        # Registrar en bitácora
+                        user_id = request.session.get('user_id')
+                        if user_id:
+                            registrar_bitacora(
+                                usuario_id=user_id,
+                                accion='STRIPE_PAYMENT_SUCCEEDED',
+                                modulo='VENTAS',
+                                descripcion=f'Pago Stripe exitoso para venta #{venta.id_venta}',
+                                ip=_get_client_ip(request)
+                            )
             
-            # Si el pago requiere acción adicional
-            elif status_pi in ['requires_payment_method', 'requires_confirmation', 'requires_action']:
-                pago_online.estado = 'pendiente'
-                pago_online.save(update_fields=['estado'])
-                
-                return JsonResponse({
+            if rechazo:
+                return {
                     'success': False,
                     'status': status_pi,
                     'pago_online_id': pago_online.id_pago,
                     'venta_id': venta.id_venta,
-                    'message': f'Pago en estado: {status_pi}. Requiere acción adicional.'
-                }, status=200)
+                    'message': rechazo
+                }, 200
             
-            # Si el pago falló
+            # El comprobante ya existente se informa; uno nuevo queda pendiente en el outbox
+            if hasattr(venta, 'comprobante'):
+                comprobante = venta.comprobante
+                comprobante_data = {
+                    'id': comprobante.id_comprobante,
+                    'numero': comprobante.nro,
+                    'tipo': comprobante.tipo,
+                    'fecha': comprobante.fecha_emision.isoformat(),
+                    'pdf_url': f'/api/ventas/comprobantes/{venta.id_venta}/pdf/'
+                }
             else:
-                pago_online.estado = 'fallido'
-                pago_online.save(update_fields=['estado'])
-                
-                return JsonResponse({
-                    'success': False,
-                    'status': status_pi,
-                    'pago_online_id': pago_online.id_pago,
-                    'venta_id': venta.id_venta,
-                    'message': f'Pago fallido o en estado inesperado: {status_pi}'
-                }, status=200)
-            
-        except json.JSONDecodeError:
-            return JsonResponse({
+                comprobante_data = {
+                    'estado': 'pendiente',
+                    'pdf_url': f'/api/ventas/comprobantes/{venta.id_venta}/pdf/'
+                }
+        
+            logger.info(f"✅ PagoOnline #{pago_online.id_pago} y Venta #{venta.id_venta} confirmados exitosamente")
+        
+            response_data = {
+                'success': True,
+                'status': status_pi,
+                'pago_online_id': pago_online.id_pago,
+                'venta_id': venta.id_venta,
+                'message': 'Pago confirmado exitosamente'
+            }
+        
+            response_data['comprobante'] = comprobante_data
+        
+            return response_data, 200
+        
+        # Si el pago requiere acción adicional o Stripe aún lo procesa: el pago no
+        # cambia (sigue pendiente, o ya lo cerró la conciliación o un reembolso)
+        elif status_pi in ['requires_payment_method', 'requires_confirmation', 'requires_action', 'processing']:
+            if status_pi == 'processing':
+                mensaje = 'Pago en proceso. Verifique nuevamente en unos segundos.'
+            else:
+                mensaje = f'Pago en estado: {status_pi}. Requiere acción adicional.'
+        
+            return {
                 'success': False,
-                'message': 'Formato de datos inválido'
-            }, status=400)
-        except Exception as e:
-            logger.error(f"Error en VerifyPaymentIntentView: {str(e)}", exc_info=True)
-            return JsonResponse({
+                'status': status_pi,
+                'pago_online_id': pago_online.id_pago,
+                'venta_id': venta.id_venta,
+                'message': mensaje
+            }, 200
+        
+        # Un PaymentIntent cancelado ya no se puede pagar: cerrar pago y venta y
+        # devolver el stock retenido
+        elif status_pi == 'canceled':
+            with transaction.atomic():
+                pago_online = PagoOnline.objects.select_for_update().get(id_pago=pago_online.id_pago)
+                if pago_online.estado == 'pendiente':
+                    pago_online.estado = 'fallido'
+                    pago_online.save(update_fields=['estado'])
+                liberar_reservas(venta)
+                cancelar_ventas(Venta.objects.filter(id_venta=venta.id_venta))
+        
+            return {
                 'success': False,
-                'message': f'Error interno: {str(e)}'
-            }, status=500)
+                'status': status_pi,
+                'pago_online_id': pago_online.id_pago,
+                'venta_id': venta.id_venta,
+                'message': 'El pago fue cancelado y la venta anulada'
+            }, 200
+        
+        # Estado desconocido: no se toca el pago, la conciliación lo resolverá
+        else:
+            logger.warning(f"⚠️ PaymentIntent {payment_intent_id} en estado inesperado: {status_pi}")
+            return {
+                'success': False,
+                'status': status_pi,
+                'pago_online_id': pago_online.id_pago,
+                'venta_id': venta.id_venta,
+                'message': f'Pago en estado inesperado: {status_pi}'
+            }, 200
@@ -1,3 +1,269 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from autenticacion_usuarios.models import Cliente, Rol, Usuario
+from productos.models import Producto, Stock
+from . import resumen_clientes
+from .conciliacion import PasarelaStub, conciliar_pagos_pendientes
+from .numeracion import AsignadorNumeros
+from .models import (
+    Carrito, ClienteResumen, Comprobante, DetalleVenta, EventoOutbox, PagoOnline, ReservaStock, Venta
+)
+
+
+class ConciliacionPagosTest(TestCase):
+    """Conciliación por lotes de pagos Stripe pendientes (conciliacion.py)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        rol = Rol.objects.create(nombre='Cliente')
+        usuario = Usuario.objects.create(nombre='Ana', email='ana@test.com', contrasena='x', id_rol=rol)
+        cls.cliente = Cliente.objects.create(id=usuario)
+        cls.producto = Producto.objects.create(nombre='Mouse', precio=Decimal('10.00'))
+        cls.stock = Stock.objects.create(producto=cls.producto, cantidad=10)
+
+    def _venta_pendiente(self, payment_intent_id, cantidad=2, estado='pendiente', estado_reserva='activa'):
+        venta = Venta.objects.create(cliente=self.cliente, total=Decimal('10.00') * cantidad, estado=estado)
+        DetalleVenta.objects.create(venta=venta, producto=self.producto, cantidad=cantidad, precio_unitario=Decimal('10.00'))
+        ReservaStock.objects.create(
+            venta=venta, producto=self.producto, cantidad=cantidad, estado=estado_reserva,
+            fecha_expiracion=timezone.now() + timedelta(minutes=15)
+        )
+        PagoOnline.objects.create(venta=venta, monto=venta.total, stripe_payment_intent_id=payment_intent_id)
+        return venta
+
+    def _conciliar(self, estados):
+        return conciliar_pagos_pendientes(PasarelaStub(estados), antiguedad_minima=timedelta(0))
+
+    def _stock(self):
+        self.stock.refresh_from_db()
+        return self.stock.cantidad
+
+    def test_pago_exitoso_completa_venta_y_descuenta_stock(self):
+        venta = self._venta_pendiente('pi_ok')
+        carrito = Carrito.objects.create(cliente=self.cliente, activo=True)
+
+        resumen = self._conciliar({'pi_ok': 'succeeded'})
+
+        venta.refresh_from_db()
+        self.assertEqual(resumen['ventas_completadas'], 1)
+        self.assertEqual(venta.estado, 'completada')
+        self.assertEqual(venta.pago_online.estado, 'exitoso')
+        self.assertEqual(self._stock(), 8)
+        self.assertEqual(venta.reservas.get().estado, 'confirmada')
+        self.assertTrue(EventoOutbox.objects.filter(tipo='generar_comprobante', payload__venta_id=venta.id_venta).exists())
+        # El carrito actual del cliente no pertenece a la venta conciliada
+        self.assertTrue(Carrito.objects.filter(pk=carrito.pk).exists())
+
+    def test_pago_exitoso_de_venta_cancelada_se_reembolsa(self):
+        venta = self._venta_pendiente('pi_tarde', estado='cancelada', estado_reserva='liberada')
+
+        resumen = self._conciliar({'pi_tarde': 'succeeded'})
+
+        venta.refresh_from_db()
+        self.assertEqual(resumen['ventas_completadas'], 0)
+        self.assertEqual(resumen['ventas_rechazadas'], 1)
+        self.assertEqual(venta.estado, 'cancelada')
+        self.assertEqual(venta.pago_online.estado, 'reembolsado')
+        self.assertEqual(self._stock(), 10)
+        self.assertTrue(
+            EventoOutbox.objects.filter(tipo='anular_payment_intent', payload__payment_intent_id='pi_tarde').exists()
+        )
+
+    def test_pago_exitoso_sin_stock_se_reembolsa(self):
+        completa = self._venta_pendiente('pi_primero', cantidad=6)
+        sin_stock = self._venta_pendiente('pi_segundo', cantidad=6)
+
+        resumen = self._conciliar({'pi_primero': 'succeeded', 'pi_segundo': 'succeeded'})
+
+        completa.refresh_from_db()
+        sin_stock.refresh_from_db()
+        self.assertEqual((resumen['ventas_completadas'], resumen['ventas_rechazadas']), (1, 1))
+        self.assertEqual(completa.estado, 'completada')
+        self.assertEqual(sin_stock.estado, 'cancelada')
+        self.assertEqual(sin_stock.pago_online.estado, 'reembolsado')
+        self.assertEqual(self._stock(), 4)
+
+    def test_pago_cancelado_libera_reserva(self):
+        venta = self._venta_pendiente('pi_cancelado')
+
+        resumen = self._conciliar({'pi_cancelado': 'canceled'})
+
+        venta.refresh_from_db()
+        self.assertEqual(resumen['ventas_canceladas'], 1)
+        self.assertEqual(venta.estado, 'cancelada')
+        self.assertEqual(venta.pago_online.estado, 'fallido')
+        self.assertEqual(venta.reservas.get().estado, 'liberada')
+        self.assertEqual(self._stock(), 10)
+
+    def test_pago_en_curso_no_cambia(self):
+        venta = self._venta_pendiente('pi_en_curso')
+
+        resumen = self._conciliar({'pi_en_curso': 'requires_payment_method'})
+
+        venta.refresh_from_db()
+        self.assertEqual(resumen['estados'], {'requires_payment_method': 1})
+        self.assertEqual((resumen['ventas_completadas'], resumen['ventas_canceladas']), (0, 0))
+        self.assertEqual(venta.estado, 'pendiente')
+        self.assertEqual(venta.pago_online.estado, 'pendiente')
+        self.assertEqual(venta.reservas.get().estado, 'activa')
+        self.assertEqual(self._stock(), 10)
+
+
+class SegmentosRFMTest(TestCase):
+    """Puntajes RFM de resumen_clientes.recalcular_segmentos"""
+
+    def test_empates_reciben_el_mismo_puntaje(self):
+        rol = Rol.objects.create(nombre='Cliente')
+        ultima = timezone.now() - timedelta(days=3)
+        # Seis clientes idénticos y uno mejor en todo
+        for i in range(7):
+            usuario = Usuario.objects.create(nombre=f'C{i}', email=f'c{i}@test.com', contrasena='x', id_rol=rol)
+            cliente = Cliente.objects.create(id=usuario)
+            mejor = i == 6
+            ClienteResumen.objects.create(
+                cliente=cliente,
+                total_compras=10 if mejor else 1,
+                monto_total=Decimal('500.00') if mejor else Decimal('20.00'),
+                ultima_compra=timezone.now() if mejor else ultima,
+            )
+
+        resumen_clientes.recalcular_segmentos()
+
+        puntajes = list(ClienteResumen.objects.order_by('pk').values_list('recencia', 'frecuencia', 'valor'))
+        self.assertEqual(set(puntajes[:6]), {(1, 1, 1)})
+        self.assertEqual(puntajes[6], (5, 5, 5))
+
+    def _cliente_resumen(self, i, total_compras, monto, dias):
+        rol, _ = Rol.objects.get_or_create(nombre='Cliente')
+        usuario = Usuario.objects.create(nombre=f'C{i}', email=f'c{i}@test.com', contrasena='x', id_rol=rol)
+        ClienteResumen.objects.create(
+            cliente=Cliente.objects.create(id=usuario), total_compras=total_compras,
+            monto_total=Decimal(monto), ultima_compra=timezone.now() - timedelta(days=dias),
+        )
+
+    def test_un_solo_comprador_recibe_puntaje_neutro(self):
+        self._cliente_resumen(0, 1, '20.00', 3)
+
+        resumen_clientes.recalcular_segmentos()
+
+        resumen = ClienteResumen.objects.get()
+        self.assertEqual((resumen.recencia, resumen.frecuencia, resumen.valor), (3, 3, 3))
+        self.assertEqual(resumen.segmento, 'potencial')
+
+    def test_dimension_empatada_recibe_puntaje_neutro(self):
+        # Todos compraron una vez: la frecuencia no distingue a nadie
+        for i in range(5):
+            self._cliente_resumen(i, 1, f'{10 * (i + 1)}.00', 50 - 10 * i)
+
+        resumen_clientes.recalcular_segmentos()
+
+        puntajes = list(ClienteResumen.objects.order_by('pk').values_list('recencia', 'frecuencia', 'valor'))
+        self.assertEqual([frecuencia for _, frecuencia, _ in puntajes], [3] * 5)
+        self.assertEqual([(r, v) for r, _, v in puntajes], [(1, 1), (2, 2), (3, 3), (4, 4), (5, 5)])
+
+
+def _crear_comprobantes(cantidad, tipo='factura'):
+    rol, _ = Rol.objects.get_or_create(nombre='Cliente')
+    for _ in range(cantidad):
+        numero = Comprobante.objects.count() + 1
+        usuario = Usuario.objects.create(nombre='C', email=f'comprobante{numero}@test.com', contrasena='x', id_rol=rol)
+        venta = Venta.objects.create(cliente=Cliente.objects.create(id=usuario), total=Decimal('10.00'))
+        Comprobante.objects.create(venta=venta, tipo=tipo, nro=f'ANT-{numero}', total_factura=venta.total)
+
+
+@override_settings(COMPROBANTE_NUMERACION_BLOQUE=1, COMPROBANTE_NUMERACION_POR_ANIO=False)
+class NumeracionSinHuecosTest(TestCase):
+    """Numeración con bloqueo de fila (numeracion._reservar_en_transaccion)"""
+
+    def test_continua_despues_de_los_existentes(self):
+        _crear_comprobantes(2)
+        asignador = AsignadorNumeros()
+        self.assertEqual([asignador.siguiente('factura'), asignador.siguiente('factura')], [3, 4])
+        self.assertEqual(asignador.siguiente('recibo'), 1)
+
+    def test_reversion_no_deja_huecos(self):
+        asignador = AsignadorNumeros()
+        self.assertEqual(asignador.siguiente('factura'), 1)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.assertEqual(asignador.siguiente('factura'), 2)
+                raise RuntimeError('falla al crear el comprobante')
+        self.assertEqual(asignador.siguiente('factura'), 2)
+
+    @override_settings(COMPROBANTE_NUMERACION_POR_ANIO=True)
+    def test_reinicio_anual(self):
+        _crear_comprobantes(2)
+        anio = timezone.localdate().year
+        asignador = AsignadorNumeros()
+        with mock.patch('ventas_carrito.numeracion.timezone.localdate', return_value=date(anio - 1, 12, 31)):
+            self.assertEqual(asignador.siguiente('factura'), 1)
+        # El año en curso continúa después de sus propios comprobantes
+        self.assertEqual(asignador.siguiente('factura'), 3)
+        with mock.patch('ventas_carrito.numeracion.timezone.localdate', return_value=date(anio + 1, 1, 1)):
+            self.assertEqual([asignador.siguiente('factura'), asignador.siguiente('factura')], [1, 2])
+
+
+# El bloque se reserva en una conexión propia: necesita datos confirmados
+@override_settings(COMPROBANTE_NUMERACION_BLOQUE=3, COMPROBANTE_NUMERACION_POR_ANIO=False)
+class NumeracionPorBloquesTest(TransactionTestCase):
+    """Numeración con bloques reservados por proceso (numeracion._reservar_bloque)"""
+
+    def test_bloques_sin_repetir(self):
+        _crear_comprobantes(1)
+        primero, segundo = AsignadorNumeros(), AsignadorNumeros()
+        numeros = [primero.siguiente('factura'), segundo.siguiente('factura')]
+        numeros += [primero.siguiente('factura') for _ in range(3)]
+        # Cada proceso reparte su bloque; al agotarlo reserva el siguiente libre
+        self.assertEqual(numeros, [2, 5, 3, 4, 8])
+
+
+# Sesión en cookie firmada: las consultas medidas son solo las de la vista
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+class HistorialVentasConsultasTest(TestCase):
+    """HistorialVentasView hace las mismas consultas sin importar cuántas ventas muestra"""
+
+    @classmethod
+    def setUpTestData(cls):
+        rol_admin = Rol.objects.create(nombre='Administrador')
+        rol_cliente = Rol.objects.create(nombre='Cliente')
+        cls.admin = Usuario.objects.create(nombre='Admin', email='admin@test.com', contrasena='x', id_rol=rol_admin)
+        usuario = Usuario.objects.create(nombre='Ana', email='ana@test.com', contrasena='x', id_rol=rol_cliente)
+        cls.cliente = Cliente.objects.create(id=usuario)
+        cls.productos = [
+            Producto.objects.create(nombre=f'Producto {i}', precio=Decimal('5.00')) for i in range(3)
+        ]
+
+    def setUp(self):
+        session = self.client.session
+        session.update({'is_authenticated': True, 'user_id': self.admin.id})
+        session.save()
+        self.client.cookies['sessionid'] = session.session_key
+
+    def _crear_ventas(self, cantidad):
+        for i in range(cantidad):
+            venta = Venta.objects.create(cliente=self.cliente, total=Decimal('15.00'), estado='completada')
+            for producto in self.productos:
+                DetalleVenta.objects.create(venta=venta, producto=producto, cantidad=1, precio_unitario=producto.precio)
+            PagoOnline.objects.create(venta=venta, monto=venta.total, estado='exitoso')
+            if i % 2:
+                Comprobante.objects.create(venta=venta, nro=f'FAC-{venta.id_venta}', total_factura=venta.total)
+
+    def _consultar(self, consultas):
+        with self.assertNumQueries(consultas):
+            respuesta = self.client.get('/api/ventas/historial/', {'page_size': 50})
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def test_consultas_constantes(self):
+        # Usuario, rol, estadísticas, página de ventas, detalles y productos
+        self._crear_ventas(3)
+        self.assertEqual(len(self._consultar(6)['ventas']), 3)
+
+        self._crear_ventas(30)
+        self.assertEqual(len(self._consultar(6)['ventas']), 33)
@@ -23,12 +23,15 @@ urlpatterns = [
     # CU12: Comprobantes
     path('comprobantes/', comprobantes_views.ComprobanteView.as_view(), name='comprobantes'),
     path('comprobantes/generar/', comprobantes_views.ComprobanteView.as_view(), name='generar_comprobante'),
+    path('comprobantes/zip/', comprobantes_views.ComprobantesZipView.as_view(), name='comprobantes_zip'),
     path('comprobantes/<int:venta_id>/', comprobantes_views.ComprobanteView.as_view(), name='comprobante_detail'),
     path('comprobantes/<int:venta_id>/pdf/', comprobantes_views.ComprobantePDFView.as_view(), name='comprobante_pdf'),
     path('comprobantes/<int:venta_id>/excel/', comprobantes_views.ComprobanteExcelView.as_view(), name='comprobante_excel'),
     # CU13: Historial de ventas
     path('historial/', historial_views.HistorialVentasView.as_view(), name='historial_ventas'),
+    path('historial/exportar/', historial_views.HistorialExportarView.as_view(), name='historial_exportar'),
     path('historial/filtros/', historial_views.HistorialFiltrosView.as_view(), name='historial_filtros'),
+    path('historial/filtros/buscar/', historial_views.BusquedaFiltrosView.as_view(), name='historial_filtros_buscar'),
     path('historial/agregado/', historial_views.HistorialAgregadoView.as_view(), name='historial_agregado'),
     path('historial/sincronizar/', historial_views.SincronizarHistorialView.as_view(), name='sincronizar_historial'),
     path('dashboard/stats/', historial_views.DashboardStatsView.as_view(), name='dashboard_stats'),